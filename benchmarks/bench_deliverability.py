@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark the deliverability summary at increasing message volumes
+
+Fills a throwaway database with synced Twilio messages (10% inbound, one in
+seven with a newer webhook status) and times get_deliverability() over a
+window containing all of them. The counts come from the rollups, so the
+cost should stay flat as the volume grows.
+
+Usage:
+    python benchmarks/bench_deliverability.py --sizes 10000 100000 200000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mojo_core.db_utils import get_db_connection
+from mojo_core.twilio_sync import store_messages
+from mojo_core.status_store import get_deliverability, STATUS_RANK
+
+OUTBOUND_STATUSES = ['sent', 'delivered', 'read', 'failed', 'undelivered']
+
+def fill(conn, count, now):
+    """Insert count synced messages, one every 3 seconds back from now"""
+    rows = []
+    for i in range(count):
+        inbound = i % 10 == 0
+        status = 'received' if inbound else random.choice(OUTBOUND_STATUSES)
+        sent = now - i * 3
+        rows.append({
+            'sid': f"SM{i:032d}",
+            'direction': 'inbound' if inbound else 'outbound-api',
+            'from_number': 'whatsapp:+15551234567',
+            'to_number': f"whatsapp:+4477{i % 50000:08d}",
+            'phone_key': f"4477{i % 50000:08d}",
+            'body': 'Hi! Your order has shipped and is on its way.',
+            'status': status,
+            'status_rank': STATUS_RANK[status],
+            'error_code': None,
+            'error_message': None,
+            'price': -0.005,
+            'price_unit': 'USD',
+            'num_segments': 1,
+            'date_created_epoch': sent,
+            'date_sent_epoch': sent,
+            'date_updated_epoch': sent,
+        })
+    store_messages(conn, rows)
+    conn.executemany('''
+        UPDATE message_status SET status = 'read', status_rank = 5 WHERE message_sid = ?
+    ''', [(f"SM{i:032d}",) for i in range(0, count, 7)])
+    conn.commit()
+
+def time_call(func, repeat=3):
+    """Best of `repeat` runs, in milliseconds"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the deliverability summary')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 200000],
+                        help='Message counts to benchmark')
+    args = parser.parse_args()
+
+    now = int(time.time())
+    print("get_deliverability() over the whole window:")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            conn = get_db_connection(os.path.join(tmpdir, 'affiliates.db'))
+            fill(conn, size, now)
+            window = (now - size * 3 - 1, now, now - 86400)
+            elapsed = time_call(lambda: get_deliverability(conn, *window))
+            stats = get_deliverability(conn, *window)['stats']
+            conn.close()
+        print(f"  {size:>9,} messages  {elapsed:8.1f} ms  ({elapsed * 1000 / size:.2f} us/message, total={stats['total']:,})")
+
+if __name__ == '__main__':
+    main()
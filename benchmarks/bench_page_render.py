@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Benchmark render time and response size of the main web pages
+
+Builds the app against throwaway databases holding a realistic amount of data
+(templates, campaigns with run logs, contacts and report files), logs in, and
+requests each page repeatedly through the test client. Reports the median
+time per request and the size of the HTML sent. --uncached renders the
+listing tables on every request instead of serving them from the fragment cache;
+--compressed asks for brotli or gzip, so sizes are what goes over the wire.
+
+Usage:
+    python benchmarks/bench_page_render.py --requests 200 [--uncached] [--compressed]
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mojo_web import create_app, db
+from mojo_web.models import User, Template, Campaign, CampaignLog
+from mojo_core.db_utils import get_db_connection
+from mojo_core.report_manifest import record_report
+
+PAGES = ['/auth/login', '/', '/templates/', '/campaigns/', '/contacts/', '/reports/']
+
+def fill(app, affiliates_path, reports_dir, templates=20, campaigns=30, logs_per_campaign=10, contacts=5000):
+    """Seed the web and affiliates databases and the report manifest"""
+    now = datetime.now()
+    with app.app_context():
+        user = User(username='bench')
+        user.set_password('bench-password')
+        db.session.add(user)
+        for i in range(templates):
+            db.session.add(Template(name=f"Template {i}", template_sid=f"HX{i:032d}", description='Order update',
+                                    variables=['name', 'order_id']))
+        db.session.flush()
+        template_ids = [template.id for template in Template.query.all()]
+        for i in range(campaigns):
+            campaign = Campaign(name=f"Campaign {i}", description='Weekly shipped orders', status='completed',
+                                template_id=template_ids[i % len(template_ids)], db_path=affiliates_path,
+                                next_run=now + timedelta(days=1))
+            db.session.add(campaign)
+            db.session.flush()
+            for j in range(logs_per_campaign):
+                db.session.add(CampaignLog(campaign_id=campaign.id, status='success', recipients_total=500,
+                                           recipients_success=480, recipients_failed=20, execution_time=12.5,
+                                           created_at=now - timedelta(hours=i * logs_per_campaign + j)))
+        db.session.commit()
+
+    conn = get_db_connection(affiliates_path)
+    epoch = int(now.timestamp())
+    conn.executemany('''
+        INSERT INTO contacts (phone_key, phone_number, recipient, order_status, latest_order_id,
+                              is_valid_for_whatsapp, order_count, last_updated_epoch, last_messaged_epoch)
+        VALUES (?, ?, ?, 'SHIPPED', ?, 1, 1, ?, ?)
+    ''', [(f"4477{i:08d}", f"whatsapp:+4477{i:08d}", f"Customer {i}", f"ORD{i}", epoch - i * 60,
+           epoch - i * 120 if i % 3 else None) for i in range(contacts)])
+    conn.commit()
+    conn.close()
+
+    for i in range(40):
+        record_report(reports_dir, f"message_report_status_SHIPPED_{i:02d}.jsonl",
+                      {'total': 100, 'successful': 99, 'failed': 1, 'elapsed_time': 4.2, 'order_status': 'SHIPPED'},
+                      now - timedelta(hours=i))
+
+def measure(client, path, count, headers=None):
+    """Median milliseconds per request and bytes of the last response"""
+    timings = []
+    size = 0
+    for _ in range(count):
+        started = time.perf_counter()
+        response = client.get(path, headers=headers)
+        timings.append((time.perf_counter() - started) * 1000)
+        size = len(response.data)
+        assert response.status_code == 200, (path, response.status_code)
+    return statistics.median(timings), size
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark page render time and size')
+    parser.add_argument('--requests', type=int, default=200, help='Requests per page')
+    parser.add_argument('--uncached', action='store_true', help='Disable the fragment cache')
+    parser.add_argument('--compressed', action='store_true', help='Accept brotli and gzip responses')
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        affiliates_path = os.path.join(tmpdir, 'affiliates.db')
+        reports_dir = os.path.join(tmpdir, 'reports')
+        app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmpdir, 'web.db')}",
+            'WTF_CSRF_ENABLED': False,
+            'DEFAULT_DB_PATH': affiliates_path,
+            'REPORTS_DIR': reports_dir,
+            'FRAGMENT_CACHE_SECONDS': 0 if args.uncached else 30,
+        })
+        with app.app_context():
+            db.create_all()
+        fill(app, affiliates_path, reports_dir)
+
+        client = app.test_client()
+        headers = {'Accept-Encoding': 'br, gzip'} if args.compressed else None
+        print(f"Median of {args.requests} requests per page:")
+        for path in PAGES:
+            if path == '/':
+                client.post('/auth/login', data={'username': 'bench', 'password': 'bench-password'})
+            elapsed, size = measure(client, path, args.requests, headers)
+            print(f"  {path:<14} {elapsed:8.2f} ms  {size:>8,} bytes")
+    finally:
+        shutil.rmtree(tmpdir)
+
+if __name__ == '__main__':
+    main()
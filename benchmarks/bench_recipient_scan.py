@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Benchmark recipient scans on the wide orders table vs the narrow order_messaging
+and per-person contacts tables
+
+Builds a throwaway database with N fully populated order lines (default 1M),
+then times the legacy recipient query against orders, the same query against
+order_messaging and contacts, and a last_messaged update on each.
+
+Usage:
+    python benchmarks/bench_recipient_scan.py --rows 1000000
+"""
+import os
+import sys
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mojo_core.migrations import migrate, ORDER_COLUMNS
+from mojo_core.db_utils import get_recipients_from_db, count_audience
+
+STATUSES = ['To ship', 'Shipped', 'Completed', 'Canceled', 'Delivered']
+
+LEGACY_SCAN = """
+    SELECT
+        o.id, o.order_id, o.phone_number, o.raw_phone_number,
+        o.order_status, o.recipient, o.product_name, o.last_messaged
+    FROM orders o
+    WHERE o.is_valid_for_whatsapp = 1
+        AND (o.last_messaged IS NULL OR o.last_messaged = '')
+    ORDER BY o.last_updated DESC
+"""
+
+NARROW_SCAN = """
+    SELECT
+        m.id, m.order_id, m.phone_number, m.raw_phone_number,
+        m.order_status, m.recipient, m.last_messaged
+    FROM order_messaging m
+    WHERE m.is_valid_for_whatsapp = 1
+        AND m.last_messaged_epoch IS NULL
+    ORDER BY m.last_updated_epoch DESC
+"""
+
+CONTACTS_SCAN = """
+    SELECT
+        c.latest_order_id, c.phone_number, c.raw_phone_number,
+        c.order_status, c.recipient, c.last_messaged_epoch
+    FROM contacts c
+    WHERE c.is_valid_for_whatsapp = 1
+        AND c.last_messaged_epoch IS NULL
+    ORDER BY c.last_updated_epoch DESC
+"""
+
+def generate_rows(count, people):
+    """Yield fully populated order lines, several per person"""
+    columns = [name for name, _ in ORDER_COLUMNS]
+    base_time = datetime.datetime(2025, 1, 1)
+    for i in range(count):
+        phone = f"4477{random.randrange(people):08d}"
+        row = {}
+        for name, col_type in ORDER_COLUMNS:
+            if col_type == 'REAL':
+                row[name] = round(random.random() * 100, 2)
+            elif col_type == 'INTEGER':
+                row[name] = random.randrange(5)
+            else:
+                row[name] = f"{name}-{i}-filler-text"
+        row.update({
+            'order_id': f"ORD{i:09d}",
+            'sku_id': f"SKU{i % 50}",
+            'order_status': random.choice(STATUSES),
+            'phone_number': phone,
+            'raw_phone_number': f"(+44){phone[2:]}",
+            'is_valid_for_whatsapp': 1 if random.random() > 0.3 else 0,
+            'last_messaged': None,
+            'last_updated': (base_time + datetime.timedelta(seconds=i)).isoformat(),
+        })
+        yield tuple(row[name] for name in columns)
+
+def build_database(db_path, rows):
+    """Create the schema and load the synthetic order lines"""
+    conn = sqlite3.connect(db_path)
+    migrate(conn)
+
+    columns = [name for name, _ in ORDER_COLUMNS]
+    placeholders = ', '.join(['?'] * len(columns))
+    conn.executemany(
+        f"INSERT INTO orders ({', '.join(columns)}) VALUES ({placeholders})",
+        generate_rows(rows, people=max(1, rows // 5))
+    )
+    conn.commit()
+
+    # Mark a slice of people as already messaged on both copies
+    now = datetime.datetime.now()
+    conn.execute("UPDATE orders SET last_messaged = ? WHERE id % 7 = 0", (now.isoformat(),))
+    conn.execute("UPDATE order_messaging SET last_messaged = ?, last_messaged_epoch = ? WHERE id % 7 = 0",
+                 (now.isoformat(), int(now.timestamp())))
+    conn.execute("""
+        UPDATE contacts SET last_messaged_epoch = ?
+        WHERE phone_key IN (SELECT phone_key FROM order_messaging WHERE id % 7 = 0)
+    """, (int(now.timestamp()),))
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+
+def timed(label, func, repeat):
+    """Run func `repeat` times and print the best wall-clock time"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"  {label:<45} {best * 1000:10.1f} ms")
+    return result
+
+def run(rows, repeat):
+    fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        print(f"Building database with {rows:,} order lines...")
+        start = time.perf_counter()
+        build_database(db_path, rows)
+        print(f"  built in {time.perf_counter() - start:.1f}s ({os.path.getsize(db_path) / 1e6:.0f} MB)\n")
+
+        conn = sqlite3.connect(db_path)
+        print("Recipient scan (full result set):")
+        legacy = timed("orders (wide rows)", lambda: conn.execute(LEGACY_SCAN).fetchall(), repeat)
+        narrow = timed("order_messaging (narrow rows)", lambda: conn.execute(NARROW_SCAN).fetchall(), repeat)
+        people = timed("contacts (one row per person)", lambda: conn.execute(CONTACTS_SCAN).fetchall(), repeat)
+        timed("get_recipients_from_db()", lambda: get_recipients_from_db(db_path), repeat)
+        timed("count_audience() preview", lambda: count_audience(db_path), repeat)
+        timed("count_audience() with order_status filter",
+              lambda: count_audience(db_path, order_status='Delivered'), repeat)
+        print(f"  rows returned: legacy={len(legacy):,} narrow={len(narrow):,} contacts={len(people):,}\n")
+
+        phone = conn.execute("SELECT phone_number FROM orders WHERE phone_number IS NOT NULL LIMIT 1").fetchone()[0]
+        now = datetime.datetime.now().isoformat()
+        print("last_messaged update for one person:")
+        timed("UPDATE orders WHERE phone_number = ?",
+              lambda: conn.execute("UPDATE orders SET last_messaged = ? WHERE phone_number = ?", (now, phone)), repeat)
+        timed("UPDATE order_messaging WHERE phone_key = ?",
+              lambda: conn.execute("UPDATE order_messaging SET last_messaged = ? WHERE phone_key = ?", (now, phone)), repeat)
+        conn.rollback()
+        conn.close()
+    finally:
+        os.unlink(db_path)
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark recipient scans on wide vs narrow tables")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Number of order lines to generate (default: 1,000,000)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement, best time is reported (default: 3)")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    run(args.rows, args.repeat)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Load test the Twilio status webhook with a burst of callbacks
+
+Replays N status callbacks (default 100k: sent, delivered and read for a third
+as many messages) against the webhook from several concurrent clients, then
+waits for the background writer and checks every message reached 'read'.
+Callbacks answered with 503 are retried, as Twilio would.
+
+Usage:
+    python benchmarks/load_test_webhooks.py --callbacks 100000 --clients 8
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mojo_web import create_app
+from mojo_web import db as web_db
+from mojo_core.db_utils import get_db_connection
+
+STATUSES = ['sent', 'delivered', 'read']
+
+def make_app(tmpdir, queue_size, batch_size):
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmpdir, 'web.db')}",
+        'DEFAULT_DB_PATH': os.path.join(tmpdir, 'affiliates.db'),
+        'TWILIO_VALIDATE_WEBHOOKS': False,
+        'WEBHOOK_QUEUE_SIZE': queue_size,
+        'WEBHOOK_BATCH_SIZE': batch_size,
+    })
+    with app.app_context():
+        web_db.create_all()
+    return app
+
+def replay(app, callbacks, results):
+    """Post callbacks in order, retrying any the webhook refuses with 503"""
+    client = app.test_client()
+    latencies = []
+    retries = 0
+    for params in callbacks:
+        while True:
+            started = time.perf_counter()
+            status_code = client.post('/webhooks/twilio/status', data=params).status_code
+            latencies.append(time.perf_counter() - started)
+            if status_code != 503:
+                assert status_code == 204, status_code
+                break
+            retries += 1
+            time.sleep(0.01)
+    results.append((latencies, retries))
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the status webhook')
+    parser.add_argument('--callbacks', type=int, default=100000, help='Number of callbacks to send')
+    parser.add_argument('--clients', type=int, default=8, help='Concurrent webhook clients')
+    parser.add_argument('--queue-size', type=int, default=20000, help='Writer queue size')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Writer batch size')
+    args = parser.parse_args()
+
+    messages = args.callbacks // len(STATUSES)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        app = make_app(tmpdir, args.queue_size, args.batch_size)
+        writer = app.extensions['status_writer']
+
+        # Each client owns a slice of messages and sends their statuses in order
+        slices = [[] for _ in range(args.clients)]
+        for i in range(messages):
+            for status in STATUSES:
+                slices[i % args.clients].append({
+                    'MessageSid': f"SM{i:032d}",
+                    'MessageStatus': status,
+                    'To': f"whatsapp:+4477{i:08d}",
+                })
+
+        results = []
+        threads = [threading.Thread(target=replay, args=(app, callbacks, results)) for callbacks in slices]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        accepted = time.perf_counter() - started
+        writer.flush()
+        written = time.perf_counter() - started
+
+        latencies = sorted(latency for thread_latencies, _ in results for latency in thread_latencies)
+        retries = sum(thread_retries for _, thread_retries in results)
+        sent = messages * len(STATUSES)
+
+        conn = get_db_connection(app.config['DEFAULT_DB_PATH'])
+        read = conn.execute("SELECT COUNT(*) FROM message_status WHERE status = 'read'").fetchone()[0]
+        events = conn.execute("SELECT COUNT(*) FROM message_status_events").fetchone()[0]
+        conn.close()
+
+    print(f"Callbacks: {sent:,} from {args.clients} clients ({messages:,} messages)")
+    print(f"  accepted in {accepted:.1f}s ({sent / accepted:,.0f}/s), written in {written:.1f}s")
+    print(f"  latency p50 {latencies[len(latencies) // 2] * 1000:.2f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f} ms")
+    print(f"  503 retries: {retries:,}, writer errors: {writer.errors:,}")
+    print(f"  events stored: {events:,}, messages at 'read': {read:,}")
+    if events != sent or read != messages:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
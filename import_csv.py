@@ -6,6 +6,8 @@ import sys
 import datetime
 import argparse
 from create_database import create_database
+from mojo_core.db_utils import get_db_connection, to_epoch
+from mojo_core.migrations import ORDER_TIME_COLUMNS
 
 def clean_phone_number(phone_number):
     """
@@ -43,8 +45,8 @@ def import_csv_to_db(csv_path, db_path='affiliates.db', delimiter=','):
     if not os.path.exists(db_path):
         create_database(db_path)
     
-    # Connect to the database
-    conn = sqlite3.connect(db_path)
+    # Connect to the database (applies any pending migrations)
+    conn = get_db_connection(db_path)
     cursor = conn.cursor()
     
     try:
@@ -156,6 +158,11 @@ def import_csv_to_db(csv_path, db_path='affiliates.db', delimiter=','):
             # Add last_updated timestamp
             data['last_updated'] = current_time
             
+            # Keep the integer epoch copies of the order times in sync
+            for time_col, epoch_col in ORDER_TIME_COLUMNS:
+                if time_col in data:
+                    data[epoch_col] = to_epoch(data[time_col])
+            
             # Process phone number
             if 'raw_phone_number' in data:
                 phone_number, raw_number, is_valid = clean_phone_number(data['raw_phone_number'])
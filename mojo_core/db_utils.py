@@ -1,14 +1,25 @@
 """
 Database utility functions for CLI and web interface
 """
+import os
 import sqlite3
 import re
+import time
 import datetime
+from urllib.parse import quote
+from mojo_core import filters
+from mojo_core.migrations import migrate, PHONE_KEY_SEPARATORS
+
+# Database files already brought up to date by this process
+_migrated_paths = set()
 
 def get_db_connection(db_path):
     """
     Create a connection to the SQLite database
     
+    Pending schema migrations are applied the first time a database file is
+    opened by this process.
+    
     Args:
         db_path (str): Path to SQLite database file
         
@@ -17,8 +28,90 @@ def get_db_connection(db_path):
     """
     conn = sqlite3.connect(db_path)
     conn.row_factory = sqlite3.Row
+    
+    path_key = os.path.abspath(db_path)
+    if path_key not in _migrated_paths:
+        migrate(conn)
+        _migrated_paths.add(path_key)
+    
     return conn
 
+def get_read_only_connection(db_path):
+    """
+    Open an existing SQLite database for reading only
+    
+    Unlike get_db_connection(), a missing file is an error rather than a new
+    empty database, and no migrations are run.
+    
+    Args:
+        db_path (str): Path to SQLite database file
+        
+    Returns:
+        sqlite3.Connection: Read-only database connection
+    
+    Raises:
+        sqlite3.OperationalError: If the file doesn't exist or can't be opened
+    """
+    conn = sqlite3.connect(f"file:{quote(os.path.abspath(db_path))}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def normalize_phone_key(phone_number):
+    """
+    Normalize a phone number into the key used to match people across tables
+    
+    Strips the 'whatsapp:' prefix and the spaces, dashes, brackets and other
+    separators numbers are written with, exactly as migrations.PHONE_KEY_SQL
+    does in the database triggers, so 'whatsapp:+447700900123',
+    '+44 7700-900123' and '447700900123' share a key.
+    
+    Args:
+        phone_number (str): Phone number in any of the stored/Twilio formats
+        
+    Returns:
+        str: Phone key, or None if nothing is left
+    """
+    if not phone_number:
+        return None
+    
+    key = str(phone_number).replace('whatsapp:', '')
+    for separator in PHONE_KEY_SEPARATORS:
+        key = key.replace(separator, '')
+    return key or None
+
+def to_epoch(value):
+    """
+    Convert a stored timestamp into Unix epoch seconds
+    
+    Accepts datetimes, ISO strings as written by this package and the order
+    export's 'dd/mm/YYYY HH:MM:SS' format. Naive times are treated as local
+    time, matching datetime.now() and the migration backfill.
+    
+    Args:
+        value: Timestamp to convert
+        
+    Returns:
+        int: Epoch seconds, or None if the value is empty or unparseable
+    """
+    if isinstance(value, datetime.datetime):
+        dt = value
+    elif isinstance(value, str) and value.strip():
+        text = value.strip()
+        try:
+            if re.match(r'^\d{2}/\d{2}/\d{4}', text):
+                dt = datetime.datetime.strptime(text[:19], '%d/%m/%Y %H:%M:%S') if len(text) > 10 \
+                    else datetime.datetime.strptime(text, '%d/%m/%Y')
+            else:
+                dt = datetime.datetime.fromisoformat(text)
+        except ValueError:
+            return None
+    else:
+        return None
+    
+    if dt.tzinfo is not None:
+        return int(dt.timestamp())
+    return int(time.mktime(dt.timetuple()))
+
 def clean_phone_number(phone_number):
     """
     Process a phone number:
@@ -49,21 +142,109 @@ def clean_phone_number(phone_number):
     
     return clean_number if is_valid else None, raw_number, is_valid
 
-def get_recipients_from_db(db_path, filter_conditions=None, order_status=None, order_by=None, limit=None, force=False):
+def build_audience_query(filter_conditions=None, order_status=None, force=False, min_days_since_messaged=None):
+    """
+    Build the WHERE clause that selects a campaign audience from contacts c
+    
+    Args:
+        filter_conditions (str): Audience filter expression (see mojo_core.filters)
+        order_status (str): Filter by the status of each person's latest order
+        force (bool): If True, include previously messaged recipients
+        min_days_since_messaged (int): If set, also include recipients last messaged
+            at least this many days ago
+    
+    Returns:
+        tuple: (SQL WHERE clause, list of parameters)
+    
+    Raises:
+        FilterError: If the filter expression is invalid
+    """
+    where = "c.is_valid_for_whatsapp = 1"
+    params = []
+    
+    # Unless force flag is True, exclude recipients who have been messaged before
+    # (or recently, with a frequency cap); both are index range checks on the epoch
+    if not force:
+        if min_days_since_messaged is not None:
+            where += " AND (c.last_messaged_epoch IS NULL OR c.last_messaged_epoch <= ?)"
+            params.append(int(time.time()) - int(min_days_since_messaged) * 86400)
+        else:
+            where += " AND c.last_messaged_epoch IS NULL"
+    
+    # Add order status filter if provided (the status of the person's latest order)
+    if order_status:
+        where += " AND c.order_status = ?"
+        params.append(order_status)
+    
+    # Filter expressions match any of the person's order lines. The subquery
+    # isn't correlated, so SQLite evaluates it once and can drive it from an
+    # index on the filtered column; the wide detail table is only joined when
+    # the filter reads one of its columns
+    compiled = filters.compile_filter(filter_conditions) if filter_conditions else None
+    if compiled:
+        where += " AND c.phone_key IN (SELECT m.phone_key FROM order_messaging m"
+        if compiled.needs_orders:
+            where += " JOIN orders o ON o.id = m.id"
+        where += f" WHERE {compiled.sql})"
+        params.extend(compiled.params)
+    
+    return where, params
+
+# contacts columns a recipient list can be ordered by
+CONTACT_ORDER_COLUMNS = {
+    'phone_key', 'phone_number', 'raw_phone_number', 'recipient', 'buyer_username', 'order_status',
+    'latest_order_id', 'order_count', 'first_order_epoch', 'last_order_epoch', 'last_updated_epoch',
+    'last_messaged_epoch'
+}
+
+def build_order_by(order_by):
+    """
+    Check an ORDER BY list over contacts columns and return it in canonical form
+    
+    Args:
+        order_by (str): Comma separated terms like "c.last_order_epoch DESC" or "recipient"
+    
+    Returns:
+        str: ORDER BY list naming only c.<column> ASC/DESC terms
+    
+    Raises:
+        ValueError: If a term names an unknown column or has anything besides a direction
+    """
+    terms = []
+    for term in order_by.split(','):
+        match = re.fullmatch(r'\s*(?:c\.)?(\w+)(?:\s+(ASC|DESC))?\s*', term, re.IGNORECASE)
+        if not match or match.group(1).lower() not in CONTACT_ORDER_COLUMNS:
+            raise ValueError(f"Can't order recipients by: {term.strip()}")
+        terms.append(f"c.{match.group(1).lower()} {(match.group(2) or 'ASC').upper()}")
+    return ', '.join(terms)
+
+def get_recipients_from_db(db_path, filter_conditions=None, order_status=None, order_by=None, limit=None, force=False,
+                           min_days_since_messaged=None):
     """
     Get recipients from the database
     
     Args:
         db_path (str): Path to SQLite database file
-        filter_conditions (str): Custom SQL WHERE clause
+        filter_conditions (str): Audience filter expression over a person's order lines
+            (see mojo_core.filters)
         order_status (str): Filter by order status (e.g., 'SHIPPED', 'DELIVERED')
-        order_by (str): SQL ORDER BY clause
+        order_by (str): ORDER BY list over contacts columns (see build_order_by)
         limit (int): Maximum number of recipients to return
         force (bool): If True, include previously messaged recipients
+        min_days_since_messaged (int): If set, also include recipients last messaged
+            at least this many days ago
     
     Returns:
         list: List of dicts with recipient information
+    
+    Raises:
+        FilterError: If the filter expression is invalid, e.g. a stored raw SQL filter
+        ValueError: If order_by names anything but contacts columns
     """
+    # Bad filters and orderings are the caller's to report, not an empty audience
+    where, params = build_audience_query(filter_conditions, order_status, force, min_days_since_messaged)
+    order = build_order_by(order_by) if order_by else "c.last_updated_epoch DESC"
+    
     recipients = []
     
     try:
@@ -71,38 +252,18 @@ def get_recipients_from_db(db_path, filter_conditions=None, order_status=None, o
         conn = get_db_connection(db_path)
         cursor = conn.cursor()
         
-        # Build query
-        query = """
+        # Build query against the per-person contacts table (one row per phone)
+        query = f"""
             SELECT 
-                o.id, o.order_id, o.phone_number, o.raw_phone_number, 
-                o.order_status, o.recipient, o.product_name, o.last_messaged
+                c.latest_order_id AS order_id, c.phone_number, c.raw_phone_number, 
+                c.order_status, c.recipient, c.buyer_username,
+                datetime(c.last_messaged_epoch, 'unixepoch', 'localtime') AS last_messaged
             FROM 
-                orders o
-            WHERE 
-                o.is_valid_for_whatsapp = 1
+                contacts c
+            WHERE {where}
+            ORDER BY {order}
         """
         
-        # Unless force flag is True, exclude recipients who have been messaged before
-        if not force:
-            query += " AND (o.last_messaged IS NULL OR o.last_messaged = '')"
-        
-        params = []
-        
-        # Add order status filter if provided
-        if order_status:
-            query += " AND o.order_status = ?"
-            params.append(order_status)
-        
-        # Add custom filter conditions if provided
-        if filter_conditions:
-            query += f" AND {filter_conditions}"
-        
-        # Add ordering
-        if order_by:
-            query += f" ORDER BY {order_by}"
-        else:
-            query += " ORDER BY o.last_updated DESC"
-        
         # Add limit
         if limit:
             query += " LIMIT ?"
@@ -111,20 +272,10 @@ def get_recipients_from_db(db_path, filter_conditions=None, order_status=None, o
         # Execute query
         cursor.execute(query, params)
         
-        # Get results
-        unique_phone_numbers = set()  # Track unique phone numbers
-        
         for row in cursor.fetchall():
             # Convert row to dict
             recipient = dict(row)
             
-            # Skip this record if we've already seen this phone number
-            if recipient['phone_number'] in unique_phone_numbers:
-                continue
-                
-            # Add this phone number to our set of seen numbers
-            unique_phone_numbers.add(recipient['phone_number'])
-            
             # Format phone number for WhatsApp
             if recipient['phone_number'] and not recipient['phone_number'].startswith('whatsapp:'):
                 recipient['formatted_number'] = f"whatsapp:{recipient['phone_number']}"
@@ -140,7 +291,115 @@ def get_recipients_from_db(db_path, filter_conditions=None, order_status=None, o
         print(f"Error getting recipients from database: {e}")
         return []
 
-def log_message_to_db(db_path, order_id, phone_number, template_id, message_sid, status, error_message=None):
+def count_audience(db_path, filter_conditions=None, order_status=None, limit=None, force=False,
+                   min_days_since_messaged=None, sample=0):
+    """
+    Count the unique recipients a campaign would reach, without a dry run
+    
+    contacts holds one row per phone_key, so counting its rows is the
+    COUNT(DISTINCT phone_key) of the audience and is answered from the
+    recipient scan index.
+    
+    Args:
+        db_path (str): Path to SQLite database file
+        filter_conditions (str): Audience filter expression
+        order_status (str): Filter by order status
+        limit (int): Campaign recipient limit, caps the count
+        force (bool): If True, include previously messaged recipients
+        min_days_since_messaged (int): If set, also include recipients last messaged
+            at least this many days ago
+        sample (int): Number of example recipients to return
+    
+    Returns:
+        dict: {'count': int, 'sample': list of dicts}
+    
+    Raises:
+        FilterError: If the filter expression is invalid
+    """
+    where, params = build_audience_query(filter_conditions, order_status, force, min_days_since_messaged)
+    
+    conn = get_db_connection(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT COUNT(*) FROM contacts c WHERE {where}", params)
+        count = cursor.fetchone()[0]
+        if limit:
+            count = min(count, int(limit))
+        
+        rows = []
+        if sample:
+            cursor.execute(f"""
+                SELECT c.latest_order_id AS order_id, c.recipient, c.phone_number, c.order_status
+                FROM contacts c
+                WHERE {where}
+                ORDER BY c.last_updated_epoch DESC
+                LIMIT ?
+            """, params + [int(sample)])
+            rows = [dict(row) for row in cursor.fetchall()]
+        
+        return {'count': count, 'sample': rows}
+    finally:
+        conn.close()
+
+def check_audience_indexes(db_path, filter_conditions=None, order_status=None):
+    """
+    Check whether an audience filter can be answered through indexes
+    
+    Args:
+        db_path (str): Path to SQLite database file
+        filter_conditions (str): Audience filter expression
+        order_status (str): Filter by order status
+    
+    Returns:
+        list: EXPLAIN QUERY PLAN details for full scans of the order tables
+            (empty if every order-level condition uses an index)
+    
+    Raises:
+        FilterError: If the filter expression is invalid
+    """
+    where, params = build_audience_query(filter_conditions, order_status)
+    conn = get_db_connection(db_path)
+    try:
+        return filters.full_scans(conn, f"SELECT c.phone_key FROM contacts c WHERE {where}", params)
+    finally:
+        conn.close()
+
+def get_database_stats(db_path, today_epoch):
+    """
+    Contact and message counts of an affiliates database
+    
+    Read from the contact_counts row and today's daily message rollup, which
+    triggers keep current, so they cost the same for any number of rows.
+    
+    Args:
+        db_path (str): Path to SQLite database file
+        today_epoch (int): Start of today (local midnight)
+    
+    Returns:
+        dict: {'contacts': int, 'valid_contacts': int, 'messages_today': int}
+    """
+    conn = get_db_connection(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT total, valid FROM contact_counts WHERE id = 1")
+        counts = cursor.fetchone()
+        cursor.execute("""
+            SELECT COALESCE(SUM(message_count), 0)
+            FROM message_rollup_daily
+            WHERE bucket_epoch = ? AND direction != 'inbound'
+        """, (today_epoch,))
+        messages_today = cursor.fetchone()[0]
+    finally:
+        conn.close()
+    
+    return {
+        'contacts': counts['total'] if counts else 0,
+        'valid_contacts': counts['valid'] if counts else 0,
+        'messages_today': messages_today
+    }
+
+def log_message_to_db(db_path, order_id, phone_number, template_id, message_sid, status, error_message=None,
+                      campaign_id=None, run_id=None):
     """
     Log message details to the database
     
@@ -152,18 +411,22 @@ def log_message_to_db(db_path, order_id, phone_number, template_id, message_sid,
         message_sid (str): Twilio message SID
         status (str): Message status
         error_message (str): Error message if any
+        campaign_id (int): Campaign that sent the message, if any
+        run_id (int): Campaign run that sent the message, if any
     """
     try:
         conn = get_db_connection(db_path)
         cursor = conn.cursor()
         
-        sent_time = datetime.datetime.now().isoformat()
+        now = datetime.datetime.now()
         
         cursor.execute('''
             INSERT INTO message_log 
-            (order_id, phone_number, message_template_id, message_sid, status, sent_time, error_message)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (order_id, phone_number, template_id, message_sid, status, sent_time, error_message))
+            (order_id, phone_number, message_template_id, message_sid, status, sent_time, sent_epoch, error_message,
+             campaign_id, run_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (order_id, phone_number, template_id, message_sid, status, now.isoformat(), to_epoch(now), error_message,
+              campaign_id, run_id))
         
         conn.commit()
         conn.close()
@@ -182,15 +445,20 @@ def update_last_messaged(db_path, phone_number):
         conn = get_db_connection(db_path)
         cursor = conn.cursor()
         
-        # Extract just the phone number portion without 'whatsapp:' prefix
-        cleaned_number = phone_number.replace("whatsapp:", "") if phone_number.startswith("whatsapp:") else phone_number
-        
-        # Update all records with this phone number
+        # Update the person's contact row and all their order lines via the
+        # phone key, leaving the wide orders rows untouched
+        now = datetime.datetime.now()
+        phone_key = normalize_phone_key(phone_number)
+        cursor.execute("""
+            UPDATE contacts 
+            SET last_messaged_epoch = ?
+            WHERE phone_key = ?
+        """, (to_epoch(now), phone_key))
         cursor.execute("""
-            UPDATE orders 
-            SET last_messaged = ? 
-            WHERE phone_number = ?
-        """, (datetime.datetime.now().isoformat(), cleaned_number))
+            UPDATE order_messaging 
+            SET last_messaged = ?, last_messaged_epoch = ?
+            WHERE phone_key = ?
+        """, (now.isoformat(), to_epoch(now), phone_key))
         
         conn.commit()
         conn.close()
@@ -0,0 +1,206 @@
+"""
+Streaming data exports for finance and BI
+
+The send history (message_log with each message's current delivery status),
+the status events Twilio reported, and the contacts table can be exported as
+CSV or JSON Lines, filtered by date range and campaign. Rows are read a batch
+at a time, each batch by its own query that seeks past the last row written,
+and written out as each batch is formatted. Memory stays the same however large
+the export is, and no read is left open while a slow client downloads, so the
+webhook writer and the sync can still checkpoint the database.
+"""
+import io
+import csv
+import json
+from mojo_core.db_utils import get_db_connection
+
+CSV = 'csv'
+JSONL = 'jsonl'
+
+# Export formats and their content types
+FORMATS = {
+    CSV: 'text/csv',
+    JSONL: 'application/x-ndjson',
+}
+
+# Rows fetched and written per chunk
+BATCH_SIZE = 1000
+
+# Each dataset's query, the epoch column its date range applies to, how it is
+# limited to one campaign, and the (epoch, unique key) order it is read in; both
+# order columns are selected under the name after their table alias
+EXPORTS = {
+    'messages': {
+        'sql': '''
+            SELECT l.id, l.order_id, l.phone_number, l.message_template_id AS template_id, l.message_sid,
+                   l.status AS send_status, l.error_message AS send_error, l.sent_time, l.sent_epoch,
+                   l.campaign_id, l.run_id,
+                   s.status AS delivery_status, s.error_code, s.error_message, s.price, s.price_unit
+            FROM message_log l
+            LEFT JOIN message_status s ON s.message_sid = l.message_sid
+        ''',
+        'date_column': 'l.sent_epoch',
+        'campaign_filter': 'l.campaign_id = ?',
+        'order_by': ('l.sent_epoch', 'l.id'),
+    },
+    'status_events': {
+        'sql': '''
+            SELECT e.id, e.message_sid, e.status, e.error_code, e.error_message, e.event_epoch,
+                   datetime(e.event_epoch, 'unixepoch') AS event_time_utc,
+                   s.campaign_id, s.template_id, s.phone_key
+            FROM message_status_events e
+            LEFT JOIN message_status s ON s.message_sid = e.message_sid
+        ''',
+        'date_column': 'e.event_epoch',
+        'campaign_filter': 's.campaign_id = ?',
+        'order_by': ('e.event_epoch', 'e.id'),
+    },
+    'contacts': {
+        'sql': '''
+            SELECT c.phone_key, c.phone_number, c.raw_phone_number, c.recipient, c.buyer_username,
+                   c.order_status, c.latest_order_id, c.is_valid_for_whatsapp, c.order_count,
+                   c.first_order_epoch, c.last_order_epoch, c.last_updated_epoch, c.last_messaged_epoch
+            FROM contacts c
+        ''',
+        'date_column': 'c.last_updated_epoch',
+        'campaign_filter': 'c.phone_key IN (SELECT phone_key FROM message_status WHERE campaign_id = ?)',
+        'order_by': ('c.last_updated_epoch', 'c.phone_key'),
+    },
+}
+
+def export_query(dataset, start_epoch=None, end_epoch=None, campaign_id=None):
+    """
+    SQL and parameters for an export
+
+    Args:
+        dataset (str): 'messages', 'status_events' or 'contacts'
+        start_epoch (int): Only rows at or after this time
+        end_epoch (int): Only rows at or before this time
+        campaign_id (int): Only rows for this campaign
+
+    Returns:
+        tuple: (sql, params)
+
+    Raises:
+        ValueError: If the dataset is unknown
+    """
+    export, conditions, params = _export_filters(dataset, start_epoch, end_epoch, campaign_id)
+    return _select(export, conditions), params
+
+def stream_export(db_path, dataset, fmt=CSV, start_epoch=None, end_epoch=None, campaign_id=None,
+                  batch_size=BATCH_SIZE):
+    """
+    Stream an export as text chunks
+
+    The dataset and format are checked straight away; the database is only
+    opened once the first chunk is asked for, and closed after the last.
+
+    Args:
+        db_path (str): Path to SQLite database file
+        dataset (str): 'messages', 'status_events' or 'contacts'
+        fmt (str): CSV or JSONL
+        start_epoch (int): Only rows at or after this time
+        end_epoch (int): Only rows at or before this time
+        campaign_id (int): Only rows for this campaign
+        batch_size (int): Rows per chunk
+
+    Returns:
+        generator: str chunks; for CSV the first starts with the header row
+
+    Raises:
+        ValueError: If the dataset or format is unknown
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    export, conditions, params = _export_filters(dataset, start_epoch, end_epoch, campaign_id)
+    return _stream(db_path, export, conditions, params, fmt, batch_size)
+
+def _export_filters(dataset, start_epoch, end_epoch, campaign_id):
+    """The dataset's export definition, with the WHERE conditions and parameters for its filters"""
+    if dataset not in EXPORTS:
+        raise ValueError(f"Unknown export: {dataset}")
+    export = EXPORTS[dataset]
+
+    conditions = []
+    params = []
+    if start_epoch is not None:
+        conditions.append(f"{export['date_column']} >= ?")
+        params.append(start_epoch)
+    if end_epoch is not None:
+        conditions.append(f"{export['date_column']} <= ?")
+        params.append(end_epoch)
+    if campaign_id is not None:
+        conditions.append(export['campaign_filter'])
+        params.append(campaign_id)
+    return export, conditions, params
+
+def _select(export, conditions, limit=False):
+    """The export's query with its conditions, in its read order, optionally taking a LIMIT parameter"""
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    return f"{export['sql']} {where} ORDER BY {', '.join(export['order_by'])}{' LIMIT ?' if limit else ''}"
+
+def _next_batch(cursor, export, conditions, params, position, batch_size):
+    """
+    Up to batch_size rows after a position in the export's order
+
+    Args:
+        position (tuple): (epoch, key) of the last row already read, or None for the start
+
+    Returns:
+        list: Row tuples
+    """
+    epoch_column, key_column = export['order_by']
+
+    # Each part is one index range; NULL epochs sort first and are never less or
+    # greater than a number, so crossing from them to the dated rows takes a second part
+    if position is None:
+        parts = [([], [])]
+    elif position[0] is None:
+        parts = [([f"{epoch_column} IS NULL AND {key_column} > ?"], [position[1]]),
+                 ([f"{epoch_column} IS NOT NULL"], [])]
+    else:
+        parts = [([f"({epoch_column}, {key_column}) > (?, ?)"], list(position))]
+
+    rows = []
+    for seek, seek_params in parts:
+        if len(rows) >= batch_size:
+            break
+        cursor.execute(_select(export, conditions + seek, limit=True),
+                       params + seek_params + [batch_size - len(rows)])
+        rows.extend(cursor.fetchall())
+    return rows
+
+def _stream(db_path, export, conditions, params, fmt, batch_size):
+    conn = get_db_connection(db_path)
+    try:
+        cursor = conn.cursor()
+        # Plain tuples: the column names are only needed once
+        cursor.row_factory = None
+        cursor.execute(_select(export, conditions, limit=True), params + [0])
+        columns = [column[0] for column in cursor.description]
+        epoch_index, key_index = (columns.index(column.split('.')[-1]) for column in export['order_by'])
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if fmt == CSV:
+            writer.writerow(columns)
+        position = None
+        while True:
+            # fetchall() finishes each query, so its read ends before the batch is sent
+            rows = _next_batch(cursor, export, conditions, params, position, batch_size)
+            if not rows:
+                break
+            position = (rows[-1][epoch_index], rows[-1][key_index])
+            if fmt == CSV:
+                writer.writerows(rows)
+            else:
+                for row in rows:
+                    buffer.write(json.dumps(dict(zip(columns, row)), default=str) + '\n')
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        # An empty CSV export still has its header
+        if buffer.tell():
+            yield buffer.getvalue()
+    finally:
+        conn.close()
@@ -0,0 +1,250 @@
+"""
+Audience filter language for campaigns and the CLI
+
+Filters are written as comparisons joined with AND/OR, for example:
+
+    order_status = 'Delivered' AND (country IN ('United Kingdom', 'Ireland') OR created_time >= '2025-01-01')
+
+and compile to a parameterized SQL condition over a person's order lines
+(order_messaging m, joined to orders o when a detail column is used). Values
+are always bound as parameters, and filters with the same shape compile to
+the same SQL text, so SQLite can reuse its prepared statements.
+"""
+import re
+from collections import namedtuple
+from functools import lru_cache
+from mojo_core import db_utils
+from mojo_core.migrations import ORDER_COLUMNS, ORDER_TIME_COLUMNS
+
+class FilterError(ValueError):
+    """Raised when a filter can't be parsed or uses an unknown field"""
+
+# A compiled filter: SQL condition, bound parameters, and whether it reads orders o
+CompiledFilter = namedtuple('CompiledFilter', ['sql', 'params', 'needs_orders'])
+
+# Fields held on the narrow order_messaging table
+NARROW_FIELDS = {
+    'order_id': 'm.order_id',
+    'order_status': 'm.order_status',
+    'recipient': 'm.recipient',
+    'buyer_username': 'm.buyer_username',
+    'phone_number': 'm.phone_number',
+    'raw_phone_number': 'm.raw_phone_number',
+    'is_valid_for_whatsapp': 'm.is_valid_for_whatsapp',
+}
+
+# Time fields are compared through their indexed integer epoch columns
+TIME_FIELDS = {time_col: f"o.{epoch_col}" for time_col, epoch_col in ORDER_TIME_COLUMNS}
+TIME_FIELDS.update({
+    'last_updated': 'm.last_updated_epoch',
+    'last_messaged': 'm.last_messaged_epoch',
+})
+
+# Every other order export column is available from the wide table
+FIELDS = {name: f"o.{name}" for name, _ in ORDER_COLUMNS}
+FIELDS.update(NARROW_FIELDS)
+FIELDS.update(TIME_FIELDS)
+
+COMPARISON_OPERATORS = {'=', '!=', '<>', '<', '<=', '>', '>='}
+
+_TOKEN_RE = re.compile(r"""
+    \s*(?:
+        (?P<string>'(?:[^']|'')*'|"(?:[^"]|"")*")
+      | (?P<number>-?\d+(?:\.\d+)?)
+      | (?P<op><=|>=|<>|!=|=|<|>)
+      | (?P<punct>[(),])
+      | (?P<word>[A-Za-z_][A-Za-z0-9_.]*)
+    )""", re.VERBOSE)
+
+KEYWORDS = {'AND', 'OR', 'NOT', 'IN', 'LIKE', 'IS', 'NULL'}
+
+def quote(value):
+    """
+    Quote a value for use in filter text
+
+    Args:
+        value (str): Value to quote
+
+    Returns:
+        str: Single-quoted value with embedded quotes doubled
+    """
+    return "'" + str(value).replace("'", "''") + "'"
+
+def _tokenize(text):
+    """Split filter text into (kind, value) tokens"""
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = _TOKEN_RE.match(text, position)
+        if not match or match.end() == position:
+            raise FilterError(f"Unexpected character at position {position}: {text[position:position + 10]!r}")
+        position = match.end()
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == 'string':
+            value = value[1:-1].replace(value[0] * 2, value[0])
+        elif kind == 'number':
+            value = float(value) if '.' in value else int(value)
+        elif kind == 'word' and value.upper() in KEYWORDS:
+            kind, value = 'keyword', value.upper()
+        tokens.append((kind, value))
+    return tokens
+
+class _Parser:
+    """Recursive-descent parser producing SQL text and parameters"""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.position = 0
+        self.params = []
+        self.needs_orders = False
+
+    def peek(self, kind=None, value=None):
+        if self.position >= len(self.tokens):
+            return None
+        token = self.tokens[self.position]
+        if kind and token[0] != kind:
+            return None
+        if value and token[1] != value:
+            return None
+        return token
+
+    def take(self, kind=None, value=None):
+        token = self.peek(kind, value)
+        if token is None:
+            found = self.tokens[self.position][1] if self.position < len(self.tokens) else 'end of filter'
+            raise FilterError(f"Expected {value or kind}, found {found!r}")
+        self.position += 1
+        return token
+
+    def parse(self):
+        sql = self.parse_or()
+        if self.position < len(self.tokens):
+            raise FilterError(f"Unexpected {self.tokens[self.position][1]!r}")
+        return sql
+
+    def parse_or(self):
+        parts = [self.parse_and()]
+        while self.peek('keyword', 'OR'):
+            self.take()
+            parts.append(self.parse_and())
+        return parts[0] if len(parts) == 1 else '(' + ' OR '.join(parts) + ')'
+
+    def parse_and(self):
+        parts = [self.parse_not()]
+        while self.peek('keyword', 'AND'):
+            self.take()
+            parts.append(self.parse_not())
+        return parts[0] if len(parts) == 1 else '(' + ' AND '.join(parts) + ')'
+
+    def parse_not(self):
+        if self.peek('keyword', 'NOT'):
+            self.take()
+            return f"NOT {self.parse_not()}"
+        if self.peek('punct', '('):
+            self.take()
+            sql = self.parse_or()
+            self.take('punct', ')')
+            return sql
+        return self.parse_comparison()
+
+    def parse_field(self):
+        name = self.take('word')[1]
+        # Accept the o./m. prefixes used by older raw SQL filters
+        if re.match(r'^[om]\.', name):
+            name = name[2:]
+        if name not in FIELDS:
+            raise FilterError(f"Unknown field {name!r}")
+        column = FIELDS[name]
+        if column.startswith('o.'):
+            self.needs_orders = True
+        return name, column
+
+    def parse_value(self, field):
+        kind, value = self.take()
+        if kind not in ('string', 'number'):
+            raise FilterError(f"Expected a value for {field}, found {value!r}")
+        if field in TIME_FIELDS and not isinstance(value, (int, float)):
+            epoch = db_utils.to_epoch(value)
+            if epoch is None:
+                raise FilterError(f"Invalid date for {field}: {value!r}")
+            value = epoch
+        self.params.append(value)
+        return '?'
+
+    def parse_comparison(self):
+        field, column = self.parse_field()
+
+        if self.peek('keyword', 'IS'):
+            self.take()
+            negate = bool(self.peek('keyword', 'NOT'))
+            if negate:
+                self.take()
+            self.take('keyword', 'NULL')
+            return f"{column} IS {'NOT ' if negate else ''}NULL"
+
+        negate = False
+        if self.peek('keyword', 'NOT'):
+            self.take()
+            negate = True
+
+        if self.peek('keyword', 'IN'):
+            self.take()
+            self.take('punct', '(')
+            placeholders = [self.parse_value(field)]
+            while self.peek('punct', ','):
+                self.take()
+                placeholders.append(self.parse_value(field))
+            self.take('punct', ')')
+            return f"{column} {'NOT ' if negate else ''}IN ({', '.join(placeholders)})"
+
+        if self.peek('keyword', 'LIKE'):
+            self.take()
+            if field in TIME_FIELDS:
+                raise FilterError(f"LIKE can't be used with time field {field}")
+            return f"{column} {'NOT ' if negate else ''}LIKE {self.parse_value(field)}"
+
+        if negate:
+            raise FilterError("NOT must be followed by IN or LIKE here")
+
+        operator = self.take('op')[1]
+        if operator not in COMPARISON_OPERATORS:
+            raise FilterError(f"Unknown operator {operator!r}")
+        return f"{column} {operator} {self.parse_value(field)}"
+
+@lru_cache(maxsize=256)
+def compile_filter(text):
+    """
+    Compile filter text into a parameterized SQL condition
+
+    Args:
+        text (str): Filter expression
+
+    Returns:
+        CompiledFilter: SQL condition over order_messaging m / orders o,
+            its parameters, and whether the orders table must be joined
+
+    Raises:
+        FilterError: If the filter is invalid
+    """
+    if not text or not text.strip():
+        return None
+    parser = _Parser(_tokenize(text))
+    sql = parser.parse()
+    return CompiledFilter(sql, tuple(parser.params), parser.needs_orders)
+
+def full_scans(conn, query, params=()):
+    """
+    Find the order tables a query reads without an index search
+
+    Args:
+        conn (sqlite3.Connection): Database connection
+        query (str): SQL query to check
+        params (tuple): Query parameters
+
+    Returns:
+        list: EXPLAIN QUERY PLAN details for full scans of order_messaging or orders
+    """
+    plan = conn.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()
+    return [row[3] for row in plan if re.match(r'^SCAN (m|o|order_messaging|orders)\b', row[3])]
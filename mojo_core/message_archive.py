@@ -0,0 +1,336 @@
+"""
+Tiered storage for the message send log
+
+message_log only ever grows. archive_messages() moves rows older than a
+cutoff out of SQLite into Parquet files partitioned by month:
+
+    <archive_dir>/message_log/month=YYYY-MM/part-<min_id>-<max_id>-<run time>.parquet
+
+and deletes them from the live table. Each file is catalogued in
+message_archive_files together with its id and time range. A file is written
+under a temporary name and renamed once complete, and no run ever opens a
+path that is already catalogued.
+
+query_messages() reads the archive and the live table as one history, oldest
+first. It opens only the files whose time range overlaps the query (partition
+skipping), and from those it reads only the columns asked for (column
+pruning). Parquet row-group statistics skip further within each file.
+
+The reports are unaffected: they read the rollups and message_status, not
+message_log. Parquet needs the optional pyarrow package. Without it the live
+table can still be queried, but nothing can be archived or read back.
+"""
+import os
+import time
+import datetime
+from mojo_core.db_utils import get_db_connection
+
+try:
+    import pyarrow
+    import pyarrow.dataset as pyarrow_dataset
+    import pyarrow.parquet as pyarrow_parquet
+except ImportError:
+    # Optional: needed only to write or read archived messages
+    pyarrow = None
+
+# message_log columns kept in the archive, with their Parquet types
+ARCHIVE_COLUMNS = [
+    ('id', 'int64'),
+    ('order_id', 'string'),
+    ('phone_number', 'string'),
+    ('message_template_id', 'string'),
+    ('message_sid', 'string'),
+    ('status', 'string'),
+    ('sent_time', 'string'),
+    ('sent_epoch', 'int64'),
+    ('error_message', 'string'),
+    ('campaign_id', 'int64'),
+    ('run_id', 'int64'),
+]
+COLUMN_NAMES = [name for name, _ in ARCHIVE_COLUMNS]
+
+TABLE_DIR = 'message_log'
+
+# Rows per fetch, and per Parquet row group
+BATCH_SIZE = 50000
+
+# Uncatalogued files younger than this may belong to a run still in progress,
+# so they are left for a later run to clear up
+ORPHAN_GRACE_SECONDS = 24 * 3600
+
+def archive_messages(db_path, archive_dir, before_epoch, batch_size=BATCH_SIZE):
+    """
+    Move message_log rows sent before a cutoff into the Parquet archive
+
+    Files are written completely and catalogued before any row is deleted.
+    The catalogue entries are committed first, marked with the run's cutoff
+    (pending_delete_epoch) until the rows are deleted in a second commit. A
+    run that fails before its catalogue commit leaves every row in the live
+    table, and a later run removes its uncatalogued files once they are older
+    than ORPHAN_GRACE_SECONDS. One that fails
+    after it has its deletion finished by the next run, and query_messages()
+    skips those rows in the meantime.
+
+    Args:
+        db_path (str): Path to SQLite database file
+        archive_dir (str): Root of the archive
+        before_epoch (int): Archive rows with sent_epoch before this
+        batch_size (int): Rows fetched and written at a time
+
+    Returns:
+        int: Number of rows archived
+
+    Raises:
+        RuntimeError: If pyarrow isn't installed
+    """
+    _require_pyarrow()
+    schema = _schema()
+
+    conn = get_db_connection(db_path)
+    try:
+        _remove_orphans(conn, archive_dir)
+        _finish_pending_deletes(conn)
+
+        # Rows inserted while the run goes on are left for the next one
+        run_max_id = conn.execute("SELECT MAX(id) FROM message_log").fetchone()[0]
+        if run_max_id is None:
+            return 0
+
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        cursor.execute(f'''
+            SELECT strftime('%Y-%m', sent_epoch, 'unixepoch', 'localtime') AS month, {', '.join(COLUMN_NAMES)}
+            FROM message_log
+            WHERE sent_epoch < ? AND id <= ?
+            ORDER BY sent_epoch, id
+        ''', (before_epoch, run_max_id))
+
+        # Names carry the run's start time, so runs with the same rows in range never collide
+        run_stamp = datetime.datetime.now().strftime('%Y%m%dT%H%M%S%f')
+        catalogued = {row['path'] for row in conn.execute("SELECT path FROM message_archive_files")}
+        files = []
+        writer = None
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                # Rows come in time order, so each month's rows are contiguous
+                for month, month_rows in _split_by_month(rows):
+                    if writer is None or writer.month != month:
+                        if writer:
+                            files.append(writer.close())
+                        writer = _PartitionWriter(archive_dir, month, run_max_id, run_stamp, schema)
+                    writer.write(month_rows)
+        finally:
+            if writer:
+                files.append(writer.close())
+
+        if not files:
+            return 0
+        for entry in files:
+            _publish(archive_dir, entry, run_stamp, catalogued)
+
+        now = int(datetime.datetime.now().timestamp())
+        with conn:
+            conn.executemany('''
+                INSERT INTO message_archive_files (
+                    path, month, run_max_id, row_count, min_id, max_id, min_epoch, max_epoch, created_epoch,
+                    pending_delete_epoch
+                )
+                VALUES (:path, :month, :run_max_id, :row_count, :min_id, :max_id, :min_epoch, :max_epoch,
+                        :created_epoch, :pending_delete_epoch)
+            ''', [dict(entry, created_epoch=now, pending_delete_epoch=before_epoch) for entry in files])
+        # Only rows already catalogued are deleted
+        _finish_pending_deletes(conn)
+        return sum(entry['row_count'] for entry in files)
+    finally:
+        conn.close()
+
+def query_messages(db_path, archive_dir, columns=None, start_epoch=None, end_epoch=None, campaign_id=None,
+                   batch_size=BATCH_SIZE):
+    """
+    Stream message history from the archive and the live table, oldest first
+
+    Args:
+        db_path (str): Path to SQLite database file
+        archive_dir (str): Root of the archive
+        columns (list): Columns to return, defaults to all of ARCHIVE_COLUMNS
+        start_epoch (int): Only messages sent at or after this time
+        end_epoch (int): Only messages sent at or before this time
+        campaign_id (int): Only messages sent by this campaign
+        batch_size (int): Rows read at a time
+
+    Yields:
+        dict: One message's requested columns
+
+    Raises:
+        ValueError: If a column isn't one of ARCHIVE_COLUMNS
+        RuntimeError: If archived files are needed and pyarrow isn't installed
+    """
+    columns = list(columns or COLUMN_NAMES)
+    unknown = [column for column in columns if column not in COLUMN_NAMES]
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+
+    conn = get_db_connection(db_path)
+    try:
+        archived = _archived_files(conn, start_epoch, end_epoch)
+        if archived:
+            _require_pyarrow()
+            expression = _filter_expression(start_epoch, end_epoch, campaign_id)
+            for path in archived:
+                dataset = pyarrow_dataset.dataset(os.path.join(archive_dir, path), format='parquet')
+                for batch in dataset.to_batches(columns=columns, filter=expression, batch_size=batch_size):
+                    values = batch.to_pydict()
+                    for row in zip(*(values[column] for column in columns)):
+                        yield dict(zip(columns, row))
+
+        conditions = []
+        params = []
+        if start_epoch is not None:
+            conditions.append("sent_epoch >= ?")
+            params.append(start_epoch)
+        if end_epoch is not None:
+            conditions.append("sent_epoch <= ?")
+            params.append(end_epoch)
+        if campaign_id is not None:
+            conditions.append("campaign_id = ?")
+            params.append(campaign_id)
+        # Archived by a run whose deletion hasn't finished yet
+        conditions.append('''NOT EXISTS (
+            SELECT 1 FROM message_archive_files f
+            WHERE f.pending_delete_epoch IS NOT NULL
+                AND message_log.sent_epoch < f.pending_delete_epoch AND message_log.id <= f.run_max_id
+        )''')
+        where = f"WHERE {' AND '.join(conditions)}"
+
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        cursor.execute(f"SELECT {', '.join(columns)} FROM message_log {where} ORDER BY sent_epoch, id", params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(zip(columns, row))
+    finally:
+        conn.close()
+
+def _require_pyarrow():
+    if pyarrow is None:
+        raise RuntimeError("The message archive needs pyarrow: pip install pyarrow")
+
+def _schema():
+    return pyarrow.schema([(name, getattr(pyarrow, type_name)()) for name, type_name in ARCHIVE_COLUMNS])
+
+def _split_by_month(rows):
+    """(month, rows without the month column) for each run of rows in the same month"""
+    start = 0
+    for position in range(1, len(rows) + 1):
+        if position == len(rows) or rows[position][0] != rows[start][0]:
+            yield rows[start][0], [row[1:] for row in rows[start:position]]
+            start = position
+
+def _archived_files(conn, start_epoch, end_epoch):
+    """Catalogued files whose time range overlaps the query, oldest first"""
+    conditions = []
+    params = []
+    if start_epoch is not None:
+        conditions.append("max_epoch >= ?")
+        params.append(start_epoch)
+    if end_epoch is not None:
+        conditions.append("min_epoch <= ?")
+        params.append(end_epoch)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    rows = conn.execute(f"SELECT path FROM message_archive_files {where} ORDER BY min_epoch, path", params)
+    return [row['path'] for row in rows]
+
+def _filter_expression(start_epoch, end_epoch, campaign_id):
+    expression = None
+    for condition in (
+        pyarrow_dataset.field('sent_epoch') >= start_epoch if start_epoch is not None else None,
+        pyarrow_dataset.field('sent_epoch') <= end_epoch if end_epoch is not None else None,
+        pyarrow_dataset.field('campaign_id') == campaign_id if campaign_id is not None else None,
+    ):
+        if condition is not None:
+            expression = condition if expression is None else expression & condition
+    return expression
+
+def _finish_pending_deletes(conn):
+    """Delete the live rows of runs whose files are catalogued but whose deletion hasn't committed"""
+    runs = conn.execute('''
+        SELECT DISTINCT run_max_id, pending_delete_epoch FROM message_archive_files
+        WHERE pending_delete_epoch IS NOT NULL
+    ''').fetchall()
+    for run_max_id, before_epoch in runs:
+        with conn:
+            conn.execute("DELETE FROM message_log WHERE sent_epoch < ? AND id <= ?", (before_epoch, run_max_id))
+            conn.execute('''
+                UPDATE message_archive_files SET pending_delete_epoch = NULL
+                WHERE run_max_id = ? AND pending_delete_epoch = ?
+            ''', (run_max_id, before_epoch))
+
+def _publish(archive_dir, entry, run_stamp, catalogued):
+    """Move a finished file from its temporary name to its final one"""
+    path = os.path.join(TABLE_DIR, f"month={entry['month']}",
+                        f"part-{entry['min_id']:012d}-{entry['max_id']:012d}-{run_stamp}.parquet")
+    full_path = os.path.join(archive_dir, path)
+    if path in catalogued or os.path.exists(full_path):
+        raise RuntimeError(f"Archive file already exists: {path}")
+    os.rename(os.path.join(archive_dir, entry['path']), full_path)
+    entry['path'] = path
+
+def _remove_orphans(conn, archive_dir):
+    """
+    Delete files left by a run that failed before committing, including unfinished temporary ones
+
+    Only files untouched for ORPHAN_GRACE_SECONDS are removed: a concurrent
+    run's temporary file, or one it has published but not yet catalogued, is
+    younger than that.
+    """
+    table_dir = os.path.join(archive_dir, TABLE_DIR)
+    if not os.path.isdir(table_dir):
+        return
+    catalogued = {row['path'] for row in conn.execute("SELECT path FROM message_archive_files")}
+    cutoff = time.time() - ORPHAN_GRACE_SECONDS
+    for partition in os.listdir(table_dir):
+        for filename in os.listdir(os.path.join(table_dir, partition)):
+            path = os.path.join(TABLE_DIR, partition, filename)
+            full_path = os.path.join(archive_dir, path)
+            if path not in catalogued and os.path.getmtime(full_path) < cutoff:
+                os.remove(full_path)
+
+class _PartitionWriter:
+    """Writes one archive run's rows for one month to a Parquet file, a row group per batch"""
+
+    def __init__(self, archive_dir, month, run_max_id, run_stamp, schema):
+        self.month = month
+        # Renamed by _publish() once the file is complete and its id range known
+        self.path = os.path.join(TABLE_DIR, f"month={month}", f"part-{run_stamp}.parquet.tmp")
+        self.entry = {'path': self.path, 'month': month, 'run_max_id': run_max_id, 'row_count': 0,
+                      'min_id': None, 'max_id': None, 'min_epoch': None, 'max_epoch': None}
+        self._schema = schema
+        full_path = os.path.join(archive_dir, self.path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        self._writer = pyarrow_parquet.ParquetWriter(full_path, schema, compression='zstd')
+
+    def write(self, rows):
+        columns = list(zip(*rows))
+        self._writer.write_table(pyarrow.Table.from_arrays(
+            [pyarrow.array(values, type=field.type) for values, field in zip(columns, self._schema)],
+            schema=self._schema
+        ))
+        ids = columns[COLUMN_NAMES.index('id')]
+        epochs = columns[COLUMN_NAMES.index('sent_epoch')]
+        entry = self.entry
+        entry['row_count'] += len(rows)
+        entry['min_id'] = min(ids) if entry['min_id'] is None else min(entry['min_id'], min(ids))
+        entry['max_id'] = max(ids) if entry['max_id'] is None else max(entry['max_id'], max(ids))
+        entry['min_epoch'] = epochs[0] if entry['min_epoch'] is None else entry['min_epoch']
+        entry['max_epoch'] = epochs[-1]
+
+    def close(self):
+        """Finish the file and return its catalogue entry"""
+        self._writer.close()
+        return self.entry
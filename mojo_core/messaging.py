@@ -4,15 +4,20 @@ Core messaging functionality shared between CLI and web interface
 import os
 import time
 import datetime
-import pathlib
 from mojo_core.twilio_client import twilio_client
+from mojo_core.status_store import record_sent_message
+from mojo_core.run_journal import RunJournal
 from mojo_core.db_utils import (
     get_recipients_from_db,
     log_message_to_db,
     update_last_messaged
 )
 
-def send_message(db_path, to, content_sid, content_variables=None, order_id=None, log_to_db=True):
+# Report directory when the caller doesn't pass one (the web app passes its REPORTS_DIR)
+REPORTS_DIR = os.environ.get('REPORTS_DIR', 'reports')
+
+def send_message(db_path, to, content_sid, content_variables=None, order_id=None, log_to_db=True, campaign_id=None,
+                 run_id=None):
     """
     Send a WhatsApp message and log it to the database
     
@@ -23,6 +28,8 @@ def send_message(db_path, to, content_sid, content_variables=None, order_id=None
         content_variables (dict): Variables for the template
         order_id (str): Order ID for tracking
         log_to_db (bool): Whether to log the message to the database
+        campaign_id (int): Campaign sending the message, for the campaign reports
+        run_id (int): Campaign run sending the message, from start_campaign_run()
     
     Returns:
         dict: Message result with status and details
@@ -47,9 +54,15 @@ def send_message(db_path, to, content_sid, content_variables=None, order_id=None
                 phone_number=to,
                 template_id=content_sid,
                 message_sid=message.sid,
-                status=message.status
+                status=message.status,
+                campaign_id=campaign_id,
+                run_id=run_id
             )
             
+            # Track the message until its status callbacks arrive
+            record_sent_message(db_path, message.sid, to, message.status,
+                                template_id=content_sid, campaign_id=campaign_id, run_id=run_id)
+            
             # Update last_messaged timestamp
             update_last_messaged(db_path, to)
         
@@ -71,7 +84,9 @@ def send_message(db_path, to, content_sid, content_variables=None, order_id=None
                 template_id=content_sid,
                 message_sid=None,
                 status="error",
-                error_message=str(e)
+                error_message=str(e),
+                campaign_id=campaign_id,
+                run_id=run_id
             )
         
         return {
@@ -83,7 +98,8 @@ def send_message(db_path, to, content_sid, content_variables=None, order_id=None
 
 def send_bulk_messages(db_path, content_sid, content_variables=None, recipients=None, 
                       filter_conditions=None, order_status=None, limit=None, 
-                      dry_run=False, delay=1.0, force=False):
+                      dry_run=False, delay=1.0, force=False, min_days_since_messaged=None, campaign_id=None,
+                      run_id=None, reports_dir=None):
     """
     Send WhatsApp messages to multiple recipients
     
@@ -98,6 +114,11 @@ def send_bulk_messages(db_path, content_sid, content_variables=None, recipients=
         dry_run (bool): If True, don't actually send messages
         delay (float): Delay between messages in seconds
         force (bool): If True, include previously messaged recipients
+        min_days_since_messaged (int): If set, also include recipients last messaged
+            at least this many days ago
+        campaign_id (int): Campaign sending the messages, for the campaign reports
+        run_id (int): Campaign run sending the messages, from start_campaign_run()
+        reports_dir (str): Directory for the run's report, defaults to REPORTS_DIR
     
     Returns:
         dict: Results summary with message logs
@@ -112,7 +133,8 @@ def send_bulk_messages(db_path, content_sid, content_variables=None, recipients=
             filter_conditions=filter_conditions,
             order_status=order_status,
             limit=limit,
-            force=force
+            force=force,
+            min_days_since_messaged=min_days_since_messaged
         )
     
     if not recipients:
@@ -136,6 +158,15 @@ def send_bulk_messages(db_path, content_sid, content_variables=None, recipients=
     # Store message logs
     message_logs = []
     
+    # Each recipient's outcome is journaled as soon as it is known
+    journal = RunJournal(reports_dir or REPORTS_DIR, {
+        'dry_run': dry_run,
+        'order_status': order_status,
+        'force': force,
+        'campaign_id': campaign_id,
+        'run_id': run_id
+    })
+    
     for i, recipient in enumerate(recipients):
         # Skip if we've already processed this phone number
         if recipient['formatted_number'] in processed_numbers:
@@ -163,7 +194,9 @@ def send_bulk_messages(db_path, content_sid, content_variables=None, recipients=
                 to=recipient['formatted_number'],
                 content_sid=content_sid,
                 content_variables=content_variables,
-                order_id=recipient['order_id']
+                order_id=recipient['order_id'],
+                campaign_id=campaign_id,
+                run_id=run_id
             )
             
             log_entry['status'] = result.get('status', 'failed')
@@ -177,6 +210,7 @@ def send_bulk_messages(db_path, content_sid, content_variables=None, recipients=
         
         # Add to logs
         message_logs.append(log_entry)
+        journal.record(log_entry)
         
         # Add delay between messages to avoid rate limits
         if i < len(recipients) - 1 and not dry_run:
@@ -184,22 +218,13 @@ def send_bulk_messages(db_path, content_sid, content_variables=None, recipients=
     
     elapsed_time = time.time() - start_time
     
-    # Generate a detailed report file
-    if message_logs:
-        report_path = generate_report(
-            message_logs=message_logs,
-            summary={
-                'total': len(processed_numbers),
-                'successful': successful,
-                'failed': failed,
-                'elapsed_time': elapsed_time,
-                'dry_run': dry_run,
-                'order_status': order_status,
-                'force': force
-            }
-        )
-    else:
-        report_path = None
+    # Finish the journal; the text report is rendered from it on demand
+    report_path = journal.close({
+        'total': len(processed_numbers),
+        'successful': successful,
+        'failed': failed,
+        'elapsed_time': elapsed_time
+    })
     
     return {
         "success": True,
@@ -210,80 +235,3 @@ def send_bulk_messages(db_path, content_sid, content_variables=None, recipients=
         "report_path": report_path,
         "logs": message_logs
     }
-
-def generate_report(message_logs, summary):
-    """
-    Generate a detailed report of the messaging session
-    
-    Args:
-        message_logs (list): List of message log entries
-        summary (dict): Dictionary with summary information
-        
-    Returns:
-        str: Path to the generated report file
-    """
-    # Create reports directory if it doesn't exist
-    reports_dir = pathlib.Path('reports')
-    reports_dir.mkdir(exist_ok=True)
-    
-    # Generate timestamp for filename with the format dd-mm-yy_hh-mm-ss
-    timestamp = datetime.datetime.now().strftime('%d-%m-%y_%H-%M-%S')
-    
-    # Create filename based on parameters and timestamp
-    filename_parts = ['message_report']
-    if summary.get('dry_run'):
-        filename_parts.append('dry_run')
-    if summary.get('force'):
-        filename_parts.append('force')
-    if summary.get('order_status'):
-        filename_parts.append(f"status_{summary['order_status']}")
-    filename_parts.append(timestamp)
-    
-    filename = '_'.join(filename_parts) + '.txt'
-    report_path = reports_dir / filename
-    
-    # Write the report
-    with open(report_path, 'w') as f:
-        # Write header
-        f.write('='*80 + '\n')
-        f.write(f"MOJO WHATSAPP MESSAGE REPORT\n")
-        f.write(f"Generated: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        if summary.get('dry_run'):
-            f.write("Mode: DRY RUN (no messages actually sent)\n")
-        else:
-            f.write("Mode: LIVE RUN\n")
-        if summary.get('force'):
-            f.write("WARNING: FORCE MODE ENABLED - Including previously messaged recipients\n")
-        f.write('='*80 + '\n\n')
-        
-        # Only include filters section if there are actual filters to display
-        if summary.get('order_status'):
-            f.write("MESSAGE SENT TO:\n")
-            if summary.get('order_status'):
-                f.write(f"  Orders with status: {summary['order_status']}\n")
-            f.write("\n")
-        
-        # Write detailed message logs
-        f.write("DETAILED MESSAGE LOG:\n")
-        f.write('-'*80 + '\n')
-        for i, log in enumerate(message_logs, 1):
-            f.write(f"Message {i}:\n")
-            f.write(f"  Order ID: {log['order_id']}\n")
-            f.write(f"  Recipient: {log['recipient']}\n")
-            f.write(f"  Phone Number: {log['phone_number']}\n")
-            f.write(f"  Status: {log['status']}\n")
-            if log.get('message_sid'):
-                f.write(f"  Message SID: {log['message_sid']}\n")
-            if log.get('error'):
-                f.write(f"  Error: {log['error']}\n")
-            f.write(f"  Timestamp: {log['timestamp']}\n")
-            f.write('-'*80 + '\n')
-        
-        # Write summary
-        f.write("\nSUMMARY:\n")
-        f.write(f"Total unique recipients: {summary['total']}\n")
-        f.write(f"Successful: {summary['successful']}\n")
-        f.write(f"Failed: {summary['failed']}\n")
-        f.write(f"Time elapsed: {summary['elapsed_time']:.2f} seconds\n")
-    
-    return str(report_path) 
\ No newline at end of file
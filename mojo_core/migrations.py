@@ -0,0 +1,1253 @@
+"""
+Schema migrations for the affiliates SQLite database
+
+Migrations are applied in order and tracked with SQLite's PRAGMA user_version,
+so every step runs exactly once per database file.
+"""
+import sqlite3
+
+# Full order export schema (one row per order line / SKU)
+ORDER_COLUMNS = [
+    ('order_id', 'TEXT'),
+    ('order_status', 'TEXT'),
+    ('order_substatus', 'TEXT'),
+    ('cancellation_return_type', 'TEXT'),
+    ('normal_or_preorder', 'TEXT'),
+    ('sku_id', 'TEXT'),
+    ('seller_sku', 'TEXT'),
+    ('product_name', 'TEXT'),
+    ('variation', 'TEXT'),
+    ('quantity', 'INTEGER'),
+    ('sku_quantity_return', 'INTEGER'),
+    ('sku_unit_original_price', 'REAL'),
+    ('sku_subtotal_before_discount', 'REAL'),
+    ('sku_platform_discount', 'REAL'),
+    ('sku_seller_discount', 'REAL'),
+    ('sku_subtotal_after_discount', 'REAL'),
+    ('shipping_fee_after_discount', 'REAL'),
+    ('original_shipping_fee', 'REAL'),
+    ('shipping_fee_seller_discount', 'REAL'),
+    ('shipping_fee_platform_discount', 'REAL'),
+    ('taxes', 'REAL'),
+    ('order_amount', 'REAL'),
+    ('order_refund_amount', 'REAL'),
+    ('created_time', 'TEXT'),
+    ('paid_time', 'TEXT'),
+    ('rth_time', 'TEXT'),
+    ('shipped_time', 'TEXT'),
+    ('delivered_time', 'TEXT'),
+    ('cancelled_time', 'TEXT'),
+    ('cancel_by', 'TEXT'),
+    ('cancel_reason', 'TEXT'),
+    ('fulfillment_type', 'TEXT'),
+    ('warehouse_name', 'TEXT'),
+    ('tracking_id', 'TEXT'),
+    ('delivery_option', 'TEXT'),
+    ('shipping_provider_name', 'TEXT'),
+    ('buyer_message', 'TEXT'),
+    ('buyer_username', 'TEXT'),
+    ('recipient', 'TEXT'),
+    ('phone_number', 'TEXT'),
+    ('raw_phone_number', 'TEXT'),  # Stores the original phone number format
+    ('is_valid_for_whatsapp', 'BOOLEAN'),  # Flag indicating if the number is valid for WhatsApp
+    ('zipcode', 'TEXT'),
+    ('state', 'TEXT'),
+    ('country', 'TEXT'),
+    ('county', 'TEXT'),
+    ('districts', 'TEXT'),
+    ('street_name', 'TEXT'),
+    ('house_number', 'TEXT'),
+    ('delivery_instruction', 'TEXT'),
+    ('payment_method', 'TEXT'),
+    ('weight', 'REAL'),
+    ('product_category', 'TEXT'),
+    ('package_id', 'TEXT'),
+    ('seller_note', 'TEXT'),
+    ('shipping_information', 'TEXT'),
+    ('checked_status', 'TEXT'),
+    ('checked_marked_by', 'TEXT'),
+    ('last_messaged', 'TEXT'),  # Legacy copy, the send path now writes order_messaging
+    ('last_updated', 'TEXT'),
+]
+
+MESSAGE_LOG_COLUMNS = [
+    ('order_id', 'TEXT'),
+    ('phone_number', 'TEXT'),
+    ('message_template_id', 'TEXT'),
+    ('message_sid', 'TEXT'),
+    ('status', 'TEXT'),
+    ('sent_time', 'TEXT'),
+    ('error_message', 'TEXT'),
+]
+
+# Messaging-relevant columns copied from orders into the narrow order_messaging table
+ORDER_MESSAGING_COLUMNS = [
+    'order_id', 'phone_number', 'raw_phone_number', 'recipient', 'order_status',
+    'buyer_username', 'is_valid_for_whatsapp', 'last_updated'
+]
+
+# Characters phone numbers are written with besides their digits. A phone key is
+# the number without them or its 'whatsapp:' prefix; db_utils.normalize_phone_key
+# strips the same ones, so keys made in Python and by the triggers always match
+PHONE_KEY_SEPARATORS = ' \t\r\n+-().\\/'
+
+def _phone_key_sql():
+    sql = "replace({col}, 'whatsapp:', '')"
+    for separator in PHONE_KEY_SEPARATORS:
+        sql = f"replace({sql}, char({ord(separator)}), '')"
+    return f"NULLIF({sql}, '')"
+
+# SQL expression that turns a stored phone number into the phone key used for lookups
+PHONE_KEY_SQL = _phone_key_sql()
+
+# Order export time columns and the indexed INTEGER epoch columns that mirror them
+ORDER_TIME_COLUMNS = [
+    ('created_time', 'created_epoch'),
+    ('paid_time', 'paid_epoch'),
+    ('rth_time', 'rth_epoch'),
+    ('shipped_time', 'shipped_epoch'),
+    ('delivered_time', 'delivered_epoch'),
+    ('cancelled_time', 'cancelled_epoch'),
+]
+
+# SQL expression that turns a stored timestamp into Unix epoch seconds (or NULL).
+# Accepts ISO strings as written by the Python code and the export's
+# 'dd/mm/YYYY HH:MM:SS' format; naive times are local, like datetime.now().
+EPOCH_SQL = """CAST(strftime('%s', CASE
+    WHEN {col} GLOB '[0-9][0-9]/[0-9][0-9]/[0-9][0-9][0-9][0-9]*'
+    THEN substr({col}, 7, 4) || '-' || substr({col}, 4, 2) || '-' || substr({col}, 1, 2) || substr({col}, 11)
+    ELSE NULLIF(trim({col}), '') END, 'utc') AS INTEGER)"""
+
+def _add_missing_columns(cursor, table, columns):
+    """
+    Add any columns missing from an existing table
+
+    Older databases (e.g. testing.db or web imports) were created with a
+    reduced orders schema, so bring them up to the full column set.
+    """
+    cursor.execute(f"PRAGMA table_info({table})")
+    existing = {row[1] for row in cursor.fetchall()}
+    for name, col_type in columns:
+        if name not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {col_type}")
+
+def _create_base_tables(cursor):
+    """Create the orders and message_log tables"""
+    order_columns = ',\n        '.join(f"{name} {col_type}" for name, col_type in ORDER_COLUMNS)
+    cursor.execute(f'''
+    CREATE TABLE IF NOT EXISTS orders (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        {order_columns},
+        UNIQUE(order_id, sku_id)
+    )
+    ''')
+    _add_missing_columns(cursor, 'orders', ORDER_COLUMNS)
+
+    log_columns = ',\n        '.join(f"{name} {col_type}" for name, col_type in MESSAGE_LOG_COLUMNS)
+    cursor.execute(f'''
+    CREATE TABLE IF NOT EXISTS message_log (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        {log_columns}
+    )
+    ''')
+    _add_missing_columns(cursor, 'message_log', MESSAGE_LOG_COLUMNS)
+
+def _create_order_messaging(cursor):
+    """
+    Split the hot messaging columns out of the wide orders rows
+
+    order_messaging shares its rowid with orders and holds only what the send
+    and lookup paths need. Triggers keep it in sync with every writer of
+    orders, so importers don't need to know about it. last_messaged is owned
+    by order_messaging: the send path only ever updates the narrow row.
+    """
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS order_messaging (
+        id INTEGER PRIMARY KEY, -- Same rowid as orders.id
+        order_id TEXT,
+        phone_key TEXT, -- Digits-only phone number used to match people
+        phone_number TEXT,
+        raw_phone_number TEXT,
+        recipient TEXT,
+        order_status TEXT,
+        buyer_username TEXT,
+        is_valid_for_whatsapp BOOLEAN,
+        last_messaged TEXT,
+        last_updated TEXT
+    )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_order_messaging_phone_key ON order_messaging(phone_key)")
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_order_messaging_recipient_scan
+        ON order_messaging(is_valid_for_whatsapp, last_messaged, order_status)
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_order_messaging_last_updated ON order_messaging(last_updated)")
+
+    columns = ', '.join(ORDER_MESSAGING_COLUMNS)
+    new_values = ', '.join(f"NEW.{col}" for col in ORDER_MESSAGING_COLUMNS)
+    assignments = ', '.join(f"{col} = NEW.{col}" for col in ORDER_MESSAGING_COLUMNS)
+    phone_key = PHONE_KEY_SQL.format(col='NEW.phone_number')
+
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS trg_orders_messaging_insert AFTER INSERT ON orders
+    BEGIN
+        INSERT OR REPLACE INTO order_messaging (id, phone_key, last_messaged, {columns})
+        VALUES (NEW.id, {phone_key}, NULLIF(NEW.last_messaged, ''), {new_values});
+    END
+    ''')
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS trg_orders_messaging_update
+    AFTER UPDATE OF {columns} ON orders
+    BEGIN
+        UPDATE order_messaging
+        SET phone_key = {phone_key}, {assignments}
+        WHERE id = NEW.id;
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_orders_messaging_delete AFTER DELETE ON orders
+    BEGIN
+        DELETE FROM order_messaging WHERE id = OLD.id;
+    END
+    ''')
+
+    # Backfill existing order lines
+    cursor.execute(f'''
+        INSERT OR IGNORE INTO order_messaging (id, phone_key, last_messaged, {columns})
+        SELECT id, {PHONE_KEY_SQL.format(col='phone_number')}, NULLIF(last_messaged, ''), {columns}
+        FROM orders
+    ''')
+
+def _create_order_messaging_triggers(cursor, columns):
+    """
+    (Re)create the triggers that copy orders writes onto order_messaging
+
+    Every migration that changes what the copy carries calls this, so the
+    triggers are only ever defined here.
+
+    Args:
+        cursor (sqlite3.Cursor): Migration cursor
+        columns (list): order_messaging columns copied straight from orders
+    """
+    column_list = ', '.join(columns)
+    new_values = ', '.join(f"NEW.{col}" for col in columns)
+    assignments = ', '.join(f"{col} = NEW.{col}" for col in columns)
+    phone_key = PHONE_KEY_SQL.format(col='NEW.phone_number')
+
+    cursor.execute("DROP TRIGGER IF EXISTS trg_orders_messaging_insert")
+    cursor.execute(f'''
+    CREATE TRIGGER trg_orders_messaging_insert AFTER INSERT ON orders
+    BEGIN
+        INSERT OR REPLACE INTO order_messaging
+            (id, phone_key, last_messaged, last_messaged_epoch, last_updated_epoch, {column_list})
+        VALUES (NEW.id, {phone_key}, NULLIF(NEW.last_messaged, ''),
+                {EPOCH_SQL.format(col='NEW.last_messaged')}, {EPOCH_SQL.format(col='NEW.last_updated')},
+                {new_values});
+    END
+    ''')
+    cursor.execute("DROP TRIGGER IF EXISTS trg_orders_messaging_update")
+    cursor.execute(f'''
+    CREATE TRIGGER trg_orders_messaging_update
+    AFTER UPDATE OF {column_list} ON orders
+    BEGIN
+        UPDATE order_messaging
+        SET phone_key = {phone_key}, last_updated_epoch = {EPOCH_SQL.format(col='NEW.last_updated')},
+            {assignments}
+        WHERE id = NEW.id;
+    END
+    ''')
+
+def _create_epoch_columns(cursor):
+    """
+    Mirror the TEXT timestamps with indexed integer epoch columns
+
+    Range and "never messaged" checks compare integers through an index
+    instead of comparing strings. The send path writes last_messaged_epoch and
+    sent_epoch itself, importers write the order time epochs, and the
+    order_messaging triggers derive last_updated_epoch from orders.
+    """
+    _add_missing_columns(cursor, 'order_messaging', [
+        ('last_messaged_epoch', 'INTEGER'),
+        ('last_updated_epoch', 'INTEGER'),
+    ])
+    _add_missing_columns(cursor, 'message_log', [('sent_epoch', 'INTEGER')])
+    _add_missing_columns(cursor, 'orders', [(epoch_col, 'INTEGER') for _, epoch_col in ORDER_TIME_COLUMNS])
+
+    # Backfill from the TEXT columns
+    cursor.execute(f'''
+        UPDATE order_messaging SET
+            last_messaged_epoch = {EPOCH_SQL.format(col='last_messaged')},
+            last_updated_epoch = {EPOCH_SQL.format(col='last_updated')}
+    ''')
+    cursor.execute(f"UPDATE message_log SET sent_epoch = {EPOCH_SQL.format(col='sent_time')}")
+    assignments = ', '.join(
+        f"{epoch_col} = {EPOCH_SQL.format(col=col)}" for col, epoch_col in ORDER_TIME_COLUMNS
+    )
+    cursor.execute(f"UPDATE orders SET {assignments}")
+
+    # The never-messaged test becomes last_messaged_epoch IS NULL
+    cursor.execute("DROP INDEX IF EXISTS idx_order_messaging_recipient_scan")
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_order_messaging_recipient_scan
+        ON order_messaging(is_valid_for_whatsapp, last_messaged_epoch, order_status)
+    ''')
+    cursor.execute("DROP INDEX IF EXISTS idx_order_messaging_last_updated")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_order_messaging_last_updated ON order_messaging(last_updated_epoch)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_message_log_sent_epoch ON message_log(sent_epoch)")
+    for _, epoch_col in ORDER_TIME_COLUMNS:
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_orders_{epoch_col} ON orders({epoch_col})")
+
+    # Recreate the sync triggers so they also derive last_updated_epoch
+    _create_order_messaging_triggers(cursor, ORDER_MESSAGING_COLUMNS)
+
+# Columns on order_messaging that feed the per-person contacts summary
+CONTACT_SOURCE_COLUMNS = [
+    'phone_key', 'order_id', 'phone_number', 'raw_phone_number', 'recipient', 'order_status',
+    'buyer_username', 'is_valid_for_whatsapp', 'last_updated_epoch', 'created_epoch'
+]
+
+# Recompute one person's contacts row from their order lines. The latest line
+# (by order creation time, falling back to import time) supplies the name and
+# status; last_messaged is owned by the send path and is only seeded here.
+CONTACT_REFRESH_SQL = """
+    INSERT INTO contacts (
+        phone_key, phone_number, raw_phone_number, recipient, buyer_username, order_status,
+        latest_order_id, is_valid_for_whatsapp, order_count, first_order_epoch, last_order_epoch,
+        last_updated_epoch, last_messaged_epoch
+    )
+    SELECT
+        l.phone_key, l.phone_number, l.raw_phone_number, l.recipient,
+        (SELECT b.buyer_username FROM order_messaging b
+         WHERE b.phone_key = l.phone_key AND b.buyer_username IS NOT NULL AND b.buyer_username != ''
+         ORDER BY COALESCE(b.created_epoch, b.last_updated_epoch) DESC, b.id DESC LIMIT 1),
+        l.order_status, l.order_id,
+        (SELECT MAX(a.is_valid_for_whatsapp) FROM order_messaging a WHERE a.phone_key = l.phone_key),
+        (SELECT COUNT(DISTINCT a.order_id) FROM order_messaging a WHERE a.phone_key = l.phone_key),
+        (SELECT MIN(COALESCE(a.created_epoch, a.last_updated_epoch)) FROM order_messaging a WHERE a.phone_key = l.phone_key),
+        (SELECT MAX(COALESCE(a.created_epoch, a.last_updated_epoch)) FROM order_messaging a WHERE a.phone_key = l.phone_key),
+        (SELECT MAX(a.last_updated_epoch) FROM order_messaging a WHERE a.phone_key = l.phone_key),
+        (SELECT MAX(a.last_messaged_epoch) FROM order_messaging a WHERE a.phone_key = l.phone_key)
+    FROM order_messaging l
+    WHERE l.phone_key = {key}
+    ORDER BY COALESCE(l.created_epoch, l.last_updated_epoch) DESC, l.id DESC
+    LIMIT 1
+    ON CONFLICT(phone_key) DO UPDATE SET
+        phone_number = excluded.phone_number,
+        raw_phone_number = excluded.raw_phone_number,
+        recipient = excluded.recipient,
+        buyer_username = excluded.buyer_username,
+        order_status = excluded.order_status,
+        latest_order_id = excluded.latest_order_id,
+        is_valid_for_whatsapp = excluded.is_valid_for_whatsapp,
+        order_count = excluded.order_count,
+        first_order_epoch = excluded.first_order_epoch,
+        last_order_epoch = excluded.last_order_epoch,
+        last_updated_epoch = excluded.last_updated_epoch
+"""
+
+def _create_contacts(cursor):
+    """
+    Add a contacts table with one row per person, keyed by phone_key
+
+    Audience queries and buyer lookups read one row per person instead of one
+    per order line. Triggers on order_messaging refresh a person's row
+    whenever one of their lines is imported, changed or deleted, so importers
+    keep it current without knowing about it; the send path updates
+    last_messaged directly.
+    """
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS contacts (
+        phone_key TEXT PRIMARY KEY,
+        phone_number TEXT,
+        raw_phone_number TEXT,
+        recipient TEXT, -- Name on the latest order
+        buyer_username TEXT, -- Latest known buyer username
+        order_status TEXT, -- Status of the latest order
+        latest_order_id TEXT,
+        is_valid_for_whatsapp BOOLEAN,
+        order_count INTEGER,
+        first_order_epoch INTEGER,
+        last_order_epoch INTEGER,
+        last_updated_epoch INTEGER,
+        last_messaged_epoch INTEGER
+    )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_contacts_recipient_scan
+        ON contacts(is_valid_for_whatsapp, last_messaged_epoch, last_updated_epoch)
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_contacts_last_updated ON contacts(last_updated_epoch)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_contacts_order_status ON contacts(order_status)")
+
+    # The contact summary uses the order creation time, so carry it on the narrow table
+    _add_missing_columns(cursor, 'order_messaging', [('created_epoch', 'INTEGER')])
+    cursor.execute("UPDATE order_messaging SET created_epoch = (SELECT o.created_epoch FROM orders o WHERE o.id = order_messaging.id)")
+
+    _create_order_messaging_triggers(cursor, ORDER_MESSAGING_COLUMNS + ['created_epoch'])
+
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS trg_messaging_contacts_insert AFTER INSERT ON order_messaging
+    WHEN NEW.phone_key IS NOT NULL
+    BEGIN
+        {CONTACT_REFRESH_SQL.format(key='NEW.phone_key')};
+    END
+    ''')
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS trg_messaging_contacts_update
+    AFTER UPDATE OF {', '.join(CONTACT_SOURCE_COLUMNS)} ON order_messaging
+    BEGIN
+        {CONTACT_REFRESH_SQL.format(key='NEW.phone_key')};
+        -- A line that moved to another number also changes its previous owner
+        {CONTACT_REFRESH_SQL.format(key='(CASE WHEN OLD.phone_key IS NOT NEW.phone_key THEN OLD.phone_key END)')};
+        DELETE FROM contacts
+        WHERE phone_key = OLD.phone_key
+            AND OLD.phone_key IS NOT NEW.phone_key
+            AND NOT EXISTS (SELECT 1 FROM order_messaging WHERE phone_key = OLD.phone_key);
+    END
+    ''')
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS trg_messaging_contacts_delete AFTER DELETE ON order_messaging
+    WHEN OLD.phone_key IS NOT NULL
+    BEGIN
+        {CONTACT_REFRESH_SQL.format(key='OLD.phone_key')};
+        DELETE FROM contacts
+        WHERE phone_key = OLD.phone_key
+            AND NOT EXISTS (SELECT 1 FROM order_messaging WHERE phone_key = OLD.phone_key);
+    END
+    ''')
+
+    # Backfill one row per existing person
+    cursor.execute("SELECT DISTINCT phone_key FROM order_messaging WHERE phone_key IS NOT NULL")
+    for (key,) in cursor.fetchall():
+        cursor.execute(CONTACT_REFRESH_SQL.format(key='?'), (key,))
+
+def _create_filter_indexes(cursor):
+    """Index the narrow columns campaign filters most often compare"""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_order_messaging_order_id ON order_messaging(order_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_order_messaging_order_status ON order_messaging(order_status)")
+
+def _create_audience_indexes(cursor):
+    """
+    Covering indexes for audience counts
+
+    Filters over order lines only need the phone_key of matching lines, and
+    the order status filter reads the person's latest status on contacts, so
+    both are answered from the index without reading table rows.
+    """
+    cursor.execute("DROP INDEX IF EXISTS idx_contacts_order_status")
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_contacts_order_status
+        ON contacts(order_status, is_valid_for_whatsapp, last_messaged_epoch)
+    ''')
+    cursor.execute("DROP INDEX IF EXISTS idx_order_messaging_order_id")
+    cursor.execute("DROP INDEX IF EXISTS idx_order_messaging_order_status")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_order_messaging_order_id ON order_messaging(order_id, phone_key)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_order_messaging_order_status ON order_messaging(order_status, phone_key)")
+
+def _create_message_status(cursor):
+    """
+    Add the local store for Twilio status callbacks and inbound messages
+
+    message_status holds the current status per message SID, and
+    message_status_events every transition Twilio reported.
+    """
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS message_status (
+        message_sid TEXT PRIMARY KEY,
+        status TEXT,
+        status_rank INTEGER, -- Position in the status progression, see status_store.STATUS_RANK
+        error_code TEXT,
+        error_message TEXT,
+        to_number TEXT,
+        from_number TEXT,
+        phone_key TEXT,
+        created_epoch INTEGER, -- First time the message was seen
+        updated_epoch INTEGER
+    )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_message_status_created ON message_status(created_epoch)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_message_status_phone_key ON message_status(phone_key)")
+
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS message_status_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        message_sid TEXT,
+        status TEXT,
+        error_code TEXT,
+        error_message TEXT,
+        event_epoch INTEGER
+    )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_message_status_events_sid ON message_status_events(message_sid)")
+
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS inbound_messages (
+        message_sid TEXT PRIMARY KEY,
+        from_number TEXT,
+        to_number TEXT,
+        phone_key TEXT,
+        body TEXT,
+        profile_name TEXT,
+        num_media INTEGER,
+        received_epoch INTEGER
+    )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_inbound_messages_received ON inbound_messages(received_epoch)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_inbound_messages_phone_key ON inbound_messages(phone_key)")
+
+    # Seed current statuses from the send log
+    cursor.execute(f'''
+        INSERT OR IGNORE INTO message_status (
+            message_sid, status, status_rank, error_code, error_message,
+            to_number, phone_key, created_epoch, updated_epoch
+        )
+        SELECT message_sid, status, 0, NULL, error_message,
+               phone_number, {PHONE_KEY_SQL.format(col='phone_number')}, sent_epoch, sent_epoch
+        FROM message_log
+        WHERE message_sid IS NOT NULL AND message_sid != ''
+    ''')
+
+def _create_twilio_messages(cursor):
+    """
+    Add the local copy of Twilio's message log and the sync high-water marks
+
+    twilio_messages is filled by twilio_sync and is what the deliverability
+    report reads; sync_state remembers how far each sync has got.
+    """
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS twilio_messages (
+        sid TEXT PRIMARY KEY,
+        direction TEXT, -- 'inbound', 'outbound-api', 'outbound-reply'...
+        from_number TEXT,
+        to_number TEXT,
+        phone_key TEXT, -- The other party: To for outbound, From for inbound
+        body TEXT,
+        status TEXT,
+        status_rank INTEGER,
+        error_code TEXT,
+        error_message TEXT,
+        price REAL,
+        price_unit TEXT,
+        num_segments INTEGER,
+        date_created_epoch INTEGER,
+        date_sent_epoch INTEGER,
+        date_updated_epoch INTEGER
+    )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_twilio_messages_sent ON twilio_messages(date_sent_epoch)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_twilio_messages_phone_key ON twilio_messages(phone_key)")
+
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS sync_state (
+        name TEXT PRIMARY KEY,
+        high_water_epoch INTEGER,
+        synced_epoch INTEGER
+    )
+    ''')
+
+def _create_deliverability_index(cursor):
+    """
+    Covering index for the deliverability counts
+
+    The grouped count over a time window reads direction, status and sid
+    from the index alone instead of every message row (bodies included).
+    """
+    cursor.execute("DROP INDEX IF EXISTS idx_twilio_messages_sent")
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_twilio_messages_sent
+        ON twilio_messages(date_sent_epoch, direction, status, status_rank, sid)
+    ''')
+
+# Rollup tables and the SQL that maps a message's sent_epoch to their bucket:
+# whole hours, and local calendar days like the rest of the reports
+ROLLUP_BUCKETS = [
+    ('message_rollup_hourly', "({col} - {col} % 3600)"),
+    ('message_rollup_daily', "CAST(strftime('%s', date({col}, 'unixepoch', 'localtime'), 'utc') AS INTEGER)"),
+]
+
+# Rollup dimensions and how each is read from a message_status row; missing
+# values become '' or 0 so they still group (NULLs never match a primary key)
+ROLLUP_DIMENSIONS = [
+    ('direction', "COALESCE({row}direction, '')"),
+    ('status', "COALESCE({row}status, '')"),
+    ('template_id', "COALESCE({row}template_id, '')"),
+    ('campaign_id', "COALESCE({row}campaign_id, 0)"),
+    ('error_code', "COALESCE({row}error_code, '')"),
+]
+
+def _rollup_change_sql(table, bucket_sql, row, delta):
+    """Statement adding delta to the rollup row of a message_status row (NEW. or OLD.)"""
+    names = [name for name, _ in ROLLUP_DIMENSIONS]
+    values = [value.format(row=row) for _, value in ROLLUP_DIMENSIONS]
+    bucket = bucket_sql.format(col=f"{row}sent_epoch")
+    if delta < 0:
+        match = ' AND '.join(f"{name} = {value}" for name, value in zip(names, values))
+        return f"UPDATE {table} SET message_count = message_count - 1 WHERE bucket_epoch = {bucket} AND {match};"
+    return f'''INSERT INTO {table} (bucket_epoch, {', '.join(names)}, message_count)
+            VALUES ({bucket}, {', '.join(values)}, 1)
+            ON CONFLICT(bucket_epoch, {', '.join(names)}) DO UPDATE SET message_count = message_count + 1;'''
+
+def _create_message_rollups(cursor):
+    """
+    Add hourly and daily message counts maintained from message_status
+
+    Each message counts once, in the bucket of its sent time, under its
+    current direction/status/template/campaign/error_code. Triggers move the
+    count between rollup rows whenever a message's status changes, so reports
+    over any range read a few rollup rows instead of every message.
+    """
+    _add_missing_columns(cursor, 'message_log', [('campaign_id', 'INTEGER')])
+    _add_missing_columns(cursor, 'message_status', [
+        ('direction', 'TEXT'),
+        ('template_id', 'TEXT'),
+        ('campaign_id', 'INTEGER'),
+        ('sent_epoch', 'INTEGER'),
+    ])
+
+    # Fill the new message_status columns from the send log and the synced message log
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_message_log_sid ON message_log(message_sid)")
+    cursor.execute('''
+        UPDATE message_status SET
+            direction = 'outbound-api',
+            template_id = (SELECT l.message_template_id FROM message_log l
+                           WHERE l.message_sid = message_status.message_sid),
+            sent_epoch = (SELECT l.sent_epoch FROM message_log l
+                          WHERE l.message_sid = message_status.message_sid)
+        WHERE message_sid IN (SELECT message_sid FROM message_log)
+    ''')
+    cursor.execute('''
+        INSERT OR IGNORE INTO message_status (
+            message_sid, status, status_rank, error_code, error_message,
+            to_number, from_number, phone_key, created_epoch, updated_epoch
+        )
+        SELECT sid, status, status_rank, error_code, error_message,
+               to_number, from_number, phone_key, date_created_epoch, date_updated_epoch
+        FROM twilio_messages
+    ''')
+    cursor.execute('''
+        UPDATE message_status SET
+            direction = (SELECT t.direction FROM twilio_messages t WHERE t.sid = message_status.message_sid),
+            sent_epoch = COALESCE((SELECT t.date_sent_epoch FROM twilio_messages t
+                                   WHERE t.sid = message_status.message_sid), sent_epoch)
+        WHERE message_sid IN (SELECT sid FROM twilio_messages)
+    ''')
+
+    dimensions = ', '.join(name for name, _ in ROLLUP_DIMENSIONS)
+    for table, bucket_sql in ROLLUP_BUCKETS:
+        cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {table} (
+            bucket_epoch INTEGER,
+            direction TEXT,
+            status TEXT,
+            template_id TEXT,
+            campaign_id INTEGER,
+            error_code TEXT,
+            message_count INTEGER,
+            PRIMARY KEY (bucket_epoch, {dimensions})
+        )
+        ''')
+        cursor.execute(f"DELETE FROM {table}")
+        values = ', '.join(value.format(row='') for _, value in ROLLUP_DIMENSIONS)
+        cursor.execute(f'''
+            INSERT INTO {table} (bucket_epoch, {dimensions}, message_count)
+            SELECT {bucket_sql.format(col='sent_epoch')}, {values}, COUNT(*)
+            FROM message_status
+            WHERE sent_epoch IS NOT NULL
+            GROUP BY 1, 2, 3, 4, 5, 6
+        ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_message_rollup_daily_campaign ON message_rollup_daily(campaign_id)")
+
+    insert_sql = '\n            '.join(_rollup_change_sql(table, bucket_sql, 'NEW.', 1) for table, bucket_sql in ROLLUP_BUCKETS)
+    delete_sql = '\n            '.join(_rollup_change_sql(table, bucket_sql, 'OLD.', -1) for table, bucket_sql in ROLLUP_BUCKETS)
+    changed = ' OR '.join(f"OLD.{name} IS NOT NEW.{name}" for name in ['sent_epoch', 'direction', 'status', 'template_id',
+                                                                      'campaign_id', 'error_code'])
+
+    cursor.execute("DROP TRIGGER IF EXISTS trg_message_status_rollup_insert")
+    cursor.execute(f'''
+        CREATE TRIGGER trg_message_status_rollup_insert
+        AFTER INSERT ON message_status
+        WHEN NEW.sent_epoch IS NOT NULL
+        BEGIN
+            {insert_sql}
+        END
+    ''')
+
+    # Remove the old contribution and add the new one; either side may have no sent time yet
+    cursor.execute("DROP TRIGGER IF EXISTS trg_message_status_rollup_update_old")
+    cursor.execute(f'''
+        CREATE TRIGGER trg_message_status_rollup_update_old
+        AFTER UPDATE ON message_status
+        WHEN OLD.sent_epoch IS NOT NULL AND ({changed})
+        BEGIN
+            {delete_sql}
+        END
+    ''')
+    cursor.execute("DROP TRIGGER IF EXISTS trg_message_status_rollup_update_new")
+    cursor.execute(f'''
+        CREATE TRIGGER trg_message_status_rollup_update_new
+        AFTER UPDATE ON message_status
+        WHEN NEW.sent_epoch IS NOT NULL AND ({changed})
+        BEGIN
+            {insert_sql}
+        END
+    ''')
+
+    cursor.execute("DROP TRIGGER IF EXISTS trg_message_status_rollup_delete")
+    cursor.execute(f'''
+        CREATE TRIGGER trg_message_status_rollup_delete
+        AFTER DELETE ON message_status
+        WHEN OLD.sent_epoch IS NOT NULL
+        BEGIN
+            {delete_sql}
+        END
+    ''')
+
+# Funnel stages and whether a message_status row (NEW. or OLD.) has reached
+# each; stages are cumulative, so a read message also counts as sent and delivered
+FUNNEL_STAGES = [
+    ('messages', "1"),
+    ('sent', "({row}status IN ('sent', 'delivered', 'read', 'undelivered'))"),
+    ('delivered', "({row}status IN ('delivered', 'read'))"),
+    ('read_count', "({row}status = 'read')"),
+    ('replied', "({row}replied_epoch IS NOT NULL)"),
+    ('failed', "({row}status IN ('failed', 'undelivered', 'canceled'))"),
+]
+
+# Inbound messages within this many seconds of a campaign message count as replies to it
+REPLY_WINDOW_SECONDS = 7 * 86400
+
+def _funnel_change_sql(row, sign):
+    """Statements adding (sign=1) or removing (sign=-1) a message's stages from its run's funnel"""
+    names = ', '.join(name for name, _ in FUNNEL_STAGES)
+    key = f"COALESCE({row}campaign_id, 0), COALESCE({row}run_id, 0)"
+    if sign > 0:
+        values = ', '.join(flag.format(row=row) for _, flag in FUNNEL_STAGES)
+        updates = ', '.join(f"{name} = {name} + excluded.{name}" for name, _ in FUNNEL_STAGES)
+        funnel = f'''INSERT INTO campaign_funnel (campaign_id, run_id, {names})
+            VALUES ({key}, {values})
+            ON CONFLICT(campaign_id, run_id) DO UPDATE SET {updates};'''
+        errors = f'''INSERT INTO campaign_funnel_errors (campaign_id, run_id, error_code, message_count)
+            SELECT {key}, {row}error_code, 1 WHERE {row}error_code IS NOT NULL
+            ON CONFLICT(campaign_id, run_id, error_code) DO UPDATE SET message_count = message_count + 1;'''
+    else:
+        updates = ', '.join(f"{name} = {name} - {flag.format(row=row)}" for name, flag in FUNNEL_STAGES)
+        match = f"campaign_id = COALESCE({row}campaign_id, 0) AND run_id = COALESCE({row}run_id, 0)"
+        funnel = f"UPDATE campaign_funnel SET {updates} WHERE {match};"
+        errors = f'''UPDATE campaign_funnel_errors SET message_count = message_count - 1
+            WHERE {match} AND error_code = {row}error_code;'''
+    return funnel + '\n            ' + errors
+
+def _create_campaign_funnels(cursor):
+    """
+    Add per-campaign, per-run delivery funnels maintained from message_status
+
+    campaign_runs numbers each campaign execution; its run_id is stored on
+    message_log and message_status for every message the run sends. Triggers
+    keep campaign_funnel (queued -> sent -> delivered -> read -> replied, plus
+    failed) and campaign_funnel_errors current as statuses change, and mark a
+    campaign message as replied when its recipient writes back.
+    """
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS campaign_runs (
+        run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        campaign_id INTEGER,
+        campaign_log_id INTEGER, -- CampaignLog row in the web database, set when the run finishes
+        started_epoch INTEGER,
+        finished_epoch INTEGER
+    )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_campaign_runs_campaign ON campaign_runs(campaign_id)")
+
+    _add_missing_columns(cursor, 'message_log', [('run_id', 'INTEGER')])
+    _add_missing_columns(cursor, 'message_status', [('run_id', 'INTEGER'), ('replied_epoch', 'INTEGER')])
+
+    # Replies are matched to the recipient's latest message before them
+    cursor.execute("DROP INDEX IF EXISTS idx_message_status_phone_key")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_message_status_phone_key ON message_status(phone_key, sent_epoch)")
+
+    stages = ',\n        '.join(f"{name} INTEGER DEFAULT 0" for name, _ in FUNNEL_STAGES)
+    cursor.execute(f'''
+    CREATE TABLE IF NOT EXISTS campaign_funnel (
+        campaign_id INTEGER,
+        run_id INTEGER, -- 0 for messages sent before runs were recorded
+        {stages},
+        PRIMARY KEY (campaign_id, run_id)
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS campaign_funnel_errors (
+        campaign_id INTEGER,
+        run_id INTEGER,
+        error_code TEXT,
+        message_count INTEGER,
+        PRIMARY KEY (campaign_id, run_id, error_code)
+    )
+    ''')
+
+    # Link existing statuses to their campaign through the send log
+    cursor.execute('''
+        UPDATE message_status SET
+            campaign_id = (SELECT l.campaign_id FROM message_log l
+                           WHERE l.message_sid = message_status.message_sid)
+        WHERE campaign_id IS NULL
+          AND message_sid IN (SELECT message_sid FROM message_log WHERE campaign_id IS NOT NULL)
+    ''')
+
+    names = ', '.join(name for name, _ in FUNNEL_STAGES)
+    sums = ', '.join(f"SUM({flag.format(row='')})" for _, flag in FUNNEL_STAGES)
+    cursor.execute("DELETE FROM campaign_funnel")
+    cursor.execute(f'''
+        INSERT INTO campaign_funnel (campaign_id, run_id, {names})
+        SELECT campaign_id, COALESCE(run_id, 0), {sums}
+        FROM message_status
+        WHERE campaign_id IS NOT NULL
+        GROUP BY 1, 2
+    ''')
+    cursor.execute("DELETE FROM campaign_funnel_errors")
+    cursor.execute('''
+        INSERT INTO campaign_funnel_errors (campaign_id, run_id, error_code, message_count)
+        SELECT campaign_id, COALESCE(run_id, 0), error_code, COUNT(*)
+        FROM message_status
+        WHERE campaign_id IS NOT NULL AND error_code IS NOT NULL
+        GROUP BY 1, 2, 3
+    ''')
+
+    changed = ' OR '.join(f"OLD.{name} IS NOT NEW.{name}"
+                          for name in ['campaign_id', 'run_id', 'status', 'error_code', 'replied_epoch'])
+
+    cursor.execute("DROP TRIGGER IF EXISTS trg_message_status_funnel_insert")
+    cursor.execute(f'''
+        CREATE TRIGGER trg_message_status_funnel_insert
+        AFTER INSERT ON message_status
+        WHEN NEW.campaign_id IS NOT NULL
+        BEGIN
+            {_funnel_change_sql('NEW.', 1)}
+        END
+    ''')
+    cursor.execute("DROP TRIGGER IF EXISTS trg_message_status_funnel_update_old")
+    cursor.execute(f'''
+        CREATE TRIGGER trg_message_status_funnel_update_old
+        AFTER UPDATE ON message_status
+        WHEN OLD.campaign_id IS NOT NULL AND ({changed})
+        BEGIN
+            {_funnel_change_sql('OLD.', -1)}
+        END
+    ''')
+    cursor.execute("DROP TRIGGER IF EXISTS trg_message_status_funnel_update_new")
+    cursor.execute(f'''
+        CREATE TRIGGER trg_message_status_funnel_update_new
+        AFTER UPDATE ON message_status
+        WHEN NEW.campaign_id IS NOT NULL AND ({changed})
+        BEGIN
+            {_funnel_change_sql('NEW.', 1)}
+        END
+    ''')
+
+    # An inbound message marks the sender's latest campaign message as replied
+    cursor.execute("DROP TRIGGER IF EXISTS trg_message_status_reply")
+    cursor.execute(f'''
+        CREATE TRIGGER trg_message_status_reply
+        AFTER INSERT ON message_status
+        WHEN NEW.direction = 'inbound' AND NEW.phone_key IS NOT NULL AND NEW.sent_epoch IS NOT NULL
+        BEGIN
+            UPDATE message_status SET replied_epoch = NEW.sent_epoch
+            WHERE message_sid = (
+                SELECT message_sid FROM message_status
+                WHERE phone_key = NEW.phone_key
+                  AND sent_epoch BETWEEN NEW.sent_epoch - {REPLY_WINDOW_SECONDS} AND NEW.sent_epoch
+                  AND direction != 'inbound'
+                ORDER BY sent_epoch DESC
+                LIMIT 1
+            )
+            AND campaign_id IS NOT NULL
+            AND replied_epoch IS NULL;
+        END
+    ''')
+
+# Two-digit country calling codes; codes starting 1 (NANP) or 7 are one digit
+# and every other code is three digits
+TWO_DIGIT_CALLING_CODES = [
+    '20', '27', '30', '31', '32', '33', '34', '36', '39', '40', '41', '43', '44', '45', '46', '47', '48', '49',
+    '51', '52', '53', '54', '55', '56', '57', '58', '60', '61', '62', '63', '64', '65', '66',
+    '81', '82', '84', '86', '90', '91', '92', '93', '94', '95', '98',
+]
+
+def _country_code_sql(row):
+    """Expression giving the calling code of a message_status row's phone_key (NEW., OLD. or '')"""
+    key = f"{row}phone_key"
+    two_digit = ', '.join(f"'{code}'" for code in TWO_DIGIT_CALLING_CODES)
+    return (f"COALESCE(CASE WHEN substr({key}, 1, 1) IN ('1', '7') THEN substr({key}, 1, 1) "
+            f"WHEN substr({key}, 1, 2) IN ({two_digit}) THEN substr({key}, 1, 2) "
+            f"ELSE substr({key}, 1, 3) END, '')")
+
+# Cost rollup dimensions and how each is read from a message_status row
+COST_DIMENSIONS = [
+    ('campaign_id', "COALESCE({row}campaign_id, 0)"),
+    ('template_id', "COALESCE({row}template_id, '')"),
+    ('country_code', None),
+    ('price_unit', "COALESCE({row}price_unit, '')"),
+]
+
+def _cost_values(row):
+    return [value.format(row=row) if value else _country_code_sql(row) for _, value in COST_DIMENSIONS]
+
+def _cost_change_sql(row, sign):
+    """Statement adding (sign=1) or removing (sign=-1) a message's cost from its daily cost row"""
+    names = [name for name, _ in COST_DIMENSIONS]
+    values = _cost_values(row)
+    bucket = ROLLUP_BUCKETS[1][1].format(col=f"{row}sent_epoch")
+    priced = f"({row}price IS NOT NULL)"
+    cost = f"COALESCE(ABS({row}price), 0)"
+    if sign < 0:
+        match = ' AND '.join(f"{name} = {value}" for name, value in zip(names, values))
+        return f'''UPDATE message_cost_daily SET
+                message_count = message_count - 1, priced_count = priced_count - {priced}, cost = cost - {cost}
+            WHERE bucket_epoch = {bucket} AND {match};'''
+    return f'''INSERT INTO message_cost_daily (bucket_epoch, {', '.join(names)}, message_count, priced_count, cost)
+            VALUES ({bucket}, {', '.join(values)}, 1, {priced}, {cost})
+            ON CONFLICT(bucket_epoch, {', '.join(names)}) DO UPDATE SET
+                message_count = message_count + 1,
+                priced_count = priced_count + excluded.priced_count,
+                cost = cost + excluded.cost;'''
+
+def _create_message_costs(cursor):
+    """
+    Add message prices to message_status and a daily cost rollup
+
+    Twilio reports each message's price (negative, in price_unit) once it has
+    been charged, and the message sync copies it onto message_status. Triggers
+    keep message_cost_daily current per day, campaign, template and recipient
+    calling code. Outbound messages are counted with and without a price, so
+    the average cost per priced message can be used to estimate a send.
+    """
+    _add_missing_columns(cursor, 'message_status', [('price', 'REAL'), ('price_unit', 'TEXT')])
+    cursor.execute('''
+        UPDATE message_status SET
+            price = (SELECT t.price FROM twilio_messages t WHERE t.sid = message_status.message_sid),
+            price_unit = (SELECT t.price_unit FROM twilio_messages t WHERE t.sid = message_status.message_sid)
+        WHERE message_sid IN (SELECT sid FROM twilio_messages WHERE price IS NOT NULL)
+    ''')
+
+    dimensions = ', '.join(name for name, _ in COST_DIMENSIONS)
+    cursor.execute(f'''
+    CREATE TABLE IF NOT EXISTS message_cost_daily (
+        bucket_epoch INTEGER,
+        campaign_id INTEGER,
+        template_id TEXT,
+        country_code TEXT,
+        price_unit TEXT,
+        message_count INTEGER,
+        priced_count INTEGER,
+        cost REAL, -- positive spend in price_unit
+        PRIMARY KEY (bucket_epoch, {dimensions})
+    )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_message_cost_daily_campaign ON message_cost_daily(campaign_id)")
+    cursor.execute("DELETE FROM message_cost_daily")
+    cursor.execute(f'''
+        INSERT INTO message_cost_daily (bucket_epoch, {dimensions}, message_count, priced_count, cost)
+        SELECT {ROLLUP_BUCKETS[1][1].format(col='sent_epoch')}, {', '.join(_cost_values(''))},
+               COUNT(*), COUNT(price), COALESCE(SUM(ABS(price)), 0)
+        FROM message_status
+        WHERE sent_epoch IS NOT NULL AND COALESCE(direction, '') != 'inbound'
+        GROUP BY 1, 2, 3, 4, 5
+    ''')
+
+    changed = ' OR '.join(f"OLD.{name} IS NOT NEW.{name}"
+                          for name in ['sent_epoch', 'direction', 'campaign_id', 'template_id', 'phone_key',
+                                       'price', 'price_unit'])
+    counted = "{row}sent_epoch IS NOT NULL AND COALESCE({row}direction, '') != 'inbound'"
+
+    cursor.execute("DROP TRIGGER IF EXISTS trg_message_status_cost_insert")
+    cursor.execute(f'''
+        CREATE TRIGGER trg_message_status_cost_insert
+        AFTER INSERT ON message_status
+        WHEN {counted.format(row='NEW.')}
+        BEGIN
+            {_cost_change_sql('NEW.', 1)}
+        END
+    ''')
+
+    # Remove the old contribution and add the new one, as for the message rollups
+    cursor.execute("DROP TRIGGER IF EXISTS trg_message_status_cost_update_old")
+    cursor.execute(f'''
+        CREATE TRIGGER trg_message_status_cost_update_old
+        AFTER UPDATE ON message_status
+        WHEN {counted.format(row='OLD.')} AND ({changed})
+        BEGIN
+            {_cost_change_sql('OLD.', -1)}
+        END
+    ''')
+    cursor.execute("DROP TRIGGER IF EXISTS trg_message_status_cost_update_new")
+    cursor.execute(f'''
+        CREATE TRIGGER trg_message_status_cost_update_new
+        AFTER UPDATE ON message_status
+        WHEN {counted.format(row='NEW.')} AND ({changed})
+        BEGIN
+            {_cost_change_sql('NEW.', 1)}
+        END
+    ''')
+    cursor.execute("DROP TRIGGER IF EXISTS trg_message_status_cost_delete")
+    cursor.execute(f'''
+        CREATE TRIGGER trg_message_status_cost_delete
+        AFTER DELETE ON message_status
+        WHEN {counted.format(row='OLD.')}
+        BEGIN
+            {_cost_change_sql('OLD.', -1)}
+        END
+    ''')
+
+def _create_export_indexes(cursor):
+    """
+    Indexes for the date-range and campaign filters of the data exports
+
+    Exports stream rows in the order of the filtered column, so each one is a
+    range scan of an index rather than a sort of the whole table.
+    """
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_message_status_events_epoch ON message_status_events(event_epoch)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_message_log_campaign ON message_log(campaign_id, sent_epoch)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_message_status_campaign ON message_status(campaign_id, phone_key)")
+
+def _create_message_archive(cursor):
+    """
+    Catalogue of message_log rows moved into Parquet files
+
+    message_archive maintains it. One row per file, with the id and time
+    range it holds, so queries open only the files that can match. It is
+    written in the same transaction that deletes the rows from message_log.
+    """
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS message_archive_files (
+        path TEXT PRIMARY KEY, -- Relative to the archive directory
+        month TEXT, -- YYYY-MM partition, local time like the reports
+        run_max_id INTEGER, -- Highest message_log id covered by the archive run that wrote it
+        row_count INTEGER,
+        min_id INTEGER,
+        max_id INTEGER,
+        min_epoch INTEGER,
+        max_epoch INTEGER,
+        created_epoch INTEGER
+    )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_message_archive_files_epoch ON message_archive_files(min_epoch, max_epoch)")
+
+def _create_contact_counts(cursor):
+    """
+    Add a one-row table of contact counts maintained by triggers on contacts
+
+    The dashboard and the contacts browser show how many people there are and
+    how many can be messaged on WhatsApp. Reading them here costs the same for
+    any number of contacts, where COUNT(*) scans the whole table.
+    """
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS contact_counts (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        total INTEGER NOT NULL,
+        valid INTEGER NOT NULL -- is_valid_for_whatsapp = 1, like the audience queries
+    )
+    ''')
+    cursor.execute('''
+        INSERT OR REPLACE INTO contact_counts (id, total, valid)
+        SELECT 1, COUNT(*), COALESCE(SUM(is_valid_for_whatsapp = 1), 0) FROM contacts
+    ''')
+
+    cursor.execute("DROP TRIGGER IF EXISTS trg_contacts_count_insert")
+    cursor.execute('''
+        CREATE TRIGGER trg_contacts_count_insert AFTER INSERT ON contacts
+        BEGIN
+            UPDATE contact_counts SET total = total + 1,
+                                      valid = valid + (NEW.is_valid_for_whatsapp IS 1)
+            WHERE id = 1;
+        END
+    ''')
+    cursor.execute("DROP TRIGGER IF EXISTS trg_contacts_count_update")
+    cursor.execute('''
+        CREATE TRIGGER trg_contacts_count_update AFTER UPDATE OF is_valid_for_whatsapp ON contacts
+        WHEN (OLD.is_valid_for_whatsapp IS 1) != (NEW.is_valid_for_whatsapp IS 1)
+        BEGIN
+            UPDATE contact_counts SET valid = valid + (NEW.is_valid_for_whatsapp IS 1) - (OLD.is_valid_for_whatsapp IS 1)
+            WHERE id = 1;
+        END
+    ''')
+    cursor.execute("DROP TRIGGER IF EXISTS trg_contacts_count_delete")
+    cursor.execute('''
+        CREATE TRIGGER trg_contacts_count_delete AFTER DELETE ON contacts
+        BEGIN
+            UPDATE contact_counts SET total = total - 1,
+                                      valid = valid - (OLD.is_valid_for_whatsapp IS 1)
+            WHERE id = 1;
+        END
+    ''')
+
+def _create_contact_listing_index(cursor):
+    """
+    Index contacts by (last_updated_epoch, phone_key) for the contacts browser
+
+    It lists contacts newest first and seeks each page from the last row of
+    the one before, so every page is a single index range. The new index
+    starts with last_updated_epoch and replaces the one on that column alone.
+    """
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_contacts_listing ON contacts(last_updated_epoch, phone_key)")
+    cursor.execute("DROP INDEX IF EXISTS idx_contacts_last_updated")
+
+def _add_archive_pending_deletes(cursor):
+    """
+    Record which archive runs still have rows to delete from message_log
+
+    archive_messages commits a run's catalogue entries before it deletes the
+    rows they hold. pending_delete_epoch keeps the run's cutoff until the
+    deletion commits, so an interrupted run can be finished and its rows are
+    not read twice in the meantime.
+    """
+    _add_missing_columns(cursor, 'message_archive_files', [('pending_delete_epoch', 'INTEGER')])
+
+def _rekey_phone_numbers(cursor):
+    """
+    Strip every separator from phone keys, as db_utils.normalize_phone_key does
+
+    Keys used to keep the spaces, dashes and brackets a number was written with,
+    so such people never matched the keys made in Python by the send path and
+    webhooks. The orders triggers are recreated with the new PHONE_KEY_SQL and
+    existing keys are rewritten; the order_messaging triggers merge contacts
+    whose keys now agree.
+    """
+    _create_order_messaging_triggers(cursor, ORDER_MESSAGING_COLUMNS + ['created_epoch'])
+
+    # The old keys are the numbers less 'whatsapp:' and '+', so stripping them
+    # again gives the key of the number itself
+    for table in ('order_messaging', 'message_status'):
+        cursor.execute(f'''
+            UPDATE {table} SET phone_key = {PHONE_KEY_SQL.format(col='phone_key')}
+            WHERE phone_key GLOB '*[^0-9]*'
+        ''')
+
+    # A merged contact keeps its latest send from either of its old keys
+    cursor.execute('''
+        UPDATE contacts SET last_messaged_epoch = (
+            SELECT MAX(a.last_messaged_epoch) FROM order_messaging a WHERE a.phone_key = contacts.phone_key
+        )
+        WHERE EXISTS (
+            SELECT 1 FROM order_messaging a
+            WHERE a.phone_key = contacts.phone_key
+                AND a.last_messaged_epoch > COALESCE(contacts.last_messaged_epoch, 0)
+        )
+    ''')
+
+def _migration_001(cursor):
+    _create_base_tables(cursor)
+    _create_order_messaging(cursor)
+
+def _migration_002(cursor):
+    _create_epoch_columns(cursor)
+
+def _migration_003(cursor):
+    _create_contacts(cursor)
+
+def _migration_004(cursor):
+    _create_filter_indexes(cursor)
+
+def _migration_005(cursor):
+    _create_audience_indexes(cursor)
+
+def _migration_006(cursor):
+    _create_message_status(cursor)
+
+def _migration_007(cursor):
+    _create_twilio_messages(cursor)
+
+def _migration_008(cursor):
+    _create_deliverability_index(cursor)
+
+def _migration_009(cursor):
+    _create_message_rollups(cursor)
+
+def _migration_010(cursor):
+    _create_campaign_funnels(cursor)
+
+def _migration_011(cursor):
+    _create_message_costs(cursor)
+
+def _migration_012(cursor):
+    _create_export_indexes(cursor)
+
+def _migration_013(cursor):
+    _create_message_archive(cursor)
+
+def _migration_014(cursor):
+    _create_contact_counts(cursor)
+
+def _migration_015(cursor):
+    _create_contact_listing_index(cursor)
+
+def _migration_016(cursor):
+    _add_archive_pending_deletes(cursor)
+
+def _migration_017(cursor):
+    _rekey_phone_numbers(cursor)
+
+# Ordered list of migrations; position + 1 is the schema version
+MIGRATIONS = [
+    _migration_001,
+    _migration_002,
+    _migration_003,
+    _migration_004,
+    _migration_005,
+    _migration_006,
+    _migration_007,
+    _migration_008,
+    _migration_009,
+    _migration_010,
+    _migration_011,
+    _migration_012,
+    _migration_013,
+    _migration_014,
+    _migration_015,
+    _migration_016,
+    _migration_017,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+def migrate(conn):
+    """
+    Apply any pending migrations to an open connection
+
+    Args:
+        conn (sqlite3.Connection): Database connection
+
+    Returns:
+        int: Schema version after migrating
+    """
+    cursor = conn.cursor()
+    version = cursor.execute("PRAGMA user_version").fetchone()[0]
+
+    for index in range(version, SCHEMA_VERSION):
+        # Run each step in its own explicit transaction so DDL rolls back too
+        conn.commit()
+        cursor.execute("BEGIN")
+        try:
+            MIGRATIONS[index](cursor)
+            # PRAGMA doesn't accept bound parameters
+            cursor.execute(f"PRAGMA user_version = {index + 1}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    return max(version, SCHEMA_VERSION)
+
+def migrate_database(db_path):
+    """
+    Apply any pending migrations to a database file
+
+    Args:
+        db_path (str): Path to SQLite database file
+
+    Returns:
+        int: Schema version after migrating
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        return migrate(conn)
+    finally:
+        conn.close()
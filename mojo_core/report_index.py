@@ -0,0 +1,160 @@
+"""
+Offset index sidecars for report files
+
+A report's index (<report>.idx) holds the byte offset of every recipient
+record as fixed-width 8-byte integers, so the record at any position is found
+with one seek into the index and one into the report. The report viewer pages
+through a 100k-recipient run at the same cost as a 10-recipient one.
+
+Journals write their index as they are written. Reports without one (legacy
+text reports, or a journal whose index was lost) are indexed with a single
+scan the first time they are viewed. Offsets are into the report's original
+content, so they stay valid once the retention job compresses it.
+"""
+import os
+import json
+import struct
+from mojo_core.report_storage import open_report
+
+OFFSET = struct.Struct('<Q')
+INDEX_EXTENSION = '.idx'
+
+# First line of each recipient's block in a legacy text report
+TEXT_ENTRY_PREFIX = b'Message '
+TEXT_END = b'SUMMARY:'
+
+def index_path(report_path):
+    """Path of a report's offset index"""
+    return report_path + INDEX_EXTENSION
+
+class IndexWriter:
+    """
+    Appends record offsets to an index as a report is written
+
+    Args:
+        report_path (str): Report the index belongs to
+    """
+
+    def __init__(self, report_path):
+        # Unbuffered, so a report being written can be paged while the run goes on
+        self._file = open(index_path(report_path), 'wb', buffering=0)
+
+    def add(self, offset):
+        """Record the byte offset of the next entry"""
+        self._file.write(OFFSET.pack(offset))
+
+    def close(self):
+        self._file.close()
+
+def build_index(report_path):
+    """
+    Index a report with one scan and save the sidecar
+
+    Args:
+        report_path (str): Journal (.jsonl) or legacy text report
+
+    Returns:
+        int: Number of entries indexed
+    """
+    journal = report_path.endswith('.jsonl')
+    offsets = []
+    position = 0
+    with open_report(report_path) as f:
+        for line in f:
+            if journal:
+                try:
+                    is_entry = json.loads(line).get('type') == 'message'
+                except ValueError:
+                    is_entry = False
+            else:
+                is_entry = line.startswith(TEXT_ENTRY_PREFIX) and line.rstrip().endswith(b':')
+            if is_entry:
+                offsets.append(position)
+            position += len(line)
+
+    with open(index_path(report_path), 'wb') as f:
+        f.write(b''.join(OFFSET.pack(offset) for offset in offsets))
+    return len(offsets)
+
+def _ensure_index(report_path):
+    """Index path, building the index if it is missing or was cut short mid-entry"""
+    path = index_path(report_path)
+    if not os.path.exists(path) or os.path.getsize(path) % OFFSET.size:
+        build_index(report_path)
+    return path
+
+def entry_count(report_path):
+    """
+    Number of recipient entries in a report, indexing it first if needed
+
+    Returns:
+        int: Entries in the report
+    """
+    return os.path.getsize(_ensure_index(report_path)) // OFFSET.size
+
+def entry_offset(report_path, position):
+    """
+    Byte offset of an entry
+
+    Args:
+        report_path (str): Report path
+        position (int): Entry number, starting at 0
+
+    Returns:
+        int: Byte offset in the report, or None past the last entry
+    """
+    with open(_ensure_index(report_path), 'rb') as f:
+        f.seek(position * OFFSET.size)
+        data = f.read(OFFSET.size)
+    return OFFSET.unpack(data)[0] if len(data) == OFFSET.size else None
+
+def read_journal_page(report_path, start, count):
+    """
+    Records of a journal from entry `start`, at most `count` of them
+
+    Returns:
+        list: Message records (dicts) in file order
+    """
+    offset = entry_offset(report_path, start)
+    if offset is None:
+        return []
+
+    records = []
+    with open_report(report_path) as f:
+        f.seek(offset)
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get('type') != 'message':
+                break
+            records.append(record)
+            if len(records) == count:
+                break
+    return records
+
+def read_text_page(report_path, start, count):
+    """
+    Text of a legacy report's entries from `start`, at most `count` of them
+
+    Returns:
+        str: The entries' text blocks
+    """
+    offset = entry_offset(report_path, start)
+    if offset is None:
+        return ''
+
+    lines = []
+    seen = 0
+    with open_report(report_path) as f:
+        f.seek(offset)
+        for line in f:
+            if line.startswith(TEXT_END):
+                break
+            if line.startswith(TEXT_ENTRY_PREFIX) and line.rstrip().endswith(b':'):
+                seen += 1
+                if seen > count:
+                    break
+            lines.append(line)
+    return b''.join(lines).decode('utf-8', errors='replace').rstrip('\n')
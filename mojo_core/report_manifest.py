@@ -0,0 +1,252 @@
+"""
+Manifest of generated message reports
+
+Each run journal (run_journal.RunJournal) records its report's metadata in a
+small SQLite database kept next to the report files (reports/manifest.db), so
+the reports page is an indexed, paginated query instead of a directory listing
+with every filename and file parsed on each request. Reports written before the
+manifest existed are indexed from their filenames and summaries the first time
+it is opened.
+The manifest also records where the retention job has moved each report
+(compressed in place, or into an archive bundle).
+"""
+import os
+import re
+import sqlite3
+import datetime
+
+MANIFEST_NAME = 'manifest.db'
+MANIFEST_VERSION = 2
+
+# Report modes, as stored in report_files.mode
+LIVE = 'live'
+DRY_RUN = 'dry_run'
+
+# Summary lines at the end of a text report and the manifest columns they fill
+SUMMARY_FIELDS = [
+    ('Total unique recipients', 'total', int),
+    ('Successful', 'successful', int),
+    ('Failed', 'failed', int),
+    ('Time elapsed', 'elapsed_time', lambda value: float(value.split()[0])),
+]
+
+def connect(reports_dir):
+    """
+    Open the manifest of a reports directory, creating it if needed
+
+    Args:
+        reports_dir (str): Directory holding the report files
+
+    Returns:
+        sqlite3.Connection: Manifest connection (row_factory = sqlite3.Row)
+    """
+    os.makedirs(reports_dir, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(reports_dir, MANIFEST_NAME))
+    conn.row_factory = sqlite3.Row
+
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version < MANIFEST_VERSION:
+        _upgrade(conn, reports_dir, version)
+
+    return conn
+
+def _upgrade(conn, reports_dir, version):
+    """Bring the manifest schema up to MANIFEST_VERSION"""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'report_files'"
+    ).fetchone()
+    if not exists:
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS report_files (
+            filename TEXT PRIMARY KEY,
+            created_epoch INTEGER,
+            mode TEXT, -- 'live' or 'dry_run'
+            force BOOLEAN,
+            order_status TEXT,
+            total INTEGER,
+            successful INTEGER,
+            failed INTEGER,
+            elapsed_time REAL
+        )
+        ''')
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_report_files_created ON report_files(created_epoch)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_report_files_mode ON report_files(mode, created_epoch)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_report_files_status ON report_files(order_status, created_epoch)")
+        _index_existing_reports(conn, reports_dir)
+
+    # Version 2: where the retention job has put each report
+    columns = {row['name'] for row in conn.execute("PRAGMA table_info(report_files)")}
+    if 'storage' not in columns:
+        conn.execute("ALTER TABLE report_files ADD COLUMN storage TEXT NOT NULL DEFAULT 'plain'")
+    if 'archive' not in columns:
+        conn.execute("ALTER TABLE report_files ADD COLUMN archive TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_report_files_storage ON report_files(storage, archive, created_epoch)")
+
+    conn.execute(f"PRAGMA user_version = {MANIFEST_VERSION}")
+    conn.commit()
+
+def record_report(reports_dir, filename, summary, created=None):
+    """
+    Add a report to the manifest
+
+    Args:
+        reports_dir (str): Directory holding the report files
+        filename (str): Report file name within reports_dir
+        summary (dict): The run's settings, plus its summary once the journal is closed
+                        (total, successful, failed, elapsed_time, dry_run, force, order_status)
+        created (datetime.datetime): When the report was generated, defaults to now
+    """
+    created = created or datetime.datetime.now()
+    conn = connect(reports_dir)
+    try:
+        conn.execute('''
+            INSERT OR REPLACE INTO report_files (
+                filename, created_epoch, mode, force, order_status, total, successful, failed, elapsed_time
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            filename,
+            int(created.timestamp()),
+            DRY_RUN if summary.get('dry_run') else LIVE,
+            bool(summary.get('force')),
+            summary.get('order_status') or None,
+            summary.get('total'),
+            summary.get('successful'),
+            summary.get('failed'),
+            summary.get('elapsed_time'),
+        ))
+        conn.commit()
+    finally:
+        conn.close()
+
+def set_storage(conn, filename, storage, archive=None):
+    """
+    Record where the retention job has moved a report
+
+    Args:
+        conn (sqlite3.Connection): Manifest connection; the caller commits
+        filename (str): Report file name as generated
+        storage (str): How the report is stored (see report_storage)
+        archive (str): Archive bundle holding the report, relative to the reports directory
+    """
+    conn.execute("UPDATE report_files SET storage = ?, archive = ? WHERE filename = ?",
+                 (storage, archive, filename))
+
+def list_reports(reports_dir, start_epoch=None, end_epoch=None, mode=None, order_status=None,
+                 page=1, per_page=50):
+    """
+    One page of reports, newest first
+
+    Args:
+        reports_dir (str): Directory holding the report files
+        start_epoch (int): Only reports created at or after this time
+        end_epoch (int): Only reports created at or before this time
+        mode (str): LIVE or DRY_RUN
+        order_status (str): Only reports sent to orders with this status
+        page (int): Page number, starting at 1
+        per_page (int): Reports per page
+
+    Returns:
+        tuple: (list of report dicts, total number of matching reports)
+    """
+    conditions = []
+    params = []
+    if start_epoch is not None:
+        conditions.append("created_epoch >= ?")
+        params.append(start_epoch)
+    if end_epoch is not None:
+        conditions.append("created_epoch <= ?")
+        params.append(end_epoch)
+    if mode:
+        conditions.append("mode = ?")
+        params.append(mode)
+    if order_status:
+        conditions.append("order_status = ?")
+        params.append(order_status)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+    if not os.path.isdir(reports_dir):
+        return [], 0
+
+    conn = connect(reports_dir)
+    try:
+        total = conn.execute(f"SELECT COUNT(*) FROM report_files {where}", params).fetchone()[0]
+        rows = conn.execute(f'''
+            SELECT * FROM report_files {where}
+            ORDER BY created_epoch DESC
+            LIMIT ? OFFSET ?
+        ''', params + [per_page, (max(page, 1) - 1) * per_page]).fetchall()
+    finally:
+        conn.close()
+
+    return [_report_data(row) for row in rows], total
+
+def get_report(reports_dir, filename):
+    """
+    Manifest entry of one report
+
+    Returns:
+        dict: Report metadata, or None if the report isn't in the manifest
+    """
+    if not os.path.isdir(reports_dir):
+        return None
+
+    conn = connect(reports_dir)
+    try:
+        row = conn.execute("SELECT * FROM report_files WHERE filename = ?", (filename,)).fetchone()
+    finally:
+        conn.close()
+    return _report_data(row) if row else None
+
+def _report_data(row):
+    report = dict(row)
+    report['date'] = datetime.datetime.fromtimestamp(row['created_epoch'])
+    report['is_dry_run'] = row['mode'] == DRY_RUN
+    report['force_mode'] = bool(row['force'])
+    report['status'] = row['order_status']
+    return report
+
+def _index_existing_reports(conn, reports_dir):
+    """Add reports written before the manifest, from their filenames and summaries"""
+    for filename in os.listdir(reports_dir):
+        if not filename.endswith('.txt'):
+            continue
+        match = re.search(r'(\d{2}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2})', filename)
+        if not match:
+            continue
+        try:
+            created = datetime.datetime.strptime(match.group(1), '%d-%m-%y_%H-%M-%S')
+        except ValueError:
+            continue
+
+        status_match = re.search(r'status_([A-Z]+)', filename)
+        values = {
+            'filename': filename,
+            'created_epoch': int(created.timestamp()),
+            'mode': DRY_RUN if 'dry_run' in filename else LIVE,
+            'force': 'force' in filename,
+            'order_status': status_match.group(1) if status_match else None,
+        }
+        values.update(_read_summary(os.path.join(reports_dir, filename)))
+
+        columns = ', '.join(values)
+        placeholders = ', '.join(f":{name}" for name in values)
+        conn.execute(f"INSERT OR IGNORE INTO report_files ({columns}) VALUES ({placeholders})", values)
+
+def _read_summary(path):
+    """Summary figures from the end of a text report"""
+    summary = {}
+    try:
+        with open(path, 'r') as f:
+            in_summary = False
+            for line in f:
+                if line.startswith('SUMMARY:'):
+                    in_summary = True
+                elif in_summary and ':' in line:
+                    label, value = line.split(':', 1)
+                    for field_label, column, convert in SUMMARY_FIELDS:
+                        if label.strip() == field_label:
+                            summary[column] = convert(value.strip())
+    except (OSError, ValueError):
+        pass
+    return summary
@@ -0,0 +1,128 @@
+"""
+Retention policy for report files
+
+Reports are written uncompressed so they can be streamed and paged while a run
+is going. Once a report is older than compress_days it is compressed in place
+(gzip, or zstd when the zstandard package is installed and chosen), and once it
+is older than archive_days it is moved into the archive bundle for its month,
+reports/archive/reports-YYYY-MM.tar. The manifest is updated as each report
+moves, so the reports directory itself only ever holds recent reports and
+report_storage.open_report() still finds every one of them.
+"""
+import os
+import tarfile
+import datetime
+import shutil
+from mojo_core import report_manifest, report_storage
+from mojo_core.report_index import index_path
+
+COMPRESS_DAYS = 30
+ARCHIVE_DAYS = 365
+
+def apply_retention(reports_dir, compress_days=COMPRESS_DAYS, archive_days=ARCHIVE_DAYS, codec=report_storage.GZIP,
+                    now=None):
+    """
+    Compress and archive old reports
+
+    Args:
+        reports_dir (str): Directory holding the report files
+        compress_days (int): Compress reports older than this, None to never compress
+        archive_days (int): Move reports older than this into archive bundles, None to never archive
+        codec (str): report_storage.GZIP or report_storage.ZSTD; falls back to gzip if zstd isn't installed
+        now (datetime.datetime): Current time, defaults to now
+
+    Returns:
+        dict: Numbers of reports compressed and archived
+    """
+    result = {'compressed': 0, 'archived': 0}
+    if not os.path.isdir(reports_dir):
+        return result
+
+    if codec not in report_storage.available_codecs():
+        codec = report_storage.GZIP
+    now = now or datetime.datetime.now()
+
+    conn = report_manifest.connect(reports_dir)
+    try:
+        if archive_days is not None:
+            cutoff = int((now - datetime.timedelta(days=archive_days)).timestamp())
+            for row in _due(conn, "archive IS NULL", cutoff):
+                if _archive(conn, reports_dir, row, codec):
+                    result['archived'] += 1
+
+        if compress_days is not None:
+            cutoff = int((now - datetime.timedelta(days=compress_days)).timestamp())
+            for row in _due(conn, "archive IS NULL AND storage = 'plain'", cutoff):
+                if _compress(conn, reports_dir, row['filename'], codec):
+                    result['compressed'] += 1
+    finally:
+        conn.close()
+
+    return result
+
+def run_scheduled_retention(reports_dir, compress_days, archive_days, codec):
+    """
+    Scheduler entry point: apply the retention policy and log, never raise
+
+    Args:
+        reports_dir (str): Directory holding the report files
+        compress_days (int): Compress reports older than this
+        archive_days (int): Archive reports older than this
+        codec (str): Compression codec
+    """
+    try:
+        result = apply_retention(reports_dir, compress_days, archive_days, codec)
+        print(f"Report retention: compressed {result['compressed']}, archived {result['archived']}")
+    except Exception as e:
+        print(f"Error applying report retention: {e}")
+
+def _due(conn, condition, cutoff):
+    # Fetched up front, as each report's row is updated while the list is worked through
+    return conn.execute(f'''
+        SELECT filename, storage, created_epoch FROM report_files
+        WHERE {condition} AND created_epoch < ?
+        ORDER BY created_epoch
+    ''', (cutoff,)).fetchall()
+
+def _compress(conn, reports_dir, filename, codec):
+    """Compress one plain report in place; False if its file has gone"""
+    report_path = os.path.join(reports_dir, filename)
+    if not os.path.exists(report_path):
+        return False
+
+    target = report_path + report_storage.SUFFIXES[codec]
+    partial = target + '.part'
+    with open(report_path, 'rb') as source, report_storage.compressor(partial, codec) as out:
+        shutil.copyfileobj(source, out, report_storage.CHUNK_SIZE)
+    # Renamed into place before the original goes, so a crash never leaves the report missing
+    os.replace(partial, target)
+    report_manifest.set_storage(conn, filename, codec)
+    conn.commit()
+    os.remove(report_path)
+    return True
+
+def _archive(conn, reports_dir, row, codec):
+    """Move one report, compressing it first if needed, into its month's bundle; False if its file has gone"""
+    filename = row['filename']
+    report_path = os.path.join(reports_dir, filename)
+    if row['storage'] == report_storage.PLAIN and not _compress(conn, reports_dir, filename, codec):
+        return False
+    found = report_storage.locate(report_path)
+    if not found:
+        return False
+    path, storage = found
+
+    month = datetime.datetime.fromtimestamp(row['created_epoch']).strftime('%Y-%m')
+    bundle = os.path.join(report_storage.ARCHIVE_DIR, f"reports-{month}.tar")
+    os.makedirs(os.path.join(reports_dir, report_storage.ARCHIVE_DIR), exist_ok=True)
+    # Members are already compressed, so the bundle is a plain tar that can be appended to and read by offset
+    with tarfile.open(os.path.join(reports_dir, bundle), 'a') as tar:
+        tar.add(path, arcname=report_storage.stored_name(filename, storage))
+    report_manifest.set_storage(conn, filename, storage, bundle)
+    conn.commit()
+
+    os.remove(path)
+    # The offset index is rebuilt if the report is viewed again
+    if os.path.exists(index_path(report_path)):
+        os.remove(index_path(report_path))
+    return True
@@ -0,0 +1,146 @@
+"""
+Reading reports however they are stored
+
+The retention job (see report_retention) compresses older reports in place
+(<report>.gz, or <report>.zst when zstandard is installed) and later moves
+them into monthly archive bundles (reports/archive/reports-YYYY-MM.tar). A
+report keeps its original name in the manifest and in URLs; open_report()
+finds wherever it is now and decompresses it as it is read, so nothing is ever
+unpacked to disk.
+"""
+import io
+import os
+import tarfile
+import contextlib
+import gzip
+from mojo_core.report_manifest import get_report
+
+try:
+    import zstandard
+except ImportError:
+    # Optional: reports are gzipped when it isn't installed
+    zstandard = None
+
+# Storage of a report, as stored in report_files.storage
+PLAIN = 'plain'
+GZIP = 'gzip'
+ZSTD = 'zstd'
+
+SUFFIXES = {PLAIN: '', GZIP: '.gz', ZSTD: '.zst'}
+
+ARCHIVE_DIR = 'archive'
+
+CHUNK_SIZE = 64 * 1024
+
+def stored_name(filename, storage):
+    """File name of a report once stored with `storage`, e.g. x.jsonl.gz"""
+    return filename + SUFFIXES[storage]
+
+def available_codecs():
+    """Compression codecs that can be used here, preferred first"""
+    return [ZSTD, GZIP] if zstandard else [GZIP]
+
+def compressor(path, storage):
+    """
+    Writable binary file that compresses into `path`
+
+    Args:
+        path (str): Compressed file to write
+        storage (str): GZIP or ZSTD
+
+    Returns:
+        file: Binary file object, to be closed by the caller
+    """
+    if storage == ZSTD:
+        if zstandard is None:
+            raise RuntimeError("zstandard is not installed")
+        return zstandard.ZstdCompressor().stream_writer(open(path, 'wb'), closefd=True)
+    return gzip.open(path, 'wb')
+
+def locate(report_path):
+    """
+    Where a report is on disk outside any archive bundle
+
+    Returns:
+        tuple: (path, storage), or None if it isn't in the reports directory
+    """
+    for storage, suffix in SUFFIXES.items():
+        if os.path.exists(report_path + suffix):
+            return report_path + suffix, storage
+    return None
+
+def report_exists(report_path):
+    """True if the report is in the reports directory, compressed or not, or in an archive bundle"""
+    if locate(report_path):
+        return True
+    reports_dir, filename = os.path.split(report_path)
+    entry = get_report(reports_dir, filename)
+    return bool(entry and entry['archive'])
+
+@contextlib.contextmanager
+def open_report(report_path):
+    """
+    Open a report for reading, decompressing it as it is read
+
+    Args:
+        report_path (str): Path the report was written to (reports/<filename>)
+
+    Yields:
+        file: Binary file object of the report's original content. Plain files
+              seek as usual; compressed ones seek by decompressing up to the offset.
+
+    Raises:
+        FileNotFoundError: If the report isn't anywhere
+    """
+    with contextlib.ExitStack() as stack:
+        found = locate(report_path)
+        if found:
+            path, storage = found
+            raw = stack.enter_context(open(path, 'rb'))
+        else:
+            reports_dir, filename = os.path.split(report_path)
+            entry = get_report(reports_dir, filename)
+            if not entry or not entry['archive']:
+                raise FileNotFoundError(report_path)
+            storage = entry['storage']
+            # Bundles are uncompressed tars of compressed reports, so a member is read without unpacking the rest
+            bundle = stack.enter_context(tarfile.open(os.path.join(reports_dir, entry['archive']), 'r:'))
+            raw = stack.enter_context(bundle.extractfile(stored_name(filename, storage)))
+        yield stack.enter_context(_decompressed(raw, storage))
+
+def _decompressed(raw, storage):
+    if storage == GZIP:
+        return gzip.GzipFile(fileobj=raw, mode='rb')
+    if storage == ZSTD:
+        if zstandard is None:
+            raise RuntimeError("zstandard is needed to read this report")
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(raw))
+    return raw
+
+def iter_report(report_path, chunk_size=CHUNK_SIZE):
+    """
+    Stream a report's original content in chunks
+
+    Yields:
+        bytes: Up to chunk_size bytes at a time
+    """
+    with open_report(report_path) as f:
+        yield from iter(lambda: f.read(chunk_size), b'')
+
+def read_tail(f, size):
+    """
+    Last `size` bytes of an open report, from no earlier than its current position
+
+    Plain and gzipped reports seek to the end; streams that only read forwards
+    (zstd) are read through, keeping the last `size` bytes.
+    """
+    position = f.tell()
+    try:
+        end = f.seek(0, os.SEEK_END)
+    except (OSError, ValueError):
+        tail = b''
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            tail = (tail + chunk)[-size:]
+        return tail
+    f.seek(max(end - size, position))
+    return f.read()
@@ -0,0 +1,222 @@
+"""
+Structured JSON Lines journals of send runs
+
+Each send run streams one JSON object per line to reports/<name>.jsonl as it
+goes: a header with the run's settings, one record per recipient, and a footer
+with the summary once the run ends. A run that stops half way still leaves
+every recipient it reached on disk. The readable text report is rendered from
+the journal on demand, and readers stream it line by line instead of loading
+and scraping a text file. An offset index (see report_index) is written
+alongside, so any page of records can be read directly.
+"""
+import os
+import json
+import datetime
+from mojo_core.report_manifest import record_report
+from mojo_core.report_index import IndexWriter
+from mojo_core.report_storage import open_report, read_tail
+
+HEADER = 'header'
+MESSAGE = 'message'
+FOOTER = 'footer'
+
+JOURNAL_EXTENSION = '.jsonl'
+
+def report_basename(settings, generated):
+    """
+    Report name without extension, e.g. message_report_dry_run_status_SHIPPED_16-05-25_18-20-50
+
+    Args:
+        settings (dict): Run settings (dry_run, force, order_status)
+        generated (datetime.datetime): When the run started
+
+    Returns:
+        str: Base file name
+    """
+    parts = ['message_report']
+    if settings.get('dry_run'):
+        parts.append('dry_run')
+    if settings.get('force'):
+        parts.append('force')
+    if settings.get('order_status'):
+        parts.append(f"status_{settings['order_status']}")
+    parts.append(generated.strftime('%d-%m-%y_%H-%M-%S'))
+    return '_'.join(parts)
+
+class RunJournal:
+    """
+    Journal of one send run, written as it happens
+
+    The file is only created when the first recipient is recorded, so a run
+    that reaches nobody leaves no report.
+
+    Args:
+        reports_dir (str): Directory for report files
+        settings (dict): Run settings for the header (dry_run, force, order_status, order_id...)
+    """
+
+    def __init__(self, reports_dir, settings):
+        self.reports_dir = str(reports_dir)
+        self.settings = settings
+        self.generated = datetime.datetime.now()
+        self.filename = report_basename(settings, self.generated) + JOURNAL_EXTENSION
+        self.path = os.path.join(self.reports_dir, self.filename)
+        self.count = 0
+        self._file = None
+        self._index = None
+        self._offset = 0
+
+    def record(self, log_entry):
+        """
+        Append one recipient's outcome
+
+        Args:
+            log_entry (dict): order_id, recipient, phone_number, status, message_sid, error, timestamp
+        """
+        if self._file is None:
+            self._open()
+        offset = self._offset
+        self._write(dict(log_entry, type=MESSAGE))
+        # Indexed once the record is on disk, so the index never points past the journal
+        self._index.add(offset)
+        self.count += 1
+
+    def close(self, summary):
+        """
+        Write the footer and index the report
+
+        Args:
+            summary (dict): total, successful, failed, elapsed_time
+
+        Returns:
+            str: Path to the journal, or None if nothing was recorded
+        """
+        if self._file is None:
+            return None
+        self._write(dict(summary, type=FOOTER))
+        self._file.close()
+        self._file = None
+        self._index.close()
+        record_report(self.reports_dir, self.filename, dict(self.settings, **summary), self.generated)
+        return self.path
+
+    def _open(self):
+        os.makedirs(self.reports_dir, exist_ok=True)
+        # Line buffered, so every record is on disk as soon as it is written
+        self._file = open(self.path, 'w', buffering=1, encoding='utf-8')
+        self._index = IndexWriter(self.path)
+        self._write(dict(self.settings, type=HEADER, generated=self.generated.isoformat(timespec='seconds')))
+        # Listed while the run is still going; close() fills in the summary
+        record_report(self.reports_dir, self.filename, self.settings, self.generated)
+
+    def _write(self, record):
+        line = json.dumps(record, default=str) + '\n'
+        self._file.write(line)
+        self._offset += len(line.encode('utf-8'))
+
+def is_journal(filename):
+    """True for journal file names, False for legacy text reports"""
+    return filename.endswith(JOURNAL_EXTENSION)
+
+def read_journal(path):
+    """
+    Stream the records of a journal
+
+    A line cut short by a crash mid-write is skipped.
+
+    Args:
+        path (str): Journal path
+
+    Yields:
+        dict: Header, message and footer records in file order
+    """
+    with open_report(path) as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+def read_header_footer(path):
+    """
+    Header and footer of a journal without reading the records between them
+
+    Returns:
+        tuple: (header dict, footer dict or None if the run didn't finish)
+    """
+    with open_report(path) as f:
+        header = json.loads(f.readline() or b'{}')
+        # The footer is the last line, a short one
+        tail = read_tail(f, 4096)
+    lines = tail.rstrip(b'\n').split(b'\n')
+    try:
+        footer = json.loads(lines[-1])
+    except ValueError:
+        return header, None
+    return header, footer if footer.get('type') == FOOTER else None
+
+def text_report(path):
+    """
+    Render a journal as the readable text report, one line at a time
+
+    Args:
+        path (str): Journal path
+
+    Yields:
+        str: Report lines, each ending in a newline
+    """
+    number = 0
+    for record in read_journal(path):
+        kind = record.get('type')
+        if kind == HEADER:
+            yield from _text_header(record)
+        elif kind == MESSAGE:
+            number += 1
+            yield from _text_message(number, record)
+        elif kind == FOOTER:
+            yield from _text_summary(record)
+
+def _text_header(header):
+    generated = datetime.datetime.fromisoformat(header['generated'])
+    yield '=' * 80 + '\n'
+    yield "MOJO WHATSAPP MESSAGE REPORT\n"
+    yield f"Generated: {generated.strftime('%Y-%m-%d %H:%M:%S')}\n"
+    if header.get('dry_run'):
+        yield "Mode: DRY RUN (no messages actually sent)\n"
+    else:
+        yield "Mode: LIVE RUN\n"
+    if header.get('force'):
+        yield "WARNING: FORCE MODE ENABLED - Including previously messaged recipients\n"
+    yield '=' * 80 + '\n\n'
+
+    # Only include filters section if there are actual filters to display
+    if header.get('order_status') or header.get('order_id'):
+        yield "MESSAGE SENT TO:\n"
+        if header.get('order_status'):
+            yield f"  Orders with status: {header['order_status']}\n"
+        if header.get('order_id'):
+            yield f"  Specific order ID: {header['order_id']}\n"
+        yield "\n"
+
+    yield "DETAILED MESSAGE LOG:\n"
+    yield '-' * 80 + '\n'
+
+def _text_message(number, record):
+    yield f"Message {number}:\n"
+    yield f"  Order ID: {record.get('order_id')}\n"
+    yield f"  Recipient: {record.get('recipient')}\n"
+    yield f"  Phone Number: {record.get('phone_number')}\n"
+    yield f"  Status: {record.get('status')}\n"
+    if record.get('message_sid'):
+        yield f"  Message SID: {record['message_sid']}\n"
+    if record.get('error'):
+        yield f"  Error: {record['error']}\n"
+    yield f"  Timestamp: {record.get('timestamp')}\n"
+    yield '-' * 80 + '\n'
+
+def _text_summary(footer):
+    yield "\nSUMMARY:\n"
+    yield f"Total unique recipients: {footer['total']}\n"
+    yield f"Successful: {footer['successful']}\n"
+    yield f"Failed: {footer['failed']}\n"
+    yield f"Time elapsed: {footer['elapsed_time']:.2f} seconds\n"
@@ -0,0 +1,553 @@
+"""
+Local store for Twilio message status callbacks and inbound messages
+
+Twilio posts a StatusCallback for every status change of an outbound message
+(queued, sent, delivered, read, failed...). Each callback is appended to
+message_status_events, and message_status keeps the current status per
+message SID. The deliverability report reads the message log synced by
+twilio_sync and applies these statuses on top, so a delivery or read shows
+up before the next sync.
+"""
+import os
+import time
+from collections import Counter
+from mojo_core.db_utils import get_db_connection, normalize_phone_key
+
+# Status progression; callbacks can arrive out of order, so a message only
+# moves forward (failed/undelivered are final)
+STATUS_RANK = {
+    'accepted': 0,
+    'scheduled': 0,
+    'queued': 1,
+    'sending': 2,
+    'sent': 3,
+    'receiving': 3,
+    'received': 4,
+    'delivered': 4,
+    'read': 5,
+    'undelivered': 6,
+    'failed': 6,
+    'canceled': 6,
+}
+
+def status_event(values, event_epoch=None):
+    """
+    Build a status event from StatusCallback form values
+
+    Args:
+        values (dict): Callback parameters (MessageSid, MessageStatus, ErrorCode, To, From...)
+        event_epoch (int): When the event happened, defaults to now
+
+    Returns:
+        dict: Normalized event, or None if there is no SID or status
+    """
+    sid = values.get('MessageSid') or values.get('SmsSid')
+    status = (values.get('MessageStatus') or values.get('SmsStatus') or '').lower()
+    if not sid or not status:
+        return None
+
+    return {
+        'message_sid': sid,
+        'status': status,
+        'status_rank': STATUS_RANK.get(status, 0),
+        'error_code': values.get('ErrorCode') or None,
+        'error_message': values.get('ErrorMessage') or None,
+        'to_number': values.get('To'),
+        'from_number': values.get('From'),
+        'phone_key': normalize_phone_key(values.get('To')),
+        'event_epoch': int(event_epoch if event_epoch is not None else time.time()),
+        # Known to the sender and the message sync, not to the callback
+        'direction': None,
+        'template_id': None,
+        'campaign_id': None,
+        'run_id': None,
+        'sent_epoch': None,
+        # Reported by Twilio once the message is charged, read by the message sync
+        'price': None,
+        'price_unit': None,
+    }
+
+def inbound_event(values, event_epoch=None):
+    """
+    Build an inbound message record from incoming-message webhook values
+
+    Args:
+        values (dict): Webhook parameters (MessageSid, From, To, Body, ProfileName...)
+        event_epoch (int): When the message arrived, defaults to now
+
+    Returns:
+        dict: Normalized inbound message, or None if there is no SID
+    """
+    sid = values.get('MessageSid') or values.get('SmsSid')
+    if not sid:
+        return None
+
+    return {
+        'message_sid': sid,
+        'from_number': values.get('From'),
+        'to_number': values.get('To'),
+        'phone_key': normalize_phone_key(values.get('From')),
+        'body': values.get('Body') or '',
+        'profile_name': values.get('ProfileName'),
+        'num_media': int(values.get('NumMedia') or 0),
+        'received_epoch': int(event_epoch if event_epoch is not None else time.time()),
+    }
+
+def record_status_events(conn, events):
+    """
+    Append status events and advance each message's current status
+
+    Callers commit; the whole batch is written with executemany.
+
+    Args:
+        conn (sqlite3.Connection): Affiliates database connection
+        events (list): Events built by status_event()
+    """
+    if not events:
+        return
+
+    conn.executemany('''
+        INSERT INTO message_status_events (message_sid, status, error_code, error_message, event_epoch)
+        VALUES (:message_sid, :status, :error_code, :error_message, :event_epoch)
+    ''', events)
+    record_current_statuses(conn, events)
+
+def record_current_statuses(conn, events):
+    """
+    Advance each message's current status without logging the events
+
+    Triggers on message_status keep the hourly and daily rollups and the
+    daily cost rollup in step.
+
+    Args:
+        conn (sqlite3.Connection): Affiliates database connection
+        events (list): Events shaped like status_event() results
+    """
+    if not events:
+        return
+
+    # Later or more advanced statuses win; numbers and first-seen time are kept
+    conn.executemany('''
+        INSERT INTO message_status (
+            message_sid, status, status_rank, error_code, error_message,
+            to_number, from_number, phone_key, created_epoch, updated_epoch,
+            direction, template_id, campaign_id, run_id, sent_epoch, price, price_unit
+        )
+        VALUES (
+            :message_sid, :status, :status_rank, :error_code, :error_message,
+            :to_number, :from_number, :phone_key, :event_epoch, :event_epoch,
+            :direction, :template_id, :campaign_id, :run_id, :sent_epoch, :price, :price_unit
+        )
+        ON CONFLICT(message_sid) DO UPDATE SET
+            status = CASE WHEN excluded.status_rank >= message_status.status_rank
+                          THEN excluded.status ELSE message_status.status END,
+            status_rank = MAX(excluded.status_rank, message_status.status_rank),
+            error_code = COALESCE(excluded.error_code, message_status.error_code),
+            error_message = COALESCE(excluded.error_message, message_status.error_message),
+            to_number = COALESCE(message_status.to_number, excluded.to_number),
+            from_number = COALESCE(message_status.from_number, excluded.from_number),
+            phone_key = COALESCE(message_status.phone_key, excluded.phone_key),
+            created_epoch = MIN(message_status.created_epoch, excluded.created_epoch),
+            updated_epoch = MAX(message_status.updated_epoch, excluded.updated_epoch),
+            direction = COALESCE(excluded.direction, message_status.direction),
+            template_id = COALESCE(message_status.template_id, excluded.template_id),
+            campaign_id = COALESCE(message_status.campaign_id, excluded.campaign_id),
+            run_id = COALESCE(message_status.run_id, excluded.run_id),
+            sent_epoch = COALESCE(excluded.sent_epoch, message_status.sent_epoch),
+            price = COALESCE(excluded.price, message_status.price),
+            price_unit = COALESCE(excluded.price_unit, message_status.price_unit)
+    ''', events)
+
+def record_inbound_messages(conn, messages):
+    """
+    Store inbound messages, ignoring webhook retries of the same SID
+
+    Args:
+        conn (sqlite3.Connection): Affiliates database connection
+        messages (list): Messages built by inbound_event()
+    """
+    if not messages:
+        return
+
+    conn.executemany('''
+        INSERT OR IGNORE INTO inbound_messages (
+            message_sid, from_number, to_number, phone_key, body, profile_name, num_media, received_epoch
+        )
+        VALUES (
+            :message_sid, :from_number, :to_number, :phone_key, :body, :profile_name, :num_media, :received_epoch
+        )
+    ''', messages)
+
+    # Inbound messages are counted in the rollups like outbound ones
+    record_current_statuses(conn, [
+        dict(status_event({'MessageSid': message['message_sid'], 'MessageStatus': 'received',
+                           'From': message['from_number'], 'To': message['to_number']}, message['received_epoch']),
+             phone_key=message['phone_key'], direction='inbound', sent_epoch=message['received_epoch'])
+        for message in messages
+    ])
+
+def record_sent_message(db_path, message_sid, to, status, template_id=None, campaign_id=None, run_id=None):
+    """
+    Seed the current status of a message we just sent
+
+    Links the SID to the recipient, template and campaign before the first
+    callback arrives.
+
+    Args:
+        db_path (str): Path to SQLite database file
+        message_sid (str): Twilio message SID
+        to (str): Recipient's WhatsApp number
+        status (str): Status returned by the create call (usually 'queued')
+        template_id (str): Content template SID
+        campaign_id (int): Campaign that sent the message, if any
+        run_id (int): Campaign run from start_campaign_run(), if any
+    """
+    event = status_event({'MessageSid': message_sid, 'MessageStatus': status, 'To': to})
+    if not event:
+        return
+    event.update(direction='outbound-api', template_id=template_id, campaign_id=campaign_id, run_id=run_id,
+                 sent_epoch=event['event_epoch'])
+
+    try:
+        conn = get_db_connection(db_path)
+        record_status_events(conn, [event])
+        conn.commit()
+        conn.close()
+    except Exception as e:
+        print(f"Error recording message status: {e}")
+
+def start_campaign_run(db_path, campaign_id):
+    """
+    Number a new execution of a campaign
+
+    Args:
+        db_path (str): Path to SQLite database file
+        campaign_id (int): Campaign being executed
+
+    Returns:
+        int: run_id to pass to the send functions
+    """
+    conn = get_db_connection(db_path)
+    cursor = conn.execute("INSERT INTO campaign_runs (campaign_id, started_epoch) VALUES (?, ?)",
+                          (campaign_id, int(time.time())))
+    conn.commit()
+    conn.close()
+    return cursor.lastrowid
+
+def finish_campaign_run(db_path, run_id, campaign_log_id=None):
+    """
+    Record the end of a campaign run and the CampaignLog row describing it
+
+    Args:
+        db_path (str): Path to SQLite database file
+        run_id (int): Run from start_campaign_run()
+        campaign_log_id (int): CampaignLog ID in the web database
+    """
+    conn = get_db_connection(db_path)
+    conn.execute("UPDATE campaign_runs SET finished_epoch = ?, campaign_log_id = ? WHERE run_id = ?",
+                 (int(time.time()), campaign_log_id, run_id))
+    conn.commit()
+    conn.close()
+
+def get_campaign_funnel(conn, campaign_id):
+    """
+    Delivery funnel of a campaign, in total and per run
+
+    Reads the campaign_funnel tables that triggers keep current, so the cost
+    doesn't depend on how many messages the campaign sent.
+
+    Args:
+        conn (sqlite3.Connection): Affiliates database connection (row_factory = sqlite3.Row)
+        campaign_id (int): Campaign ID
+
+    Returns:
+        dict: {'total': {stage: count}, 'errors': {error_code: count},
+               'runs': [{'run_id', 'campaign_log_id', 'started', stages..., 'errors'}]} newest run first
+    """
+    stages = ['messages', 'sent', 'delivered', 'read', 'replied', 'failed']
+    total = dict.fromkeys(stages, 0)
+    errors = Counter()
+    runs = {}
+
+    rows = conn.execute('''
+        SELECT f.*, f.read_count AS read, r.campaign_log_id, r.started_epoch
+        FROM campaign_funnel f
+        LEFT JOIN campaign_runs r ON r.run_id = f.run_id
+        WHERE f.campaign_id = ?
+        ORDER BY f.run_id DESC
+    ''', (campaign_id,)).fetchall()
+    for row in rows:
+        run = {stage: row[stage] for stage in stages}
+        run.update(run_id=row['run_id'], campaign_log_id=row['campaign_log_id'],
+                   started=_iso(row['started_epoch']), errors={})
+        runs[row['run_id']] = run
+        for stage in stages:
+            total[stage] += row[stage]
+
+    rows = conn.execute('''
+        SELECT run_id, error_code, message_count
+        FROM campaign_funnel_errors
+        WHERE campaign_id = ? AND message_count > 0
+    ''', (campaign_id,)).fetchall()
+    for row in rows:
+        errors[row['error_code']] += row['message_count']
+        if row['run_id'] in runs:
+            runs[row['run_id']]['errors'][row['error_code']] = row['message_count']
+
+    return {'total': total, 'errors': dict(errors), 'runs': list(runs.values())}
+
+# Path of the web app's status webhook (mojo_web/routes/webhooks.py)
+STATUS_WEBHOOK_PATH = '/webhooks/twilio/status'
+
+def status_callback_url():
+    """
+    Public URL of the status webhook, set as status_callback on every send
+
+    Returns:
+        str: TWILIO_STATUS_CALLBACK_URL, else the status webhook under
+             TWILIO_WEBHOOK_BASE_URL, or None if callbacks aren't configured
+    """
+    url = os.environ.get('TWILIO_STATUS_CALLBACK_URL')
+    if url:
+        return url
+    base_url = os.environ.get('TWILIO_WEBHOOK_BASE_URL')
+    return base_url.rstrip('/') + STATUS_WEBHOOK_PATH if base_url else None
+
+# Counter key for inbound messages, which have no delivery status of their own
+INBOUND_KEY = 'inbound'
+
+# Synced status, moved forward by any newer webhook status for the same message
+EFFECTIVE_STATUS_SQL = '''
+    CASE WHEN s.status_rank > t.status_rank THEN s.status ELSE t.status END
+'''
+
+# Latest messages in a window with their buyer, resolved in the same query
+# through the contacts primary key rather than one lookup per message
+MESSAGE_LIST_SQL = f'''
+    SELECT t.*, {EFFECTIVE_STATUS_SQL} AS current_status,
+           COALESCE(s.error_code, t.error_code) AS current_error_code,
+           COALESCE(s.error_message, t.error_message) AS current_error_message,
+           c.buyer_username, c.recipient, c.latest_order_id
+    FROM twilio_messages t
+    LEFT JOIN message_status s ON s.message_sid = t.sid
+    LEFT JOIN contacts c ON c.phone_key = t.phone_key
+    WHERE t.date_sent_epoch BETWEEN ? AND ? AND {{direction_condition}}
+    ORDER BY t.date_sent_epoch DESC
+    LIMIT ?
+'''
+
+def get_deliverability(conn, start_epoch, end_epoch, today_epoch, limit=100):
+    """
+    Summarize outbound delivery status and inbound messages for a time window
+
+    Figures come from the message rollups, so they cover every message in
+    the window at the same cost for any window length; the listed messages
+    come from the twilio_messages table kept up to date by twilio_sync.
+
+    Args:
+        conn (sqlite3.Connection): Affiliates database connection (row_factory = sqlite3.Row)
+        start_epoch (int): Window start
+        end_epoch (int): Window end
+        today_epoch (int): Start of today (local midnight), for the percentage figures
+        limit (int): Maximum number of messages listed per direction (stats cover all)
+
+    Returns:
+        dict: {'messages': [...], 'inbound_messages': [...], 'stats': {...}}
+    """
+    cursor = conn.cursor()
+
+    # Counts come from the rollups: hourly rows for the window (from the start
+    # of its first hour) and today's daily rows, folded into outbound statuses
+    # and inbound with a Counter
+    counts = Counter()
+    today_counts = Counter()
+    cursor.execute('''
+        SELECT direction = 'inbound' AS inbound, status, SUM(message_count) AS total
+        FROM message_rollup_hourly
+        WHERE bucket_epoch BETWEEN ? AND ?
+        GROUP BY 1, 2
+    ''', (start_epoch - start_epoch % 3600, end_epoch))
+    for row in cursor.fetchall():
+        counts[INBOUND_KEY if row['inbound'] else row['status']] += row['total']
+    cursor.execute('''
+        SELECT direction = 'inbound' AS inbound, status, SUM(message_count) AS total
+        FROM message_rollup_daily
+        WHERE bucket_epoch = ?
+        GROUP BY 1, 2
+    ''', (today_epoch,))
+    for row in cursor.fetchall():
+        today_counts[INBOUND_KEY if row['inbound'] else row['status']] += row['total']
+
+    inbound = counts.pop(INBOUND_KEY, 0)
+    today_inbound = today_counts.pop(INBOUND_KEY, 0)
+    total = sum(counts.values()) + inbound
+    today_total = sum(today_counts.values()) + today_inbound
+
+    def pct(count):
+        return round(count / today_total * 100, 1) if today_total > 0 else 0
+
+    stats = {
+        'total': total,
+        'delivered': counts['delivered'],
+        'delivered_pct': pct(today_counts['delivered']),
+        'sent': counts['sent'],
+        'sent_pct': pct(today_counts['sent']),
+        'failed': counts['failed'],
+        'failed_pct': pct(today_counts['failed']),
+        'undelivered': counts['undelivered'],
+        'undelivered_pct': pct(today_counts['undelivered']),
+        'received': inbound,
+        'received_pct': pct(today_inbound),
+        'read': counts['read'],
+        'read_pct': pct(today_counts['read']),
+        'inbound': inbound,
+    }
+
+    messages = {}
+    for direction, condition in (('outbound', "t.direction != 'inbound'"), ('inbound', "t.direction = 'inbound'")):
+        cursor.execute(MESSAGE_LIST_SQL.format(direction_condition=condition), (start_epoch, end_epoch, limit))
+        messages[direction] = [_message_data(row) for row in cursor.fetchall()]
+
+    return {'messages': messages['outbound'], 'inbound_messages': messages['inbound'], 'stats': stats}
+
+def get_campaign_statuses(conn, campaign_id):
+    """
+    Current status and error counts for every message a campaign sent
+
+    Args:
+        conn (sqlite3.Connection): Affiliates database connection
+        campaign_id (int): Campaign ID
+
+    Returns:
+        dict: {'statuses': {status: count}, 'errors': {error_code: count}, 'total': int}
+    """
+    statuses = Counter()
+    errors = Counter()
+    rows = conn.execute('''
+        SELECT status, error_code, SUM(message_count)
+        FROM message_rollup_daily
+        WHERE campaign_id = ? AND direction != 'inbound'
+        GROUP BY status, error_code
+        HAVING SUM(message_count) > 0
+    ''', (campaign_id,)).fetchall()
+    for status, error_code, count in rows:
+        statuses[status] += count
+        if error_code:
+            errors[error_code] += count
+    return {'statuses': dict(statuses), 'errors': dict(errors), 'total': sum(statuses.values())}
+
+# How get_spend() can group the daily cost rollup
+SPEND_GROUPS = {
+    'day': 'bucket_epoch',
+    'campaign': 'campaign_id',
+    'template': 'template_id',
+    'country': 'country_code',
+}
+
+# Price history used for send estimates
+COST_HISTORY_DAYS = 30
+
+def get_spend(conn, start_epoch, end_epoch, group_by='day', campaign_id=None):
+    """
+    Message spend from the daily cost rollup
+
+    Args:
+        conn (sqlite3.Connection): Affiliates database connection
+        start_epoch (int): Window start (rounded down to its day)
+        end_epoch (int): Window end
+        group_by (str): One of SPEND_GROUPS ('day', 'campaign', 'template', 'country')
+        campaign_id (int): Only count this campaign's messages
+
+    Returns:
+        list: [{'key', 'price_unit', 'messages', 'priced', 'cost'}], highest cost first
+              ('day' groups are in date order, keyed 'YYYY-MM-DD')
+
+    Raises:
+        ValueError: If group_by is not one of SPEND_GROUPS
+    """
+    if group_by not in SPEND_GROUPS:
+        raise ValueError(f"Cannot group spend by {group_by!r}")
+    column = SPEND_GROUPS[group_by]
+
+    start_day = conn.execute("SELECT CAST(strftime('%s', date(?, 'unixepoch', 'localtime'), 'utc') AS INTEGER)",
+                             (start_epoch,)).fetchone()[0]
+    conditions = "bucket_epoch BETWEEN ? AND ?"
+    params = [start_day, end_epoch]
+    if campaign_id is not None:
+        conditions += " AND campaign_id = ?"
+        params.append(campaign_id)
+
+    rows = conn.execute(f'''
+        SELECT {column}, price_unit, SUM(message_count), SUM(priced_count), SUM(cost)
+        FROM message_cost_daily
+        WHERE {conditions}
+        GROUP BY 1, 2
+        HAVING SUM(message_count) > 0
+        ORDER BY {'1' if group_by == 'day' else '5 DESC'}
+    ''', params).fetchall()
+
+    return [{
+        'key': time.strftime('%Y-%m-%d', time.localtime(key)) if group_by == 'day' else key,
+        'price_unit': price_unit or None,
+        'messages': messages,
+        'priced': priced,
+        'cost': round(cost, 4),
+    } for key, price_unit, messages, priced, cost in rows]
+
+def estimate_message_cost(conn, template_id=None, since_epoch=None):
+    """
+    Average cost of a priced outbound message, for estimating a send
+
+    Uses the template's own price history when it has any, otherwise every
+    template's.
+
+    Args:
+        conn (sqlite3.Connection): Affiliates database connection
+        template_id (str): Content template SID
+        since_epoch (int): History start, defaults to COST_HISTORY_DAYS ago
+
+    Returns:
+        dict: {'per_message', 'price_unit', 'priced'}, or None without price history
+    """
+    if since_epoch is None:
+        since_epoch = int(time.time()) - COST_HISTORY_DAYS * 86400
+
+    scopes = [("AND template_id = ?", [template_id])] if template_id else []
+    scopes.append(('', []))
+    for condition, params in scopes:
+        row = conn.execute(f'''
+            SELECT price_unit, SUM(cost), SUM(priced_count)
+            FROM message_cost_daily
+            WHERE bucket_epoch >= ? AND priced_count > 0 {condition}
+            GROUP BY price_unit
+            ORDER BY 3 DESC
+            LIMIT 1
+        ''', [since_epoch] + params).fetchone()
+        if row:
+            price_unit, cost, priced = row
+            return {'per_message': cost / priced, 'price_unit': price_unit or None, 'priced': priced}
+    return None
+
+def _iso(epoch):
+    """Format an epoch as a local ISO timestamp for JSON responses"""
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(epoch)) if epoch else None
+
+def _message_data(row):
+    """Shape a stored message like the message dicts the reports page renders"""
+    return {
+        'sid': row['sid'],
+        'to': row['to_number'],
+        'from': row['from_number'],
+        'body': row['body'] or '',
+        'status': row['current_status'],
+        'direction': row['direction'],
+        'error_code': row['current_error_code'],
+        'error_message': row['current_error_message'],
+        'date_created': _iso(row['date_created_epoch']),
+        'date_sent': _iso(row['date_sent_epoch']),
+        'date_updated': _iso(row['date_updated_epoch']),
+        'price': row['price'],
+        'buyer_username': row['buyer_username'],
+        'recipient': row['recipient'],
+        'order_id': row['latest_order_id'],
+    }
@@ -0,0 +1,204 @@
+"""
+Batched background writer for Twilio webhook events
+
+A large campaign produces several status callbacks per message within
+minutes. Instead of one SQLite transaction per callback, webhook handlers
+submit events to a bounded in-process queue and a single writer thread
+drains it, writing each batch with executemany in one transaction.
+
+The webhook has already answered Twilio by the time an event is written, so
+Twilio won't send it again: a batch that fails is retried with backoff, and
+the queue is drained when the process exits.
+"""
+import time
+import queue
+import atexit
+import threading
+from mojo_core.db_utils import get_db_connection
+from mojo_core.status_store import record_status_events, record_inbound_messages
+
+STATUS = 'status'
+INBOUND = 'inbound'
+
+# Queued by stop() behind the last event to write
+_STOP = object()
+
+class StatusWriter:
+    """
+    Queue of webhook events drained in batches by a background thread
+
+    Args:
+        db_path (str): Path to SQLite database file
+        max_queue (int): Events held before submit() refuses new ones
+        batch_size (int): Most events written in one transaction
+        retries (int): Further attempts at a failed batch before its events are written one by one
+        retry_delay (float): Seconds before the first retry, doubled for each one after
+        busy_timeout (int): Milliseconds a write waits for another connection's lock
+    """
+
+    def __init__(self, db_path, max_queue=20000, batch_size=1000, retries=5, retry_delay=0.5, busy_timeout=5000):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.busy_timeout = busy_timeout
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.written = 0
+        self.errors = 0
+        self._thread = None
+        self._stopped = False
+        self._lock = threading.Lock()
+
+    def submit(self, kind, event):
+        """
+        Queue an event for the writer thread
+
+        Args:
+            kind (str): STATUS for status_event() dicts, INBOUND for inbound_event() dicts
+            event (dict): Event to write
+
+        Returns:
+            bool: False if the queue is full or the writer has stopped, and the
+                  caller should ask Twilio to retry
+        """
+        if self._stopped:
+            return False
+        self._ensure_started()
+        try:
+            self.queue.put_nowait((kind, event))
+        except queue.Full:
+            return False
+        return True
+
+    def flush(self):
+        """Block until every queued event has been written"""
+        self.queue.join()
+
+    def stop(self, timeout=30):
+        """
+        Write every queued event, then stop the writer thread
+
+        Registered with atexit when the thread starts, so a restart doesn't
+        drop callbacks Twilio has already been told were received. Later
+        submit() calls are refused.
+
+        Args:
+            timeout (float): Seconds to wait for the queue to drain
+        """
+        with self._lock:
+            self._stopped = True
+            thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        try:
+            self.queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        thread.join(timeout)
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._stopped or (self._thread is not None and self._thread.is_alive()):
+                return
+            # A writer thread that died is replaced, so the queue never stops draining
+            if self._thread is None:
+                atexit.register(self.stop)
+            thread = threading.Thread(target=self._run, name='status-writer', daemon=True)
+            thread.start()
+            self._thread = thread
+
+    def _next_batch(self):
+        """Wait for one event, then take whatever else is already queued, up to a stop()"""
+        batch = [self.queue.get()]
+        while len(batch) < self.batch_size and batch[-1] is not _STOP:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _connect(self):
+        conn = get_db_connection(self.db_path)
+        # Readers don't block the writer (or it them), and brief locks are waited out
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout)}")
+        return conn
+
+    def _close(self, conn):
+        """Close a connection that may be broken; returns None so the next write reconnects"""
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        return None
+
+    def _write(self, conn, events):
+        try:
+            record_status_events(conn, [event for kind, event in events if kind == STATUS])
+            record_inbound_messages(conn, [event for kind, event in events if kind == INBOUND])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def _write_with_retries(self, conn, events):
+        """
+        Write events, retrying with backoff; if the batch keeps failing, write
+        its events one at a time so only the ones that can't be written are lost
+
+        Connecting is part of each attempt, so a database that can't be opened
+        (locked during a migration, say) is retried like a failed write rather
+        than ending the thread.
+
+        Args:
+            conn (sqlite3.Connection): Open connection, or None to connect first
+
+        Returns:
+            sqlite3.Connection: The connection to use from now on, or None
+        """
+        delay = self.retry_delay
+        for attempt in range(self.retries + 1):
+            try:
+                conn = conn or self._connect()
+                self._write(conn, events)
+                self.written += len(events)
+                return conn
+            except Exception as e:
+                print(f"Error writing {len(events)} webhook events (attempt {attempt + 1}): {e}")
+                # Start again on a fresh connection in case this one is broken
+                conn = self._close(conn)
+                if attempt == self.retries:
+                    break
+                time.sleep(delay)
+                delay *= 2
+
+        for event in events:
+            try:
+                conn = conn or self._connect()
+                self._write(conn, [event])
+                self.written += 1
+            except Exception as e:
+                self.errors += 1
+                print(f"Dropping webhook event {event[1]!r}: {e}")
+                conn = self._close(conn)
+        return conn
+
+    def _run(self):
+        conn = None
+        try:
+            while True:
+                batch = self._next_batch()
+                events = [item for item in batch if item is not _STOP]
+                try:
+                    if events:
+                        conn = self._write_with_retries(conn, events)
+                finally:
+                    for _ in batch:
+                        self.queue.task_done()
+                if len(events) < len(batch):
+                    return
+        finally:
+            self._close(conn)
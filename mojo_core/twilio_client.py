@@ -4,6 +4,7 @@ Twilio API client wrapper
 import os
 from twilio.rest import Client
 from dotenv import load_dotenv
+from mojo_core.status_store import status_callback_url
 
 # Load environment variables
 load_dotenv()
@@ -17,6 +18,8 @@ class TwilioClient:
         self.auth_token = os.environ.get("TWILIO_AUTH_TOKEN")
         self.whatsapp_number = os.environ.get("TWILIO_WHATSAPP_NUMBER", "whatsapp:+15551234567")
         self.messaging_service_sid = os.environ.get("TWILIO_MESSAGING_SERVICE_SID")
+        # Public URL of /webhooks/twilio/status, so delivery updates are pushed to us
+        self.status_callback_url = status_callback_url()
         
         # Validate credentials
         if not self.account_sid or not self.auth_token:
@@ -60,6 +63,9 @@ class TwilioClient:
         else:
             message_params["from_"] = self.whatsapp_number
         
+        if self.status_callback_url:
+            message_params["status_callback"] = self.status_callback_url
+        
         # Send message
         return self.client.messages.create(**message_params)
     
@@ -0,0 +1,246 @@
+"""
+Incremental sync of Twilio's message log into the local twilio_messages table
+
+Each run pages through Messages.list from the stored high-water mark (the end
+of the last completed scan), re-reading a short lookback window so status
+changes the webhooks missed on recent messages are picked up. Long ranges are
+split into day slices that are fetched in parallel and written as each slice
+arrives.
+
+Messages.list can only be filtered by date_sent, so messages Twilio never sent
+(failed or undelivered before sending, with no date_sent) are not synced; their
+statuses reach message_status through the status webhooks only.
+"""
+import time
+from twilio.rest import Client
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from mojo_core.db_utils import get_db_connection, normalize_phone_key
+from mojo_core.status_store import STATUS_RANK, record_current_statuses
+
+SYNC_NAME = 'twilio_messages'
+DAY = 86400
+
+# First sync reaches this far back
+INITIAL_DAYS = 30
+
+# Messages sent in this window before the high-water mark are re-read, since
+# their status can still change (sent -> delivered -> read). The status webhooks
+# carry most changes, so this only has to catch the ones they missed
+LOOKBACK_SECONDS = 6 * 3600
+
+def _epoch(value):
+    """Twilio datetime (timezone-aware) to epoch seconds"""
+    return int(value.timestamp()) if value else None
+
+def _utc(epoch):
+    return datetime.fromtimestamp(epoch, tz=timezone.utc)
+
+def message_row(message):
+    """
+    Flatten a Twilio MessageInstance into a twilio_messages row
+
+    Args:
+        message: twilio.rest.api.v2010.account.message.MessageInstance
+
+    Returns:
+        dict: Row values keyed by column name
+    """
+    direction = message.direction or ''
+    other_party = message.from_ if direction == 'inbound' else message.to
+    status = (message.status or '').lower()
+    return {
+        'sid': message.sid,
+        'direction': direction,
+        'from_number': message.from_,
+        'to_number': message.to,
+        'phone_key': normalize_phone_key(other_party),
+        'body': message.body,
+        'status': status,
+        'status_rank': STATUS_RANK.get(status, 0),
+        'error_code': str(message.error_code) if message.error_code else None,
+        'error_message': message.error_message,
+        'price': float(message.price) if message.price else None,
+        'price_unit': message.price_unit,
+        'num_segments': int(message.num_segments) if message.num_segments else None,
+        'date_created_epoch': _epoch(message.date_created),
+        'date_sent_epoch': _epoch(message.date_sent),
+        'date_updated_epoch': _epoch(message.date_updated),
+    }
+
+def upsert_messages(conn, rows):
+    """
+    Insert or refresh synced messages; callers commit
+
+    Args:
+        conn (sqlite3.Connection): Affiliates database connection
+        rows (list): Rows built by message_row()
+    """
+    if not rows:
+        return
+
+    conn.executemany('''
+        INSERT INTO twilio_messages (
+            sid, direction, from_number, to_number, phone_key, body, status, status_rank,
+            error_code, error_message, price, price_unit, num_segments,
+            date_created_epoch, date_sent_epoch, date_updated_epoch
+        )
+        VALUES (
+            :sid, :direction, :from_number, :to_number, :phone_key, :body, :status, :status_rank,
+            :error_code, :error_message, :price, :price_unit, :num_segments,
+            :date_created_epoch, :date_sent_epoch, :date_updated_epoch
+        )
+        ON CONFLICT(sid) DO UPDATE SET
+            status = excluded.status,
+            status_rank = excluded.status_rank,
+            error_code = excluded.error_code,
+            error_message = excluded.error_message,
+            price = excluded.price,
+            price_unit = excluded.price_unit,
+            num_segments = excluded.num_segments,
+            date_sent_epoch = excluded.date_sent_epoch,
+            date_updated_epoch = excluded.date_updated_epoch
+    ''', rows)
+
+def status_from_row(row):
+    """Current-status event for a synced message, for record_current_statuses()"""
+    return {
+        'message_sid': row['sid'],
+        'status': row['status'],
+        'status_rank': row['status_rank'],
+        'error_code': row['error_code'],
+        'error_message': row['error_message'],
+        'to_number': row['to_number'],
+        'from_number': row['from_number'],
+        'phone_key': row['phone_key'],
+        'event_epoch': row['date_updated_epoch'] or row['date_created_epoch'],
+        'direction': row['direction'],
+        'template_id': None,
+        'campaign_id': None,
+        'run_id': None,
+        'sent_epoch': row['date_sent_epoch'],
+        'price': row['price'],
+        'price_unit': row['price_unit'],
+    }
+
+def store_messages(conn, rows):
+    """
+    Store synced messages and move their current status forward; callers commit
+
+    Args:
+        conn (sqlite3.Connection): Affiliates database connection
+        rows (list): Rows built by message_row()
+    """
+    upsert_messages(conn, rows)
+    record_current_statuses(conn, [status_from_row(row) for row in rows])
+
+def day_slices(start_epoch, end_epoch):
+    """
+    Split a time range into consecutive slices of at most one day
+
+    Args:
+        start_epoch (int): Range start
+        end_epoch (int): Range end
+
+    Returns:
+        list: (start, end) epoch pairs covering the range
+    """
+    slices = []
+    while start_epoch < end_epoch:
+        slice_end = min(start_epoch + DAY, end_epoch)
+        slices.append((start_epoch, slice_end))
+        start_epoch = slice_end
+    return slices
+
+def fetch_slice(client, start_epoch, end_epoch, page_size=1000):
+    """
+    Page through every message sent in one slice
+
+    Args:
+        client (twilio.rest.Client): Twilio REST client
+        start_epoch (int): Slice start
+        end_epoch (int): Slice end
+        page_size (int): Messages per API page
+
+    Returns:
+        list: Rows built by message_row()
+    """
+    messages = client.messages.stream(
+        date_sent_after=_utc(start_epoch),
+        date_sent_before=_utc(end_epoch),
+        page_size=page_size
+    )
+    return [message_row(message) for message in messages]
+
+def get_high_water_mark(conn):
+    """
+    End of the last completed scan of Twilio's message log
+
+    Returns:
+        int: Epoch every message sent before has been synced, or None before the first sync
+    """
+    row = conn.execute("SELECT high_water_epoch FROM sync_state WHERE name = ?", (SYNC_NAME,)).fetchone()
+    return row[0] if row else None
+
+def sync_messages(client, db_path, now=None, max_workers=4, initial_days=INITIAL_DAYS,
+                  lookback_seconds=LOOKBACK_SECONDS):
+    """
+    Bring twilio_messages up to date with Twilio's message log
+
+    Args:
+        client (twilio.rest.Client): Twilio REST client
+        db_path (str): Path to SQLite database file
+        now (int): Sync up to this epoch, defaults to the current time
+        max_workers (int): Day slices fetched in parallel
+        initial_days (int): How far back the first sync reaches
+        lookback_seconds (int): How far before the high-water mark each run starts
+
+    Returns:
+        int: Number of messages fetched
+    """
+    now = int(now if now is not None else time.time())
+    conn = get_db_connection(db_path)
+    try:
+        high_water = get_high_water_mark(conn)
+        if high_water is None:
+            start = now - initial_days * DAY
+        else:
+            start = high_water - lookback_seconds
+
+        fetched = 0
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            slices = day_slices(start, now + 1)
+            # map() yields in slice order, so each slice is written as soon as it and its predecessors arrive
+            for rows in pool.map(lambda bounds: fetch_slice(client, *bounds), slices):
+                store_messages(conn, rows)
+                conn.commit()
+                fetched += len(rows)
+
+        # Only advance the mark once every slice is stored; everything up to now
+        # has been scanned, so the next run starts one lookback before now
+        conn.execute('''
+            INSERT INTO sync_state (name, high_water_epoch, synced_epoch) VALUES (?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET
+                high_water_epoch = excluded.high_water_epoch,
+                synced_epoch = excluded.synced_epoch
+        ''', (SYNC_NAME, now, now))
+        conn.commit()
+        return fetched
+    finally:
+        conn.close()
+
+def run_scheduled_sync(account_sid, auth_token, db_path, lookback_seconds=LOOKBACK_SECONDS):
+    """
+    Scheduler entry point: sync and log, never raise
+
+    Args:
+        account_sid (str): Twilio account SID
+        auth_token (str): Twilio auth token
+        db_path (str): Path to SQLite database file
+        lookback_seconds (int): How far before the high-water mark each run starts
+    """
+    try:
+        fetched = sync_messages(Client(account_sid, auth_token), db_path, lookback_seconds=lookback_seconds)
+        print(f"Synced {fetched} Twilio messages")
+    except Exception as e:
+        print(f"Error syncing Twilio messages: {e}")
@@ -2,12 +2,15 @@
 MOJO WhatsApp Manager Web Application
 """
 import os
+from datetime import datetime
 from flask import Flask, redirect, url_for, request
-from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
 from flask_migrate import Migrate
 from flask_wtf.csrf import CSRFProtect
 from flask_apscheduler import APScheduler
 from flask_login import LoginManager, current_user
+from jinja2 import FileSystemBytecodeCache
+from sqlalchemy import event
 
 # Initialize extensions
 db = SQLAlchemy()
@@ -16,6 +19,51 @@ csrf = CSRFProtect()
 scheduler = APScheduler()
 login_manager = LoginManager()
 
+@event.listens_for(SignallingSession, 'after_commit')
+def clear_fragment_cache(session):
+    """Cached fragments may show rows a commit has just changed"""
+    cache = session.app.extensions.get('fragment_cache')
+    if cache is not None:
+        cache.clear()
+
+def schedule_message_sync(app):
+    """Keep the local copy of Twilio's message log current for the reports"""
+    minutes = app.config['TWILIO_SYNC_MINUTES']
+    if app.testing or not minutes or not app.config['TWILIO_ACCOUNT_SID'] or not app.config['TWILIO_AUTH_TOKEN']:
+        return
+    
+    from mojo_core.twilio_sync import run_scheduled_sync
+    scheduler.add_job(
+        id='twilio_message_sync',
+        func=run_scheduled_sync,
+        args=[app.config['TWILIO_ACCOUNT_SID'], app.config['TWILIO_AUTH_TOKEN'], app.config['DEFAULT_DB_PATH'],
+              app.config['TWILIO_SYNC_LOOKBACK_HOURS'] * 3600],
+        trigger='interval',
+        minutes=minutes,
+        next_run_time=datetime.now(),
+        max_instances=1,
+        coalesce=True,
+        replace_existing=True
+    )
+
+def schedule_report_retention(app):
+    """Compress and archive old report files once a day"""
+    if app.testing or not app.config['REPORT_RETENTION_HOURS']:
+        return
+    
+    from mojo_core.report_retention import run_scheduled_retention
+    scheduler.add_job(
+        id='report_retention',
+        func=run_scheduled_retention,
+        args=[app.config['REPORTS_DIR'], app.config['REPORT_COMPRESS_DAYS'], app.config['REPORT_ARCHIVE_DAYS'],
+              app.config['REPORT_COMPRESSION']],
+        trigger='interval',
+        hours=app.config['REPORT_RETENTION_HOURS'],
+        max_instances=1,
+        coalesce=True,
+        replace_existing=True
+    )
+
 def create_app(test_config=None):
     """
     Create and configure the Flask application
@@ -36,7 +84,34 @@ def create_app(test_config=None):
         TWILIO_AUTH_TOKEN=os.environ.get('TWILIO_AUTH_TOKEN'),
         TWILIO_WHATSAPP_NUMBER=os.environ.get('TWILIO_WHATSAPP_NUMBER'),
         TWILIO_MESSAGING_SERVICE_SID=os.environ.get('TWILIO_MESSAGING_SERVICE_SID'),
-        DEFAULT_DB_PATH=os.environ.get('DB_PATH', 'affiliates.db')
+        TWILIO_WEBHOOK_BASE_URL=os.environ.get('TWILIO_WEBHOOK_BASE_URL'),
+        TWILIO_VALIDATE_WEBHOOKS=True,
+        WEBHOOK_QUEUE_SIZE=20000,
+        WEBHOOK_BATCH_SIZE=1000,
+        TWILIO_SYNC_MINUTES=5,
+        # Each sync re-reads this much before the last one ended, for status changes the webhooks missed
+        TWILIO_SYNC_LOOKBACK_HOURS=int(os.environ.get('TWILIO_SYNC_LOOKBACK_HOURS', 6)),
+        REPORT_CACHE_SECONDS=15,
+        # Rendered table fragments are reused for this long, or until the web database is next written
+        FRAGMENT_CACHE_SECONDS=30,
+        # Compiled templates are kept here so new worker processes don't compile them again (None to disable)
+        JINJA_BYTECODE_CACHE_DIR=os.path.join(app.instance_path, 'jinja_cache'),
+        # Static files are linked by content hash, so browsers can keep them this long
+        STATIC_MAX_AGE=365 * 24 * 3600,
+        # HTML and JSON responses at least this large are gzip (or brotli) compressed
+        COMPRESS_MIN_SIZE=1024,
+        COMPRESS_LEVEL=6,
+        CAMPAIGN_SPEND_LIMIT=float(os.environ['CAMPAIGN_SPEND_LIMIT']) if os.environ.get('CAMPAIGN_SPEND_LIMIT') else None,
+        DEFAULT_DB_PATH=os.environ.get('DB_PATH', 'affiliates.db'),
+        # Where campaign sends write report files, and where the reports pages read them
+        REPORTS_DIR=os.environ.get('REPORTS_DIR', os.path.join(app.root_path, '..', 'reports')),
+        # Reports are compressed after REPORT_COMPRESS_DAYS and archived after REPORT_ARCHIVE_DAYS
+        REPORT_COMPRESS_DAYS=int(os.environ.get('REPORT_COMPRESS_DAYS', 30)),
+        REPORT_ARCHIVE_DAYS=int(os.environ.get('REPORT_ARCHIVE_DAYS', 365)),
+        REPORT_COMPRESSION=os.environ.get('REPORT_COMPRESSION', 'gzip'),
+        REPORT_RETENTION_HOURS=24,
+        # Parquet archive of old message_log rows (flask archive-messages)
+        MESSAGE_ARCHIVE_DIR=os.environ.get('MESSAGE_ARCHIVE_DIR', os.path.join(app.root_path, '..', 'archive'))
     )
     
     # Override with instance config if specified
@@ -55,8 +130,12 @@ def create_app(test_config=None):
     db.init_app(app)
     migrate.init_app(app, db)
     csrf.init_app(app)
-    scheduler.init_app(app)
-    scheduler.start()
+    # The scheduler is process-wide; only the first app created configures and starts it
+    if not scheduler.running:
+        scheduler.init_app(app)
+        scheduler.start()
+        schedule_message_sync(app)
+        schedule_report_retention(app)
     
     # Configure Flask-Login
     login_manager.init_app(app)
@@ -70,7 +149,7 @@ def create_app(test_config=None):
         return User.query.get(int(user_id))
     
     # Register blueprints
-    from mojo_web.routes import dashboard, templates, contacts, campaigns, reports, auth, settings
+    from mojo_web.routes import dashboard, templates, contacts, campaigns, reports, auth, settings, webhooks
     
     app.register_blueprint(auth.bp)
     app.register_blueprint(dashboard.bp)
@@ -79,22 +158,82 @@ def create_app(test_config=None):
     app.register_blueprint(campaigns.bp)
     app.register_blueprint(reports.bp)
     app.register_blueprint(settings.bp)
+    app.register_blueprint(webhooks.bp)
+    
+    # Short-lived cache shared by the polled report endpoints
+    from mojo_web.cache import TTLCache
+    app.extensions['report_cache'] = TTLCache(app.config['REPORT_CACHE_SECONDS'])
+    # Rendered HTML of the heavy listing tables (see cache.cached_fragment)
+    app.extensions['fragment_cache'] = TTLCache(app.config['FRAGMENT_CACHE_SECONDS'])
+    
+    # Block tags leave no blank lines behind in the rendered pages
+    app.jinja_env.trim_blocks = True
+    app.jinja_env.lstrip_blocks = True
+    if app.config['JINJA_BYTECODE_CACHE_DIR']:
+        os.makedirs(app.config['JINJA_BYTECODE_CACHE_DIR'], exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config['JINJA_BYTECODE_CACHE_DIR'])
+    
+    # Content hashes and compressed copies of the static files
+    from mojo_web.compression import StaticAssets, choose_encoding, compress_response
+    app.extensions['static_assets'] = StaticAssets(app.static_folder)
+    
+    # Webhook events are written in batches by a background thread
+    from mojo_core.status_writer import StatusWriter
+    app.extensions['status_writer'] = StatusWriter(
+        app.config['DEFAULT_DB_PATH'],
+        max_queue=app.config['WEBHOOK_QUEUE_SIZE'],
+        batch_size=app.config['WEBHOOK_BATCH_SIZE']
+    )
     
     # Register CLI commands
-    from mojo_web.commands import create_admin_command
+    from mojo_web.commands import (create_admin_command, sync_messages_command, report_retention_command,
+                                   export_command, archive_messages_command, query_messages_command)
     app.cli.add_command(create_admin_command)
+    app.cli.add_command(sync_messages_command)
+    app.cli.add_command(report_retention_command)
+    app.cli.add_command(export_command)
+    app.cli.add_command(archive_messages_command)
+    app.cli.add_command(query_messages_command)
     
     # Add authentication to all routes except auth routes
     @app.before_request
     def check_authentication():
-        # Skip auth routes and static files
-        if request.endpoint and (request.endpoint.startswith('auth.') or request.endpoint.startswith('static')):
+        # Skip auth routes, static files and Twilio webhooks (signature-validated instead)
+        if request.endpoint and (request.endpoint.startswith('auth.') or request.endpoint.startswith('static')
+                                 or request.endpoint.startswith('webhooks.')):
+            return
+        
+        # Honour Flask-Login's switch for disabling authentication (e.g. in tests)
+        if app.config.get('LOGIN_DISABLED'):
             return
             
         # Require authentication for all other routes
         if not current_user.is_authenticated:
             return redirect(url_for('auth.login'))
     
+    # Static URLs carry a hash of the file's content, so a changed file gets a new URL
+    @app.url_defaults
+    def fingerprint_static_urls(endpoint, values):
+        if endpoint == 'static' and 'filename' in values:
+            version = app.extensions['static_assets'].fingerprint(values['filename'])
+            if version:
+                values['v'] = version
+    
+    # Compress what leaves the app; current static files are also cached for good
+    @app.after_request
+    def compress_responses(response):
+        encoding = choose_encoding(request.accept_encodings)
+        if request.endpoint == 'static':
+            return app.extensions['static_assets'].serve_immutable(
+                response, request.view_args['filename'], request.args.get('v'), encoding, app.config['STATIC_MAX_AGE']
+            )
+        return compress_response(response, encoding, app.config['COMPRESS_MIN_SIZE'], app.config['COMPRESS_LEVEL'])
+    
+    # Values used by the shared base template
+    @app.context_processor
+    def inject_now():
+        return {'now': datetime.now()}
+    
     # Make url_for('index') work
     app.add_url_rule('/', endpoint='index')
     
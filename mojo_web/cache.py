@@ -0,0 +1,122 @@
+"""
+Small in-process caches for the web interface
+
+Report endpoints are polled by every open tab. TTLCache keeps each computed
+result for a few seconds and coalesces concurrent misses, so simultaneous
+polls for the same key share one computation.
+
+The same cache type also holds rendered HTML fragments of the heavy listing
+tables (cached_fragment), so a page view re-renders only its shell.
+"""
+import time
+import threading
+from flask import current_app, render_template
+from markupsafe import Markup
+
+class _Flight:
+    """A computation in progress that other callers can wait for"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+class TTLCache:
+    """
+    Thread-safe cache whose entries expire after a fixed time
+
+    Expired entries are kept for peek() until the next sweep, which runs at
+    most once per ttl from get() and drops every expired entry but the one
+    being asked for, so a cache keyed by request parameters stays bounded.
+
+    Args:
+        ttl (float): Seconds an entry is served before it is recomputed
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._entries = {}
+        self._flights = {}
+        self._swept = time.monotonic()
+        self._lock = threading.Lock()
+
+    def get(self, key, compute):
+        """
+        Return the cached value for key, computing it at most once at a time
+
+        Args:
+            key: Cache key
+            compute (callable): Called with no arguments to produce a fresh value
+
+        Returns:
+            The cached or freshly computed value
+
+        Raises:
+            Exception: Whatever compute() raised; failures are not cached
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now - self._swept >= self.ttl:
+                self._sweep(now, key)
+            entry = self._entries.get(key)
+            if entry and now - entry[0] < self.ttl:
+                return entry[1]
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            if flight.error:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = compute()
+            with self._lock:
+                self._entries[key] = (time.monotonic(), flight.value)
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def _sweep(self, now, keep):
+        """Drop expired entries other than keep; callers hold the lock"""
+        for key in [key for key, entry in self._entries.items() if key != keep and now - entry[0] >= self.ttl]:
+            del self._entries[key]
+        self._swept = now
+
+    def peek(self, key):
+        """Return the last value stored for key, even if expired, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+        return entry[1] if entry else None
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._entries.clear()
+
+def cached_fragment(key, template_name, load):
+    """
+    Render a partial template through the app's fragment cache
+
+    The HTML is reused for the same key until FRAGMENT_CACHE_SECONDS pass or
+    the web database is next committed to. Cached partials must not depend on
+    the request or the session (no csrf_token()).
+
+    Args:
+        key: Cache key; must cover everything the partial's content depends on
+        template_name (str): Partial to render
+        load (callable): Returns the partial's context; only called on a miss
+
+    Returns:
+        Markup: The rendered HTML
+    """
+    html = current_app.extensions['fragment_cache'].get(key, lambda: render_template(template_name, **load()))
+    return Markup(html)
@@ -1,8 +1,18 @@
 """
 Custom Flask CLI commands for MOJO WhatsApp Manager
 """
+import csv
+import json
 import click
+from datetime import datetime, timedelta
+from flask import current_app
 from flask.cli import with_appcontext
+from twilio.rest import Client
+from mojo_core.twilio_sync import sync_messages
+from mojo_core.report_retention import apply_retention
+from mojo_core.exports import EXPORTS, FORMATS, CSV, stream_export
+from mojo_core.message_archive import archive_messages, query_messages
+from mojo_core.db_utils import get_db_connection
 from mojo_web import db
 from mojo_web.models import User
 
@@ -25,4 +35,95 @@ def create_admin_command(username, password):
     db.session.add(user)
     db.session.commit()
     
-    click.echo(f'Admin user {username} created successfully') 
\ No newline at end of file
+    click.echo(f'Admin user {username} created successfully')
+
+@click.command('sync-messages')
+@click.option('--days', default=30, help='How far back the first sync reaches')
+@with_appcontext
+def sync_messages_command(days):
+    """Sync Twilio's message log into the local database"""
+    client = Client(current_app.config['TWILIO_ACCOUNT_SID'], current_app.config['TWILIO_AUTH_TOKEN'])
+    fetched = sync_messages(client, current_app.config['DEFAULT_DB_PATH'], initial_days=days,
+                            lookback_seconds=current_app.config['TWILIO_SYNC_LOOKBACK_HOURS'] * 3600)
+    
+    click.echo(f'Synced {fetched} messages')
+
+@click.command('report-retention')
+@click.option('--compress-days', type=int, help='Compress reports older than this (default REPORT_COMPRESS_DAYS)')
+@click.option('--archive-days', type=int, help='Archive reports older than this (default REPORT_ARCHIVE_DAYS)')
+@with_appcontext
+def report_retention_command(compress_days, archive_days):
+    """Compress and archive old report files"""
+    config = current_app.config
+    result = apply_retention(
+        config['REPORTS_DIR'],
+        compress_days if compress_days is not None else config['REPORT_COMPRESS_DAYS'],
+        archive_days if archive_days is not None else config['REPORT_ARCHIVE_DAYS'],
+        config['REPORT_COMPRESSION']
+    )
+    
+    click.echo(f"Compressed {result['compressed']} reports, archived {result['archived']}")
+
+@click.command('export')
+@click.argument('dataset', type=click.Choice(list(EXPORTS)))
+@click.option('--format', 'fmt', type=click.Choice(list(FORMATS)), default=CSV, help='Output format')
+@click.option('--start-date', type=click.DateTime(['%Y-%m-%d']), help='First day to include')
+@click.option('--end-date', type=click.DateTime(['%Y-%m-%d']), help='Last day to include')
+@click.option('--campaign-id', type=int, help='Only rows for this campaign')
+@click.option('--output', type=click.File('w'), default='-', help='File to write (default stdout)')
+@with_appcontext
+def export_command(dataset, fmt, start_date, end_date, campaign_id, output):
+    """Export messages, status events or contacts as CSV or JSON Lines"""
+    chunks = stream_export(
+        current_app.config['DEFAULT_DB_PATH'], dataset, fmt,
+        start_epoch=int(start_date.timestamp()) if start_date else None,
+        end_epoch=int((end_date + timedelta(days=1)).timestamp()) - 1 if end_date else None,
+        campaign_id=campaign_id
+    )
+    for chunk in chunks:
+        output.write(chunk)
+
+@click.command('archive-messages')
+@click.option('--days', default=365, help='Archive messages sent more than this many days ago')
+@click.option('--vacuum', is_flag=True, help='Compact the database file afterwards')
+@with_appcontext
+def archive_messages_command(days, vacuum):
+    """Move old message_log rows into the Parquet archive"""
+    db_path = current_app.config['DEFAULT_DB_PATH']
+    before = datetime.now() - timedelta(days=days)
+    archived = archive_messages(db_path, current_app.config['MESSAGE_ARCHIVE_DIR'], int(before.timestamp()))
+    
+    if vacuum and archived:
+        conn = get_db_connection(db_path)
+        conn.execute("VACUUM")
+        conn.close()
+    
+    click.echo(f'Archived {archived} messages sent before {before:%Y-%m-%d}')
+
+@click.command('query-messages')
+@click.option('--columns', help='Comma-separated columns to output (default all)')
+@click.option('--start-date', type=click.DateTime(['%Y-%m-%d']), help='First day to include')
+@click.option('--end-date', type=click.DateTime(['%Y-%m-%d']), help='Last day to include')
+@click.option('--campaign-id', type=int, help='Only messages sent by this campaign')
+@click.option('--format', 'fmt', type=click.Choice(list(FORMATS)), default=CSV, help='Output format')
+@click.option('--output', type=click.File('w'), default='-', help='File to write (default stdout)')
+@with_appcontext
+def query_messages_command(columns, start_date, end_date, campaign_id, fmt, output):
+    """Query message history across the live table and the archive"""
+    columns = [column.strip() for column in columns.split(',')] if columns else None
+    rows = query_messages(
+        current_app.config['DEFAULT_DB_PATH'], current_app.config['MESSAGE_ARCHIVE_DIR'], columns,
+        start_epoch=int(start_date.timestamp()) if start_date else None,
+        end_epoch=int((end_date + timedelta(days=1)).timestamp()) - 1 if end_date else None,
+        campaign_id=campaign_id
+    )
+    
+    writer = None
+    for row in rows:
+        if fmt == CSV:
+            if writer is None:
+                writer = csv.DictWriter(output, fieldnames=list(row))
+                writer.writeheader()
+            writer.writerow(row)
+        else:
+            output.write(json.dumps(row) + '\n')
@@ -0,0 +1,190 @@
+"""
+Compressed responses and fingerprinted static files for the web interface
+
+Pages and the polled JSON endpoints are compressed as they leave the app once
+they reach COMPRESS_MIN_SIZE bytes: with brotli when the client accepts it and
+the optional brotli package is installed, otherwise with gzip. Streamed
+responses (exports, report downloads) are left alone.
+
+Static files are linked with a hash of their content (?v=...). A request for a
+file's current hash can be cached forever, so it is answered with an immutable
+Cache-Control, and its compressed body is made once per file and reused.
+"""
+import os
+import gzip
+import hashlib
+import threading
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:
+    # Optional: responses are gzipped when it isn't installed
+    brotli = None
+
+GZIP = 'gzip'
+BROTLI = 'br'
+
+# Content types worth compressing
+COMPRESSIBLE_TYPES = {
+    'text/html',
+    'text/css',
+    'text/plain',
+    'application/json',
+    'application/javascript',
+    'text/javascript',
+    'image/svg+xml',
+}
+
+def choose_encoding(accept_encodings):
+    """
+    Best encoding a client accepts
+
+    Args:
+        accept_encodings: request.accept_encodings
+
+    Returns:
+        str: BROTLI, GZIP, or None to send the response as it is
+    """
+    if brotli and accept_encodings[BROTLI]:
+        return BROTLI
+    if accept_encodings[GZIP]:
+        return GZIP
+    return None
+
+def compress(data, encoding, level=6):
+    """
+    Compress bytes
+
+    Args:
+        data (bytes): Uncompressed body
+        encoding (str): BROTLI or GZIP
+        level (int): gzip level, 1-9; brotli uses quality 4 (about as fast as
+                     gzip 6), or 11 at level 9 for bodies compressed once
+
+    Returns:
+        bytes: Compressed body
+    """
+    if encoding == BROTLI:
+        return brotli.compress(data, quality=11 if level >= 9 else 4)
+    # mtime=0 so the same body always compresses to the same bytes
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+def compress_response(response, encoding, min_size, level=6):
+    """
+    Compress a finished response in place when it is worth it
+
+    Args:
+        response: Flask response
+        encoding (str): From choose_encoding()
+        min_size (int): Smaller bodies are sent as they are
+        level (int): Compression level
+
+    Returns:
+        The response
+    """
+    if response.mimetype not in COMPRESSIBLE_TYPES or response.direct_passthrough or response.is_streamed:
+        return response
+    # Caches must keep compressed and plain copies apart, whichever this client gets
+    response.vary.add('Accept-Encoding')
+    if (encoding is None or response.status_code != 200 or 'Content-Encoding' in response.headers
+            or response.content_length is not None and response.content_length < min_size):
+        return response
+
+    data = response.get_data()
+    if len(data) < min_size:
+        return response
+    response.set_data(compress(data, encoding, level))
+    _mark_encoded(response, encoding)
+    return response
+
+def _mark_encoded(response, encoding):
+    response.headers['Content-Encoding'] = encoding
+    # Byte ranges would now address the compressed body
+    response.headers.pop('Accept-Ranges', None)
+    # The body differs from the plain one, so a strong ETag no longer fits; If-None-Match still matches a weak one
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+class StaticAssets:
+    """
+    Content hashes and compressed bodies of the files in a static folder
+
+    Both are worked out once per version of a file (its mtime and size) and
+    kept for the life of the process.
+
+    Args:
+        static_folder (str): The app's static folder
+    """
+
+    def __init__(self, static_folder):
+        self.static_folder = static_folder
+        self._fingerprints = {}
+        self._compressed = {}
+        self._lock = threading.Lock()
+
+    def fingerprint(self, filename):
+        """Short hash of a static file's content, or None if there is no such file"""
+        path = self._path(filename)
+        try:
+            stat = os.stat(path)
+        except (OSError, TypeError):
+            return None
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            fingerprint = self._fingerprints.get(key)
+        if fingerprint is None:
+            with open(path, 'rb') as f:
+                fingerprint = hashlib.sha1(f.read()).hexdigest()[:12]
+            with self._lock:
+                self._fingerprints[key] = fingerprint
+        return fingerprint
+
+    def serve_immutable(self, response, filename, version, encoding, max_age):
+        """
+        Finish the response to a static request for a file's current version
+
+        Requests for any other version are left to revalidate as usual, so an
+        old URL never pins new content.
+
+        Args:
+            response: Response of Flask's static view
+            filename (str): Requested file, relative to the static folder
+            version (str): The ?v= the file was requested with
+            encoding (str): From choose_encoding()
+            max_age (int): Seconds browsers may keep the file
+        """
+        if response.status_code != 200 or not version or version != self.fingerprint(filename):
+            return response
+
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+        response.cache_control.immutable = True
+
+        if response.mimetype not in COMPRESSIBLE_TYPES:
+            return response
+        response.vary.add('Accept-Encoding')
+        if encoding is None:
+            return response
+
+        key = (filename, version, encoding)
+        with self._lock:
+            body = self._compressed.get(key)
+        if body is None:
+            with open(self._path(filename), 'rb') as f:
+                body = compress(f.read(), encoding, level=9)
+            with self._lock:
+                self._compressed[key] = body
+
+        # Close the file Flask opened before replacing it with the compressed body
+        response.close()
+        response.direct_passthrough = False
+        response.set_data(body)
+        _mark_encoded(response, encoding)
+        return response
+
+    def _path(self, filename):
+        # None for names outside the folder, like Flask's static view
+        return safe_join(self.static_folder, filename)
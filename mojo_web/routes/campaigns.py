@@ -1,13 +1,19 @@
 """
 Campaigns routes
 """
+import os
 from datetime import datetime
 import json
-from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, make_response
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
 from flask_login import login_required
+from sqlalchemy.orm import joinedload
 from mojo_web import db, scheduler
 from mojo_web.models import Template, Campaign, CampaignLog
+from mojo_web.cache import cached_fragment
 from mojo_core.messaging import send_bulk_messages
+from mojo_core.status_store import start_campaign_run, finish_campaign_run, estimate_message_cost
+from mojo_core.db_utils import check_audience_indexes, count_audience, get_db_connection
+from mojo_core.filters import compile_filter, FilterError
 
 bp = Blueprint('campaigns', __name__, url_prefix='/campaigns')
 
@@ -15,264 +21,12 @@ bp = Blueprint('campaigns', __name__, url_prefix='/campaigns')
 @login_required
 def index():
     """List all campaigns"""
-    campaigns = Campaign.query.order_by(Campaign.updated_at.desc()).all()
+    cards = cached_fragment(('campaigns', 'cards'), 'campaigns/_cards.html', lambda: {
+        'campaigns': Campaign.query.options(joinedload(Campaign.template))
+                                   .order_by(Campaign.updated_at.desc()).all()
+    })
     
-    # Generate direct HTML response
-    html = """
-    <!DOCTYPE html>
-    <html lang="en">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>Campaigns - MOJO WhatsApp Manager</title>
-        
-        <!-- Bootstrap CSS -->
-        <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/css/bootstrap.min.css" rel="stylesheet">
-        <link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0-beta3/css/all.min.css">
-        
-        <style>
-            :root {
-                --mojo-dark: #272D45;
-                --mojo-red: #E60517;
-                --mojo-dark-red: #87000A;
-            }
-            
-            body {
-                background-color: #f5f5f5;
-            }
-            
-            .navbar {
-                background-color: var(--mojo-dark);
-            }
-            
-            .logo-text {
-                color: white;
-                font-weight: bold;
-                font-size: 24px;
-            }
-            
-            .btn-primary {
-                background-color: var(--mojo-red);
-                border-color: var(--mojo-red);
-            }
-            
-            .btn-primary:hover {
-                background-color: var(--mojo-dark-red);
-                border-color: var(--mojo-dark-red);
-            }
-            
-            .logout-btn {
-                color: white;
-                text-decoration: none;
-            }
-            
-            .logout-btn:hover {
-                color: #f8f9fa;
-            }
-            
-            .campaign-card {
-                transition: transform 0.2s;
-            }
-            
-            .campaign-card:hover {
-                transform: translateY(-5px);
-                box-shadow: 0 10px 20px rgba(0,0,0,0.1);
-            }
-            
-            .status-badge {
-                text-transform: uppercase;
-                font-size: 0.8rem;
-                font-weight: bold;
-            }
-            
-            .badge-draft {
-                background-color: #6c757d;
-            }
-            
-            .badge-scheduled {
-                background-color: #ffc107;
-                color: #212529;
-            }
-            
-            .badge-running {
-                background-color: #17a2b8;
-            }
-            
-            .badge-completed {
-                background-color: #28a745;
-            }
-            
-            .badge-failed {
-                background-color: #dc3545;
-            }
-        </style>
-    </head>
-    <body>
-        <!-- Navbar -->
-        <nav class="navbar navbar-dark py-3">
-            <div class="container">
-                <span class="navbar-brand logo-text">
-                    <div style="background: var(--mojo-red); color: white; display: inline-block; width: 40px; height: 40px; border-radius: 50%; text-align: center; line-height: 40px; margin-right: 10px;">M</div>
-                    MOJO WhatsApp Manager
-                </span>
-                <div>
-                    <a href="/" class="btn btn-outline-light me-2">Dashboard</a>
-                    <a href="/auth/logout" class="logout-btn">
-                        <i class="fas fa-sign-out-alt"></i> Logout
-                    </a>
-                </div>
-            </div>
-        </nav>
-        
-        <!-- Main Content -->
-        <div class="container mt-4">
-            <div class="row mb-4">
-                <div class="col-md-6">
-                    <h2>Campaigns</h2>
-                    <p class="text-muted">Manage your WhatsApp message campaigns</p>
-                </div>
-                <div class="col-md-6 text-end">
-                    <a href="/campaigns/create" class="btn btn-primary">
-                        <i class="fas fa-plus"></i> Create New Campaign
-                    </a>
-                </div>
-            </div>
-            
-            <div class="row">
-    """
-    
-    # Add campaign cards
-    if campaigns:
-        for campaign in campaigns:
-            # Determine status badge class
-            status_class = {
-                'draft': 'badge-draft text-white',
-                'scheduled': 'badge-scheduled',
-                'running': 'badge-running text-white',
-                'completed': 'badge-completed text-white',
-                'failed': 'badge-failed text-white'
-            }.get(campaign.status, 'badge-secondary')
-            
-            # Format next run time
-            next_run_text = campaign.next_run.strftime('%Y-%m-%d %H:%M') if campaign.next_run else 'Not scheduled'
-            
-            # Determine if recurring
-            recurring_text = '<span class="text-success"><i class="fas fa-sync-alt"></i> Recurring</span>' if campaign.is_recurring else ''
-            
-            # Get template name
-            template_name = campaign.template.name if campaign.template else 'Unknown Template'
-            
-            html += f"""
-                <div class="col-md-4 mb-4">
-                    <div class="card campaign-card">
-                        <div class="card-header d-flex justify-content-between align-items-center">
-                            <h5 class="mb-0">{campaign.name}</h5>
-                            <span class="badge status-badge {status_class}">{campaign.status}</span>
-                        </div>
-                        <div class="card-body">
-                            <p class="card-text">{campaign.description or 'No description provided'}</p>
-                            
-                            <div class="mb-2">
-                                <small class="text-muted">Template:</small>
-                                <div>{template_name}</div>
-                            </div>
-                            
-                            <div class="mb-2">
-                                <small class="text-muted">Next Run:</small>
-                                <div>{next_run_text} {recurring_text}</div>
-                            </div>
-                            
-                            <div class="mb-3">
-                                <small class="text-muted">Last Updated:</small>
-                                <div>{campaign.updated_at.strftime('%Y-%m-%d %H:%M')}</div>
-                            </div>
-                            
-                            <div class="d-flex justify-content-between">
-                                <div>
-                                    <a href="/campaigns/{campaign.id}" class="btn btn-sm btn-outline-primary">
-                                        <i class="fas fa-eye"></i> View
-                                    </a>
-                                    <a href="/campaigns/{campaign.id}/edit" class="btn btn-sm btn-outline-secondary">
-                                        <i class="fas fa-edit"></i> Edit
-                                    </a>
-                                </div>
-                                <div>
-                                    <form method="POST" action="/campaigns/{campaign.id}/run" class="d-inline">
-                                        <button type="submit" class="btn btn-sm btn-success">
-                                            <i class="fas fa-play"></i> Run
-                                        </button>
-                                    </form>
-                                    <button class="btn btn-sm btn-danger" onclick="confirmDelete({campaign.id}, '{campaign.name}')">
-                                        <i class="fas fa-trash"></i>
-                                    </button>
-                                </div>
-                            </div>
-                        </div>
-                    </div>
-                </div>
-            """
-    else:
-        html += """
-                <div class="col-12">
-                    <div class="card">
-                        <div class="card-body text-center py-5">
-                            <i class="fas fa-bullhorn fa-5x text-muted mb-3"></i>
-                            <h4>No Campaigns Found</h4>
-                            <p>You haven't created any campaigns yet. Click the button below to create your first campaign.</p>
-                            <a href="/campaigns/create" class="btn btn-primary">
-                                <i class="fas fa-plus"></i> Create Campaign
-                            </a>
-                        </div>
-                    </div>
-                </div>
-        """
-    
-    html += """
-            </div>
-            
-            <!-- Delete Confirmation Modal -->
-            <div class="modal fade" id="deleteModal" tabindex="-1" aria-hidden="true">
-                <div class="modal-dialog">
-                    <div class="modal-content">
-                        <div class="modal-header bg-danger text-white">
-                            <h5 class="modal-title">Confirm Delete</h5>
-                            <button type="button" class="btn-close" data-bs-dismiss="modal" aria-label="Close"></button>
-                        </div>
-                        <div class="modal-body">
-                            Are you sure you want to delete the campaign <span id="campaignName"></span>?
-                        </div>
-                        <div class="modal-footer">
-                            <button type="button" class="btn btn-secondary" data-bs-dismiss="modal">Cancel</button>
-                            <form id="deleteForm" method="POST">
-                                <button type="submit" class="btn btn-danger">Delete</button>
-                            </form>
-                        </div>
-                    </div>
-                </div>
-            </div>
-            
-            <div class="row mt-4">
-                <div class="col-md-12 text-center">
-                    <p class="text-muted">MOJO WhatsApp Manager | Version 1.0</p>
-                </div>
-            </div>
-        </div>
-        
-        <!-- Bootstrap JavaScript -->
-        <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/js/bootstrap.bundle.min.js"></script>
-        
-        <script>
-            function confirmDelete(id, name) {
-                document.getElementById('deleteForm').action = `/campaigns/${id}/delete`;
-                document.getElementById('campaignName').textContent = name;
-                new bootstrap.Modal(document.getElementById('deleteModal')).show();
-            }
-        </script>
-    </body>
-    </html>
-    """
-    
-    return make_response(html)
+    return render_template('campaigns/index.html', cards=cards)
 
 @bp.route('/create', methods=['GET', 'POST'])
 @login_required
@@ -301,6 +55,11 @@ def create():
             templates = Template.query.filter_by(is_active=True).all()
             return render_template('campaigns/create.html', templates=templates)
         
+        # Check the audience filter compiles, and warn if it can't use an index
+        if not check_audience_filter(db_path, filter_conditions, order_status):
+            templates = Template.query.filter_by(is_active=True).all()
+            return render_template('campaigns/create.html', templates=templates)
+        
         # Create campaign
         campaign = Campaign(
             name=name,
@@ -404,6 +163,11 @@ def edit(id):
             templates = Template.query.filter_by(is_active=True).all()
             return render_template('campaigns/edit.html', campaign=campaign, templates=templates)
         
+        # Check the audience filter compiles, and warn if it can't use an index
+        if not check_audience_filter(db_path, filter_conditions, order_status):
+            templates = Template.query.filter_by(is_active=True).all()
+            return render_template('campaigns/edit.html', campaign=campaign, templates=templates)
+        
         # Update campaign
         campaign.name = name
         campaign.description = description
@@ -520,6 +284,101 @@ def run(id):
     flash('Campaign execution started.', 'success')
     return redirect(url_for('campaigns.view', id=id))
 
+@bp.route('/api/audience')
+@login_required
+def api_audience():
+    """API endpoint to preview how many unique recipients a campaign would reach"""
+    db_path = request.args.get('db_path') or current_app.config['DEFAULT_DB_PATH']
+    if not os.path.exists(db_path):
+        return {'error': f'Database not found: {db_path}', 'count': 0, 'sample': []}, 404
+    
+    try:
+        limit = int(request.args.get('recipient_limit') or 0) or None
+        sample = min(int(request.args.get('sample') or 0), 20)
+    except ValueError:
+        return {'error': 'recipient_limit and sample must be numbers', 'count': 0, 'sample': []}, 400
+    
+    try:
+        audience = count_audience(
+            db_path,
+            filter_conditions=request.args.get('filter_conditions'),
+            order_status=request.args.get('order_status') or None,
+            limit=limit,
+            force=request.args.get('force_flag') in ('1', 'true', 'on'),
+            sample=sample
+        )
+    except FilterError as e:
+        return {'error': f'Invalid filter: {str(e)}', 'count': 0, 'sample': []}, 400
+    
+    template = Template.query.get(request.args.get('template_id', type=int) or 0)
+    audience['cost'] = estimate_campaign_cost(db_path, template.template_sid if template else None, audience['count'])
+    return audience
+
+def estimate_campaign_cost(db_path, template_sid, recipients):
+    """
+    Estimate what sending to an audience will cost from recent Twilio prices
+    
+    Args:
+        db_path (str): Path to SQLite database file
+        template_sid (str): Content template SID, or None for the overall average
+        recipients (int): Audience size
+        
+    Returns:
+        dict: {'per_message', 'total', 'price_unit', 'based_on', 'limit', 'over_limit'},
+              or None if no sent message has been priced yet
+    """
+    conn = get_db_connection(db_path)
+    try:
+        estimate = estimate_message_cost(conn, template_sid)
+    finally:
+        conn.close()
+    
+    if not estimate:
+        return None
+    
+    total = estimate['per_message'] * recipients
+    limit = current_app.config.get('CAMPAIGN_SPEND_LIMIT')
+    return {
+        'per_message': round(estimate['per_message'], 5),
+        'total': round(total, 2),
+        'price_unit': estimate['price_unit'],
+        'based_on': estimate['priced'],
+        'limit': limit,
+        'over_limit': limit is not None and total > limit
+    }
+
+def check_audience_filter(db_path, filter_conditions, order_status=None):
+    """
+    Validate a campaign's audience filter before it is saved
+    
+    Flashes an error if the filter is invalid, and a warning if
+    EXPLAIN QUERY PLAN shows it will scan the order tables instead of
+    using an index.
+    
+    Returns:
+        bool: True if the filter can be saved
+    """
+    if not filter_conditions:
+        return True
+    
+    try:
+        compile_filter(filter_conditions)
+        # Don't create a database file just to check the plan
+        scans = check_audience_indexes(db_path, filter_conditions, order_status) if os.path.exists(db_path) else []
+    except FilterError as e:
+        flash(f'Invalid filter: {str(e)}', 'danger')
+        return False
+    except Exception as e:
+        current_app.logger.warning(f"Could not check filter query plan: {str(e)}")
+        return True
+    
+    if scans:
+        flash('This filter can\'t use an index and will scan every order line when the campaign runs '
+              f'({"; ".join(scans)}). Filtering on order_id, order_status, last_updated or an order time '
+              'field keeps it fast.', 'warning')
+    
+    return True
+
 def schedule_campaign_job(campaign):
     """Schedule a campaign for execution"""
     job_id = f'campaign_{campaign.id}'
@@ -610,9 +469,32 @@ def execute_campaign(campaign_id):
             campaign.status = 'failed'
             db.session.commit()
             return
-        
+
         # Execute the campaign
+        run_id = None
         try:
+            # Refuse sends expected to cost more than the configured limit
+            if current_app.config.get('CAMPAIGN_SPEND_LIMIT') is not None:
+                audience = count_audience(campaign.db_path, filter_conditions=campaign.filter_conditions,
+                                          order_status=campaign.order_status, limit=campaign.recipient_limit,
+                                          force=campaign.force_flag)
+                cost = estimate_campaign_cost(campaign.db_path, template.template_sid, audience['count'])
+                if cost and cost['over_limit']:
+                    log = CampaignLog(
+                        campaign_id=campaign.id,
+                        status='failure',
+                        recipients_total=audience['count'],
+                        error_message=f"Estimated cost {cost['total']} is over the spend limit of {cost['limit']}"
+                                      f" ({cost['price_unit'] or 'account currency'})"
+                    )
+                    db.session.add(log)
+                    campaign.status = 'failed'
+                    db.session.commit()
+                    return
+            
+            # Number this run so its messages get their own funnel
+            run_id = start_campaign_run(campaign.db_path, campaign.id)
+            
             # Parameters for sending
             params = {
                 'db_path': campaign.db_path,
@@ -622,7 +504,10 @@ def execute_campaign(campaign_id):
                 'order_status': campaign.order_status,
                 'limit': campaign.recipient_limit,
                 'force': campaign.force_flag,
-                'dry_run': False
+                'dry_run': False,
+                'campaign_id': campaign.id,
+                'run_id': run_id,
+                'reports_dir': current_app.config['REPORTS_DIR']
             }
             
             # Send messages
@@ -661,4 +546,7 @@ def execute_campaign(campaign_id):
             campaign.status = 'failed'
         
         # Save changes
-        db.session.commit() 
\ No newline at end of file
+        db.session.commit()
+        
+        if run_id:
+            finish_campaign_run(campaign.db_path, run_id, log.id) 
\ No newline at end of file
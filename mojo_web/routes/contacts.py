@@ -3,10 +3,12 @@ Contacts routes for managing recipients/contacts
 """
 import os
 import sqlite3
-from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, make_response
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
 from flask_login import login_required
+from markupsafe import Markup
 from werkzeug.utils import secure_filename
 from mojo_core.db_utils import get_db_connection, clean_phone_number
+from mojo_web.cache import cached_fragment
 import datetime
 
 bp = Blueprint('contacts', __name__, url_prefix='/contacts')
@@ -16,327 +18,147 @@ bp = Blueprint('contacts', __name__, url_prefix='/contacts')
 def index():
     """List contacts from selected database"""
     db_path = request.args.get('db_path', current_app.config['DEFAULT_DB_PATH'])
+    after = _parse_position(request.args.get('after'))
+    before = _parse_position(request.args.get('before'))
+    last = request.args.get('last') == '1'
     page = request.args.get('page', 1, type=int)
-    per_page = 50
-    offset = (page - 1) * per_page
     
-    contacts = []
-    total_count = 0
-    total_pages = 0
+    table = None
     error_message = None
-    
     try:
-        conn = get_db_connection(db_path)
-        
-        # Get total count
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM orders")
-        total_count = cursor.fetchone()[0]
-        
-        # Get contacts with pagination
-        cursor.execute("""
-            SELECT 
-                order_id, recipient, phone_number, raw_phone_number, order_status, 
-                is_valid_for_whatsapp, last_messaged, last_updated
-            FROM 
-                orders
-            ORDER BY 
-                last_updated DESC
-            LIMIT ? OFFSET ?
-        """, (per_page, offset))
-        
-        contacts = cursor.fetchall()
-        conn.close()
-        
-        # Calculate total pages
-        total_pages = (total_count + per_page - 1) // per_page
-        
+        if after or before or last:
+            # Seeking makes any page as cheap as the first, so only the first is worth caching
+            table = Markup(render_template('contacts/_table.html',
+                                           **_contacts_page(db_path, after=after, before=before, last=last, page=page)))
+        else:
+            table = cached_fragment(('contacts', os.path.abspath(db_path)), 'contacts/_table.html',
+                                    lambda: _contacts_page(db_path))
     except Exception as e:
         error_message = f"Error accessing database: {str(e)}"
     
-    # Generate direct HTML response
-    html = """
-    <!DOCTYPE html>
-    <html lang="en">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>Contacts - MOJO WhatsApp Manager</title>
-        
-        <!-- Bootstrap CSS -->
-        <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/css/bootstrap.min.css" rel="stylesheet">
-        <link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0-beta3/css/all.min.css">
-        
-        <style>
-            :root {
-                --mojo-dark: #272D45;
-                --mojo-red: #E60517;
-                --mojo-dark-red: #87000A;
-            }
-            
-            body {
-                background-color: #f5f5f5;
-            }
-            
-            .navbar {
-                background-color: var(--mojo-dark);
-            }
-            
-            .logo-text {
-                color: white;
-                font-weight: bold;
-                font-size: 24px;
-            }
-            
-            .btn-primary {
-                background-color: var(--mojo-red);
-                border-color: var(--mojo-red);
-            }
-            
-            .btn-primary:hover {
-                background-color: var(--mojo-dark-red);
-                border-color: var(--mojo-dark-red);
-            }
-            
-            .logout-btn {
-                color: white;
-                text-decoration: none;
-            }
-            
-            .logout-btn:hover {
-                color: #f8f9fa;
-            }
-            
-            .pagination .page-item.active .page-link {
-                background-color: var(--mojo-red);
-                border-color: var(--mojo-red);
-            }
-            
-            .pagination .page-link {
-                color: var(--mojo-dark);
-            }
-            
-            .valid-badge {
-                background-color: #28a745;
-            }
-            
-            .invalid-badge {
-                background-color: #dc3545;
-            }
-        </style>
-    </head>
-    <body>
-        <!-- Navbar -->
-        <nav class="navbar navbar-dark py-3">
-            <div class="container">
-                <span class="navbar-brand logo-text">
-                    <div style="background: var(--mojo-red); color: white; display: inline-block; width: 40px; height: 40px; border-radius: 50%; text-align: center; line-height: 40px; margin-right: 10px;">M</div>
-                    MOJO WhatsApp Manager
-                </span>
-                <div>
-                    <a href="/" class="btn btn-outline-light me-2">Dashboard</a>
-                    <a href="/auth/logout" class="logout-btn">
-                        <i class="fas fa-sign-out-alt"></i> Logout
-                    </a>
-                </div>
-            </div>
-        </nav>
-        
-        <!-- Main Content -->
-        <div class="container mt-4">
-            <div class="row mb-4">
-                <div class="col-md-6">
-                    <h2>Contacts</h2>
-                    <p class="text-muted">Manage recipient contacts from your database</p>
-                </div>
-                <div class="col-md-6 text-end">
-                    <a href="/contacts/import" class="btn btn-primary">
-                        <i class="fas fa-upload"></i> Import Contacts
-                    </a>
-                </div>
-            </div>
-            
-            <!-- Search and Filter -->
-            <div class="card mb-4">
-                <div class="card-body">
-                    <div class="row g-3">
-                        <div class="col-md-6">
-                            <form action="/contacts/search" method="get" class="d-flex">
-                                <input type="hidden" name="db_path" value="{db_path}">
-                                <input type="text" name="q" class="form-control" placeholder="Search contacts...">
-                                <button type="submit" class="btn btn-primary ms-2">
-                                    <i class="fas fa-search"></i>
-                                </button>
-                            </form>
-                        </div>
-                        <div class="col-md-6">
-                            <form action="/contacts/filter" method="get" class="d-flex">
-                                <input type="hidden" name="db_path" value="{db_path}">
-                                <select name="status" class="form-select">
-                                    <option value="">All Statuses</option>
-                                    <option value="READY_TO_SHIP">Ready to Ship</option>
-                                    <option value="SHIPPED">Shipped</option>
-                                    <option value="DELIVERED">Delivered</option>
-                                    <option value="CANCELLED">Cancelled</option>
-                                    <option value="IMPORTED">Imported</option>
-                                </select>
-                                <button type="submit" class="btn btn-primary ms-2">
-                                    <i class="fas fa-filter"></i>
-                                </button>
-                            </form>
-                        </div>
-                    </div>
-                </div>
-            </div>
+    return render_template('contacts/index.html', db_path=db_path, table=table, error_message=error_message)
+
+# Contacts are listed newest first by (last_updated_epoch, phone_key), which
+# idx_contacts_listing covers; SQLite sorts NULL epochs last in that order
+CONTACT_LIST_SQL = """
+    SELECT 
+        phone_key, last_updated_epoch,
+        latest_order_id AS order_id, recipient, phone_number, raw_phone_number, order_status, 
+        is_valid_for_whatsapp,
+        strftime('%Y-%m-%d %H:%M', last_messaged_epoch, 'unixepoch', 'localtime') AS last_messaged,
+        strftime('%Y-%m-%d %H:%M', last_updated_epoch, 'unixepoch', 'localtime') AS last_updated
+    FROM 
+        contacts
+    {where}
+    ORDER BY 
+        last_updated_epoch {order}, phone_key {order}
+    LIMIT ?
+"""
+
+def _contacts_page(db_path, after=None, before=None, last=False, page=1, per_page=50):
     """
+    Context for contacts/_table.html: one page of contacts, most recently updated first
     
-    # Add error message if exists
-    if error_message:
-        html += f"""
-            <div class="alert alert-danger" role="alert">
-                {error_message}
-            </div>
-        """
+    Pages are found by seeking from a position in the listing instead of an
+    OFFSET, so each costs one index lookup however deep it is.
     
-    # Add contacts table
-    html += f"""
-            <div class="card">
-                <div class="card-header d-flex justify-content-between align-items-center">
-                    <span>Contacts ({total_count})</span>
-                    <span>Database: {db_path}</span>
-                </div>
-                <div class="card-body">
-                    <div class="table-responsive">
-                        <table class="table table-striped">
-                            <thead>
-                                <tr>
-                                    <th>Order ID</th>
-                                    <th>Recipient</th>
-                                    <th>Phone Number</th>
-                                    <th>Status</th>
-                                    <th>WhatsApp</th>
-                                    <th>Last Messaged</th>
-                                    <th>Last Updated</th>
-                                </tr>
-                            </thead>
-                            <tbody>
+    Args:
+        db_path (str): Path to SQLite database file
+        after (tuple): Position of the last contact on the previous page
+        before (tuple): Position of the first contact on the next page
+        last (bool): Show the last page
+        page (int): Number of the page shown, for display only
+        per_page (int): Contacts per page
     """
+    conn = get_db_connection(db_path)
+    try:
+        cursor = conn.cursor()
+        # Maintained by triggers on contacts
+        cursor.execute("SELECT total FROM contact_counts WHERE id = 1")
+        row = cursor.fetchone()
+        total_count = row[0] if row else 0
+        total_pages = (total_count + per_page - 1) // per_page
+        
+        if last:
+            contacts = _seek_contacts(cursor, None, older=False, limit=total_count % per_page or per_page)[::-1]
+            page = max(total_pages, 1)
+            has_previous, has_next = total_count > len(contacts), False
+        elif before:
+            contacts = _seek_contacts(cursor, before, older=False, limit=per_page + 1)
+            has_previous, has_next = len(contacts) > per_page, True
+            contacts = contacts[:per_page][::-1]
+        else:
+            contacts = _seek_contacts(cursor, after, older=True, limit=per_page + 1)
+            has_previous, has_next = after is not None, len(contacts) > per_page
+            contacts = contacts[:per_page]
+    finally:
+        conn.close()
     
-    # Add contacts rows
-    if contacts:
-        for contact in contacts:
-            order_id, recipient, phone_number, raw_phone_number, order_status, is_valid, last_messaged, last_updated = contact
-            
-            # Format validity badge
-            valid_badge = f'<span class="badge valid-badge">Valid</span>' if is_valid else f'<span class="badge invalid-badge">Invalid</span>'
-            
-            # Format last messaged date
-            if last_messaged:
-                try:
-                    last_messaged_date = datetime.datetime.fromisoformat(last_messaged)
-                    last_messaged_formatted = last_messaged_date.strftime('%Y-%m-%d %H:%M')
-                except:
-                    last_messaged_formatted = last_messaged
-            else:
-                last_messaged_formatted = 'Never'
-            
-            # Format last updated date
-            if last_updated:
-                try:
-                    last_updated_date = datetime.datetime.fromisoformat(last_updated)
-                    last_updated_formatted = last_updated_date.strftime('%Y-%m-%d %H:%M')
-                except:
-                    last_updated_formatted = last_updated
-            else:
-                last_updated_formatted = 'Unknown'
-            
-            html += f"""
-                                <tr>
-                                    <td>{order_id}</td>
-                                    <td>{recipient}</td>
-                                    <td>{phone_number or raw_phone_number}</td>
-                                    <td>{order_status}</td>
-                                    <td>{valid_badge}</td>
-                                    <td>{last_messaged_formatted}</td>
-                                    <td>{last_updated_formatted}</td>
-                                </tr>
-            """
-    else:
-        html += """
-                                <tr>
-                                    <td colspan="7" class="text-center">No contacts found.</td>
-                                </tr>
-        """
-    
-    # Close table and add pagination
-    html += """
-                            </tbody>
-                        </table>
-                    </div>
+    if not has_previous:
+        page = 1
+    return {
+        'contacts': contacts,
+        'total_count': total_count,
+        'total_pages': total_pages,
+        'page': min(max(page, 1), max(total_pages, 1)),
+        'previous_position': _format_position(contacts[0]) if has_previous and contacts else None,
+        'next_position': _format_position(contacts[-1]) if has_next and contacts else None,
+        'db_path': db_path,
+    }
+
+def _seek_contacts(cursor, position, older, limit):
     """
+    Up to `limit` contacts on one side of a position in the listing, nearest first
     
-    # Add pagination if needed
-    if total_pages > 1:
-        html += f"""
-                    <nav aria-label="Page navigation">
-                        <ul class="pagination justify-content-center">
-        """
-        
-        # Previous page button
-        prev_disabled = "disabled" if page <= 1 else ""
-        prev_page = page - 1 if page > 1 else 1
-        html += f"""
-                            <li class="page-item {prev_disabled}">
-                                <a class="page-link" href="/contacts/?db_path={db_path}&page={prev_page}" aria-label="Previous">
-                                    <span aria-hidden="true">&laquo;</span>
-                                </a>
-                            </li>
-        """
-        
-        # Page number buttons
-        for p in range(max(1, page - 2), min(total_pages + 1, page + 3)):
-            active = "active" if p == page else ""
-            html += f"""
-                            <li class="page-item {active}">
-                                <a class="page-link" href="/contacts/?db_path={db_path}&page={p}">{p}</a>
-                            </li>
-            """
-        
-        # Next page button
-        next_disabled = "disabled" if page >= total_pages else ""
-        next_page = page + 1 if page < total_pages else total_pages
-        html += f"""
-                            <li class="page-item {next_disabled}">
-                                <a class="page-link" href="/contacts/?db_path={db_path}&page={next_page}" aria-label="Next">
-                                    <span aria-hidden="true">&raquo;</span>
-                                </a>
-                            </li>
-                        </ul>
-                    </nav>
-        """
+    Args:
+        cursor (sqlite3.Cursor): Affiliates database cursor
+        position (tuple): (last_updated_epoch, phone_key) to start from, or None
+            for the start of the listing (older) or its end (not older)
+        older (bool): True for the contacts listed after the position, False
+            for those listed before it
+        limit (int): Maximum number of contacts
     
-    # Close card and main container
-    html += """
-                </div>
-            </div>
-            
-            <div class="row mt-4">
-                <div class="col-md-12 text-center">
-                    <p class="text-muted">MOJO WhatsApp Manager | Version 1.0</p>
-                </div>
-            </div>
-        </div>
-        
-        <!-- Bootstrap JavaScript -->
-        <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/js/bootstrap.bundle.min.js"></script>
-    </body>
-    </html>
+    Returns:
+        list: Contact rows
     """
+    order = 'DESC' if older else 'ASC'
+    compare = '<' if older else '>'
     
-    # Format DB path in the HTML
-    html = html.replace("{db_path}", db_path)
+    # Each part is one index range; NULL epochs are never less or greater than
+    # a number, so crossing between them and the dated contacts takes a second part
+    if position is None:
+        parts = [('', [])]
+    elif position[0] is None:
+        parts = [(f"WHERE last_updated_epoch IS NULL AND phone_key {compare} ?", [position[1]])]
+        if not older:
+            parts.append(("WHERE last_updated_epoch IS NOT NULL", []))
+    else:
+        parts = [(f"WHERE (last_updated_epoch, phone_key) {compare} (?, ?)", list(position))]
+        if older:
+            parts.append(("WHERE last_updated_epoch IS NULL", []))
     
-    return make_response(html)
+    contacts = []
+    for where, params in parts:
+        if len(contacts) >= limit:
+            break
+        cursor.execute(CONTACT_LIST_SQL.format(where=where, order=order), params + [limit - len(contacts)])
+        contacts.extend(cursor.fetchall())
+    return contacts
+
+def _format_position(contact):
+    """URL form of a contact's position in the listing"""
+    epoch = contact['last_updated_epoch']
+    return f"{'' if epoch is None else epoch}:{contact['phone_key']}"
+
+def _parse_position(value):
+    """(last_updated_epoch, phone_key) from _format_position(), or None if missing or malformed"""
+    if not value or ':' not in value:
+        return None
+    epoch, phone_key = value.split(':', 1)
+    try:
+        return (int(epoch) if epoch else None, phone_key)
+    except ValueError:
+        return None
 
 @bp.route('/import', methods=['GET', 'POST'])
 @login_required
@@ -394,22 +216,6 @@ def import_contacts():
                     conn = get_db_connection(db_path)
                     cursor = conn.cursor()
                     
-                    # Ensure the orders table exists
-                    cursor.execute("""
-                        CREATE TABLE IF NOT EXISTS orders (
-                            id INTEGER PRIMARY KEY AUTOINCREMENT,
-                            order_id TEXT,
-                            order_status TEXT,
-                            recipient TEXT,
-                            product_name TEXT,
-                            phone_number TEXT,
-                            raw_phone_number TEXT,
-                            is_valid_for_whatsapp BOOLEAN,
-                            last_messaged TEXT,
-                            last_updated TEXT
-                        )
-                    """)
-                    
                     # Process and deduplicate numbers
                     unique_numbers = set()
                     valid_count = 0
@@ -457,6 +263,10 @@ def import_contacts():
                     conn.commit()
                     conn.close()
                     
+                    # Cached reports carry buyer details from contacts, and cached pages list them
+                    current_app.extensions['report_cache'].clear()
+                    current_app.extensions['fragment_cache'].clear()
+                    
                     flash(f'Imported {valid_count} valid contacts. {invalid_count} invalid numbers were skipped.', 'success')
                     return redirect(url_for('contacts.index', db_path=db_path))
                 
@@ -488,17 +298,19 @@ def search():
         # Search in multiple fields
         cursor.execute("""
             SELECT 
-                order_id, recipient, phone_number, raw_phone_number, order_status, 
-                is_valid_for_whatsapp, last_messaged, last_updated
+                latest_order_id AS order_id, recipient, phone_number, raw_phone_number, order_status, 
+                is_valid_for_whatsapp,
+                datetime(last_messaged_epoch, 'unixepoch', 'localtime') AS last_messaged,
+                datetime(last_updated_epoch, 'unixepoch', 'localtime') AS last_updated
             FROM 
-                orders
+                contacts
             WHERE 
-                order_id LIKE ? OR
+                phone_key IN (SELECT phone_key FROM order_messaging WHERE order_id LIKE ?) OR
                 recipient LIKE ? OR
                 phone_number LIKE ? OR
                 raw_phone_number LIKE ?
             ORDER BY 
-                last_updated DESC
+                last_updated_epoch DESC
             LIMIT 100
         """, (f'%{query}%', f'%{query}%', f'%{query}%', f'%{query}%'))
         
@@ -534,14 +346,16 @@ def filter_contacts():
         # Filter by status
         cursor.execute("""
             SELECT 
-                order_id, recipient, phone_number, raw_phone_number, order_status, 
-                is_valid_for_whatsapp, last_messaged, last_updated
+                latest_order_id AS order_id, recipient, phone_number, raw_phone_number, order_status, 
+                is_valid_for_whatsapp,
+                datetime(last_messaged_epoch, 'unixepoch', 'localtime') AS last_messaged,
+                datetime(last_updated_epoch, 'unixepoch', 'localtime') AS last_updated
             FROM 
-                orders
+                contacts
             WHERE 
                 order_status = ?
             ORDER BY 
-                last_updated DESC
+                last_updated_epoch DESC
             LIMIT 500
         """, (status,))
         
@@ -551,7 +365,7 @@ def filter_contacts():
         # Get unique statuses for filter options
         conn = get_db_connection(db_path)
         cursor = conn.cursor()
-        cursor.execute("SELECT DISTINCT order_status FROM orders")
+        cursor.execute("SELECT DISTINCT order_status FROM contacts")
         statuses = [row[0] for row in cursor.fetchall() if row[0]]
         conn.close()
         
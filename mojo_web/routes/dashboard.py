@@ -1,10 +1,16 @@
 """
 Dashboard routes
 """
-from flask import Blueprint, render_template, make_response
+from collections import Counter
+from datetime import datetime
+from flask import Blueprint, render_template, current_app
 from flask_login import login_required
+from sqlalchemy import func, literal, null
+from sqlalchemy.orm import joinedload
 from mojo_web import db
 from mojo_web.models import Template, Campaign, CampaignLog
+from mojo_web.cache import cached_fragment
+from mojo_core.db_utils import get_database_stats
 
 bp = Blueprint('dashboard', __name__)
 
@@ -12,197 +18,45 @@ bp = Blueprint('dashboard', __name__)
 @login_required
 def index():
     """Dashboard homepage"""
-    # Get dashboard statistics
-    stats = {
-        'templates': Template.query.count(),
-        'campaigns': Campaign.query.count(),
-        'completed_campaigns': Campaign.query.filter_by(status='completed').count(),
-        'scheduled_campaigns': Campaign.query.filter_by(status='scheduled').count()
-    }
-    
-    # Get recent campaign logs
-    recent_logs = CampaignLog.query.order_by(CampaignLog.created_at.desc()).limit(5).all()
-    
-    # Get upcoming scheduled campaigns
-    upcoming_campaigns = Campaign.query.filter_by(status='scheduled').order_by(Campaign.next_run).limit(5).all()
+    # Both follow the web database, so they are rendered again after its next commit
+    campaign_stats = cached_fragment(('dashboard', 'stats'), 'dashboard/_campaign_stats.html', lambda: {
+        'stats': _campaign_stats()
+    })
+    activity = cached_fragment(('dashboard', 'activity'), 'dashboard/_activity.html', lambda: {
+        'recent_logs': (CampaignLog.query.options(joinedload(CampaignLog.campaign))
+                        .order_by(CampaignLog.created_at.desc()).limit(5).all()),
+        'upcoming_campaigns': (Campaign.query.options(joinedload(Campaign.template)).filter_by(status='scheduled')
+                               .order_by(Campaign.next_run).limit(5).all())
+    })
     
-    # Basic dashboard HTML
-    html = """
-    <!DOCTYPE html>
-    <html lang="en">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>Dashboard - MOJO WhatsApp Manager</title>
-        
-        <!-- Bootstrap CSS -->
-        <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/css/bootstrap.min.css" rel="stylesheet">
-        <link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0-beta3/css/all.min.css">
-        
-        <style>
-            :root {
-                --mojo-dark: #272D45;
-                --mojo-red: #E60517;
-                --mojo-dark-red: #87000A;
-            }
-            
-            body {
-                background-color: #f5f5f5;
-            }
-            
-            .navbar {
-                background-color: var(--mojo-dark);
-            }
-            
-            .logo-text {
-                color: white;
-                font-weight: bold;
-                font-size: 24px;
-            }
-            
-            .card-stats {
-                transition: transform 0.3s;
-                cursor: pointer;
-            }
-            
-            .card-stats:hover {
-                transform: translateY(-5px);
-            }
-            
-            .btn-primary {
-                background-color: var(--mojo-red);
-                border-color: var(--mojo-red);
-            }
-            
-            .btn-primary:hover {
-                background-color: var(--mojo-dark-red);
-                border-color: var(--mojo-dark-red);
-            }
-            
-            .logout-btn {
-                color: white;
-                text-decoration: none;
-            }
-            
-            .logout-btn:hover {
-                color: #f8f9fa;
-            }
-        </style>
-    </head>
-    <body>
-        <!-- Navbar -->
-        <nav class="navbar navbar-dark py-3">
-            <div class="container">
-                <span class="navbar-brand logo-text">
-                    <div style="background: var(--mojo-red); color: white; display: inline-block; width: 40px; height: 40px; border-radius: 50%; text-align: center; line-height: 40px; margin-right: 10px;">M</div>
-                    MOJO WhatsApp Manager
-                </span>
-                <a href="/auth/logout" class="logout-btn">
-                    <i class="fas fa-sign-out-alt"></i> Logout
-                </a>
-            </div>
-        </nav>
-        
-        <!-- Main Content -->
-        <div class="container mt-4">
-            <div class="row mb-4">
-                <div class="col">
-                    <h2 class="mb-0">Dashboard</h2>
-                    <p class="text-muted">Welcome to the MOJO WhatsApp Manager</p>
-                </div>
-            </div>
-            
-            <!-- Stats -->
-            <div class="row mb-4">
-    """
+    # Affiliates database counts come from trigger-maintained counters, so they are read fresh
+    today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    try:
+        database_stats = get_database_stats(current_app.config['DEFAULT_DB_PATH'], int(today_start.timestamp()))
+    except Exception as e:
+        current_app.logger.error(f"Error reading affiliates database counts: {str(e)}")
+        database_stats = None
     
-    # Add stats cards
-    html += f"""
-                <div class="col-md-3 mb-3">
-                    <div class="card card-stats bg-primary text-white">
-                        <div class="card-body text-center">
-                            <h5 class="card-title"><i class="fas fa-file-alt"></i> Templates</h5>
-                            <p class="display-4">{stats['templates']}</p>
-                        </div>
-                    </div>
-                </div>
-                <div class="col-md-3 mb-3">
-                    <div class="card card-stats bg-success text-white">
-                        <div class="card-body text-center">
-                            <h5 class="card-title"><i class="fas fa-bullhorn"></i> Campaigns</h5>
-                            <p class="display-4">{stats['campaigns']}</p>
-                        </div>
-                    </div>
-                </div>
-                <div class="col-md-3 mb-3">
-                    <div class="card card-stats bg-info text-white">
-                        <div class="card-body text-center">
-                            <h5 class="card-title"><i class="fas fa-check-circle"></i> Completed</h5>
-                            <p class="display-4">{stats['completed_campaigns']}</p>
-                        </div>
-                    </div>
-                </div>
-                <div class="col-md-3 mb-3">
-                    <div class="card card-stats bg-warning text-white">
-                        <div class="card-body text-center">
-                            <h5 class="card-title"><i class="fas fa-clock"></i> Scheduled</h5>
-                            <p class="display-4">{stats['scheduled_campaigns']}</p>
-                        </div>
-                    </div>
-                </div>
-    """
+    return render_template('dashboard/index.html', campaign_stats=campaign_stats, activity=activity,
+                           database_stats=database_stats)
+
+def _campaign_stats():
+    """Template count and campaign counts by status, from one statement"""
+    by_status = (db.session.query(literal('campaigns'), Campaign.status, func.count(Campaign.id))
+                 .group_by(Campaign.status))
+    templates = db.session.query(literal('templates'), null(), func.count(Template.id))
     
-    html += """
-            </div>
-            
-            <!-- Quick Actions -->
-            <div class="row mb-4">
-                <div class="col-12">
-                    <div class="card">
-                        <div class="card-body">
-                            <h5 class="card-title mb-3">Quick Actions</h5>
-                            <div class="row">
-                                <div class="col-md-3 col-6 mb-3">
-                                    <a href="/templates" class="btn btn-outline-primary w-100">
-                                        <i class="fas fa-file-alt mb-2"></i><br>
-                                        Templates
-                                    </a>
-                                </div>
-                                <div class="col-md-3 col-6 mb-3">
-                                    <a href="/campaigns" class="btn btn-outline-primary w-100">
-                                        <i class="fas fa-bullhorn mb-2"></i><br>
-                                        Campaigns
-                                    </a>
-                                </div>
-                                <div class="col-md-3 col-6 mb-3">
-                                    <a href="/contacts" class="btn btn-outline-primary w-100">
-                                        <i class="fas fa-address-book mb-2"></i><br>
-                                        Contacts
-                                    </a>
-                                </div>
-                                <div class="col-md-3 col-6 mb-3">
-                                    <a href="/reports" class="btn btn-outline-primary w-100">
-                                        <i class="fas fa-chart-bar mb-2"></i><br>
-                                        Reports
-                                    </a>
-                                </div>
-                            </div>
-                        </div>
-                    </div>
-                </div>
-            </div>
-            
-            <div class="row">
-                <div class="col-md-12 text-center">
-                    <p class="text-muted">MOJO WhatsApp Manager | Version 1.0</p>
-                </div>
-            </div>
-        </div>
-        
-        <!-- Bootstrap JavaScript -->
-        <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/js/bootstrap.bundle.min.js"></script>
-    </body>
-    </html>
-    """
+    statuses = Counter()
+    template_count = 0
+    for kind, status, count in by_status.union_all(templates).all():
+        if kind == 'templates':
+            template_count = count
+        else:
+            statuses[status] += count
     
-    return make_response(html) 
\ No newline at end of file
+    return {
+        'templates': template_count,
+        'campaigns': sum(statuses.values()),
+        'completed_campaigns': statuses['completed'],
+        'scheduled_campaigns': statuses['scheduled']
+    }
@@ -2,1109 +2,51 @@
 Reports routes for viewing message and campaign reports
 """
 import os
-import re
+import json
+import hashlib
+import mimetypes
 from datetime import datetime, timedelta
-from flask import Blueprint, render_template, request, send_file, abort, current_app, make_response
+from flask import (Blueprint, render_template, request, send_file, abort, current_app, Response,
+                   stream_with_context, flash)
 from flask_login import login_required
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
 from mojo_web import db
 from mojo_web.models import Campaign, CampaignLog
-import os
-from twilio.rest import Client
+from mojo_web.cache import cached_fragment
+from mojo_core import exports, report_manifest, report_index, report_storage, run_journal
+from mojo_core.db_utils import get_db_connection, get_read_only_connection
+from mojo_core.status_store import get_deliverability, get_campaign_statuses, get_campaign_funnel, get_spend
 
 bp = Blueprint('reports', __name__, url_prefix='/reports')
 
+def _reports_dir():
+    """Directory the send functions write report files to"""
+    return current_app.config['REPORTS_DIR']
+
 @bp.route('/')
 @login_required
 def index():
     """Reports dashboard showing message reports and campaign logs"""
-    # Generate direct HTML
-    html = """
-    <!DOCTYPE html>
-    <html lang="en">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>Reports - MOJO WhatsApp Manager</title>
-        
-        <!-- Bootstrap CSS -->
-        <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/css/bootstrap.min.css" rel="stylesheet">
-        <link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0-beta3/css/all.min.css">
-        
-        <style>
-            :root {
-                --mojo-dark: #272D45;
-                --mojo-red: #E60517;
-                --mojo-dark-red: #87000A;
-            }
-            
-            body {
-                background-color: #f5f5f5;
-            }
-            
-            .navbar {
-                background-color: var(--mojo-dark);
-            }
-            
-            .logo-text {
-                color: white;
-                font-weight: bold;
-                font-size: 24px;
-            }
-            
-            .btn-primary {
-                background-color: var(--mojo-red);
-                border-color: var(--mojo-red);
-            }
-            
-            .btn-primary:hover {
-                background-color: var(--mojo-dark-red);
-                border-color: var(--mojo-dark-red);
-            }
-            
-            .logout-btn {
-                color: white;
-                text-decoration: none;
-            }
-            
-            .logout-btn:hover {
-                color: #f8f9fa;
-            }
-            
-            .nav-tabs .nav-link.active {
-                background-color: white;
-                color: var(--mojo-dark);
-                font-weight: bold;
-            }
-            
-            .nav-tabs .nav-link {
-                color: var(--mojo-dark);
-            }
-            
-            .card {
-                border: none;
-                box-shadow: 0 0.125rem 0.25rem rgba(0,0,0,0.075);
-                margin-bottom: 1.5rem;
-            }
-            
-            .card-header {
-                background-color: var(--mojo-dark);
-                color: white;
-                font-weight: bold;
-            }
-            
-            .card .card-body {
-                text-center py-4;
-            }
-            
-            .card-body h2 {
-                margin-bottom: 5px;
-            }
-            
-            /* Make all stat boxes the same height */
-            .row .card {
-                height: 100%;
-            }
-            
-            .status-sent {
-                color: #28a745;
-            }
-            
-            .status-delivered {
-                color: #28a745;
-                font-weight: bold;
-            }
-            
-            .status-read {
-                color: #218838;
-                font-weight: bold;
-            }
-            
-            .status-failed, .status-undelivered {
-                color: #dc3545;
-            }
-            
-            .status-queued {
-                color: #ffc107;
-            }
-            
-            .refresh-button {
-                position: fixed;
-                bottom: 20px;
-                right: 20px;
-                z-index: 1000;
-            }
-            
-            .message-tabs .nav-link {
-                font-weight: bold;
-                padding: 10px 20px;
-            }
-            
-            .message-count {
-                display: inline-block;
-                background-color: var(--mojo-red);
-                color: white;
-                border-radius: 50%;
-                padding: 2px 8px;
-                font-size: 12px;
-                margin-left: 5px;
-            }
-            
-            .percentage {
-                font-size: 14px;
-                opacity: 0.8;
-                margin-left: 5px;
-            }
-        </style>
-    </head>
-    <body>
-        <!-- Navbar -->
-        <nav class="navbar navbar-dark py-3">
-            <div class="container">
-                <span class="navbar-brand logo-text">
-                    <div style="background: var(--mojo-red); color: white; display: inline-block; width: 40px; height: 40px; border-radius: 50%; text-align: center; line-height: 40px; margin-right: 10px;">M</div>
-                    MOJO WhatsApp Manager
-                </span>
-                <div>
-                    <a href="/" class="btn btn-outline-light me-2">Dashboard</a>
-                    <a href="/auth/logout" class="logout-btn">
-                        <i class="fas fa-sign-out-alt"></i> Logout
-                    </a>
-                </div>
-            </div>
-        </nav>
-        
-        <!-- Main Content -->
-        <div class="container mt-4">
-            <div class="row mb-4">
-                <div class="col">
-                    <h2>Reports Dashboard</h2>
-                    <p class="text-muted">View message delivery reports and campaign logs</p>
-                </div>
-            </div>
-            
-            <ul class="nav nav-tabs mb-4" id="reportsTabs" role="tablist">
-                <li class="nav-item" role="presentation">
-                    <button class="nav-link active" id="delivery-tab" data-bs-toggle="tab" data-bs-target="#delivery" type="button" role="tab" aria-controls="delivery" aria-selected="true">
-                        <i class="fas fa-paper-plane"></i> Message Delivery
-                    </button>
-                </li>
-                <li class="nav-item" role="presentation">
-                    <button class="nav-link" id="campaigns-tab" data-bs-toggle="tab" data-bs-target="#campaigns" type="button" role="tab" aria-controls="campaigns" aria-selected="false">
-                        <i class="fas fa-bullhorn"></i> Campaign Logs
-                    </button>
-                </li>
-                <li class="nav-item" role="presentation">
-                    <button class="nav-link" id="files-tab" data-bs-toggle="tab" data-bs-target="#files" type="button" role="tab" aria-controls="files" aria-selected="false">
-                        <i class="fas fa-file-alt"></i> Report Files
-                    </button>
-                </li>
-            </ul>
-            
-            <div class="tab-content" id="reportsTabsContent">
-                <!-- Delivery Reports Tab -->
-                <div class="tab-pane fade show active" id="delivery" role="tabpanel" aria-labelledby="delivery-tab">
-                    <div class="card">
-                        <div class="card-header d-flex justify-content-between align-items-center">
-                            <span>Recent Message Delivery</span>
-                            <div>
-                                <select id="timeRangeFilter" class="form-select form-select-sm" style="width: auto; display: inline-block;">
-                                    <option value="24">Last 24 Hours</option>
-                                    <option value="48">Last 48 Hours</option>
-                                    <option value="168">Last 7 Days</option>
-                                </select>
-                            </div>
-                        </div>
-                        <div class="card-body">
-                            <div class="row mb-4">
-                                <div class="col-md-3">
-                                    <div class="card bg-primary text-white">
-                                        <div class="card-body text-center">
-                                            <h5>Total Messages</h5>
-                                            <h2 id="total-messages">...</h2>
-                                            <small>All messages sent and received</small>
-                                        </div>
-                                    </div>
-                                </div>
-                                <div class="col-md-3">
-                                    <div class="card bg-info text-white">
-                                        <div class="card-body text-center">
-                                            <h5>Affiliate Responses</h5>
-                                            <h2 id="inbound-messages">...</h2>
-                                            <small>Incoming messages received from customers</small>
-                                        </div>
-                                    </div>
-                                </div>
-                                <div class="col-md-3">
-                                    <div class="card bg-secondary text-white">
-                                        <div class="card-body text-center">
-                                            <h5>Delivered</h5>
-                                            <h2 id="delivered-messages">...</h2>
-                                            <span id="delivered-percent" class="percentage">0%</span>
-                                            <small>Outbound messages confirmed delivered to handset</small>
-                                        </div>
-                                    </div>
-                                </div>
-                                <div class="col-md-3">
-                                    <div class="card bg-success text-white">
-                                        <div class="card-body text-center">
-                                            <h5>Read</h5>
-                                            <h2 id="read-messages">...</h2>
-                                            <span id="read-percent" class="percentage">0%</span>
-                                            <small>WhatsApp: Message opened by recipient</small>
-                                        </div>
-                                    </div>
-                                </div>
-                            </div>
-                            
-                            <div class="row mb-4">
-                                <div class="col-md-3">
-                                    <div class="card bg-info text-white">
-                                        <div class="card-body text-center">
-                                            <h5>Sent</h5>
-                                            <h2 id="sent-messages">...</h2>
-                                            <span id="sent-percent" class="percentage">0%</span>
-                                            <small>Messages accepted by upstream carrier</small>
-                                        </div>
-                                    </div>
-                                </div>
-                                <div class="col-md-3">
-                                    <div class="card bg-danger text-white">
-                                        <div class="card-body text-center">
-                                            <h5>Failed</h5>
-                                            <h2 id="failed-messages">...</h2>
-                                            <span id="failed-percent" class="percentage">0%</span>
-                                            <small>Messages failed during processing</small>
-                                        </div>
-                                    </div>
-                                </div>
-                                <div class="col-md-3">
-                                    <div class="card bg-warning text-white">
-                                        <div class="card-body text-center">
-                                            <h5>Received</h5>
-                                            <h2 id="received-messages">...</h2>
-                                            <span id="received-percent" class="percentage">0%</span>
-                                            <small>Inbound messages received and processed</small>
-                                        </div>
-                                    </div>
-                                </div>
-                                <div class="col-md-3">
-                                    <div class="card bg-danger text-white">
-                                        <div class="card-body text-center">
-                                            <h5>Undelivered</h5>
-                                            <h2 id="undelivered-messages">...</h2>
-                                            <span id="undelivered-percent" class="percentage">0%</span>
-                                            <small>Messages that couldn't be delivered</small>
-                                        </div>
-                                    </div>
-                                </div>
-                            </div>
-                            
-                            <!-- Message tabs -->
-                            <ul class="nav nav-tabs message-tabs mb-3" role="tablist">
-                                <li class="nav-item" role="presentation">
-                                    <button class="nav-link active" id="outbound-tab" data-bs-toggle="tab" data-bs-target="#outbound-messages" type="button" role="tab" aria-controls="outbound-messages" aria-selected="true">
-                                        Outbound Messages <span id="outbound-count" class="message-count">0</span>
-                                    </button>
-                                </li>
-                                <li class="nav-item" role="presentation">
-                                    <button class="nav-link" id="inbound-tab" data-bs-toggle="tab" data-bs-target="#inbound-messages" type="button" role="tab" aria-controls="inbound-messages" aria-selected="false">
-                                        Affiliate Responses <span id="responses-count" class="message-count">0</span>
-                                    </button>
-                                </li>
-                                <li class="nav-item" role="presentation">
-                                    <button class="nav-link" id="undelivered-tab" data-bs-toggle="tab" data-bs-target="#undelivered-messages" type="button" role="tab" aria-controls="undelivered-messages" aria-selected="false">
-                                        Undelivered Messages <span id="undelivered-count" class="message-count">0</span>
-                                    </button>
-                                </li>
-                            </ul>
-                            
-                            <div class="tab-content">
-                                <!-- Outbound Messages Tab -->
-                                <div class="tab-pane fade show active" id="outbound-messages" role="tabpanel">
-                                    <div class="table-responsive">
-                                        <table class="table table-striped" id="delivery-table">
-                                            <thead>
-                                                <tr>
-                                                    <th>Date</th>
-                                                    <th>To</th>
-                                                    <th>Buyer Username</th>
-                                                    <th>Recipient</th>
-                                                    <th>Order ID</th>
-                                                    <th>Message Body</th>
-                                                    <th>Status</th>
-                                                </tr>
-                                            </thead>
-                                            <tbody id="delivery-body">
-                                                <tr>
-                                                    <td colspan="8" class="text-center">Loading outbound message data...</td>
-                                                </tr>
-                                            </tbody>
-                                        </table>
-                                    </div>
-                                </div>
-                                
-                                <!-- Inbound Messages Tab -->
-                                <div class="tab-pane fade" id="inbound-messages" role="tabpanel" aria-labelledby="inbound-tab">
-                                    <div class="table-responsive">
-                                        <table class="table table-striped" id="inbound-table">
-                                            <thead>
-                                                <tr>
-                                                    <th>Date</th>
-                                                    <th>From</th>
-                                                    <th>Buyer Username</th>
-                                                    <th>Recipient</th>
-                                                    <th>Order ID</th>
-                                                    <th>Message Body</th>
-                                                    <th>Status</th>
-                                                </tr>
-                                            </thead>
-                                            <tbody id="inbound-body">
-                                                <tr>
-                                                    <td colspan="7" class="text-center">Loading customer responses...</td>
-                                                </tr>
-                                            </tbody>
-                                        </table>
-                                    </div>
-                                </div>
-                                
-                                <!-- Undelivered Messages Tab -->
-                                <div class="tab-pane fade" id="undelivered-messages" role="tabpanel" aria-labelledby="undelivered-tab">
-                                    <div class="table-responsive">
-                                        <table class="table table-striped" id="undelivered-table">
-                                            <thead>
-                                                <tr>
-                                                    <th>Date</th>
-                                                    <th>To</th>
-                                                    <th>Buyer Username</th>
-                                                    <th>Recipient</th>
-                                                    <th>Order ID</th>
-                                                    <th>Message Body</th>
-                                                    <th>Status</th>
-                                                </tr>
-                                            </thead>
-                                            <tbody id="undelivered-body">
-                                                <tr>
-                                                    <td colspan="7" class="text-center">Loading undelivered messages...</td>
-                                                </tr>
-                                            </tbody>
-                                        </table>
-                                    </div>
-                                </div>
-                            </div>
-                        </div>
-                    </div>
-                </div>
-                
-                <!-- Campaign Logs Tab -->
-                <div class="tab-pane fade" id="campaigns" role="tabpanel" aria-labelledby="campaigns-tab">
-                    <div class="card">
-                        <div class="card-header">
-                            <span>Recent Campaign Logs</span>
-                        </div>
-                        <div class="card-body">
-                            <div class="table-responsive">
-                                <table class="table table-striped">
-                                    <thead>
-                                        <tr>
-                                            <th>Date</th>
-                                            <th>Campaign</th>
-                                            <th>Status</th>
-                                            <th>Recipients</th>
-                                            <th>Success</th>
-                                            <th>Failed</th>
-                                            <th>Time (s)</th>
-                                            <th></th>
-                                        </tr>
-                                    </thead>
-                                    <tbody>
-    """
-    
-    # Add campaign logs
-    campaign_logs = CampaignLog.query.order_by(CampaignLog.created_at.desc()).limit(20).all()
-    
-    if campaign_logs:
-        for log in campaign_logs:
-            status_class = "text-success" if log.status == "success" else "text-danger"
-            success_rate = f"{(log.recipients_success / log.recipients_total * 100):.1f}%" if log.recipients_total > 0 else "0%"
-            
-            html += f"""
-                                        <tr>
-                                            <td>{log.created_at.strftime('%Y-%m-%d %H:%M')}</td>
-                                            <td>{log.campaign.name if log.campaign else 'Unknown'}</td>
-                                            <td class="{status_class}">{log.status}</td>
-                                            <td>{log.recipients_total}</td>
-                                            <td>{log.recipients_success} ({success_rate})</td>
-                                            <td>{log.recipients_failed}</td>
-                                            <td>{log.execution_time:.1f}s</td>
-                                            <td>
-                                                <a href="/reports/campaign/{log.campaign_id}" class="btn btn-sm btn-outline-primary">
-                                                    <i class="fas fa-eye"></i>
-                                                </a>
-                                            </td>
-                                        </tr>
-            """
-    else:
-        html += """
-                                        <tr>
-                                            <td colspan="8" class="text-center">No campaign logs found.</td>
-                                        </tr>
-        """
-    
-    # Add file reports section
-    html += """
-                                    </tbody>
-                                </table>
-                            </div>
-                        </div>
-                    </div>
-                </div>
-                
-                <!-- Report Files Tab -->
-                <div class="tab-pane fade" id="files" role="tabpanel" aria-labelledby="files-tab">
-                    <div class="card">
-                        <div class="card-header">
-                            <span>Message Report Files</span>
-                        </div>
-                        <div class="card-body">
-                            <div class="table-responsive">
-                                <table class="table table-striped">
-                                    <thead>
-                                        <tr>
-                                            <th>Date</th>
-                                            <th>Filename</th>
-                                            <th>Status</th>
-                                            <th>Type</th>
-                                            <th></th>
-                                        </tr>
-                                    </thead>
-                                    <tbody>
-    """
-    
-    # Get file reports
-    reports_dir = os.path.join(current_app.root_path, '..', 'reports')
-    file_reports = []
-    
-    if os.path.exists(reports_dir):
-        files = [f for f in os.listdir(reports_dir) if f.endswith('.txt')]
-        
-        for file in files:
-            # Extract date from filename (format: message_report_*_DD-MM-YY_HH-MM-SS.txt)
-            match = re.search(r'(\d{2}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2})', file)
-            if match:
-                date_str = match.group(1)
-                try:
-                    date = datetime.strptime(date_str, '%d-%m-%y_%H-%M-%S')
-                    
-                    # Extract status from filename if present
-                    status_match = re.search(r'status_([A-Z]+)', file)
-                    status = status_match.group(1) if status_match else None
-                    
-                    # Check if it's a dry run
-                    is_dry_run = 'dry_run' in file
-                    
-                    file_reports.append({
-                        'filename': file,
-                        'date': date,
-                        'status': status,
-                        'is_dry_run': is_dry_run
-                    })
-                except Exception:
-                    # Skip files with invalid date format
-                    continue
-        
-        # Sort by date (newest first)
-        file_reports.sort(key=lambda x: x['date'], reverse=True)
-        
-        # Limit to 20 most recent
-        file_reports = file_reports[:20]
-    
-    if file_reports:
-        for report in file_reports:
-            run_type = "Dry Run" if report['is_dry_run'] else "Live Run"
-            status_text = report['status'] if report['status'] else "Unknown"
-            
-            html += f"""
-                                        <tr>
-                                            <td>{report['date'].strftime('%Y-%m-%d %H:%M')}</td>
-                                            <td>{report['filename']}</td>
-                                            <td>{status_text}</td>
-                                            <td>{run_type}</td>
-                                            <td>
-                                                <a href="/reports/view/{report['filename']}" class="btn btn-sm btn-outline-primary me-1">
-                                                    <i class="fas fa-eye"></i>
-                                                </a>
-                                                <a href="/reports/download/{report['filename']}" class="btn btn-sm btn-outline-secondary">
-                                                    <i class="fas fa-download"></i>
-                                                </a>
-                                            </td>
-                                        </tr>
-            """
-    else:
-        html += """
-                                        <tr>
-                                            <td colspan="5" class="text-center">No report files found.</td>
-                                        </tr>
-        """
-    
-    html += """
-                                    </tbody>
-                                </table>
-                            </div>
-                        </div>
-                    </div>
-                </div>
-            </div>
-            
-            <!-- Auto-refresh button -->
-            <button class="btn btn-primary rounded-circle refresh-button" id="refreshButton" title="Refresh data">
-                <i class="fas fa-sync-alt"></i>
-            </button>
-            
-            <div class="row mt-4">
-                <div class="col-md-12 text-center">
-                    <p class="text-muted">MOJO WhatsApp Manager | Version 1.0</p>
-                </div>
-            </div>
-        </div>
-        
-        <!-- Bootstrap JavaScript -->
-        <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/js/bootstrap.bundle.min.js"></script>
-        
-        <script>
-            // Initialize page
-            document.addEventListener('DOMContentLoaded', function() {
-                let activeOutboundMessages = [];
-                let activeInboundMessages = [];
-
-                // Function to populate outbound messages table
-                function renderOutboundTable() {
-                    const outboundBody = document.getElementById('delivery-body');
-                    outboundBody.innerHTML = ''; // Clear existing
-                    let newHtml = '';
-                    if (activeOutboundMessages.length === 0) {
-                        newHtml = '<tr><td colspan="7" class="text-center">No outbound messages found for the selected time period.</td></tr>';
-                    } else {
-                        activeOutboundMessages.forEach(msg => {
-                            const statusClass = getStatusClass(msg.status);
-                            const date = new Date(msg.date_sent || msg.date_created);
-                            const buyerUsername = msg.buyer_username ? 
-                                `<a href="https://www.tiktok.com/@${msg.buyer_username}" target="_blank">@${msg.buyer_username}</a>` : '-';
-                            newHtml += `
-                                <tr>
-                                    <td>${date.toLocaleString()}</td>
-                                    <td>${msg.to}</td>
-                                    <td>${buyerUsername}</td>
-                                    <td>${msg.recipient || '-'}</td>
-                                    <td>${msg.order_id || '-'}</td>
-                                    <td>${msg.body.substring(0, 50)}${msg.body.length > 50 ? '...' : ''}</td>
-                                    <td class="${statusClass}">${msg.status}</td>
-                                </tr>
-                            `;
-                        });
-                    }
-                    outboundBody.innerHTML = newHtml;
-                    setTimeout(() => { outboundBody.innerHTML = newHtml; }, 10); // Re-assert content
-                    console.log("Rendered outbound table. HTML:", outboundBody.innerHTML.substring(0, 200) + "...");
-                }
-                
-                // Function to populate undelivered messages table
-                function renderUndeliveredTable() {
-                    const undeliveredBody = document.getElementById('undelivered-body');
-                    undeliveredBody.innerHTML = ''; // Clear existing
-                    let newHtml = '';
-                    
-                    // Filter for undelivered messages only
-                    const undeliveredMessages = activeOutboundMessages.filter(msg => msg.status === 'undelivered');
-                    
-                    if (undeliveredMessages.length === 0) {
-                        newHtml = '<tr><td colspan="7" class="text-center">No undelivered messages found for the selected time period.</td></tr>';
-                    } else {
-                        undeliveredMessages.forEach(msg => {
-                            const statusClass = getStatusClass(msg.status);
-                            const date = new Date(msg.date_sent || msg.date_created);
-                            const buyerUsername = msg.buyer_username ? 
-                                `<a href="https://www.tiktok.com/@${msg.buyer_username}" target="_blank">@${msg.buyer_username}</a>` : '-';
-                            newHtml += `
-                                <tr>
-                                    <td>${date.toLocaleString()}</td>
-                                    <td>${msg.to}</td>
-                                    <td>${buyerUsername}</td>
-                                    <td>${msg.recipient || '-'}</td>
-                                    <td>${msg.order_id || '-'}</td>
-                                    <td>${msg.body.substring(0, 50)}${msg.body.length > 50 ? '...' : ''}</td>
-                                    <td class="${statusClass}">${msg.status}</td>
-                                </tr>
-                            `;
-                        });
-                    }
-                    undeliveredBody.innerHTML = newHtml;
-                    setTimeout(() => { undeliveredBody.innerHTML = newHtml; }, 10); // Re-assert content
-                    console.log("Rendered undelivered table with", undeliveredMessages.length, "messages");
-                }
-
-                // Function to populate inbound messages table
-                function renderInboundTable() {
-                    // Locate the parent container that holds the table
-                    const tableContainer = document.querySelector('#inbound-messages .table-responsive');
-                    if (!tableContainer) {
-                        console.error("Could not find table container in #inbound-messages");
-                        return;
-                    }
-                    
-                    // Create completely new table HTML
-                    let tableHtml = `
-                        <table class="table table-striped" id="inbound-table">
-                            <thead>
-                                <tr>
-                                    <th>Date</th>
-                                    <th>From</th>
-                                    <th>Buyer Username</th>
-                                    <th>Recipient</th>
-                                    <th>Order ID</th>
-                                    <th>Message Body</th>
-                                    <th>Status</th>
-                                </tr>
-                            </thead>
-                            <tbody id="inbound-body">
-                    `;
-                    
-                    if (activeInboundMessages.length === 0) {
-                        tableHtml += '<tr><td colspan="7" class="text-center">No affiliate responses found for the selected time period.</td></tr>';
-                    } else {
-                        activeInboundMessages.forEach(msg => {
-                            const statusClass = getStatusClass(msg.status);
-                            const date = new Date(msg.date_sent || msg.date_created);
-                            const buyerUsername = msg.buyer_username ? 
-                                `<a href="https://www.tiktok.com/@${msg.buyer_username}" target="_blank">@${msg.buyer_username}</a>` : '-';
-                            tableHtml += `
-                                <tr>
-                                    <td>${date.toLocaleString()}</td>
-                                    <td>${msg.from}</td>
-                                    <td>${buyerUsername}</td>
-                                    <td>${msg.recipient || '-'}</td>
-                                    <td>${msg.order_id || '-'}</td>
-                                    <td>${msg.body.substring(0, 50)}${msg.body.length > 50 ? '...' : ''}</td>
-                                    <td class="${statusClass}">${msg.status}</td>
-                                </tr>
-                            `;
-                        });
-                    }
-                    
-                    tableHtml += `
-                            </tbody>
-                        </table>
-                    `;
-                    
-                    // Replace the entire table HTML
-                    tableContainer.innerHTML = tableHtml;
-                    
-                    // Log the new table HTML for debugging
-                    console.log("Completely rebuilt inbound table. Container HTML:", tableContainer.innerHTML.substring(0, 200) + "...");
-                    
-                    // Force a repaint/reflow - extreme measures
-                    setTimeout(() => {
-                        const tempNode = document.createTextNode('');
-                        tableContainer.appendChild(tempNode);
-                        tableContainer.removeChild(tempNode);
-                        console.log("Forced DOM refresh");
-                    }, 20);
-                }
-
-                // Function to load message delivery data
-                function loadMessageData(timeRange) {
-                    fetch('/reports/api/deliverability?hours=' + timeRange)
-                        .then(response => response.json())
-                        .then(data => {
-                            // Update stats (this part remains the same)
-                            document.getElementById('total-messages').textContent = data.stats.total;
-                            document.getElementById('delivered-messages').textContent = data.stats.delivered;
-                            document.getElementById('delivered-percent').textContent = `(${data.stats.delivered_pct}%)`;
-                            document.getElementById('sent-messages').textContent = data.stats.sent;
-                            document.getElementById('sent-percent').textContent = `(${data.stats.sent_pct}%)`;
-                            document.getElementById('failed-messages').textContent = data.stats.failed;
-                            document.getElementById('failed-percent').textContent = `(${data.stats.failed_pct}%)`;
-                            document.getElementById('read-messages').textContent = data.stats.read;
-                            document.getElementById('read-percent').textContent = `(${data.stats.read_pct}%)`;
-                            document.getElementById('received-messages').textContent = data.stats.received;
-                            document.getElementById('received-percent').textContent = `(${data.stats.received_pct}%)`;
-                            document.getElementById('undelivered-messages').textContent = data.stats.undelivered;
-                            document.getElementById('undelivered-percent').textContent = `(${data.stats.undelivered_pct}%)`;
-                            document.getElementById('inbound-messages').textContent = data.stats.inbound;
-
-                            // Filter messages for outbound and inbound tables
-                            activeOutboundMessages = data.messages.filter(msg => msg.direction === 'outbound-api');
-                            console.log("Filtered outbound messages (activeOutboundMessages):", activeOutboundMessages);
-
-                            activeInboundMessages = data.inbound_messages.filter(msg => msg.direction === 'inbound');
-                            console.log("Filtered inbound messages (activeInboundMessages):", activeInboundMessages);
-
-                            // Count and filter undelivered messages
-                            const undeliveredMessages = activeOutboundMessages.filter(msg => msg.status === 'undelivered');
-                            
-                            // Update counts in tabs
-                            document.getElementById('outbound-count').textContent = activeOutboundMessages.length;
-                            document.getElementById('responses-count').textContent = activeInboundMessages.length;
-                            document.getElementById('undelivered-count').textContent = undeliveredMessages.length;
-
-                            // Determine which tab is currently active and render its table
-                            // This is important for the initial load and auto-refresh
-                            if (document.getElementById('outbound-tab').classList.contains('active')) {
-                                renderOutboundTable();
-                            } else if (document.getElementById('inbound-tab').classList.contains('active')) {
-                                renderInboundTable();
-                            } else if (document.getElementById('undelivered-tab').classList.contains('active')) {
-                                renderUndeliveredTable();
-                            }
-
-                        })
-                        .catch(error => {
-                            console.error('Error fetching data:', error);
-                            document.getElementById('delivery-body').innerHTML = 
-                                '<tr><td colspan="7" class="text-center text-danger">Error loading message data. Please try again.</td></tr>';
-                            document.getElementById('inbound-body').innerHTML = 
-                                '<tr><td colspan="7" class="text-center text-danger">Error loading message data. Please try again.</td></tr>';
-                        });
-                }
-            
-                // Helper function to get status class
-                function getStatusClass(status) {
-                    switch(status.toLowerCase()) {
-                        case 'delivered':
-                            return 'status-delivered';
-                        case 'sent':
-                            return 'status-sent';
-                        case 'queued':
-                        case 'sending':
-                        case 'processing':
-                            return 'status-queued';
-                        case 'failed':
-                        case 'undelivered':
-                            return 'status-failed';
-                        case 'read':
-                            return 'status-read';
-                        case 'received':
-                            return 'status-sent';
-                        default:
-                            return '';
-                    }
-                }
-            
-                // Load initial data
-                const timeRange = document.getElementById('timeRangeFilter').value;
-                loadMessageData(timeRange);
-                
-                // Set up change listener for time range filter
-                document.getElementById('timeRangeFilter').addEventListener('change', function() {
-                    loadMessageData(this.value);
-                });
-                
-                // Set up auto-refresh button
-                document.getElementById('refreshButton').addEventListener('click', function() {
-                    this.classList.add('rotate-animation');
-                    const timeRange = document.getElementById('timeRangeFilter').value;
-                    loadMessageData(timeRange);
-                    setTimeout(() => {
-                        this.classList.remove('rotate-animation');
-                    }, 1000);
-                });
-                
-                // Set up auto-refresh every 120 seconds
-                setInterval(function() {
-                    const timeRange = document.getElementById('timeRangeFilter').value;
-                    loadMessageData(timeRange);
-                    const refreshButton = document.getElementById('refreshButton');
-                    refreshButton.classList.add('rotate-animation');
-                    setTimeout(() => {
-                        refreshButton.classList.remove('rotate-animation');
-                    }, 1000);
-                }, 120000);
-
-                // --- NEW DIAGNOSTIC CODE FOR TABS ---
-                const outboundTabButton = document.getElementById('outbound-tab');
-                const inboundTabButton = document.getElementById('inbound-tab');
-                const undeliveredTabButton = document.getElementById('undelivered-tab');
-                const outboundPane = document.getElementById('outbound-messages');
-                const inboundPane = document.getElementById('inbound-messages');
-                const undeliveredPane = document.getElementById('undelivered-messages');
+    # The delivery tab is filled in by static/js/reports.js from api_deliverability
+    campaign_logs = cached_fragment(('reports', 'campaign_logs'), 'reports/_campaign_logs.html', lambda: {
+        'campaign_logs': CampaignLog.query.options(joinedload(CampaignLog.campaign))
+                                          .order_by(CampaignLog.created_at.desc()).limit(20).all()
+    })
+    # 20 most recent file reports, from the report manifest
+    recent_files = cached_fragment(('reports', 'files', _reports_dir()), 'reports/_recent_files.html', lambda: {
+        'reports': report_manifest.list_reports(_reports_dir(), per_page=20)[0]
+    })
+    
+    return render_template('reports/index.html', campaign_logs=campaign_logs, recent_files=recent_files)
 
-                if (outboundTabButton && outboundPane) {
-                    outboundTabButton.addEventListener('show.bs.tab', function (event) {
-                        console.warn('Event: show.bs.tab for Outbound. Target:', event.target.id, 'RelatedTarget:', event.relatedTarget ? event.relatedTarget.id : 'null');
-                    });
-                    outboundTabButton.addEventListener('shown.bs.tab', function (event) {
-                        console.warn('Event: shown.bs.tab for Outbound. Target:', event.target.id, 'RelatedTarget:', event.relatedTarget ? event.relatedTarget.id : 'null');
-                        outboundPane.classList.add('active', 'show');
-                        if (inboundPane) inboundPane.classList.remove('active', 'show');
-                        if (undeliveredPane) undeliveredPane.classList.remove('active', 'show');
-                        renderOutboundTable();
-                        console.log('Outbound Pane classes after shown:', outboundPane.className);
-                        if (inboundPane) console.log('Inbound Pane classes after Outbound shown:', inboundPane.className);
-                        if (undeliveredPane) console.log('Undelivered Pane classes after Outbound shown:', undeliveredPane.className);
-                    });
-                }
-
-                if (inboundTabButton && inboundPane) {
-                    inboundTabButton.addEventListener('show.bs.tab', function (event) {
-                        console.warn('Event: show.bs.tab for Inbound. Target:', event.target.id, 'RelatedTarget:', event.relatedTarget ? event.relatedTarget.id : 'null');
-                    });
-                    inboundTabButton.addEventListener('shown.bs.tab', function (event) {
-                        console.warn('Event: shown.bs.tab for Inbound. Target:', event.target.id, 'RelatedTarget:', event.relatedTarget ? event.relatedTarget.id : 'null');
-                        
-                        // Remove any undelivered force container before switching to inbound tab
-                        const existingUndeliveredContainer = document.getElementById('force-undelivered-container');
-                        if (existingUndeliveredContainer) {
-                            existingUndeliveredContainer.remove();
-                            console.log("Removed undelivered force container when switching to inbound tab");
-                        }
-                        
-                        inboundPane.classList.add('active', 'show');
-                        if (outboundPane) outboundPane.classList.remove('active', 'show');
-                        if (undeliveredPane) undeliveredPane.classList.remove('active', 'show');
-                        renderInboundTable();
-                        
-                        // BRUTE FORCE APPROACH - Create a completely new element to display inbound messages
-                        console.log("Implementing brute force display solution...");
-                        
-                        // Create a container div with forced visibility
-                        const forceContainer = document.createElement('div');
-                        forceContainer.id = 'force-inbound-container';
-                        forceContainer.style.cssText = `
-                            position: relative;
-                            top: 0;
-                            left: 0;
-                            width: 100%;
-                            background-color: white;
-                            z-index: 1000;
-                            padding: 20px;
-                            border: 2px solid #E60517;
-                            box-shadow: 0 0 10px rgba(0,0,0,0.2);
-                            margin-top: 10px;
-                        `;
-                        
-                        // Create a table with simple styling
-                        let tableHTML = `
-                            <h4>Affiliate Responses (Force Display)</h4>
-                            <table style="width:100%; border-collapse: collapse; margin-top: 10px;">
-                                <thead>
-                                    <tr style="background-color: #f2f2f2;">
-                                        <th style="padding: 8px; text-align: left; border: 1px solid #ddd;">Date</th>
-                                        <th style="padding: 8px; text-align: left; border: 1px solid #ddd;">From</th>
-                                        <th style="padding: 8px; text-align: left; border: 1px solid #ddd;">Buyer Username</th>
-                                        <th style="padding: 8px; text-align: left; border: 1px solid #ddd;">Message</th>
-                                        <th style="padding: 8px; text-align: left; border: 1px solid #ddd;">Status</th>
-                                    </tr>
-                                </thead>
-                                <tbody>
-                        `;
-                        
-                        // Add each message to the table
-                        if (activeInboundMessages && activeInboundMessages.length > 0) {
-                            activeInboundMessages.forEach(msg => {
-                                const date = new Date(msg.date_sent || msg.date_created);
-                                const buyerUsername = msg.buyer_username ? 
-                                    `<a href="https://www.tiktok.com/@${msg.buyer_username}" target="_blank" style="color: #E60517;">@${msg.buyer_username}</a>` : '-';
-                                
-                                tableHTML += `
-                                    <tr style="border-bottom: 1px solid #ddd;">
-                                        <td style="padding: 8px; text-align: left; border: 1px solid #ddd;">${date.toLocaleString()}</td>
-                                        <td style="padding: 8px; text-align: left; border: 1px solid #ddd;">${msg.from}</td>
-                                        <td style="padding: 8px; text-align: left; border: 1px solid #ddd;">${buyerUsername}</td>
-                                        <td style="padding: 8px; text-align: left; border: 1px solid #ddd;">${msg.body.substring(0, 50)}${msg.body.length > 50 ? '...' : ''}</td>
-                                        <td style="padding: 8px; text-align: left; border: 1px solid #ddd;">${msg.status}</td>
-                                    </tr>
-                                `;
-                            });
-                        } else {
-                            tableHTML += `
-                                <tr>
-                                    <td colspan="5" style="padding: 8px; text-align: center; border: 1px solid #ddd;">No affiliate responses found</td>
-                                </tr>
-                            `;
-                        }
-                        
-                        tableHTML += `
-                                </tbody>
-                            </table>
-                        `;
-                        
-                        forceContainer.innerHTML = tableHTML;
-                        
-                        // Remove any existing forced container
-                        const existingContainer = document.getElementById('force-inbound-container');
-                        if (existingContainer) {
-                            existingContainer.remove();
-                        }
-                        
-                        // Insert the new container right after the tab content
-                        const tabContent = document.getElementById('delivery');
-                        if (tabContent) {
-                            tabContent.appendChild(forceContainer);
-                            console.log("Force display container added to the DOM");
-                        } else {
-                            console.error("Could not find #delivery element to append force container");
-                            // Plan B: append to the inbound-messages div
-                            inboundPane.appendChild(forceContainer);
-                        }
-                        
-                        console.log('Inbound Pane classes after shown:', inboundPane.className);
-                        if (outboundPane) console.log('Outbound Pane classes after Inbound shown:', outboundPane.className);
-                    });
-                    
-                    // Also handle cleanup when switching back to outbound tab
-                    if (outboundTabButton) {
-                        outboundTabButton.addEventListener('shown.bs.tab', function(event) {
-                            // Remove the forced container when switching to outbound tab
-                            const existingContainer = document.getElementById('force-inbound-container');
-                            if (existingContainer) {
-                                existingContainer.remove();
-                                console.log("Force display container removed");
-                            }
-                        });
-                    }
-                }
-                
-                // Setup event handlers for undelivered tab
-                if (undeliveredTabButton && undeliveredPane) {
-                    undeliveredTabButton.addEventListener('show.bs.tab', function (event) {
-                        console.warn('Event: show.bs.tab for Undelivered. Target:', event.target.id, 'RelatedTarget:', event.relatedTarget ? event.relatedTarget.id : 'null');
-                    });
-                    
-                    undeliveredTabButton.addEventListener('shown.bs.tab', function (event) {
-                        console.warn('Event: shown.bs.tab for Undelivered. Target:', event.target.id, 'RelatedTarget:', event.relatedTarget ? event.relatedTarget.id : 'null');
-                        
-                        // First, remove any inbound force container that might be present
-                        const existingInboundContainer = document.getElementById('force-inbound-container');
-                        if (existingInboundContainer) {
-                            existingInboundContainer.remove();
-                            console.log("Removed inbound force container when switching to undelivered tab");
-                        }
-                        
-                        // Then set proper classes and render table
-                        undeliveredPane.classList.add('active', 'show');
-                        if (outboundPane) outboundPane.classList.remove('active', 'show');
-                        if (inboundPane) inboundPane.classList.remove('active', 'show');
-                        renderUndeliveredTable();
-                        
-                        // Create a dedicated force display for undelivered messages
-                        const forceUndeliveredContainer = document.createElement('div');
-                        forceUndeliveredContainer.id = 'force-undelivered-container';
-                        forceUndeliveredContainer.style.cssText = `
-                            position: relative;
-                            top: 0;
-                            left: 0;
-                            width: 100%;
-                            background-color: white;
-                            z-index: 1000;
-                            padding: 20px;
-                            border: 2px solid #E60517;
-                            box-shadow: 0 0 10px rgba(0,0,0,0.2);
-                            margin-top: 10px;
-                        `;
-                        
-                        // Filter for undelivered messages only
-                        const undeliveredMessages = activeOutboundMessages.filter(msg => msg.status === 'undelivered');
-                        
-                        // Create a table with simple styling for undelivered messages
-                        let tableHTML = `
-                            <h4>Undelivered Messages (Force Display)</h4>
-                            <table style="width:100%; border-collapse: collapse; margin-top: 10px;">
-                                <thead>
-                                    <tr style="background-color: #f2f2f2;">
-                                        <th style="padding: 8px; text-align: left; border: 1px solid #ddd;">Date</th>
-                                        <th style="padding: 8px; text-align: left; border: 1px solid #ddd;">To</th>
-                                        <th style="padding: 8px; text-align: left; border: 1px solid #ddd;">Buyer Username</th>
-                                        <th style="padding: 8px; text-align: left; border: 1px solid #ddd;">Message</th>
-                                        <th style="padding: 8px; text-align: left; border: 1px solid #ddd;">Status</th>
-                                    </tr>
-                                </thead>
-                                <tbody>
-                        `;
-                        
-                        // Add each undelivered message to the table
-                        if (undeliveredMessages && undeliveredMessages.length > 0) {
-                            undeliveredMessages.forEach(msg => {
-                                const date = new Date(msg.date_sent || msg.date_created);
-                                const buyerUsername = msg.buyer_username ? 
-                                    `<a href="https://www.tiktok.com/@${msg.buyer_username}" target="_blank" style="color: #E60517;">@${msg.buyer_username}</a>` : '-';
-                                
-                                tableHTML += `
-                                    <tr style="border-bottom: 1px solid #ddd;">
-                                        <td style="padding: 8px; text-align: left; border: 1px solid #ddd;">${date.toLocaleString()}</td>
-                                        <td style="padding: 8px; text-align: left; border: 1px solid #ddd;">${msg.to}</td>
-                                        <td style="padding: 8px; text-align: left; border: 1px solid #ddd;">${buyerUsername}</td>
-                                        <td style="padding: 8px; text-align: left; border: 1px solid #ddd;">${msg.body.substring(0, 50)}${msg.body.length > 50 ? '...' : ''}</td>
-                                        <td style="padding: 8px; text-align: left; border: 1px solid #ddd;">${msg.status}</td>
-                                    </tr>
-                                `;
-                            });
-                        } else {
-                            tableHTML += `
-                                <tr>
-                                    <td colspan="5" style="padding: 8px; text-align: center; border: 1px solid #ddd;">No undelivered messages found</td>
-                                </tr>
-                            `;
-                        }
-                        
-                        tableHTML += `
-                                </tbody>
-                            </table>
-                        `;
-                        
-                        forceUndeliveredContainer.innerHTML = tableHTML;
-                        
-                        // Remove any existing undelivered force container
-                        const existingUndeliveredContainer = document.getElementById('force-undelivered-container');
-                        if (existingUndeliveredContainer) {
-                            existingUndeliveredContainer.remove();
-                        }
-                        
-                        // Insert the new container right after the tab content
-                        const tabContent = document.getElementById('delivery');
-                        if (tabContent) {
-                            tabContent.appendChild(forceUndeliveredContainer);
-                            console.log("Force display container added for undelivered messages");
-                        } else {
-                            undeliveredPane.appendChild(forceUndeliveredContainer);
-                        }
-                        
-                        console.log('Undelivered Pane classes after shown:', undeliveredPane.className);
-                        if (outboundPane) console.log('Outbound Pane classes after Undelivered shown:', outboundPane.className);
-                        if (inboundPane) console.log('Inbound Pane classes after Undelivered shown:', inboundPane.className);
-                    });
-                }
-                // --- END NEW DIAGNOSTIC CODE ---
-            });
-            
-            // Add rotation animation for refresh button
-            document.head.insertAdjacentHTML('beforeend', `
-                <style>
-                    @keyframes rotate {
-                        from { transform: rotate(0deg); }
-                        to { transform: rotate(360deg); }
-                    }
-                    .rotate-animation {
-                        animation: rotate 1s linear;
-                    }
-                </style>
-            `);
-        </script>
-    </body>
-    </html>
+def _deliverability_response(hours):
     """
-    
-    return make_response(html)
+    Build the deliverability JSON for the last `hours` hours
 
-@bp.route('/api/deliverability')
-@login_required
-def api_deliverability():
-    """API endpoint to get message delivery data from Twilio"""
-    # Get time range parameter (in hours)
-    hours = request.args.get('hours', '24')
-    try:
-        hours = int(hours)
-    except ValueError:
-        hours = 24
-    
+    Returns:
+        tuple: (body, etag, last_modified); last_modified only moves when the body changes
+    """
     # Calculate date range
     end_date = datetime.now()
     start_date = end_date - timedelta(hours=hours)
@@ -1112,216 +54,46 @@ def api_deliverability():
     # For today's date (for percentage calculations)
     today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
     
-    # Log for debugging
     current_app.logger.debug(f"Getting messages from {start_date} to {end_date}")
     
-    # Initialize Twilio client
-    account_sid = current_app.config.get('TWILIO_ACCOUNT_SID')
-    auth_token = current_app.config.get('TWILIO_AUTH_TOKEN')
-    
-    if not account_sid or not auth_token:
-        return {
-            'error': 'Twilio credentials not configured',
-            'messages': [],
-            'inbound_messages': [],
-            'stats': {
-                'total': 0,
-                'delivered': 0,
-                'delivered_pct': 0,
-                'failed': 0,
-                'received': 0,
-                'received_pct': 0,
-                'read': 0,
-                'read_pct': 0,
-                'undelivered_pct': 0,
-                'inbound': 0
-            }
-        }
+    # Filled by the scheduled Twilio sync and webhooks, so this never calls the API
+    conn = get_db_connection(current_app.config['DEFAULT_DB_PATH'])
+    try:
+        data = get_deliverability(
+            conn,
+            start_epoch=int(start_date.timestamp()),
+            end_epoch=int(end_date.timestamp()),
+            today_epoch=int(today_start.timestamp())
+        )
+        # Per-day spend of the days the window touches
+        data['spend'] = get_spend(conn, int(start_date.timestamp()), int(end_date.timestamp()))
+    finally:
+        conn.close()
     
-    client = Client(account_sid, auth_token)
+    body = json.dumps(data, sort_keys=True)
+    etag = hashlib.sha1(body.encode()).hexdigest()
+    previous = current_app.extensions['report_cache'].peek(('deliverability', hours))
+    if previous and previous[1] == etag:
+        return previous
+    return body, etag, end_date.replace(microsecond=0)
+
+# Deliverability windows the API serves, in hours
+DELIVERABILITY_DEFAULT_HOURS = 24
+DELIVERABILITY_MAX_HOURS = 720
+
+@bp.route('/api/deliverability')
+@login_required
+def api_deliverability():
+    """API endpoint to get message delivery data from the synced local message log"""
+    # Get time range parameter (in hours); it keys the report cache, so keep it to a bounded range
+    hours = request.args.get('hours', DELIVERABILITY_DEFAULT_HOURS, type=int) or DELIVERABILITY_DEFAULT_HOURS
+    hours = min(max(hours, 1), DELIVERABILITY_MAX_HOURS)
     
     try:
-        # Get messages within the date range
-        messages = client.messages.list(
-            date_sent_after=start_date,
-            date_sent_before=end_date,
-            limit=100
+        # Polls from every open tab share one computation per TTL
+        body, etag, last_modified = current_app.extensions['report_cache'].get(
+            ('deliverability', hours), lambda: _deliverability_response(hours)
         )
-        
-        # Log basic info for debugging
-        current_app.logger.debug(f"Found {len(messages)} total messages from Twilio")
-        
-        # Debug: Log all message directions to see what's available
-        directions = [msg.direction for msg in messages]
-        current_app.logger.info(f"Message directions found: {set(directions)}")
-        
-        # Count by status
-        total = len(messages)
-        delivered = sum(1 for msg in messages if msg.status == 'delivered')
-        sent = sum(1 for msg in messages if msg.status == 'sent')
-        failed = sum(1 for msg in messages if msg.status == 'failed')
-        undelivered = sum(1 for msg in messages if msg.status == 'undelivered')
-        received = sum(1 for msg in messages if msg.status == 'received')
-        read = sum(1 for msg in messages if msg.status == 'read')
-        
-        # Count by direction
-        inbound = sum(1 for msg in messages if msg.direction == 'inbound')
-        outbound = sum(1 for msg in messages if msg.direction == 'outbound-api')
-        
-        # Log direction counts
-        current_app.logger.info(f"Direction counts - inbound: {inbound}, outbound: {outbound}")
-        
-        # Today's counts for percentage calculations
-        today_messages = [msg for msg in messages if msg.date_created and msg.date_created.replace(tzinfo=None) >= today_start]
-        today_total = len(today_messages)
-        today_delivered = sum(1 for msg in today_messages if msg.status == 'delivered')
-        today_sent = sum(1 for msg in today_messages if msg.status == 'sent')
-        today_failed = sum(1 for msg in today_messages if msg.status == 'failed')
-        today_received = sum(1 for msg in today_messages if msg.status == 'received')
-        today_read = sum(1 for msg in today_messages if msg.status == 'read')
-        today_undelivered = sum(1 for msg in today_messages if msg.status == 'undelivered')
-        
-        # Calculate percentages
-        delivered_pct = (today_delivered / today_total * 100) if today_total > 0 else 0
-        sent_pct = (today_sent / today_total * 100) if today_total > 0 else 0
-        failed_pct = (today_failed / today_total * 100) if today_total > 0 else 0
-        received_pct = (today_received / today_total * 100) if today_total > 0 else 0
-        read_pct = (today_read / today_total * 100) if today_total > 0 else 0
-        undelivered_pct = (today_undelivered / today_total * 100) if today_total > 0 else 0
-        
-        # Log status and direction counts for debugging
-        current_app.logger.debug(f"Message status counts - delivered: {delivered}, failed: {failed}, queued: {sent}, received: {received}")
-        current_app.logger.debug(f"Message direction counts - outbound: {outbound}, inbound: {inbound}")
-        
-        # Log a sample message for debugging
-        if messages:
-            sample = messages[0]
-            current_app.logger.debug(f"Sample message - SID: {sample.sid}, Status: {sample.status}, Direction: {sample.direction}")
-            current_app.logger.debug(f"From: {sample.from_}, To: {sample.to}, Body: {sample.body}")
-        
-        # Format messages for JSON response
-        formatted_messages = []
-        inbound_messages = []
-        
-        # Debug counts before processing
-        current_app.logger.info(f"Messages by direction before processing - inbound: {sum(1 for msg in messages if msg.direction == 'inbound')}, outbound-api: {sum(1 for msg in messages if msg.direction == 'outbound-api')}")
-        
-        # Connect to the database - use SQLAlchemy session
-        import sqlite3
-        conn = sqlite3.connect('affiliates.db')
-        conn.row_factory = sqlite3.Row
-        
-        for msg in messages:
-            # Debug: Log each message direction for troubleshooting
-            current_app.logger.debug(f"Processing message {msg.sid} - Direction: {msg.direction}, Status: {msg.status}")
-            
-            # Skip messages that aren't inbound or outbound-api
-            if msg.direction not in ['inbound', 'outbound-api']:
-                current_app.logger.debug(f"Skipping message {msg.sid} with direction {msg.direction}")
-                continue
-                
-            # Get the phone number, stripping off any whatsapp: prefix
-            phone_number = (msg.to if msg.direction == 'outbound-api' else msg.from_)
-            if phone_number:
-                # Strip the whatsapp: prefix and any leading +
-                stripped_phone = phone_number.replace('whatsapp:', '').replace('+', '')
-                
-                try:
-                    # Query for buyer information
-                    cursor = conn.cursor()
-                    cursor.execute(
-                        "SELECT buyer_username, order_id, recipient FROM orders WHERE phone_number = ? OR phone_number = ? OR phone_number = ? ORDER BY last_updated DESC LIMIT 1",
-                        (stripped_phone, phone_number, '+' + stripped_phone)
-                    )
-                    buyer_info = cursor.fetchone()
-                    
-                    buyer_username = buyer_info['buyer_username'] if buyer_info else None
-                    order_id = buyer_info['order_id'] if buyer_info else None
-                    recipient = buyer_info['recipient'] if buyer_info else None
-                    
-                    message_data = {
-                        'sid': msg.sid,
-                        'to': msg.to,
-                        'from': msg.from_,
-                        'body': msg.body,
-                        'status': msg.status,
-                        'direction': msg.direction,
-                        'error_code': msg.error_code,
-                        'error_message': msg.error_message,
-                        'date_created': msg.date_created.isoformat() if msg.date_created else None,
-                        'date_sent': msg.date_sent.isoformat() if msg.date_sent else None,
-                        'date_updated': msg.date_updated.isoformat() if msg.date_updated else None,
-                        'price': msg.price,
-                        'buyer_username': buyer_username,
-                        'recipient': recipient,
-                        'order_id': order_id
-                    }
-                    
-                    # Add to appropriate list based on direction - strictly enforce the direction check
-                    if msg.direction == 'inbound':
-                        inbound_messages.append(message_data)
-                        current_app.logger.debug(f"Added message {msg.sid} to inbound_messages")
-                    elif msg.direction == 'outbound-api':
-                        formatted_messages.append(message_data)
-                        current_app.logger.debug(f"Added message {msg.sid} to formatted_messages")
-                
-                except Exception as e:
-                    current_app.logger.debug(f"DEBUG ERROR: {str(e)}")
-                    # Add the message even if we can't get buyer info
-                    message_data = {
-                        'sid': msg.sid,
-                        'to': msg.to,
-                        'from': msg.from_,
-                        'body': msg.body,
-                        'status': msg.status,
-                        'direction': msg.direction,
-                        'error_code': msg.error_code,
-                        'error_message': msg.error_message,
-                        'date_created': msg.date_created.isoformat() if msg.date_created else None,
-                        'date_sent': msg.date_sent.isoformat() if msg.date_sent else None,
-                        'date_updated': msg.date_updated.isoformat() if msg.date_updated else None,
-                        'price': msg.price,
-                        'buyer_username': None,
-                        'recipient': None,
-                        'order_id': None
-                    }
-                    
-                    # Add to appropriate list based on direction - strictly enforce the direction check
-                    if msg.direction == 'inbound':
-                        inbound_messages.append(message_data)
-                        current_app.logger.debug(f"Added message {msg.sid} to inbound_messages (error handling)")
-                    elif msg.direction == 'outbound-api':
-                        formatted_messages.append(message_data)
-                        current_app.logger.debug(f"Added message {msg.sid} to formatted_messages (error handling)")
-                    else:
-                        current_app.logger.debug(f"Message {msg.sid} with direction {msg.direction} not added to any list (error handling)")
-        
-        # Close the database connection
-        conn.close()
-        
-        # Log final counts for debugging
-        current_app.logger.info(f"Final counts - outbound: {len(formatted_messages)}, inbound: {len(inbound_messages)}")
-        
-        return {
-            'messages': formatted_messages,
-            'inbound_messages': inbound_messages,
-            'stats': {
-                'total': total,
-                'delivered': delivered,
-                'delivered_pct': round(delivered_pct, 1),
-                'sent': sent,
-                'sent_pct': round(sent_pct, 1),
-                'failed': failed,
-                'failed_pct': round(failed_pct, 1),
-                'undelivered': undelivered,
-                'received': received,
-                'received_pct': round(received_pct, 1),
-                'read': read,
-                'read_pct': round(read_pct, 1),
-                'undelivered_pct': round(undelivered_pct, 1),
-                'inbound': inbound
-            }
-        }
     except Exception as e:
         current_app.logger.error(f"Error in API: {str(e)}")
         return {
@@ -1341,6 +113,14 @@ def api_deliverability():
                 'inbound': 0
             }
         }
+    
+    # Unchanged polls get a 304 with no body
+    response = current_app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
 @bp.route('/campaigns')
 @login_required
@@ -1378,12 +158,10 @@ def campaigns():
         query = query.filter(CampaignLog.status == status)
         
     # Execute query
-    logs = query.order_by(CampaignLog.created_at.desc()).all()
+    logs = query.options(joinedload(CampaignLog.campaign)).order_by(CampaignLog.created_at.desc()).all()
     
     # Calculate statistics
-    total_recipients = sum(log.recipients_total for log in logs)
-    total_success = sum(log.recipients_success for log in logs)
-    total_failed = sum(log.recipients_failed for log in logs)
+    total_recipients, total_success, total_failed = _sum_logs(query)
     success_rate = round(total_success / total_recipients * 100, 1) if total_recipients > 0 else 0
     
     return render_template('reports/campaigns.html',
@@ -1396,77 +174,171 @@ def campaigns():
                           total_failed=total_failed,
                           success_rate=success_rate)
 
+def _sum_logs(query):
+    """Recipients (total, successful, failed) over a CampaignLog query, summed by the database"""
+    totals = query.with_entities(
+        func.coalesce(func.sum(CampaignLog.recipients_total), 0),
+        func.coalesce(func.sum(CampaignLog.recipients_success), 0),
+        func.coalesce(func.sum(CampaignLog.recipients_failed), 0)
+    ).order_by(None).one()
+    return tuple(int(total) for total in totals)
+
 @bp.route('/files')
 @login_required
 def files():
-    """List all file reports"""
-    # Get all report files
-    reports_dir = os.path.join(current_app.root_path, '..', 'reports')
-    if not os.path.exists(reports_dir):
-        return render_template('reports/files.html', reports=[])
-    
-    files = [f for f in os.listdir(reports_dir) if f.endswith('.txt')]
-    reports = []
-    
-    for file in files:
-        # Extract date from filename
-        match = re.search(r'(\d{2}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2})', file)
-        if match:
-            date_str = match.group(1)
-            try:
-                date = datetime.strptime(date_str, '%d-%m-%y_%H-%M-%S')
-                
-                # Extract status from filename if present
-                status_match = re.search(r'status_([A-Z]+)', file)
-                status = status_match.group(1) if status_match else None
-                
-                # Check if it's a dry run
-                is_dry_run = 'dry_run' in file
-                
-                # Check if force mode was used
-                force_mode = 'force' in file
-                
-                reports.append({
-                    'filename': file,
-                    'date': date,
-                    'status': status,
-                    'is_dry_run': is_dry_run,
-                    'force_mode': force_mode
-                })
-            except Exception:
-                # Skip files with invalid date format
-                continue
-    
-    # Sort by date (newest first)
-    reports.sort(key=lambda x: x['date'], reverse=True)
+    """List report files from the report manifest, newest first"""
+    page = request.args.get('page', 1, type=int)
+    per_page = 50
+    mode = request.args.get('mode') or None
+    status = request.args.get('status') or None
+    start_date_str = request.args.get('start_date') or ''
+    end_date_str = request.args.get('end_date') or ''
+    start_epoch, end_epoch = _date_range_epochs(start_date_str, end_date_str)
+    
+    reports, total = report_manifest.list_reports(
+        _reports_dir(),
+        start_epoch=start_epoch,
+        end_epoch=end_epoch,
+        mode=mode,
+        order_status=status,
+        page=page,
+        per_page=per_page
+    )
+    
+    return render_template('reports/files.html',
+                          reports=reports,
+                          total=total,
+                          page=page,
+                          total_pages=(total + per_page - 1) // per_page,
+                          mode=mode,
+                          status=status,
+                          start_date=start_date_str,
+                          end_date=end_date_str)
+
+def _date_range_epochs(start_date_str, end_date_str):
+    """Epochs from the start of start_date to the end of end_date; an invalid date is ignored like a missing one"""
+    try:
+        start_epoch = int(datetime.strptime(start_date_str, '%Y-%m-%d').timestamp()) if start_date_str else None
+    except ValueError:
+        start_epoch = None
+    try:
+        end_date = datetime.strptime(end_date_str, '%Y-%m-%d').replace(hour=23, minute=59, second=59)
+        end_epoch = int(end_date.timestamp())
+    except ValueError:
+        end_epoch = None
+    return start_epoch, end_epoch
+
+@bp.route('/export')
+@login_required
+def export_data():
+    """Stream the send history, status events or contacts as CSV or JSON Lines"""
+    dataset = request.args.get('dataset', 'messages')
+    fmt = request.args.get('format', exports.CSV)
+    start_date_str = request.args.get('start_date') or ''
+    end_date_str = request.args.get('end_date') or ''
+    start_epoch, end_epoch = _date_range_epochs(start_date_str, end_date_str)
+    campaign_id = request.args.get('campaign_id', type=int)
     
-    return render_template('reports/files.html', reports=reports)
+    try:
+        chunks = exports.stream_export(current_app.config['DEFAULT_DB_PATH'], dataset, fmt,
+                                       start_epoch=start_epoch, end_epoch=end_epoch, campaign_id=campaign_id)
+    except ValueError:
+        abort(400)
+    
+    # No Content-Length, so the export is sent chunked as rows are read. Only dates
+    # that parsed go in the file name, written back out rather than echoed
+    name_parts = [dataset]
+    if campaign_id:
+        name_parts.append(f"campaign_{campaign_id}")
+    if start_epoch is not None:
+        name_parts.append(datetime.fromtimestamp(start_epoch).strftime('%Y-%m-%d'))
+    if end_epoch is not None:
+        name_parts.append(datetime.fromtimestamp(end_epoch).strftime('%Y-%m-%d'))
+    return Response(stream_with_context(chunks), mimetype=exports.FORMATS[fmt],
+                    headers={'Content-Disposition': f"attachment; filename={'_'.join(name_parts)}.{fmt}"})
 
 @bp.route('/view/<filename>')
 @login_required
 def view_report(filename):
-    """View a specific report file"""
+    """View one page of a report file"""
     # Sanitize filename to prevent directory traversal
     if '..' in filename or '/' in filename:
         abort(404)
         
-    reports_dir = os.path.join(current_app.root_path, '..', 'reports')
+    reports_dir = _reports_dir()
     file_path = os.path.join(reports_dir, filename)
     
-    if not os.path.exists(file_path):
+    # Older reports may have been compressed or archived; they are decompressed as they are read
+    if not report_storage.report_exists(file_path):
         abort(404)
     
-    # Read file content
-    with open(file_path, 'r') as f:
-        content = f.read()
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = 100
+    start = (page - 1) * per_page
     
-    # Parse the report content
+    # Pages are read through the report's offset index, so only this page is loaded
     report_info = {
         'filename': filename,
-        'content': content
+        'is_journal': run_journal.is_journal(filename),
+        'entries': report_index.entry_count(file_path),
+        'first': start + 1
     }
+    report_info['last'] = min(start + per_page, report_info['entries'])
+    if report_info['is_journal']:
+        report_info['records'] = report_index.read_journal_page(file_path, start, per_page)
+        meta = _journal_meta(file_path)
+    else:
+        report_info['content'] = report_index.read_text_page(file_path, start, per_page)
+        meta = _manifest_meta(reports_dir, filename) or _parse_report_meta(_report_head_and_tail(file_path))
+    
+    report_info['meta'] = meta
     
-    # Try to extract metadata
+    return render_template('reports/view.html',
+                          report=report_info,
+                          page=page,
+                          total_pages=max((report_info['entries'] + per_page - 1) // per_page, 1))
+
+def _manifest_meta(reports_dir, filename):
+    """Metadata recorded in the manifest when the report was written"""
+    manifest_entry = report_manifest.get_report(reports_dir, filename)
+    if not manifest_entry:
+        return None
+    meta = {
+        'mode': 'DRY RUN (no messages actually sent)' if manifest_entry['is_dry_run'] else 'LIVE RUN',
+        'generated': manifest_entry['date'].strftime('%Y-%m-%d %H:%M:%S'),
+        'total_unique_recipients': manifest_entry['total'],
+        'successful': manifest_entry['successful'],
+        'failed': manifest_entry['failed'],
+    }
+    if manifest_entry['status']:
+        meta['status'] = manifest_entry['status']
+    if manifest_entry['elapsed_time'] is not None:
+        meta['time_elapsed'] = f"{manifest_entry['elapsed_time']:.2f} seconds"
+    return meta
+
+def _report_head_and_tail(file_path, size=4096):
+    """Start and end of a text report, where its header and summary are"""
+    with report_storage.open_report(file_path) as f:
+        head = f.read(size)
+        tail = report_storage.read_tail(f, size)
+    return (head + b'\n' + tail).decode('utf-8', errors='replace')
+
+def _journal_meta(file_path):
+    """Metadata from a journal's header and footer"""
+    header, footer = run_journal.read_header_footer(file_path)
+    meta = {
+        'mode': 'DRY RUN (no messages actually sent)' if header.get('dry_run') else 'LIVE RUN',
+        'generated': header.get('generated', '').replace('T', ' '),
+    }
+    if header.get('order_status'):
+        meta['status'] = header['order_status']
+    if footer:
+        meta.update(total_unique_recipients=footer['total'], successful=footer['successful'], failed=footer['failed'],
+                    time_elapsed=f"{footer['elapsed_time']:.2f} seconds")
+    return meta
+
+def _parse_report_meta(content):
+    """Metadata scraped from the text of a report missing from the manifest"""
     meta = {}
     try:
         lines = content.split('\n')
@@ -1490,10 +362,7 @@ def view_report(filename):
     except Exception:
         # If parsing fails, just use the raw content
         pass
-    
-    report_info['meta'] = meta
-    
-    return render_template('reports/view.html', report=report_info)
+    return meta
 
 @bp.route('/download/<filename>')
 @login_required
@@ -1503,31 +372,70 @@ def download_report(filename):
     if '..' in filename or '/' in filename:
         abort(404)
         
-    reports_dir = os.path.join(current_app.root_path, '..', 'reports')
+    reports_dir = _reports_dir()
     file_path = os.path.join(reports_dir, filename)
     
-    if not os.path.exists(file_path):
+    if not report_storage.report_exists(file_path):
         abort(404)
     
-    return send_file(file_path, as_attachment=True)
+    # The text version of a journal is rendered as it is sent
+    if run_journal.is_journal(filename) and request.args.get('format') == 'txt':
+        text_name = filename[:-len(run_journal.JOURNAL_EXTENSION)] + '.txt'
+        return Response(stream_with_context(run_journal.text_report(file_path)), mimetype='text/plain',
+                        headers={'Content-Disposition': f'attachment; filename={text_name}'})
+    
+    # Compressed and archived reports are decompressed as they are sent
+    if not os.path.exists(file_path):
+        return Response(stream_with_context(report_storage.iter_report(file_path)),
+                        mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+                        headers={'Content-Disposition': f'attachment; filename={filename}'})
+    
+    # Conditional, so clients can resume with Range requests and revalidate with ETag/If-Modified-Since
+    return send_file(file_path, as_attachment=True, conditional=True, max_age=0)
 
 @bp.route('/campaign/<int:id>')
 @login_required
 def campaign_report(id):
     """View a specific campaign report"""
-    campaign = Campaign.query.get_or_404(id)
+    campaign = Campaign.query.options(joinedload(Campaign.template)).get_or_404(id)
     logs = campaign.logs.order_by(CampaignLog.created_at.desc()).all()
     
     # Calculate statistics
-    total_recipients = sum(log.recipients_total for log in logs)
-    total_success = sum(log.recipients_success for log in logs)
-    total_failed = sum(log.recipients_failed for log in logs)
+    total_recipients, total_success, total_failed = _sum_logs(campaign.logs)
     success_rate = round(total_success / total_recipients * 100, 1) if total_recipients > 0 else 0
     
+    # Delivery outcome of every message the campaign sent, from the daily rollups.
+    # The campaign's database is only read, so a moved or mistyped path is
+    # reported rather than created
+    delivery = {'statuses': {}, 'errors': {}, 'total': 0}
+    funnel = {'total': {}, 'errors': {}, 'runs': []}
+    spend = []
+    if not campaign.db_path or not os.path.isfile(campaign.db_path):
+        flash(f"Campaign database not found: {campaign.db_path}", 'warning')
+    else:
+        try:
+            conn = get_read_only_connection(campaign.db_path)
+            try:
+                delivery = get_campaign_statuses(conn, campaign.id)
+                funnel = get_campaign_funnel(conn, campaign.id)
+                spend = get_spend(conn, 0, int(datetime.now().timestamp()), group_by='country',
+                                  campaign_id=campaign.id)
+            finally:
+                conn.close()
+        except Exception as e:
+            current_app.logger.error(f"Error reading campaign delivery statuses: {str(e)}")
+    
+    # Funnel of each run, by the CampaignLog row it produced
+    run_funnels = {run['campaign_log_id']: run for run in funnel['runs'] if run['campaign_log_id']}
+    
     return render_template('reports/campaign.html',
                           campaign=campaign,
                           logs=logs,
                           total_recipients=total_recipients,
                           total_success=total_success,
                           total_failed=total_failed,
-                          success_rate=success_rate) 
\ No newline at end of file
+                          success_rate=success_rate,
+                          delivery=delivery,
+                          funnel=funnel,
+                          run_funnels=run_funnels,
+                          spend=spend) 
\ No newline at end of file
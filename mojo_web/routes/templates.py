@@ -1,10 +1,11 @@
 """
 Templates routes
 """
-from flask import Blueprint, render_template, request, redirect, url_for, flash, make_response
+from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_required
 from mojo_web import db
 from mojo_web.models import Template
+from mojo_web.cache import cached_fragment
 from mojo_core.twilio_client import twilio_client
 
 bp = Blueprint('templates', __name__, url_prefix='/templates')
@@ -13,196 +14,11 @@ bp = Blueprint('templates', __name__, url_prefix='/templates')
 @login_required
 def index():
     """List all templates"""
-    templates = Template.query.order_by(Template.name).all()
+    table = cached_fragment(('templates', 'table'), 'templates/_table.html', lambda: {
+        'templates': Template.query.order_by(Template.name).all()
+    })
     
-    # Generate direct HTML response
-    html = """
-    <!DOCTYPE html>
-    <html lang="en">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>Templates - MOJO WhatsApp Manager</title>
-        
-        <!-- Bootstrap CSS -->
-        <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/css/bootstrap.min.css" rel="stylesheet">
-        <link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0-beta3/css/all.min.css">
-        
-        <style>
-            :root {
-                --mojo-dark: #272D45;
-                --mojo-red: #E60517;
-                --mojo-dark-red: #87000A;
-            }
-            
-            body {
-                background-color: #f5f5f5;
-            }
-            
-            .navbar {
-                background-color: var(--mojo-dark);
-            }
-            
-            .logo-text {
-                color: white;
-                font-weight: bold;
-                font-size: 24px;
-            }
-            
-            .btn-primary {
-                background-color: var(--mojo-red);
-                border-color: var(--mojo-red);
-            }
-            
-            .btn-primary:hover {
-                background-color: var(--mojo-dark-red);
-                border-color: var(--mojo-dark-red);
-            }
-            
-            .logout-btn {
-                color: white;
-                text-decoration: none;
-            }
-            
-            .logout-btn:hover {
-                color: #f8f9fa;
-            }
-            
-            .table th {
-                background-color: var(--mojo-dark);
-                color: white;
-            }
-        </style>
-    </head>
-    <body>
-        <!-- Navbar -->
-        <nav class="navbar navbar-dark py-3">
-            <div class="container">
-                <span class="navbar-brand logo-text">
-                    <div style="background: var(--mojo-red); color: white; display: inline-block; width: 40px; height: 40px; border-radius: 50%; text-align: center; line-height: 40px; margin-right: 10px;">M</div>
-                    MOJO WhatsApp Manager
-                </span>
-                <div>
-                    <a href="/" class="btn btn-outline-light me-2">Dashboard</a>
-                    <a href="/auth/logout" class="logout-btn">
-                        <i class="fas fa-sign-out-alt"></i> Logout
-                    </a>
-                </div>
-            </div>
-        </nav>
-        
-        <!-- Main Content -->
-        <div class="container mt-4">
-            <div class="row mb-4">
-                <div class="col-md-6">
-                    <h2>Templates</h2>
-                    <p class="text-muted">Manage WhatsApp message templates</p>
-                </div>
-                <div class="col-md-6 text-end">
-                    <a href="/templates/create" class="btn btn-primary">
-                        <i class="fas fa-plus"></i> Sync Templates from Twilio
-                    </a>
-                </div>
-            </div>
-            
-            <div class="card">
-                <div class="card-body">
-                    <div class="table-responsive">
-                        <table class="table table-striped">
-                            <thead>
-                                <tr>
-                                    <th>Name</th>
-                                    <th>Template SID</th>
-                                    <th>Description</th>
-                                    <th>Variables</th>
-                                    <th>Status</th>
-                                    <th>Actions</th>
-                                </tr>
-                            </thead>
-                            <tbody>
-    """
-    
-    # Add template rows
-    if templates:
-        for template in templates:
-            variables = ", ".join(template.variables) if template.variables else "None"
-            status = '<span class="badge bg-success">Active</span>' if template.is_active else '<span class="badge bg-secondary">Inactive</span>'
-            
-            html += f"""
-                                <tr>
-                                    <td>{template.name}</td>
-                                    <td><code>{template.template_sid}</code></td>
-                                    <td>{template.description or 'N/A'}</td>
-                                    <td>{variables}</td>
-                                    <td>{status}</td>
-                                    <td>
-                                        <a href="/templates/{template.id}/edit" class="btn btn-sm btn-outline-primary">
-                                            <i class="fas fa-edit"></i>
-                                        </a>
-                                        <button type="button" class="btn btn-sm btn-outline-danger" 
-                                                onclick="confirmDelete({template.id}, '{template.name}')">
-                                            <i class="fas fa-trash"></i>
-                                        </button>
-                                    </td>
-                                </tr>
-            """
-    else:
-        html += """
-                                <tr>
-                                    <td colspan="6" class="text-center">No templates found. Click "Sync Templates from Twilio" to import templates.</td>
-                                </tr>
-        """
-    
-    html += """
-                            </tbody>
-                        </table>
-                    </div>
-                </div>
-            </div>
-            
-            <div class="row mt-4">
-                <div class="col-md-12 text-center">
-                    <p class="text-muted">MOJO WhatsApp Manager | Version 1.0</p>
-                </div>
-            </div>
-        </div>
-        
-        <!-- Delete Confirmation Modal -->
-        <div class="modal fade" id="deleteModal" tabindex="-1" aria-hidden="true">
-            <div class="modal-dialog">
-                <div class="modal-content">
-                    <div class="modal-header bg-danger text-white">
-                        <h5 class="modal-title">Confirm Delete</h5>
-                        <button type="button" class="btn-close" data-bs-dismiss="modal" aria-label="Close"></button>
-                    </div>
-                    <div class="modal-body">
-                        Are you sure you want to delete the template <span id="templateName"></span>?
-                    </div>
-                    <div class="modal-footer">
-                        <button type="button" class="btn btn-secondary" data-bs-dismiss="modal">Cancel</button>
-                        <form id="deleteForm" method="POST">
-                            <button type="submit" class="btn btn-danger">Delete</button>
-                        </form>
-                    </div>
-                </div>
-            </div>
-        </div>
-        
-        <!-- Bootstrap JavaScript -->
-        <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/js/bootstrap.bundle.min.js"></script>
-        
-        <script>
-            function confirmDelete(id, name) {
-                document.getElementById('deleteForm').action = `/templates/${id}/delete`;
-                document.getElementById('templateName').textContent = name;
-                new bootstrap.Modal(document.getElementById('deleteModal')).show();
-            }
-        </script>
-    </body>
-    </html>
-    """
-    
-    return make_response(html)
+    return render_template('templates/index.html', table=table)
 
 @bp.route('/create', methods=['GET', 'POST'])
 @login_required
@@ -0,0 +1,85 @@
+"""
+Twilio webhook routes
+
+Twilio posts message status callbacks and incoming WhatsApp messages here.
+These routes are called by Twilio, not by a logged-in user, so they are
+exempt from the login redirect and CSRF protection; every request is
+authenticated by its X-Twilio-Signature instead.
+
+Events are queued for the app's StatusWriter rather than written inline, so
+a burst of callbacks costs one transaction per batch. When the queue is full
+the webhook answers 503 and Twilio retries the callback later.
+"""
+from functools import wraps
+from flask import Blueprint, request, current_app, abort
+from twilio.request_validator import RequestValidator
+from mojo_web import csrf
+from mojo_core.status_store import status_event, inbound_event
+from mojo_core.status_writer import STATUS, INBOUND
+
+bp = Blueprint('webhooks', __name__, url_prefix='/webhooks')
+csrf.exempt(bp)
+
+def _signed_url():
+    """
+    URL Twilio signed the request with
+
+    Behind a proxy or tunnel the public URL differs from request.url, so
+    TWILIO_WEBHOOK_BASE_URL (e.g. https://mojo.example.com) replaces the host.
+    """
+    base_url = current_app.config.get('TWILIO_WEBHOOK_BASE_URL')
+    if not base_url:
+        return request.url
+    query = request.query_string.decode()
+    return base_url.rstrip('/') + request.path + (f"?{query}" if query else '')
+
+def twilio_signature_required(view):
+    """Reject requests that don't carry a valid X-Twilio-Signature"""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if current_app.config.get('TWILIO_VALIDATE_WEBHOOKS', True):
+            validator = RequestValidator(current_app.config.get('TWILIO_AUTH_TOKEN') or '')
+            signature = request.headers.get('X-Twilio-Signature', '')
+            if not validator.validate(_signed_url(), request.form, signature):
+                current_app.logger.warning(f"Rejected webhook with invalid signature: {request.path}")
+                abort(403)
+        return view(*args, **kwargs)
+    return wrapped
+
+def _queue_event(kind, event):
+    """Hand an event to the background writer; False if its queue is full"""
+    if current_app.extensions['status_writer'].submit(kind, event):
+        return True
+    current_app.logger.warning(f"Webhook queue full, asking Twilio to retry {request.path}")
+    return False
+
+def _busy():
+    """503 response; Twilio retries webhooks that fail"""
+    return 'Busy, retry later', 503, {'Retry-After': '5'}
+
+@bp.route('/twilio/status', methods=['POST'])
+@twilio_signature_required
+def twilio_status():
+    """Record a message status callback (MessageStatus/ErrorCode transition)"""
+    event = status_event(request.form)
+    if event is None:
+        return 'Missing MessageSid or MessageStatus', 400
+
+    if not _queue_event(STATUS, event):
+        return _busy()
+
+    return '', 204
+
+@bp.route('/twilio/inbound', methods=['POST'])
+@twilio_signature_required
+def twilio_inbound():
+    """Record an incoming WhatsApp message"""
+    message = inbound_event(request.form)
+    if message is None:
+        return 'Missing MessageSid', 400
+
+    if not _queue_event(INBOUND, message):
+        return _busy()
+
+    # Empty TwiML: acknowledge without replying
+    return '<Response></Response>', 200, {'Content-Type': 'text/xml'}
@@ -0,0 +1,95 @@
+/*
+ * Campaign create/edit form: template variables, live audience count and cost estimate
+ */
+(function () {
+  'use strict';
+
+  // Show the variable fields for the selected template only
+  var templateSelect = document.getElementById('template_id');
+  if (templateSelect) {
+    templateSelect.addEventListener('change', function () {
+      document.querySelectorAll('.template-variables').forEach(function (group) {
+        var selected = group.dataset.templateId === templateSelect.value;
+        group.hidden = !selected;
+        group.querySelectorAll('input').forEach(function (input) {
+          input.disabled = !selected;
+        });
+      });
+    });
+  }
+
+  var preview = document.getElementById('audience-preview');
+  if (!preview) {
+    return;
+  }
+
+  var countEl = document.getElementById('audience-count');
+  var costEl = document.getElementById('audience-cost');
+  var errorEl = document.getElementById('audience-error');
+  var timer = null;
+  var controller = null;
+
+  function audienceParams() {
+    var params = new URLSearchParams();
+    ['template_id', 'db_path', 'order_status', 'filter_conditions', 'recipient_limit'].forEach(function (name) {
+      params.set(name, document.getElementById(name).value);
+    });
+    if (document.getElementById('force_flag').checked) {
+      params.set('force_flag', '1');
+    }
+    return params;
+  }
+
+  function formatCost(amount, unit) {
+    return amount.toLocaleString(undefined, { minimumFractionDigits: 2, maximumFractionDigits: 2 }) +
+      (unit ? ' ' + unit.toUpperCase() : '');
+  }
+
+  // Audience size times the recent average price of a sent message
+  function showCost(cost) {
+    costEl.hidden = !cost;
+    if (!cost) {
+      return;
+    }
+    costEl.textContent = 'Estimated cost ' + formatCost(cost.total, cost.price_unit) +
+      ' (' + cost.per_message + ' per message, from ' + cost.based_on.toLocaleString() + ' recent priced messages)' +
+      (cost.over_limit ? ' – over the ' + formatCost(cost.limit, cost.price_unit) + ' spend limit' : '');
+    costEl.classList.toggle('text-danger', cost.over_limit);
+  }
+
+  function refresh() {
+    // Only the latest request matters while the user is typing
+    if (controller) {
+      controller.abort();
+    }
+    controller = new AbortController();
+
+    fetch(preview.dataset.url + '?' + audienceParams().toString(), { signal: controller.signal })
+      .then(function (response) { return response.json(); })
+      .then(function (data) {
+        countEl.textContent = data.error ? '–' : data.count.toLocaleString();
+        errorEl.textContent = data.error || '';
+        errorEl.hidden = !data.error;
+        showCost(data.error ? null : data.cost);
+      })
+      .catch(function (err) {
+        if (err.name !== 'AbortError') {
+          errorEl.textContent = 'Could not load audience size';
+          errorEl.hidden = false;
+        }
+      });
+  }
+
+  document.querySelectorAll('.audience-input').forEach(function (input) {
+    input.addEventListener('input', function () {
+      clearTimeout(timer);
+      timer = setTimeout(refresh, 300);
+    });
+    input.addEventListener('change', refresh);
+  });
+  if (templateSelect) {
+    templateSelect.addEventListener('change', refresh);
+  }
+
+  refresh();
+})();
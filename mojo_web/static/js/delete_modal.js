@@ -0,0 +1,14 @@
+/*
+ * Delete buttons on the listing pages: confirm in _delete_modal.html, then post
+ */
+(function () {
+  'use strict';
+
+  document.querySelectorAll('[data-delete-url]').forEach(function (button) {
+    button.addEventListener('click', function () {
+      document.getElementById('deleteForm').action = button.dataset.deleteUrl;
+      document.getElementById('deleteName').textContent = button.dataset.name;
+      new bootstrap.Modal(document.getElementById('deleteModal')).show();
+    });
+  });
+})();
@@ -0,0 +1,506 @@
+/*
+ * Reports dashboard: polls the deliverability API and fills the message tables
+ */
+// Initialize page
+document.addEventListener('DOMContentLoaded', function() {
+    let activeOutboundMessages = [];
+    let activeInboundMessages = [];
+
+    // Function to populate outbound messages table
+    function renderOutboundTable() {
+        const outboundBody = document.getElementById('delivery-body');
+        outboundBody.innerHTML = ''; // Clear existing
+        let newHtml = '';
+        if (activeOutboundMessages.length === 0) {
+            newHtml = '<tr><td colspan="7" class="text-center">No outbound messages found for the selected time period.</td></tr>';
+        } else {
+            activeOutboundMessages.forEach(msg => {
+                const statusClass = getStatusClass(msg.status);
+                const date = new Date(msg.date_sent || msg.date_created);
+                const buyerUsername = msg.buyer_username ?
+                    `<a href="https://www.tiktok.com/@${msg.buyer_username}" target="_blank">@${msg.buyer_username}</a>` : '-';
+                newHtml += `
+                    <tr>
+                        <td>${date.toLocaleString()}</td>
+                        <td>${msg.to}</td>
+                        <td>${buyerUsername}</td>
+                        <td>${msg.recipient || '-'}</td>
+                        <td>${msg.order_id || '-'}</td>
+                        <td>${msg.body.substring(0, 50)}${msg.body.length > 50 ? '...' : ''}</td>
+                        <td class="${statusClass}">${msg.status}</td>
+                    </tr>
+                `;
+            });
+        }
+        outboundBody.innerHTML = newHtml;
+        setTimeout(() => { outboundBody.innerHTML = newHtml; }, 10); // Re-assert content
+        console.log("Rendered outbound table. HTML:", outboundBody.innerHTML.substring(0, 200) + "...");
+    }
+
+    // Function to populate undelivered messages table
+    function renderUndeliveredTable() {
+        const undeliveredBody = document.getElementById('undelivered-body');
+        undeliveredBody.innerHTML = ''; // Clear existing
+        let newHtml = '';
+
+        // Filter for undelivered messages only
+        const undeliveredMessages = activeOutboundMessages.filter(msg => msg.status === 'undelivered');
+
+        if (undeliveredMessages.length === 0) {
+            newHtml = '<tr><td colspan="7" class="text-center">No undelivered messages found for the selected time period.</td></tr>';
+        } else {
+            undeliveredMessages.forEach(msg => {
+                const statusClass = getStatusClass(msg.status);
+                const date = new Date(msg.date_sent || msg.date_created);
+                const buyerUsername = msg.buyer_username ?
+                    `<a href="https://www.tiktok.com/@${msg.buyer_username}" target="_blank">@${msg.buyer_username}</a>` : '-';
+                newHtml += `
+                    <tr>
+                        <td>${date.toLocaleString()}</td>
+                        <td>${msg.to}</td>
+                        <td>${buyerUsername}</td>
+                        <td>${msg.recipient || '-'}</td>
+                        <td>${msg.order_id || '-'}</td>
+                        <td>${msg.body.substring(0, 50)}${msg.body.length > 50 ? '...' : ''}</td>
+                        <td class="${statusClass}">${msg.status}</td>
+                    </tr>
+                `;
+            });
+        }
+        undeliveredBody.innerHTML = newHtml;
+        setTimeout(() => { undeliveredBody.innerHTML = newHtml; }, 10); // Re-assert content
+        console.log("Rendered undelivered table with", undeliveredMessages.length, "messages");
+    }
+
+    // Function to populate inbound messages table
+    function renderInboundTable() {
+        // Locate the parent container that holds the table
+        const tableContainer = document.querySelector('#inbound-messages .table-responsive');
+        if (!tableContainer) {
+            console.error("Could not find table container in #inbound-messages");
+            return;
+        }
+
+        // Create completely new table HTML
+        let tableHtml = `
+            <table class="table table-striped" id="inbound-table">
+                <thead>
+                    <tr>
+                        <th>Date</th>
+                        <th>From</th>
+                        <th>Buyer Username</th>
+                        <th>Recipient</th>
+                        <th>Order ID</th>
+                        <th>Message Body</th>
+                        <th>Status</th>
+                    </tr>
+                </thead>
+                <tbody id="inbound-body">
+        `;
+
+        if (activeInboundMessages.length === 0) {
+            tableHtml += '<tr><td colspan="7" class="text-center">No affiliate responses found for the selected time period.</td></tr>';
+        } else {
+            activeInboundMessages.forEach(msg => {
+                const statusClass = getStatusClass(msg.status);
+                const date = new Date(msg.date_sent || msg.date_created);
+                const buyerUsername = msg.buyer_username ?
+                    `<a href="https://www.tiktok.com/@${msg.buyer_username}" target="_blank">@${msg.buyer_username}</a>` : '-';
+                tableHtml += `
+                    <tr>
+                        <td>${date.toLocaleString()}</td>
+                        <td>${msg.from}</td>
+                        <td>${buyerUsername}</td>
+                        <td>${msg.recipient || '-'}</td>
+                        <td>${msg.order_id || '-'}</td>
+                        <td>${msg.body.substring(0, 50)}${msg.body.length > 50 ? '...' : ''}</td>
+                        <td class="${statusClass}">${msg.status}</td>
+                    </tr>
+                `;
+            });
+        }
+
+        tableHtml += `
+                </tbody>
+            </table>
+        `;
+
+        // Replace the entire table HTML
+        tableContainer.innerHTML = tableHtml;
+
+        // Log the new table HTML for debugging
+        console.log("Completely rebuilt inbound table. Container HTML:", tableContainer.innerHTML.substring(0, 200) + "...");
+
+        // Force a repaint/reflow - extreme measures
+        setTimeout(() => {
+            const tempNode = document.createTextNode('');
+            tableContainer.appendChild(tempNode);
+            tableContainer.removeChild(tempNode);
+            console.log("Forced DOM refresh");
+        }, 20);
+    }
+
+    // Function to load message delivery data
+    function loadMessageData(timeRange) {
+        fetch('/reports/api/deliverability?hours=' + timeRange)
+            .then(response => response.json())
+            .then(data => {
+                // Update stats (this part remains the same)
+                document.getElementById('total-messages').textContent = data.stats.total;
+                document.getElementById('delivered-messages').textContent = data.stats.delivered;
+                document.getElementById('delivered-percent').textContent = `(${data.stats.delivered_pct}%)`;
+                document.getElementById('sent-messages').textContent = data.stats.sent;
+                document.getElementById('sent-percent').textContent = `(${data.stats.sent_pct}%)`;
+                document.getElementById('failed-messages').textContent = data.stats.failed;
+                document.getElementById('failed-percent').textContent = `(${data.stats.failed_pct}%)`;
+                document.getElementById('read-messages').textContent = data.stats.read;
+                document.getElementById('read-percent').textContent = `(${data.stats.read_pct}%)`;
+                document.getElementById('received-messages').textContent = data.stats.received;
+                document.getElementById('received-percent').textContent = `(${data.stats.received_pct}%)`;
+                document.getElementById('undelivered-messages').textContent = data.stats.undelivered;
+                document.getElementById('undelivered-percent').textContent = `(${data.stats.undelivered_pct}%)`;
+                document.getElementById('inbound-messages').textContent = data.stats.inbound;
+
+                // Filter messages for outbound and inbound tables
+                activeOutboundMessages = data.messages.filter(msg => msg.direction === 'outbound-api');
+                console.log("Filtered outbound messages (activeOutboundMessages):", activeOutboundMessages);
+
+                activeInboundMessages = data.inbound_messages.filter(msg => msg.direction === 'inbound');
+                console.log("Filtered inbound messages (activeInboundMessages):", activeInboundMessages);
+
+                // Count and filter undelivered messages
+                const undeliveredMessages = activeOutboundMessages.filter(msg => msg.status === 'undelivered');
+
+                // Update counts in tabs
+                document.getElementById('outbound-count').textContent = activeOutboundMessages.length;
+                document.getElementById('responses-count').textContent = activeInboundMessages.length;
+                document.getElementById('undelivered-count').textContent = undeliveredMessages.length;
+
+                // Determine which tab is currently active and render its table
+                // This is important for the initial load and auto-refresh
+                if (document.getElementById('outbound-tab').classList.contains('active')) {
+                    renderOutboundTable();
+                } else if (document.getElementById('inbound-tab').classList.contains('active')) {
+                    renderInboundTable();
+                } else if (document.getElementById('undelivered-tab').classList.contains('active')) {
+                    renderUndeliveredTable();
+                }
+
+            })
+            .catch(error => {
+                console.error('Error fetching data:', error);
+                document.getElementById('delivery-body').innerHTML =
+                    '<tr><td colspan="7" class="text-center text-danger">Error loading message data. Please try again.</td></tr>';
+                document.getElementById('inbound-body').innerHTML =
+                    '<tr><td colspan="7" class="text-center text-danger">Error loading message data. Please try again.</td></tr>';
+            });
+    }
+
+    // Helper function to get status class
+    function getStatusClass(status) {
+        switch(status.toLowerCase()) {
+            case 'delivered':
+                return 'status-delivered';
+            case 'sent':
+                return 'status-sent';
+            case 'queued':
+            case 'sending':
+            case 'processing':
+                return 'status-queued';
+            case 'failed':
+            case 'undelivered':
+                return 'status-failed';
+            case 'read':
+                return 'status-read';
+            case 'received':
+                return 'status-sent';
+            default:
+                return '';
+        }
+    }
+
+    // Load initial data
+    const timeRange = document.getElementById('timeRangeFilter').value;
+    loadMessageData(timeRange);
+
+    // Set up change listener for time range filter
+    document.getElementById('timeRangeFilter').addEventListener('change', function() {
+        loadMessageData(this.value);
+    });
+
+    // Set up auto-refresh button
+    document.getElementById('refreshButton').addEventListener('click', function() {
+        this.classList.add('rotate-animation');
+        const timeRange = document.getElementById('timeRangeFilter').value;
+        loadMessageData(timeRange);
+        setTimeout(() => {
+            this.classList.remove('rotate-animation');
+        }, 1000);
+    });
+
+    // Set up auto-refresh every 120 seconds
+    setInterval(function() {
+        const timeRange = document.getElementById('timeRangeFilter').value;
+        loadMessageData(timeRange);
+        const refreshButton = document.getElementById('refreshButton');
+        refreshButton.classList.add('rotate-animation');
+        setTimeout(() => {
+            refreshButton.classList.remove('rotate-animation');
+        }, 1000);
+    }, 120000);
+
+    // --- NEW DIAGNOSTIC CODE FOR TABS ---
+    const outboundTabButton = document.getElementById('outbound-tab');
+    const inboundTabButton = document.getElementById('inbound-tab');
+    const undeliveredTabButton = document.getElementById('undelivered-tab');
+    const outboundPane = document.getElementById('outbound-messages');
+    const inboundPane = document.getElementById('inbound-messages');
+    const undeliveredPane = document.getElementById('undelivered-messages');
+
+    if (outboundTabButton && outboundPane) {
+        outboundTabButton.addEventListener('show.bs.tab', function (event) {
+            console.warn('Event: show.bs.tab for Outbound. Target:', event.target.id, 'RelatedTarget:', event.relatedTarget ? event.relatedTarget.id : 'null');
+        });
+        outboundTabButton.addEventListener('shown.bs.tab', function (event) {
+            console.warn('Event: shown.bs.tab for Outbound. Target:', event.target.id, 'RelatedTarget:', event.relatedTarget ? event.relatedTarget.id : 'null');
+            outboundPane.classList.add('active', 'show');
+            if (inboundPane) inboundPane.classList.remove('active', 'show');
+            if (undeliveredPane) undeliveredPane.classList.remove('active', 'show');
+            renderOutboundTable();
+            console.log('Outbound Pane classes after shown:', outboundPane.className);
+            if (inboundPane) console.log('Inbound Pane classes after Outbound shown:', inboundPane.className);
+            if (undeliveredPane) console.log('Undelivered Pane classes after Outbound shown:', undeliveredPane.className);
+        });
+    }
+
+    if (inboundTabButton && inboundPane) {
+        inboundTabButton.addEventListener('show.bs.tab', function (event) {
+            console.warn('Event: show.bs.tab for Inbound. Target:', event.target.id, 'RelatedTarget:', event.relatedTarget ? event.relatedTarget.id : 'null');
+        });
+        inboundTabButton.addEventListener('shown.bs.tab', function (event) {
+            console.warn('Event: shown.bs.tab for Inbound. Target:', event.target.id, 'RelatedTarget:', event.relatedTarget ? event.relatedTarget.id : 'null');
+
+            // Remove any undelivered force container before switching to inbound tab
+            const existingUndeliveredContainer = document.getElementById('force-undelivered-container');
+            if (existingUndeliveredContainer) {
+                existingUndeliveredContainer.remove();
+                console.log("Removed undelivered force container when switching to inbound tab");
+            }
+
+            inboundPane.classList.add('active', 'show');
+            if (outboundPane) outboundPane.classList.remove('active', 'show');
+            if (undeliveredPane) undeliveredPane.classList.remove('active', 'show');
+            renderInboundTable();
+
+            // BRUTE FORCE APPROACH - Create a completely new element to display inbound messages
+            console.log("Implementing brute force display solution...");
+
+            // Create a container div with forced visibility
+            const forceContainer = document.createElement('div');
+            forceContainer.id = 'force-inbound-container';
+            forceContainer.style.cssText = `
+                position: relative;
+                top: 0;
+                left: 0;
+                width: 100%;
+                background-color: white;
+                z-index: 1000;
+                padding: 20px;
+                border: 2px solid #E60517;
+                box-shadow: 0 0 10px rgba(0,0,0,0.2);
+                margin-top: 10px;
+            `;
+
+            // Create a table with simple styling
+            let tableHTML = `
+                <h4>Affiliate Responses (Force Display)</h4>
+                <table style="width:100%; border-collapse: collapse; margin-top: 10px;">
+                    <thead>
+                        <tr style="background-color: #f2f2f2;">
+                            <th style="padding: 8px; text-align: left; border: 1px solid #ddd;">Date</th>
+                            <th style="padding: 8px; text-align: left; border: 1px solid #ddd;">From</th>
+                            <th style="padding: 8px; text-align: left; border: 1px solid #ddd;">Buyer Username</th>
+                            <th style="padding: 8px; text-align: left; border: 1px solid #ddd;">Message</th>
+                            <th style="padding: 8px; text-align: left; border: 1px solid #ddd;">Status</th>
+                        </tr>
+                    </thead>
+                    <tbody>
+            `;
+
+            // Add each message to the table
+            if (activeInboundMessages && activeInboundMessages.length > 0) {
+                activeInboundMessages.forEach(msg => {
+                    const date = new Date(msg.date_sent || msg.date_created);
+                    const buyerUsername = msg.buyer_username ?
+                        `<a href="https://www.tiktok.com/@${msg.buyer_username}" target="_blank" style="color: #E60517;">@${msg.buyer_username}</a>` : '-';
+
+                    tableHTML += `
+                        <tr style="border-bottom: 1px solid #ddd;">
+                            <td style="padding: 8px; text-align: left; border: 1px solid #ddd;">${date.toLocaleString()}</td>
+                            <td style="padding: 8px; text-align: left; border: 1px solid #ddd;">${msg.from}</td>
+                            <td style="padding: 8px; text-align: left; border: 1px solid #ddd;">${buyerUsername}</td>
+                            <td style="padding: 8px; text-align: left; border: 1px solid #ddd;">${msg.body.substring(0, 50)}${msg.body.length > 50 ? '...' : ''}</td>
+                            <td style="padding: 8px; text-align: left; border: 1px solid #ddd;">${msg.status}</td>
+                        </tr>
+                    `;
+                });
+            } else {
+                tableHTML += `
+                    <tr>
+                        <td colspan="5" style="padding: 8px; text-align: center; border: 1px solid #ddd;">No affiliate responses found</td>
+                    </tr>
+                `;
+            }
+
+            tableHTML += `
+                    </tbody>
+                </table>
+            `;
+
+            forceContainer.innerHTML = tableHTML;
+
+            // Remove any existing forced container
+            const existingContainer = document.getElementById('force-inbound-container');
+            if (existingContainer) {
+                existingContainer.remove();
+            }
+
+            // Insert the new container right after the tab content
+            const tabContent = document.getElementById('delivery');
+            if (tabContent) {
+                tabContent.appendChild(forceContainer);
+                console.log("Force display container added to the DOM");
+            } else {
+                console.error("Could not find #delivery element to append force container");
+                // Plan B: append to the inbound-messages div
+                inboundPane.appendChild(forceContainer);
+            }
+
+            console.log('Inbound Pane classes after shown:', inboundPane.className);
+            if (outboundPane) console.log('Outbound Pane classes after Inbound shown:', outboundPane.className);
+        });
+
+        // Also handle cleanup when switching back to outbound tab
+        if (outboundTabButton) {
+            outboundTabButton.addEventListener('shown.bs.tab', function(event) {
+                // Remove the forced container when switching to outbound tab
+                const existingContainer = document.getElementById('force-inbound-container');
+                if (existingContainer) {
+                    existingContainer.remove();
+                    console.log("Force display container removed");
+                }
+            });
+        }
+    }
+
+    // Setup event handlers for undelivered tab
+    if (undeliveredTabButton && undeliveredPane) {
+        undeliveredTabButton.addEventListener('show.bs.tab', function (event) {
+            console.warn('Event: show.bs.tab for Undelivered. Target:', event.target.id, 'RelatedTarget:', event.relatedTarget ? event.relatedTarget.id : 'null');
+        });
+
+        undeliveredTabButton.addEventListener('shown.bs.tab', function (event) {
+            console.warn('Event: shown.bs.tab for Undelivered. Target:', event.target.id, 'RelatedTarget:', event.relatedTarget ? event.relatedTarget.id : 'null');
+
+            // First, remove any inbound force container that might be present
+            const existingInboundContainer = document.getElementById('force-inbound-container');
+            if (existingInboundContainer) {
+                existingInboundContainer.remove();
+                console.log("Removed inbound force container when switching to undelivered tab");
+            }
+
+            // Then set proper classes and render table
+            undeliveredPane.classList.add('active', 'show');
+            if (outboundPane) outboundPane.classList.remove('active', 'show');
+            if (inboundPane) inboundPane.classList.remove('active', 'show');
+            renderUndeliveredTable();
+
+            // Create a dedicated force display for undelivered messages
+            const forceUndeliveredContainer = document.createElement('div');
+            forceUndeliveredContainer.id = 'force-undelivered-container';
+            forceUndeliveredContainer.style.cssText = `
+                position: relative;
+                top: 0;
+                left: 0;
+                width: 100%;
+                background-color: white;
+                z-index: 1000;
+                padding: 20px;
+                border: 2px solid #E60517;
+                box-shadow: 0 0 10px rgba(0,0,0,0.2);
+                margin-top: 10px;
+            `;
+
+            // Filter for undelivered messages only
+            const undeliveredMessages = activeOutboundMessages.filter(msg => msg.status === 'undelivered');
+
+            // Create a table with simple styling for undelivered messages
+            let tableHTML = `
+                <h4>Undelivered Messages (Force Display)</h4>
+                <table style="width:100%; border-collapse: collapse; margin-top: 10px;">
+                    <thead>
+                        <tr style="background-color: #f2f2f2;">
+                            <th style="padding: 8px; text-align: left; border: 1px solid #ddd;">Date</th>
+                            <th style="padding: 8px; text-align: left; border: 1px solid #ddd;">To</th>
+                            <th style="padding: 8px; text-align: left; border: 1px solid #ddd;">Buyer Username</th>
+                            <th style="padding: 8px; text-align: left; border: 1px solid #ddd;">Message</th>
+                            <th style="padding: 8px; text-align: left; border: 1px solid #ddd;">Status</th>
+                        </tr>
+                    </thead>
+                    <tbody>
+            `;
+
+            // Add each undelivered message to the table
+            if (undeliveredMessages && undeliveredMessages.length > 0) {
+                undeliveredMessages.forEach(msg => {
+                    const date = new Date(msg.date_sent || msg.date_created);
+                    const buyerUsername = msg.buyer_username ?
+                        `<a href="https://www.tiktok.com/@${msg.buyer_username}" target="_blank" style="color: #E60517;">@${msg.buyer_username}</a>` : '-';
+
+                    tableHTML += `
+                        <tr style="border-bottom: 1px solid #ddd;">
+                            <td style="padding: 8px; text-align: left; border: 1px solid #ddd;">${date.toLocaleString()}</td>
+                            <td style="padding: 8px; text-align: left; border: 1px solid #ddd;">${msg.to}</td>
+                            <td style="padding: 8px; text-align: left; border: 1px solid #ddd;">${buyerUsername}</td>
+                            <td style="padding: 8px; text-align: left; border: 1px solid #ddd;">${msg.body.substring(0, 50)}${msg.body.length > 50 ? '...' : ''}</td>
+                            <td style="padding: 8px; text-align: left; border: 1px solid #ddd;">${msg.status}</td>
+                        </tr>
+                    `;
+                });
+            } else {
+                tableHTML += `
+                    <tr>
+                        <td colspan="5" style="padding: 8px; text-align: center; border: 1px solid #ddd;">No undelivered messages found</td>
+                    </tr>
+                `;
+            }
+
+            tableHTML += `
+                    </tbody>
+                </table>
+            `;
+
+            forceUndeliveredContainer.innerHTML = tableHTML;
+
+            // Remove any existing undelivered force container
+            const existingUndeliveredContainer = document.getElementById('force-undelivered-container');
+            if (existingUndeliveredContainer) {
+                existingUndeliveredContainer.remove();
+            }
+
+            // Insert the new container right after the tab content
+            const tabContent = document.getElementById('delivery');
+            if (tabContent) {
+                tabContent.appendChild(forceUndeliveredContainer);
+                console.log("Force display container added for undelivered messages");
+            } else {
+                undeliveredPane.appendChild(forceUndeliveredContainer);
+            }
+
+            console.log('Undelivered Pane classes after shown:', undeliveredPane.className);
+            if (outboundPane) console.log('Outbound Pane classes after Undelivered shown:', outboundPane.className);
+            if (inboundPane) console.log('Inbound Pane classes after Undelivered shown:', inboundPane.className);
+        });
+    }
+    // --- END NEW DIAGNOSTIC CODE ---
+});
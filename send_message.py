@@ -4,9 +4,9 @@ import time
 import argparse
 import datetime
 import sqlite3
-import pathlib
 from twilio.rest import Client
 from dotenv import load_dotenv
+from mojo_core import db_utils, filters, status_store, run_journal
 
 load_dotenv()  # Load environment variables from .env file
 
@@ -16,6 +16,8 @@ CONFIG = {
     "whatsappNumber": os.environ.get("TWILIO_WHATSAPP_NUMBER", "whatsapp:+15551234567"),
     "messagingServiceSid": os.environ.get("TWILIO_MESSAGING_SERVICE_SID"),
     "dbPath": os.environ.get("DB_PATH", "affiliates.db"),
+    "reportsDir": os.environ.get("REPORTS_DIR", "reports"),
+    "statusCallbackUrl": status_store.status_callback_url(),
     "delayBetweenMessages": 1  # seconds to wait between sends to avoid rate limits
 }
 
@@ -57,6 +59,9 @@ def send_message(options=None):
     else:
         message_params["from_"] = from_
 
+    if CONFIG["statusCallbackUrl"]:
+        message_params["status_callback"] = CONFIG["statusCallbackUrl"]
+
     try:
         message = client.messages.create(**message_params)
         print(f"Message sent successfully to {to}:", flush=True)
@@ -66,26 +71,10 @@ def send_message(options=None):
         # Log message in database if order_id is provided
         if order_id and options.get("log_message", True):
             log_message_to_db(order_id, to, content_sid, message.sid, message.status)
+            status_store.record_sent_message(CONFIG["dbPath"], message.sid, to, message.status, template_id=content_sid)
             
-            # Update last_messaged timestamp in orders table
-            try:
-                conn = sqlite3.connect(CONFIG["dbPath"])
-                cursor = conn.cursor()
-                
-                # Extract just the phone number portion without 'whatsapp:' prefix
-                cleaned_number = to.replace("whatsapp:", "") if to.startswith("whatsapp:") else to
-                
-                # Update all records with this phone number
-                cursor.execute("""
-                    UPDATE orders 
-                    SET last_messaged = ? 
-                    WHERE phone_number = ?
-                """, (datetime.datetime.now().isoformat(), cleaned_number))
-                
-                conn.commit()
-                conn.close()
-            except Exception as e:
-                print(f"Error updating last_messaged timestamp: {e}", flush=True)
+            # Update last_messaged timestamp on the narrow messaging table
+            db_utils.update_last_messaged(CONFIG["dbPath"], to)
             
         return message
     except Exception as e:
@@ -103,113 +92,51 @@ def log_message_to_db(order_id, phone_number, template_id, message_sid, status,
         conn = sqlite3.connect(CONFIG["dbPath"])
         cursor = conn.cursor()
         
-        sent_time = datetime.datetime.now().isoformat()
+        now = datetime.datetime.now()
         
         cursor.execute('''
             INSERT INTO message_log 
-            (order_id, phone_number, message_template_id, message_sid, status, sent_time, error_message)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (order_id, phone_number, template_id, message_sid, status, sent_time, error_message))
+            (order_id, phone_number, message_template_id, message_sid, status, sent_time, sent_epoch, error_message)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (order_id, phone_number, template_id, message_sid, status,
+              now.isoformat(), db_utils.to_epoch(now), error_message))
         
         conn.commit()
         conn.close()
     except Exception as e:
         print(f"Error logging message to database: {e}", flush=True)
 
-def get_recipients_from_db(filter_conditions=None, order_status=None, order_by=None, limit=None, force=False):
+def get_recipients_from_db(filter_conditions=None, order_status=None, order_by=None, limit=None, force=False,
+                           min_days_since_messaged=None):
     """
     Get recipients from the database
     
     Args:
         filter_conditions: Custom SQL WHERE clause
         order_status: Filter by order status (e.g., 'SHIPPED', 'DELIVERED')
-        order_by: SQL ORDER BY clause
+        order_by: ORDER BY list over contacts columns (see db_utils.build_order_by)
         limit: Maximum number of recipients to return
         force: If True, include previously messaged recipients
+        min_days_since_messaged: If set, also include recipients last messaged at least this many days ago
     
     Returns:
         List of dicts with recipient information
     """
-    recipients = []
-    
-    try:
-        # Connect to database
-        conn = sqlite3.connect(CONFIG["dbPath"])
-        conn.row_factory = sqlite3.Row  # Return rows as dictionaries
-        cursor = conn.cursor()
-        
-        # Build query
-        query = """
-            SELECT 
-                o.id, o.order_id, o.phone_number, o.raw_phone_number, 
-                o.order_status, o.recipient, o.product_name, o.last_messaged
-            FROM 
-                orders o
-            WHERE 
-                o.is_valid_for_whatsapp = 1
-        """
-        
-        # Unless force flag is True, exclude recipients who have been messaged before
-        if not force:
-            query += " AND (o.last_messaged IS NULL OR o.last_messaged = '')"
-        
-        params = []
-        
-        # Add order status filter if provided
-        if order_status:
-            query += " AND o.order_status = ?"
-            params.append(order_status)
-        
-        # Add custom filter conditions if provided
-        if filter_conditions:
-            query += f" AND {filter_conditions}"
-        
-        # Add ordering
-        if order_by:
-            query += f" ORDER BY {order_by}"
-        else:
-            query += " ORDER BY o.last_updated DESC"
-        
-        # Add limit
-        if limit:
-            query += " LIMIT ?"
-            params.append(limit)
-        
-        # Execute query
-        cursor.execute(query, params)
-        
-        # Get results
-        unique_phone_numbers = set()  # Track unique phone numbers
-        
-        for row in cursor.fetchall():
-            # Convert row to dict
-            recipient = dict(row)
-            
-            # Skip this record if we've already seen this phone number
-            if recipient['phone_number'] in unique_phone_numbers:
-                continue
-                
-            # Add this phone number to our set of seen numbers
-            unique_phone_numbers.add(recipient['phone_number'])
-            
-            # Format phone number for WhatsApp
-            if recipient['phone_number'] and not recipient['phone_number'].startswith('whatsapp:'):
-                recipient['formatted_number'] = f"whatsapp:{recipient['phone_number']}"
-            else:
-                recipient['formatted_number'] = recipient['phone_number']
-                
-            recipients.append(recipient)
-        
-        conn.close()
-        print(f"Loaded {len(recipients)} unique recipients from database", flush=True)
-        return recipients
-        
-    except Exception as e:
-        print(f"Error getting recipients from database: {e}", flush=True)
-        return []
+    recipients = db_utils.get_recipients_from_db(
+        CONFIG["dbPath"],
+        filter_conditions=filter_conditions,
+        order_status=order_status,
+        order_by=order_by,
+        limit=limit,
+        force=force,
+        min_days_since_messaged=min_days_since_messaged
+    )
+    print(f"Loaded {len(recipients)} unique recipients from database", flush=True)
+    return recipients
 
 def send_bulk_messages(content_variables=None, recipients=None, filter_conditions=None, 
-                      order_status=None, limit=None, dry_run=False, delay=None, order_id=None, db_path=None, force=False):
+                      order_status=None, limit=None, dry_run=False, delay=None, order_id=None, db_path=None, force=False,
+                      min_days_since_messaged=None):
     """Send messages to multiple recipients from the database"""
     if content_variables is None:
         content_variables = {"senderName": "MOJO Health Supplements"}
@@ -225,7 +152,8 @@ def send_bulk_messages(content_variables=None, recipients=None, filter_condition
             filter_conditions=filter_conditions,
             order_status=order_status,
             limit=limit,
-            force=force  # Pass the force flag to include previously messaged recipients if True
+            force=force,  # Pass the force flag to include previously messaged recipients if True
+            min_days_since_messaged=min_days_since_messaged
         )
     
     # Restore original database path if it was changed
@@ -263,6 +191,14 @@ def send_bulk_messages(content_variables=None, recipients=None, filter_condition
     # Create a list to store message results for logging
     message_logs = []
     
+    # Each recipient's outcome is journaled as soon as it is known
+    journal = run_journal.RunJournal(CONFIG["reportsDir"], {
+        'dry_run': dry_run,
+        'order_status': order_status,
+        'order_id': order_id,
+        'force': force
+    })
+    
     for i, recipient in enumerate(recipients):
         # Skip if we've already processed this phone number
         if recipient['formatted_number'] in processed_numbers:
@@ -292,6 +228,7 @@ def send_bulk_messages(content_variables=None, recipients=None, filter_condition
                 'message_sid': None,
                 'timestamp': datetime.datetime.now().isoformat()
             })
+            journal.record(message_logs[-1])
             continue
         
         result = send_message({
@@ -310,6 +247,7 @@ def send_bulk_messages(content_variables=None, recipients=None, filter_condition
             'timestamp': datetime.datetime.now().isoformat()
         }
         message_logs.append(log_entry)
+        journal.record(log_entry)
         
         if result:
             successful += 1
@@ -331,18 +269,14 @@ def send_bulk_messages(content_variables=None, recipients=None, filter_condition
     print(f"Time elapsed: {elapsed_time:.2f} seconds", flush=True)
     print(f"{'='*50}\n", flush=True)
     
-    # Generate a detailed report file
-    if message_logs:
-        report_path = generate_report(message_logs, {
-            'total': len(processed_numbers),
-            'successful': successful,
-            'failed': failed,
-            'elapsed_time': elapsed_time,
-            'dry_run': dry_run,
-            'order_status': order_status,
-            'order_id': order_id,
-            'force': force
-        })
+    # Finish the journal; the web interface renders the text report from it
+    report_path = journal.close({
+        'total': len(processed_numbers),
+        'successful': successful,
+        'failed': failed,
+        'elapsed_time': elapsed_time
+    })
+    if report_path:
         print(f"Report saved to: {report_path}", flush=True)
     
     return {
@@ -352,83 +286,6 @@ def send_bulk_messages(content_variables=None, recipients=None, filter_condition
         "elapsed_time": elapsed_time
     }
 
-def generate_report(message_logs, summary):
-    """
-    Generate a detailed report of the messaging session
-    
-    Args:
-        message_logs: List of message log entries
-        summary: Dictionary with summary information
-        
-    Returns:
-        Path to the generated report file
-    """
-    # Create reports directory if it doesn't exist
-    reports_dir = pathlib.Path('reports')
-    reports_dir.mkdir(exist_ok=True)
-    
-    # Generate timestamp for filename with the format dd-mm-yy_hh-mm-ss
-    timestamp = datetime.datetime.now().strftime('%d-%m-%y_%H-%M-%S')
-    
-    # Create filename based on parameters and timestamp
-    filename_parts = ['message_report']
-    if summary.get('dry_run'):
-        filename_parts.append('dry_run')
-    if summary.get('force'):
-        filename_parts.append('force')
-    if summary.get('order_status'):
-        filename_parts.append(f"status_{summary['order_status']}")
-    filename_parts.append(timestamp)
-    
-    filename = '_'.join(filename_parts) + '.txt'
-    report_path = reports_dir / filename
-    
-    # Write the report
-    with open(report_path, 'w') as f:
-        # Write header
-        f.write('='*80 + '\n')
-        f.write(f"MOJO WHATSAPP MESSAGE REPORT\n")
-        f.write(f"Generated: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        if summary.get('dry_run'):
-            f.write("Mode: DRY RUN (no messages actually sent)\n")
-        else:
-            f.write("Mode: LIVE RUN\n")
-        if summary.get('force'):
-            f.write("WARNING: FORCE MODE ENABLED - Including previously messaged recipients\n")
-        f.write('='*80 + '\n\n')
-        
-        # Only include filters section if there are actual filters to display
-        if summary.get('order_status') or summary.get('order_id'):
-            f.write("MESSAGE SENT TO:\n")
-            if summary.get('order_status'):
-                f.write(f"  Orders with status: {summary['order_status']}\n")
-            if summary.get('order_id'):
-                f.write(f"  Specific order ID: {summary['order_id']}\n")
-            f.write("\n")
-        
-        # Write detailed message logs
-        f.write("DETAILED MESSAGE LOG:\n")
-        f.write('-'*80 + '\n')
-        for i, log in enumerate(message_logs, 1):
-            f.write(f"Message {i}:\n")
-            f.write(f"  Order ID: {log['order_id']}\n")
-            f.write(f"  Recipient: {log['recipient']}\n")
-            f.write(f"  Phone Number: {log['phone_number']}\n")
-            f.write(f"  Status: {log['status']}\n")
-            if log['message_sid']:
-                f.write(f"  Message SID: {log['message_sid']}\n")
-            f.write(f"  Timestamp: {log['timestamp']}\n")
-            f.write('-'*80 + '\n')
-        
-        # Write summary
-        f.write("\nSUMMARY:\n")
-        f.write(f"Total unique recipients: {summary['total']}\n")
-        f.write(f"Successful: {summary['successful']}\n")
-        f.write(f"Failed: {summary['failed']}\n")
-        f.write(f"Time elapsed: {summary['elapsed_time']:.2f} seconds\n")
-        
-    return report_path
-
 def parse_arguments():
     """Parse command line arguments"""
     parser = argparse.ArgumentParser(description="Send WhatsApp messages using Twilio")
@@ -460,6 +317,12 @@ def parse_arguments():
     parser.add_argument("--force", action="store_true",
                         help="Force sending to all recipients, including those previously messaged")
     
+    parser.add_argument("--min-days-since-messaged", type=int,
+                        help="Also include recipients last messaged at least this many days ago")
+    
+    parser.add_argument("--reports-dir", type=str,
+                        help=f"Directory for run reports (default: {CONFIG['reportsDir']})")
+    
     parser.add_argument("--testing-mode", action="store_true",
                         help="Use testing database with only the test phone number")
     
@@ -495,6 +358,10 @@ def main():
     
     print(f"Using database: {db_path}", flush=True)
     
+    # Override reports directory if provided
+    if args.reports_dir:
+        CONFIG["reportsDir"] = args.reports_dir
+    
     # Determine if we're in dry run mode (default) or live mode
     dry_run = not args.live
     if dry_run:
@@ -506,7 +373,7 @@ def main():
     # Set filter condition for specific order ID
     filter_conditions = None
     if args.order_id:
-        filter_conditions = f"o.order_id = '{args.order_id}'"
+        filter_conditions = f"order_id = {filters.quote(args.order_id)}"
     
     # Display warning if force flag is set
     if args.force and not dry_run:
@@ -522,7 +389,8 @@ def main():
         delay=args.delay,
         order_id=args.order_id,
         db_path=db_path,
-        force=args.force
+        force=args.force,
+        min_days_since_messaged=args.min_days_since_messaged
     )
 
 def ensure_testing_db_exists(db_path):
@@ -0,0 +1,52 @@
+"""
+Unit tests for the web interface caches
+"""
+import time
+import threading
+import pytest
+from mojo_web.cache import TTLCache
+
+def test_concurrent_misses_share_one_computation():
+    """Callers arriving while a value is computed wait for it instead of recomputing"""
+    cache = TTLCache(ttl=60)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.1)
+        return 'value'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get('key', compute))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == ['value'] * 8
+    assert len(calls) == 1
+
+def test_entries_expire_and_failures_are_not_cached():
+    """Expired entries are recomputed, and a failed computation is retried next time"""
+    cache = TTLCache(ttl=0)
+    assert cache.get('key', lambda: 1) == 1
+    assert cache.get('key', lambda: 2) == 2
+    assert cache.peek('key') == 2
+
+    def fail():
+        raise RuntimeError('boom')
+
+    cache = TTLCache(ttl=60)
+    with pytest.raises(RuntimeError):
+        cache.get('key', fail)
+    assert cache.get('key', lambda: 3) == 3
+
+def test_expired_entries_are_swept():
+    """Keys that stop being asked for are dropped once expired, so the cache stays bounded"""
+    cache = TTLCache(ttl=0.05)
+    for key in range(100):
+        cache.get(key, lambda: key)
+    time.sleep(0.06)
+    cache.get('current', lambda: 'value')
+    assert cache.peek(5) is None
+    assert len(cache._entries) == 1
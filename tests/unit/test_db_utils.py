@@ -0,0 +1,239 @@
+"""
+Unit tests for the affiliates database helpers
+"""
+import os
+import sqlite3
+import tempfile
+import pytest
+from mojo_core.db_utils import (
+    get_db_connection,
+    get_recipients_from_db,
+    update_last_messaged,
+    normalize_phone_key,
+    to_epoch,
+    count_audience,
+    get_database_stats,
+    get_read_only_connection
+)
+from mojo_core.migrations import migrate, PHONE_KEY_SQL
+
+@pytest.fixture
+def db_path():
+    """Create a temporary, migrated affiliates database"""
+    db_fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.close(db_fd)
+    get_db_connection(db_path).close()
+
+    yield db_path
+
+    os.unlink(db_path)
+
+def add_order(db_path, order_id, phone_number, order_status='Shipped', is_valid=1, last_updated='2025-05-01T10:00:00'):
+    """Insert an order line the way the importers do"""
+    conn = get_db_connection(db_path)
+    conn.execute("""
+        INSERT INTO orders (order_id, order_status, recipient, phone_number, raw_phone_number,
+                            is_valid_for_whatsapp, last_updated)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, (order_id, order_status, f"Recipient {order_id}", phone_number, f"(+{phone_number})", is_valid, last_updated))
+    conn.commit()
+    conn.close()
+
+def test_normalize_phone_key():
+    """Stored and Twilio phone formats share one key"""
+    assert normalize_phone_key('whatsapp:+447700900123') == '447700900123'
+    assert normalize_phone_key('(+44)7700900123') == '447700900123'
+    assert normalize_phone_key('') is None
+
+@pytest.mark.parametrize('phone_number', [
+    '+44 7700 900123',
+    '+44-7700-900123',
+    '(+44) 7700-900123',
+    'whatsapp:+44 (0) 7700.900/123',
+    '\t447700900123\n',
+    '44****123',
+    '447700900123',
+])
+def test_phone_key_sql_matches_python(phone_number):
+    """The triggers' phone key and normalize_phone_key agree on written-out numbers"""
+    conn = get_db_connection(':memory:')
+    assert conn.execute(f"SELECT {PHONE_KEY_SQL.format(col='?')}", (phone_number,)).fetchone()[0] == \
+        normalize_phone_key(phone_number)
+    conn.close()
+
+def test_formatted_numbers_are_marked_messaged(db_path):
+    """A number imported with separators is the contact the send path marks messaged"""
+    add_order(db_path, 'A1', '+44 7700-900123')
+    update_last_messaged(db_path, 'whatsapp:+447700900123')
+    assert get_recipients_from_db(db_path) == []
+
+def test_migration_rekeys_formatted_numbers(db_path):
+    """Keys written with separators are rewritten and the people they split are merged"""
+    add_order(db_path, 'A1', '447700900123')
+    add_order(db_path, 'A2', '44 7700-900123')
+    update_last_messaged(db_path, '447700900123')
+
+    # Key the second line the way the old triggers did
+    conn = get_db_connection(db_path)
+    conn.execute("UPDATE order_messaging SET phone_key = '44 7700-900123', last_messaged_epoch = NULL "
+                 "WHERE order_id = 'A2'")
+    assert conn.execute("SELECT COUNT(*) FROM contacts").fetchone()[0] == 2
+    conn.execute("UPDATE contacts SET last_messaged_epoch = NULL")
+    conn.execute("PRAGMA user_version = 16")
+    conn.commit()
+    migrate(conn)
+
+    rows = conn.execute("SELECT phone_key, order_count, last_messaged_epoch FROM contacts").fetchall()
+    assert [(row[0], row[1]) for row in rows] == [('447700900123', 2)]
+    assert rows[0][2] is not None
+    conn.close()
+
+def test_orders_writes_sync_to_order_messaging(db_path):
+    """Inserts, updates and deletes on orders are mirrored on the narrow table"""
+    add_order(db_path, 'A1', '447700900123')
+    conn = get_db_connection(db_path)
+    conn.execute("UPDATE orders SET buyer_username = 'buyer1' WHERE order_id = 'A1'")
+    conn.commit()
+
+    row = conn.execute("SELECT phone_key, buyer_username FROM order_messaging WHERE order_id = 'A1'").fetchone()
+    assert tuple(row) == ('447700900123', 'buyer1')
+
+    conn.execute("DELETE FROM orders WHERE order_id = 'A1'")
+    conn.commit()
+    assert conn.execute("SELECT COUNT(*) FROM order_messaging").fetchone()[0] == 0
+    conn.close()
+
+def test_recipients_exclude_messaged_people(db_path):
+    """Messaging a number excludes all of that person's order lines"""
+    add_order(db_path, 'A1', '447700900123')
+    add_order(db_path, 'A2', '447700900123', last_updated='2025-05-02T10:00:00')
+    add_order(db_path, 'B1', '447700900456')
+    add_order(db_path, 'C1', None, is_valid=0)
+
+    recipients = get_recipients_from_db(db_path)
+    assert sorted(r['order_id'] for r in recipients) == ['A2', 'B1']
+
+    update_last_messaged(db_path, 'whatsapp:447700900123')
+    recipients = get_recipients_from_db(db_path)
+    assert [r['order_id'] for r in recipients] == ['B1']
+    assert len(get_recipients_from_db(db_path, force=True)) == 2
+
+def test_to_epoch_formats():
+    """ISO strings and the export's dd/mm/YYYY times map to the same epoch"""
+    assert to_epoch('2025-05-09T12:10:54') == to_epoch('09/05/2025 12:10:54')
+    assert to_epoch('') is None
+    assert to_epoch('\t') is None
+    assert to_epoch('not a date') is None
+
+def test_epoch_columns_follow_text_columns(db_path):
+    """SQL-derived epochs match the Python conversion used by the write paths"""
+    add_order(db_path, 'A1', '447700900123', last_updated='2025-05-01T10:00:00')
+    conn = get_db_connection(db_path)
+    conn.execute("UPDATE orders SET created_time = '09/05/2025 12:10:54' WHERE order_id = 'A1'")
+    conn.commit()
+
+    # Migrating an old database backfills the epochs the same way
+    conn.execute("UPDATE orders SET created_epoch = NULL")
+    conn.execute("PRAGMA user_version = 1")
+    conn.commit()
+    migrate(conn)
+
+    row = conn.execute("""
+        SELECT o.created_epoch, m.last_updated_epoch
+        FROM orders o JOIN order_messaging m ON m.id = o.id
+    """).fetchone()
+    assert tuple(row) == (to_epoch('09/05/2025 12:10:54'), to_epoch('2025-05-01T10:00:00'))
+    conn.close()
+
+def test_min_days_since_messaged(db_path):
+    """A frequency cap re-includes people messaged long enough ago"""
+    add_order(db_path, 'A1', '447700900123')
+    add_order(db_path, 'B1', '447700900456')
+    update_last_messaged(db_path, '447700900123')
+    update_last_messaged(db_path, '447700900456')
+
+    conn = get_db_connection(db_path)
+    conn.execute("UPDATE contacts SET last_messaged_epoch = last_messaged_epoch - 40 * 86400 WHERE phone_key = '447700900123'")
+    conn.commit()
+    conn.close()
+
+    assert get_recipients_from_db(db_path) == []
+    recipients = get_recipients_from_db(db_path, min_days_since_messaged=30)
+    assert [r['order_id'] for r in recipients] == ['A1']
+
+def test_contacts_summarise_order_lines(db_path):
+    """Each person gets one contacts row built from their latest order line"""
+    add_order(db_path, 'A1', '447700900123', order_status='Delivered', last_updated='2025-05-01T10:00:00')
+    add_order(db_path, 'A2', '447700900123', order_status='To ship', last_updated='2025-05-03T10:00:00')
+    conn = get_db_connection(db_path)
+    conn.execute("UPDATE orders SET buyer_username = 'buyer1' WHERE order_id = 'A1'")
+    conn.commit()
+
+    rows = conn.execute("""
+        SELECT phone_key, latest_order_id, order_status, buyer_username, order_count
+        FROM contacts
+    """).fetchall()
+    assert [tuple(row) for row in rows] == [('447700900123', 'A2', 'To ship', 'buyer1', 2)]
+
+    # The status filter reads the latest order, filter expressions match any line
+    assert get_recipients_from_db(db_path, order_status='Delivered') == []
+    recipients = get_recipients_from_db(db_path, filter_conditions="order_status = 'Delivered'")
+    assert [r['order_id'] for r in recipients] == ['A2']
+
+    conn.execute("DELETE FROM orders")
+    conn.commit()
+    assert conn.execute("SELECT COUNT(*) FROM contacts").fetchone()[0] == 0
+    conn.close()
+
+def test_contact_counts_follow_contacts(db_path):
+    """contact_counts tracks the contacts table through inserts, validity changes and deletes"""
+    def counts():
+        stats = get_database_stats(db_path, 0)
+        conn = get_db_connection(db_path)
+        actual = conn.execute("SELECT COUNT(*), COALESCE(SUM(is_valid_for_whatsapp = 1), 0) FROM contacts").fetchone()
+        conn.close()
+        assert (stats['contacts'], stats['valid_contacts']) == tuple(actual)
+        return tuple(actual)
+    
+    add_order(db_path, 'A1', '447700900123')
+    add_order(db_path, 'A2', '447700900123', is_valid=0)
+    add_order(db_path, 'B1', '447700900456', is_valid=0)
+    assert counts() == (2, 1)
+    
+    conn = get_db_connection(db_path)
+    conn.execute("UPDATE orders SET is_valid_for_whatsapp = 1 WHERE order_id = 'B1'")
+    conn.commit()
+    assert counts() == (2, 2)
+    conn.execute("DELETE FROM orders WHERE order_id IN ('A1', 'A2')")
+    conn.commit()
+    conn.close()
+    assert counts() == (1, 1)
+
+def test_count_audience_matches_recipients(db_path):
+    """The preview count equals the number of recipients a send would load"""
+    add_order(db_path, 'A1', '447700900123')
+    add_order(db_path, 'A2', '447700900123', order_status='Delivered')
+    add_order(db_path, 'B1', '447700900456', order_status='Delivered')
+    add_order(db_path, 'C1', None, is_valid=0)
+
+    assert count_audience(db_path)['count'] == len(get_recipients_from_db(db_path)) == 2
+    assert count_audience(db_path, order_status='Delivered')['count'] == 2
+    assert count_audience(db_path, order_status='Shipped')['count'] == 0
+    assert count_audience(db_path, limit=1)['count'] == 1
+
+    preview = count_audience(db_path, filter_conditions="order_id = 'B1'", sample=5)
+    assert preview['count'] == 1
+    assert [r['order_id'] for r in preview['sample']] == ['B1']
+
+def test_read_only_connection(db_path, tmp_path):
+    """Read-only connections never create a database or write to one"""
+    missing = str(tmp_path / 'missing db.db')
+    with pytest.raises(sqlite3.OperationalError):
+        get_read_only_connection(missing)
+    assert not os.path.exists(missing)
+
+    conn = get_read_only_connection(db_path)
+    assert conn.execute("SELECT COUNT(*) AS n FROM contacts").fetchone()['n'] == 0
+    with pytest.raises(sqlite3.OperationalError):
+        conn.execute("DELETE FROM contacts")
+    conn.close()
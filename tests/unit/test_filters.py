@@ -0,0 +1,90 @@
+"""
+Unit tests for the campaign audience filter language
+"""
+import os
+import tempfile
+import pytest
+from mojo_core.db_utils import get_db_connection, get_recipients_from_db, check_audience_indexes, to_epoch
+from mojo_core.filters import compile_filter, quote, FilterError
+
+@pytest.fixture
+def db_path():
+    """Create a temporary, migrated affiliates database"""
+    db_fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.close(db_fd)
+    get_db_connection(db_path).close()
+
+    yield db_path
+
+    os.unlink(db_path)
+
+def test_compile_binds_values_as_parameters():
+    """Values never end up in the SQL text"""
+    compiled = compile_filter("order_status = 'Delivered' AND (country IN ('UK', 'IE') OR created_time >= '2025-01-01')")
+    assert compiled.sql == "(m.order_status = ? AND (o.country IN (?, ?) OR o.created_epoch >= ?))"
+    assert compiled.params == ('Delivered', 'UK', 'IE', to_epoch('2025-01-01'))
+    assert compiled.needs_orders
+
+def test_same_shape_compiles_to_same_sql():
+    """Filters differing only in values share a prepared statement"""
+    assert compile_filter("order_id = 'A1'").sql == compile_filter("order_id = 'B2'").sql
+    assert not compile_filter("order_id = 'A1'").needs_orders
+
+def test_legacy_prefixes_and_quoting():
+    """Old o./m. prefixed filters still compile, and quoted values round-trip"""
+    value = "O'Brien'; DROP TABLE orders; --"
+    compiled = compile_filter(f"o.recipient = {quote(value)}")
+    assert compiled.params == (value,)
+
+@pytest.mark.parametrize('text', [
+    "password = 'x'",
+    "order_id = 'A1' OR 1=1",
+    "order_id = 'A1'; DELETE FROM orders",
+    "created_time LIKE '2025%'",
+    "order_id =",
+])
+def test_invalid_filters_are_rejected(text):
+    """Unknown fields, raw SQL and malformed expressions raise FilterError"""
+    with pytest.raises(FilterError):
+        compile_filter(text)
+
+def test_filter_selects_recipients(db_path):
+    """A compiled filter matches any of a person's order lines"""
+    conn = get_db_connection(db_path)
+    conn.executemany("""
+        INSERT INTO orders (order_id, sku_id, order_status, country, phone_number, is_valid_for_whatsapp, last_updated)
+        VALUES (?, ?, ?, ?, ?, 1, '2025-05-01T10:00:00')
+    """, [
+        ('A1', 'S1', 'Delivered', 'UK', '447700900123'),
+        ('B1', 'S1', 'Shipped', 'IE', '447700900456'),
+    ])
+    conn.commit()
+    conn.close()
+
+    recipients = get_recipients_from_db(db_path, filter_conditions="country = 'IE'")
+    assert [r['order_id'] for r in recipients] == ['B1']
+
+def test_recipient_lookup_rejects_raw_sql(db_path):
+    """Legacy raw SQL filters and orderings raise instead of returning no recipients"""
+    with pytest.raises(FilterError):
+        get_recipients_from_db(db_path, filter_conditions="1=1 OR phone_number LIKE '%44%'")
+    with pytest.raises(ValueError):
+        get_recipients_from_db(db_path, order_by="(SELECT sql FROM sqlite_master)")
+    with pytest.raises(ValueError):
+        get_recipients_from_db(db_path, order_by="c.recipient; DROP TABLE orders")
+
+    conn = get_db_connection(db_path)
+    conn.executemany("""
+        INSERT INTO orders (order_id, sku_id, order_status, phone_number, is_valid_for_whatsapp, last_updated)
+        VALUES (?, 'S1', 'Delivered', ?, 1, '2025-05-01T10:00:00')
+    """, [('A1', '447700900123'), ('B1', '447700900456')])
+    conn.commit()
+    conn.close()
+    recipients = get_recipients_from_db(db_path, order_by="phone_number desc, c.latest_order_id")
+    assert [r['order_id'] for r in recipients] == ['B1', 'A1']
+
+def test_index_check_flags_full_scans(db_path):
+    """Indexed fields pass, unindexed detail columns are reported"""
+    assert check_audience_indexes(db_path, "order_id = 'A1'") == []
+    assert check_audience_indexes(db_path, "created_time >= '2025-01-01'") == []
+    assert check_audience_indexes(db_path, "country = 'UK'") != []
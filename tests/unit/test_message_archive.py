@@ -0,0 +1,116 @@
+"""
+Unit tests for the message_log Parquet archive
+"""
+import os
+import time
+import pytest
+from mojo_core import message_archive
+from mojo_core.db_utils import get_db_connection
+from mojo_core.message_archive import archive_messages, query_messages
+
+# 2025-01-15, 2025-02-15 and 2025-03-15 (noon UTC), two messages each
+SENT_EPOCHS = [1736942400, 1736946000, 1739620800, 1739624400, 1742040000, 1742043600]
+
+@pytest.fixture
+def db_path(tmp_path):
+    db_path = str(tmp_path / 'affiliates.db')
+    conn = get_db_connection(db_path)
+    conn.executemany('''
+        INSERT INTO message_log (order_id, phone_number, message_template_id, message_sid, status, sent_epoch, campaign_id)
+        VALUES (?, 'whatsapp:+447700900123', 'HX1', ?, 'queued', ?, ?)
+    ''', [(f"ORD{number}", f"SM{number}", epoch, 1 + number % 2) for number, epoch in enumerate(SENT_EPOCHS)])
+    conn.commit()
+    conn.close()
+    return db_path
+
+def live_count(db_path):
+    conn = get_db_connection(db_path)
+    count = conn.execute("SELECT COUNT(*) FROM message_log").fetchone()[0]
+    conn.close()
+    return count
+
+def test_query_live_table_without_archive(db_path, tmp_path):
+    """With nothing archived the live table is queried on its own"""
+    rows = list(query_messages(db_path, str(tmp_path / 'archive'), ['order_id'], campaign_id=2))
+    assert rows == [{'order_id': 'ORD1'}, {'order_id': 'ORD3'}, {'order_id': 'ORD5'}]
+
+    with pytest.raises(ValueError):
+        list(query_messages(db_path, str(tmp_path / 'archive'), ['body']))
+
+def test_archive_moves_old_rows_into_monthly_files(db_path, tmp_path):
+    """Old rows move into one Parquet file per month and leave the live table"""
+    pytest.importorskip('pyarrow')
+    archive_dir = str(tmp_path / 'archive')
+
+    assert archive_messages(db_path, archive_dir, SENT_EPOCHS[4], batch_size=3) == 4
+    assert live_count(db_path) == 2
+
+    conn = get_db_connection(db_path)
+    files = conn.execute("SELECT path, month, row_count, min_epoch, max_epoch FROM message_archive_files ORDER BY path").fetchall()
+    conn.close()
+    assert [(row['month'], row['row_count']) for row in files] == [('2025-01', 2), ('2025-02', 2)]
+    assert all(os.path.exists(os.path.join(archive_dir, row['path'])) for row in files)
+
+    # Nothing left to archive
+    assert archive_messages(db_path, archive_dir, SENT_EPOCHS[4]) == 0
+
+def test_query_reads_archive_and_live_table(db_path, tmp_path):
+    """Queries span the archive and the live table, with column and time pruning"""
+    pytest.importorskip('pyarrow')
+    archive_dir = str(tmp_path / 'archive')
+    archive_messages(db_path, archive_dir, SENT_EPOCHS[4])
+
+    rows = list(query_messages(db_path, archive_dir, ['order_id', 'sent_epoch']))
+    assert [row['order_id'] for row in rows] == [f"ORD{number}" for number in range(6)]
+    assert set(rows[0]) == {'order_id', 'sent_epoch'}
+
+    rows = list(query_messages(db_path, archive_dir, ['order_id'], start_epoch=SENT_EPOCHS[2], campaign_id=1))
+    assert rows == [{'order_id': 'ORD2'}, {'order_id': 'ORD4'}]
+
+def test_failed_run_files_are_removed(db_path, tmp_path):
+    """Files from a run that never committed don't show up twice; a run in progress keeps its files"""
+    pytest.importorskip('pyarrow')
+    archive_dir = str(tmp_path / 'archive')
+    partition = os.path.join(archive_dir, 'message_log', 'month=2025-01')
+    os.makedirs(partition)
+    orphan = os.path.join(partition, 'part-000000000001.parquet')
+    in_progress = os.path.join(partition, 'part-20250101T000000000000.parquet.tmp')
+    for path in (orphan, in_progress):
+        open(path, 'wb').close()
+    stale = time.time() - message_archive.ORPHAN_GRACE_SECONDS - 60
+    os.utime(orphan, (stale, stale))
+
+    archive_messages(db_path, archive_dir, SENT_EPOCHS[2])
+    assert not os.path.exists(orphan)
+    assert os.path.exists(in_progress)
+    assert len(list(query_messages(db_path, archive_dir))) == 6
+
+def test_runs_with_the_same_rows_in_range_keep_their_files(db_path, tmp_path):
+    """A second run before any new message is written adds a file instead of replacing the first"""
+    pytest.importorskip('pyarrow')
+    archive_dir = str(tmp_path / 'archive')
+    assert archive_messages(db_path, archive_dir, SENT_EPOCHS[1]) == 1
+    assert archive_messages(db_path, archive_dir, SENT_EPOCHS[2]) == 1
+
+    conn = get_db_connection(db_path)
+    paths = [row['path'] for row in conn.execute("SELECT path FROM message_archive_files")]
+    conn.close()
+    assert len(set(paths)) == 2
+    assert not any(name.endswith('.tmp') for _, _, names in os.walk(archive_dir) for name in names)
+    rows = list(query_messages(db_path, archive_dir, ['order_id']))
+    assert [row['order_id'] for row in rows] == [f"ORD{number}" for number in range(6)]
+
+def test_interrupted_deletion_is_finished(db_path, tmp_path, monkeypatch):
+    """Rows catalogued by a run that stopped before deleting them are read once, then deleted"""
+    pytest.importorskip('pyarrow')
+    from mojo_core import message_archive
+    archive_dir = str(tmp_path / 'archive')
+    with monkeypatch.context() as patch:
+        patch.setattr(message_archive, '_finish_pending_deletes', lambda conn: None)
+        archive_messages(db_path, archive_dir, SENT_EPOCHS[4])
+    assert live_count(db_path) == 6
+    assert len(list(query_messages(db_path, archive_dir))) == 6
+
+    assert archive_messages(db_path, archive_dir, SENT_EPOCHS[4]) == 0
+    assert live_count(db_path) == 2
+    assert len(list(query_messages(db_path, archive_dir))) == 6
@@ -2,21 +2,34 @@
 Unit tests for the MOJO web interface
 """
 import os
+import re
+import gzip
+import json
+import time
+import shutil
 import tempfile
 import pytest
+from contextlib import contextmanager
+from sqlalchemy import event
 from mojo_web import create_app
 from mojo_web import db as _db
 
 @pytest.fixture
 def app():
     """Create and configure a Flask app for testing"""
-    # Create a temporary file to isolate the database for each test
+    # Create temporary files to isolate the web and affiliates databases for each test
     db_fd, db_path = tempfile.mkstemp()
+    affiliates_fd, affiliates_path = tempfile.mkstemp(suffix='.db')
+    reports_dir = tempfile.mkdtemp()
     
     app = create_app({
         'TESTING': True,
         'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}',
-        'WTF_CSRF_ENABLED': False
+        'WTF_CSRF_ENABLED': False,
+        'LOGIN_DISABLED': True,
+        'DEFAULT_DB_PATH': affiliates_path,
+        'REPORTS_DIR': reports_dir,
+        'TWILIO_AUTH_TOKEN': 'test-auth-token'
     })
     
     # Create the database and tables
@@ -25,9 +38,12 @@ def app():
     
     yield app
     
-    # Close and remove the temporary database
+    # Close and remove the temporary databases
     os.close(db_fd)
     os.unlink(db_path)
+    os.close(affiliates_fd)
+    os.unlink(affiliates_path)
+    shutil.rmtree(reports_dir)
 
 @pytest.fixture
 def client(app):
@@ -50,12 +66,57 @@ def db(app):
         _db.session.remove()
         _db.drop_all()
 
+@contextmanager
+def assert_max_queries(app, limit):
+    """Fail if the block runs more than `limit` statements on the web database (catches N+1 loads)"""
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    
+    with app.app_context():
+        engine = _db.get_engine(app)
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    assert len(statements) <= limit, f"{len(statements)} queries, expected at most {limit}:\n" + '\n'.join(statements)
+
 def test_dashboard_page(client):
     """Test the dashboard page loads successfully"""
     response = client.get('/')
     assert response.status_code == 200
     assert b'Dashboard' in response.data
 
+def test_dashboard_stats_cached_until_commit(app, client):
+    """Dashboard counts come from one grouped query, cached until the web database changes"""
+    from mojo_web.models import Template, Campaign
+    from mojo_core.status_store import record_sent_message
+    with app.app_context():
+        template = Template(name='Shipped', template_sid='HX1')
+        _db.session.add(template)
+        _db.session.flush()
+        for status in ['completed', 'completed', 'scheduled', 'draft']:
+            _db.session.add(Campaign(name=status, template_id=template.id, status=status,
+                                     db_path=app.config['DEFAULT_DB_PATH']))
+        _db.session.commit()
+    record_sent_message(app.config['DEFAULT_DB_PATH'], 'SM1', 'whatsapp:+447700900123', 'queued')
+    
+    def stats(response):
+        return [int(n) for n in re.findall(rb'display-4">(\d+)<', response.data.replace(b',', b''))]
+    
+    with assert_max_queries(app, 3):
+        response = client.get('/')
+    # Templates, campaigns, completed, scheduled; then contacts, valid numbers, messages today
+    assert stats(response) == [1, 4, 2, 1, 0, 0, 1]
+    with assert_max_queries(app, 0):
+        client.get('/')
+    
+    with app.app_context():
+        _db.session.add(Template(name='Delivered', template_sid='HX2'))
+        _db.session.commit()
+    assert stats(client.get('/'))[:4] == [2, 4, 2, 1]
+
 def test_templates_page(client):
     """Test the templates page loads successfully"""
     response = client.get('/templates/')
@@ -72,4 +133,430 @@ def test_reports_page(client):
     """Test the reports page loads successfully"""
     response = client.get('/reports/')
     assert response.status_code == 200
-    assert b'Reports' in response.data 
\ No newline at end of file
+    assert b'Reports' in response.data 
+def test_pages_link_versioned_stylesheet(client):
+    """Pages share one stylesheet, linked by content hash so browsers can keep it for good"""
+    response = client.get('/auth/login')
+    assert b'<style>' not in response.data
+    match = re.search(rb'href="(/static/css/app\.css\?v=[0-9a-f]+)"', response.data)
+    assert match
+    
+    static = client.get(match.group(1).decode(), headers={'Accept-Encoding': 'gzip'})
+    assert static.status_code == 200
+    assert static.cache_control.max_age == 365 * 24 * 3600
+    assert static.cache_control.immutable
+    assert static.headers['Content-Encoding'] == 'gzip'
+    assert b'--mojo-red' in gzip.decompress(static.data)
+    assert client.get('/static/css/app.css').cache_control.max_age is None
+    assert client.get('/static/css/app.css?v=0').cache_control.max_age is None
+
+def test_responses_compressed(app, client):
+    """Pages and JSON polls are compressed for clients that accept it, and still revalidate"""
+    response = client.get('/reports/', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert b'</html>' in gzip.decompress(response.data)
+    assert 'Content-Encoding' not in client.get('/reports/').headers
+    
+    app.config['COMPRESS_MIN_SIZE'] = 0
+    response = client.get('/reports/api/deliverability?hours=24', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['ETag'].startswith('W/')
+    assert 'stats' in json.loads(gzip.decompress(response.data))
+    
+    response = client.get('/reports/api/deliverability?hours=24',
+                          headers={'Accept-Encoding': 'gzip', 'If-None-Match': response.headers['ETag']})
+    assert response.status_code == 304
+
+def test_listing_fragments_follow_commits(app, client):
+    """Cached listing tables are rendered again once the web database changes"""
+    from mojo_web.models import Template
+    assert b'No templates found' in client.get('/templates/').data
+    
+    with app.app_context():
+        _db.session.add(Template(name='Order <shipped>', template_sid='HX1'))
+        _db.session.commit()
+    response = client.get('/templates/')
+    assert b'No templates found' not in response.data
+    assert b'Order &lt;shipped&gt;' in response.data
+
+def test_listings_load_relations_eagerly(app, client):
+    """Campaign and log listings run the same few queries however many rows they show"""
+    from mojo_web.models import Template, Campaign, CampaignLog
+    with app.app_context():
+        for i in range(5):
+            template = Template(name=f'Template {i}', template_sid=f'HX{i}')
+            _db.session.add(template)
+            _db.session.flush()
+            campaign = Campaign(name=f'Campaign {i}', template_id=template.id, status='scheduled',
+                                db_path=app.config['DEFAULT_DB_PATH'])
+            _db.session.add(campaign)
+            _db.session.flush()
+            for j in range(3):
+                _db.session.add(CampaignLog(campaign_id=campaign.id, status='success', recipients_total=10,
+                                            recipients_success=9, recipients_failed=1))
+        _db.session.commit()
+        campaign_id = campaign.id
+    
+    with assert_max_queries(app, 1):
+        response = client.get('/campaigns/')
+    assert response.data.count(b'Template 4') == 1
+    with assert_max_queries(app, 1):
+        response = client.get('/reports/')
+    assert response.data.count(b'Campaign 0') == 3
+    with assert_max_queries(app, 3):
+        assert b'Campaign 4' in client.get('/').data
+    with assert_max_queries(app, 3):
+        response = client.get(f'/reports/campaign/{campaign_id}')
+    assert b'>30<' in response.data.replace(b' ', b'').replace(b'\n', b'')
+
+def test_contacts_pages_by_position(app, client):
+    """The contacts browser seeks each page from the last, across contacts with and without an update time"""
+    from mojo_core.db_utils import get_db_connection
+    conn = get_db_connection(app.config['DEFAULT_DB_PATH'])
+    conn.executemany("""
+        INSERT INTO contacts (phone_key, phone_number, recipient, is_valid_for_whatsapp, last_updated_epoch)
+        VALUES (?, ?, ?, 1, ?)
+    """, [(f"4477{i:08d}", f"+4477{i:08d}", f"Customer {i}", None if i % 7 == 0 else 1700000000 + i // 4)
+          for i in range(120)])
+    conn.commit()
+    expected = [row[0] for row in conn.execute(
+        "SELECT phone_key FROM contacts ORDER BY last_updated_epoch DESC, phone_key DESC")]
+    conn.close()
+    
+    def walk(path, label):
+        pages = []
+        while path:
+            response = client.get(path)
+            assert response.status_code == 200
+            pages.append((re.search(rb'Page (\d+) of 3', response.data).group(1),
+                          re.findall(rb'<td>\+(4477\d{8})</td>', response.data)))
+            link = re.search(rb'<a class="page-link" href="([^"#]+)" aria-label="' + label, response.data)
+            path = link.group(1).decode().replace('&amp;', '&') if link else None
+        return pages
+    
+    forward = walk('/contacts/', b'Next')
+    assert [page for page, _ in forward] == [b'1', b'2', b'3']
+    assert [len(keys) for _, keys in forward] == [50, 50, 20]
+    assert [key.decode() for _, keys in forward for key in keys] == expected
+    
+    backward = walk('/contacts/?last=1', b'Previous')
+    assert backward == forward[::-1]
+    
+    assert b'Contacts (120)' in client.get('/contacts/').data
+
+SYNCED_COLUMNS = [
+    'sid', 'direction', 'from_number', 'to_number', 'phone_key', 'body', 'status', 'status_rank',
+    'error_code', 'error_message', 'price', 'price_unit', 'num_segments',
+    'date_created_epoch', 'date_sent_epoch', 'date_updated_epoch'
+]
+
+def post_signed(client, path, params, auth_token='test-auth-token'):
+    """POST form values signed the way Twilio signs webhooks"""
+    from twilio.request_validator import RequestValidator
+    url = f"http://localhost{path}"
+    signature = RequestValidator(auth_token).compute_signature(url, params)
+    return client.post(path, data=params, headers={'X-Twilio-Signature': signature})
+
+def test_status_webhook_requires_signature(client):
+    """Unsigned or wrongly signed callbacks are rejected"""
+    params = {'MessageSid': 'SM1', 'MessageStatus': 'delivered'}
+    assert client.post('/webhooks/twilio/status', data=params).status_code == 403
+    assert post_signed(client, '/webhooks/twilio/status', params, auth_token='wrong').status_code == 403
+
+def test_status_webhook_updates_deliverability(app, client):
+    """Callbacks move synced messages forward without calling Twilio"""
+    from mojo_core.db_utils import get_db_connection
+    from mojo_core.twilio_sync import store_messages
+
+    now = int(time.time())
+    rows = [
+        {'sid': 'SM1', 'direction': 'outbound-api', 'status': 'sent', 'status_rank': 3, 'body': 'Hello'},
+        {'sid': 'SM2', 'direction': 'inbound', 'status': 'received', 'status_rank': 4, 'body': 'Thanks!'},
+    ]
+    conn = get_db_connection(app.config['DEFAULT_DB_PATH'])
+    store_messages(conn, [dict(dict.fromkeys(SYNCED_COLUMNS), date_sent_epoch=now, **row) for row in rows])
+    conn.commit()
+    conn.close()
+
+    for status in ('delivered', 'sent'):
+        params = {'MessageSid': 'SM1', 'MessageStatus': status, 'To': 'whatsapp:+447700900123'}
+        assert post_signed(client, '/webhooks/twilio/status', params).status_code == 204
+    app.extensions['status_writer'].flush()
+
+    data = client.get('/reports/api/deliverability').get_json()
+    # The late 'sent' callback doesn't move the message back
+    assert [m['status'] for m in data['messages']] == ['delivered']
+    assert [m['body'] for m in data['inbound_messages']] == ['Thanks!']
+    assert data['stats']['delivered'] == 1
+    assert data['stats']['inbound'] == 1
+
+def test_status_webhook_backpressure(app, client):
+    """A full queue answers 503 so Twilio retries the callback"""
+    writer = app.extensions['status_writer']
+    writer.submit = lambda kind, event: False
+    params = {'MessageSid': 'SM1', 'MessageStatus': 'sent'}
+    response = post_signed(client, '/webhooks/twilio/status', params)
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '5'
+
+def test_deliverability_conditional_get(client):
+    """Repeated polls revalidate with the ETag and get an empty 304"""
+    response = client.get('/reports/api/deliverability?hours=24')
+    assert response.status_code == 200
+    assert response.headers['ETag']
+    assert response.headers['Last-Modified']
+
+    response = client.get('/reports/api/deliverability?hours=24',
+                          headers={'If-None-Match': response.headers['ETag']})
+    assert response.status_code == 304
+    assert response.data == b''
+
+def test_deliverability_hours_are_bounded(app, client):
+    """Out of range windows are clamped, so they neither fail nor add cache keys"""
+    for hours in ('-5', '0', 'abc', '24', '99999999999'):
+        response = client.get('/reports/api/deliverability', query_string={'hours': hours})
+        assert response.status_code == 200
+        assert 'error' not in response.get_json()
+    keys = set(app.extensions['report_cache']._entries)
+    assert keys == {('deliverability', 1), ('deliverability', 24), ('deliverability', 720)}
+
+def test_campaign_report_page(app, client):
+    """The campaign report shows delivery statuses from the rollups"""
+    from mojo_web.models import Template, Campaign
+    from mojo_core.status_store import record_sent_message
+
+    with app.app_context():
+        template = Template(name='Shipped', template_sid='HX1')
+        _db.session.add(template)
+        _db.session.flush()
+        campaign = Campaign(name='Spring', template_id=template.id, db_path=app.config['DEFAULT_DB_PATH'])
+        _db.session.add(campaign)
+        _db.session.commit()
+        campaign_id = campaign.id
+
+    record_sent_message(app.config['DEFAULT_DB_PATH'], 'SM1', 'whatsapp:+447700900123', 'queued',
+                        template_id='HX1', campaign_id=campaign_id)
+
+    response = client.get(f'/reports/campaign/{campaign_id}')
+    assert response.status_code == 200
+    assert b'Delivery Status' in response.data
+    assert b'Delivery Funnel' in response.data
+    assert b'queued' in response.data
+
+def test_campaign_report_missing_database(app, client, tmp_path):
+    """A campaign whose database is gone gets a warning, and no empty database is created"""
+    from mojo_web.models import Template, Campaign
+
+    missing = str(tmp_path / 'moved.db')
+    with app.app_context():
+        template = Template(name='Shipped', template_sid='HX1')
+        _db.session.add(template)
+        _db.session.flush()
+        campaign = Campaign(name='Spring', template_id=template.id, db_path=missing)
+        _db.session.add(campaign)
+        _db.session.commit()
+        campaign_id = campaign.id
+
+    response = client.get(f'/reports/campaign/{campaign_id}')
+    assert response.status_code == 200
+    assert b'Campaign database not found' in response.data
+    assert not os.path.exists(missing)
+
+def test_audience_cost_estimate(app, client):
+    """The audience preview estimates cost from the template's synced prices"""
+    from mojo_web.models import Template
+    from mojo_core.db_utils import get_db_connection
+    from mojo_core.status_store import record_sent_message, record_current_statuses, status_event
+
+    with app.app_context():
+        template = Template(name='Shipped', template_sid='HX1')
+        _db.session.add(template)
+        _db.session.commit()
+        template_id = template.id
+
+    db_path = app.config['DEFAULT_DB_PATH']
+    params = {'db_path': db_path, 'template_id': template_id}
+    assert client.get('/campaigns/api/audience', query_string=params).get_json()['cost'] is None
+
+    record_sent_message(db_path, 'SM1', 'whatsapp:+447700900123', 'queued', template_id='HX1')
+    conn = get_db_connection(db_path)
+    record_current_statuses(conn, [dict(status_event({'MessageSid': 'SM1', 'MessageStatus': 'delivered'}),
+                                        price=-0.005, price_unit='USD')])
+    conn.commit()
+    conn.close()
+
+    cost = client.get('/campaigns/api/audience', query_string=params).get_json()['cost']
+    assert (cost['per_message'], cost['price_unit'], cost['based_on']) == (0.005, 'USD', 1)
+    assert cost['over_limit'] is False
+
+def test_campaign_fails_when_spend_check_errors(app, monkeypatch):
+    """A spend limit check that raises leaves the campaign failed with a log, not running"""
+    from mojo_web.models import Template, Campaign, CampaignLog
+    from mojo_web.routes import campaigns
+    from mojo_core.filters import FilterError
+
+    def broken_filter(*args, **kwargs):
+        raise FilterError('Unsupported filter')
+    monkeypatch.setattr(campaigns, 'count_audience', broken_filter)
+    app.config['CAMPAIGN_SPEND_LIMIT'] = 10
+
+    with app.app_context():
+        template = Template(name='Shipped', template_sid='HX1')
+        _db.session.add(template)
+        _db.session.flush()
+        campaign = Campaign(name='Spring', template_id=template.id, db_path=app.config['DEFAULT_DB_PATH'])
+        _db.session.add(campaign)
+        _db.session.commit()
+        campaign_id = campaign.id
+
+        campaigns.execute_campaign(campaign_id)
+
+    with app.app_context():
+        assert Campaign.query.get(campaign_id).status == 'failed'
+        log = CampaignLog.query.filter_by(campaign_id=campaign_id).one()
+        assert (log.status, log.error_message) == ('failure', 'Unsupported filter')
+
+def test_export_streams_and_cli(app, client, runner):
+    """Exports stream from the endpoint and the CLI with the same filters"""
+    from mojo_core.db_utils import log_message_to_db
+
+    db_path = app.config['DEFAULT_DB_PATH']
+    log_message_to_db(db_path, 'ORD1', 'whatsapp:+447700900123', 'HX1', 'SM1', 'queued', campaign_id=7)
+    log_message_to_db(db_path, 'ORD2', 'whatsapp:+447700900124', 'HX1', 'SM2', 'queued')
+
+    response = client.get('/reports/export', query_string={'dataset': 'messages', 'campaign_id': 7})
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    assert 'Content-Length' not in response.headers
+    assert response.headers['Content-Disposition'] == 'attachment; filename=messages_campaign_7.csv'
+    assert b'ORD1' in response.data and b'ORD2' not in response.data
+
+    assert client.get('/reports/export', query_string={'dataset': 'orders'}).status_code == 400
+
+    response = client.get('/reports/export', query_string={'dataset': 'messages', 'start_date': '2024-03-01',
+                                                           'end_date': 'x\r\nSet-Cookie: a=b'})
+    assert response.headers['Content-Disposition'] == 'attachment; filename=messages_2024-03-01.csv'
+    response.close()
+
+    result = runner.invoke(args=['export', 'messages', '--format', 'jsonl'])
+    assert result.exit_code == 0
+    assert [line.count('"order_id"') for line in result.output.splitlines()] == [1, 1]
+
+def test_query_messages_cli(app, runner):
+    """Message history can be queried from the CLI with chosen columns"""
+    from mojo_core.db_utils import log_message_to_db
+
+    log_message_to_db(app.config['DEFAULT_DB_PATH'], 'ORD1', 'whatsapp:+447700900123', 'HX1', 'SM1', 'queued')
+    result = runner.invoke(args=['query-messages', '--columns', 'order_id,message_sid'])
+    assert result.exit_code == 0
+    assert result.output.splitlines() == ['order_id,message_sid', 'ORD1,SM1']
+
+def test_report_files_from_manifest(app, client):
+    """The files page lists and filters reports from the manifest"""
+    from datetime import datetime
+    from mojo_core.report_manifest import record_report
+
+    reports_dir = app.config['REPORTS_DIR']
+    record_report(reports_dir, 'message_report_status_ACTIVE_01-03-25_10-00-00.txt',
+                  {'total': 5, 'successful': 4, 'failed': 1, 'elapsed_time': 2.0, 'order_status': 'ACTIVE'},
+                  datetime(2025, 3, 1, 10))
+    record_report(reports_dir, 'message_report_dry_run_01-04-25_10-00-00.txt',
+                  {'total': 9, 'successful': 9, 'failed': 0, 'elapsed_time': 0.1, 'dry_run': True},
+                  datetime(2025, 4, 1, 10))
+
+    response = client.get('/reports/files')
+    assert response.status_code == 200
+    assert b'2 reports' in response.data
+
+    response = client.get('/reports/files?mode=dry_run')
+    assert b'message_report_dry_run_01-04-25' in response.data
+    assert b'status_ACTIVE' not in response.data
+
+    response = client.get('/reports/files?start_date=2025-02-01&end_date=2025-03-15&status=ACTIVE')
+    assert b'message_report_status_ACTIVE_01-03-25' in response.data
+    assert b'1 report<' in response.data
+
+def test_journal_downloads_as_text(app, client):
+    """A run journal can be downloaded as the text report"""
+    from mojo_core.run_journal import RunJournal
+
+    journal = RunJournal(app.config['REPORTS_DIR'], {'dry_run': True})
+    journal.record({'order_id': 'ORD1', 'recipient': 'Sam', 'phone_number': 'whatsapp:+447700900123',
+                    'status': 'dry-run', 'message_sid': None, 'timestamp': '2025-05-16T18:20:50'})
+    journal.close({'total': 1, 'successful': 1, 'failed': 0, 'elapsed_time': 0.1})
+
+    response = client.get(f'/reports/download/{journal.filename}?format=txt')
+    assert response.status_code == 200
+    assert response.headers['Content-Disposition'].endswith('.txt')
+    assert b'Mode: DRY RUN' in response.data
+    assert b'Total unique recipients: 1' in response.data
+
+def test_report_viewer_pages_and_ranges(app, client):
+    """Reports are viewed a page at a time and downloads honour Range and conditional requests"""
+    from mojo_core.run_journal import RunJournal
+
+    journal = RunJournal(app.config['REPORTS_DIR'], {'dry_run': False})
+    for number in range(250):
+        journal.record({'order_id': f'ORD{number}', 'recipient': 'Sam', 'phone_number': f'whatsapp:+4477009{number:05d}',
+                        'status': 'queued', 'message_sid': f'SM{number}', 'timestamp': '2025-05-16T18:20:50'})
+    journal.close({'total': 250, 'successful': 250, 'failed': 0, 'elapsed_time': 1.0})
+
+    response = client.get(f'/reports/view/{journal.filename}?page=3')
+    assert response.status_code == 200
+    assert b'Messages 201&ndash;250 of 250' in response.data
+    assert b'ORD249' in response.data
+    assert b'ORD199<' not in response.data
+
+    response = client.get(f'/reports/download/{journal.filename}', headers={'Range': 'bytes=0-99'})
+    assert response.status_code == 206
+    assert len(response.data) == 100
+
+    etag = client.get(f'/reports/download/{journal.filename}').headers['ETag']
+    response = client.get(f'/reports/download/{journal.filename}', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+
+def test_archived_report_viewer_and_download(app, client):
+    """Compressed and archived reports are decompressed as they are viewed and downloaded"""
+    import datetime
+    from mojo_core.run_journal import RunJournal
+    from mojo_core.report_retention import apply_retention
+
+    journal = RunJournal(app.config['REPORTS_DIR'], {'dry_run': False})
+    for number in range(150):
+        journal.record({'order_id': f'ORD{number}', 'recipient': 'Sam', 'phone_number': f'whatsapp:+4477009{number:05d}',
+                        'status': 'queued', 'message_sid': f'SM{number}', 'timestamp': '2025-05-16T18:20:50'})
+    journal.close({'total': 150, 'successful': 150, 'failed': 0, 'elapsed_time': 1.0})
+    with open(journal.path, 'rb') as f:
+        original = f.read()
+
+    result = apply_retention(app.config['REPORTS_DIR'], 30, 365, now=datetime.datetime.now() + datetime.timedelta(days=400))
+    assert result['archived'] == 1
+
+    response = client.get(f'/reports/view/{journal.filename}?page=2')
+    assert response.status_code == 200
+    assert b'Messages 101&ndash;150 of 150' in response.data
+    assert b'ORD149' in response.data
+
+    assert client.get(f'/reports/download/{journal.filename}').data == original
+    assert b'Total unique recipients: 150' in client.get(f'/reports/download/{journal.filename}?format=txt').data
+
+def test_legacy_text_report_viewer(app, client):
+    """Text reports written before journals are indexed on first view"""
+    text = ['=' * 80, 'MOJO WHATSAPP MESSAGE REPORT', 'Generated: 2025-05-16 18:12:13', 'Mode: LIVE RUN', '=' * 80, '',
+            'DETAILED MESSAGE LOG:', '-' * 80]
+    for number in range(1, 151):
+        text += [f'Message {number}:', f'  Order ID: ORD{number}', '-' * 80]
+    text += ['', 'SUMMARY:', 'Total unique recipients: 150', 'Successful: 150', 'Failed: 0',
+             'Time elapsed: 9.00 seconds']
+    filename = 'message_report_16-05-25_18-12-13.txt'
+    with open(os.path.join(app.config['REPORTS_DIR'], filename), 'w') as f:
+        f.write('\n'.join(text) + '\n')
+
+    response = client.get(f'/reports/view/{filename}?page=2')
+    assert response.status_code == 200
+    assert b'Messages 101&ndash;150 of 150' in response.data
+    assert b'ORD150' in response.data
+    assert b'ORD100\n' not in response.data
+    assert b'SUMMARY' not in response.data
+    assert b'9.00 seconds' in response.data
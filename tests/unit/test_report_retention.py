@@ -0,0 +1,63 @@
+"""
+Unit tests for the report retention policy
+"""
+import os
+import datetime
+import pytest
+from mojo_core.run_journal import RunJournal, read_journal, read_header_footer, text_report
+from mojo_core.report_manifest import get_report
+from mojo_core.report_index import index_path, read_journal_page
+from mojo_core.report_retention import apply_retention
+from mojo_core import report_storage
+
+SUMMARY = {'total': 3, 'successful': 3, 'failed': 0, 'elapsed_time': 0.5}
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = RunJournal(tmp_path, {'dry_run': False, 'order_status': 'SHIPPED'})
+    for number in range(3):
+        journal.record({'order_id': f"ORD{number}", 'recipient': 'Sam', 'phone_number': f"whatsapp:+4477009001{number}",
+                        'status': 'queued', 'message_sid': f"SM{number}", 'timestamp': '2025-05-16T18:20:50'})
+    journal.close(SUMMARY)
+    return journal
+
+def later(days):
+    return datetime.datetime.now() + datetime.timedelta(days=days)
+
+def test_recent_reports_are_left_alone(journal):
+    """Nothing younger than the compression age is touched"""
+    assert apply_retention(journal.reports_dir, 30, 365) == {'compressed': 0, 'archived': 0}
+    assert os.path.exists(journal.path)
+
+def test_compressed_journal_reads_the_same(journal):
+    """A compressed report replaces the original and reads back unchanged"""
+    before = ''.join(text_report(journal.path))
+    assert apply_retention(journal.reports_dir, 30, 365, now=later(31)) == {'compressed': 1, 'archived': 0}
+
+    assert not os.path.exists(journal.path)
+    assert os.path.exists(journal.path + '.gz')
+    assert get_report(journal.reports_dir, journal.filename)['storage'] == report_storage.GZIP
+    assert ''.join(text_report(journal.path)) == before
+    assert read_header_footer(journal.path)[1]['total'] == 3
+    assert [record['order_id'] for record in read_journal_page(journal.path, 1, 10)] == ['ORD1', 'ORD2']
+
+    # Already compressed reports aren't compressed again
+    assert apply_retention(journal.reports_dir, 30, 365, now=later(31))['compressed'] == 0
+
+def test_archived_journal_reads_from_bundle(journal):
+    """Very old reports move into their month's bundle and are still readable"""
+    assert apply_retention(journal.reports_dir, 30, 365, now=later(400)) == {'compressed': 0, 'archived': 1}
+
+    report = get_report(journal.reports_dir, journal.filename)
+    assert report['archive'] == os.path.join('archive', f"reports-{journal.generated.strftime('%Y-%m')}.tar")
+    assert not report_storage.locate(journal.path)
+    assert not os.path.exists(index_path(journal.path))
+    assert report_storage.report_exists(journal.path)
+    assert len(list(read_journal(journal.path))) == 5
+    assert read_journal_page(journal.path, 2, 10)[0]['order_id'] == 'ORD2'
+
+def test_missing_report_is_not_found(tmp_path):
+    """A report that isn't anywhere raises FileNotFoundError"""
+    with pytest.raises(FileNotFoundError):
+        with report_storage.open_report(os.path.join(tmp_path, 'message_report_16-05-25_18-20-50.jsonl')):
+            pass
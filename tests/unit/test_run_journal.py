@@ -0,0 +1,89 @@
+"""
+Unit tests for send run journals
+"""
+import os
+import pytest
+from mojo_core.run_journal import RunJournal, read_journal, read_header_footer, text_report, HEADER, MESSAGE, FOOTER
+from mojo_core.report_manifest import get_report
+from mojo_core.report_index import index_path, entry_count, read_journal_page, build_index
+
+SUMMARY = {'total': 2, 'successful': 1, 'failed': 1, 'elapsed_time': 1.5}
+
+def entry(number, status, error=None):
+    log_entry = {'order_id': f"ORD{number}", 'recipient': 'Sam', 'phone_number': f"whatsapp:+4477009001{number}",
+                 'status': status, 'message_sid': f"SM{number}" if not error else None,
+                 'timestamp': '2025-05-16T18:20:50'}
+    if error:
+        log_entry['error'] = error
+    return log_entry
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = RunJournal(tmp_path, {'dry_run': False, 'order_status': 'SHIPPED', 'force': False})
+    journal.record(entry(1, 'queued'))
+    journal.record(entry(2, 'failed', 'Invalid number'))
+    return journal
+
+def test_journal_streams_records(journal):
+    """Records are on disk before the run finishes, and the footer is added on close"""
+    assert [record['type'] for record in read_journal(journal.path)] == [HEADER, MESSAGE, MESSAGE]
+    assert read_header_footer(journal.path)[1] is None
+
+    path = journal.close(SUMMARY)
+    header, footer = read_header_footer(path)
+    assert (header['order_status'], footer['type'], footer['failed']) == ('SHIPPED', FOOTER, 1)
+    assert os.path.basename(path).startswith('message_report_status_SHIPPED_')
+
+def test_journal_is_listed_in_manifest(journal):
+    """The manifest lists a run while it is in progress and gets its summary on close"""
+    assert get_report(journal.reports_dir, journal.filename)['total'] is None
+    journal.close(SUMMARY)
+    report = get_report(journal.reports_dir, journal.filename)
+    assert (report['status'], report['total'], report['failed']) == ('SHIPPED', 2, 1)
+
+def test_text_report_rendered_from_journal(journal):
+    """The text report keeps the format of the reports written before journals"""
+    text = ''.join(text_report(journal.close(SUMMARY)))
+    assert 'Mode: LIVE RUN\n' in text
+    assert '  Orders with status: SHIPPED\n' in text
+    assert 'Message 2:\n  Order ID: ORD2\n' in text
+    assert '  Error: Invalid number\n' in text
+    assert text.endswith('SUMMARY:\nTotal unique recipients: 2\nSuccessful: 1\nFailed: 1\nTime elapsed: 1.50 seconds\n')
+
+def test_truncated_line_is_skipped(journal):
+    """A record cut short by a crash doesn't stop the journal being read"""
+    journal._file.write('{"type": "message", "order_id": "OR')
+    journal._file.close()
+    assert len(list(read_journal(journal.path))) == 3
+    assert read_header_footer(journal.path)[1] is None
+
+def test_empty_run_leaves_no_journal(tmp_path):
+    """A run that reaches nobody writes no report"""
+    journal = RunJournal(tmp_path, {'dry_run': True})
+    assert journal.close(SUMMARY) is None
+    assert not os.path.exists(journal.path)
+
+def test_index_written_with_journal(journal):
+    """The offset index is written as records are, and matches a rebuilt one"""
+    journal.close(SUMMARY)
+    with open(index_path(journal.path), 'rb') as f:
+        written = f.read()
+    assert entry_count(journal.path) == 2
+    assert [record['order_id'] for record in read_journal_page(journal.path, 1, 10)] == ['ORD2']
+
+    assert build_index(journal.path) == 2
+    with open(index_path(journal.path), 'rb') as f:
+        assert f.read() == written
+
+def test_send_writes_report_to_given_directory(tmp_path, monkeypatch):
+    """Bulk sends journal into the directory they are given, not the working directory"""
+    from mojo_core.messaging import send_bulk_messages
+
+    monkeypatch.chdir(tmp_path)
+    reports_dir = tmp_path / 'configured'
+    recipients = [{'order_id': 'ORD1', 'recipient': 'Sam', 'formatted_number': 'whatsapp:+447700900123'}]
+    result = send_bulk_messages('unused.db', 'HX1', recipients=recipients, dry_run=True, reports_dir=str(reports_dir))
+
+    assert os.path.dirname(result['report_path']) == str(reports_dir)
+    assert get_report(str(reports_dir), os.path.basename(result['report_path']))['total'] == 1
+    assert not (tmp_path / 'reports').exists()
@@ -0,0 +1,257 @@
+"""
+Unit tests for the local message status store
+"""
+import os
+import sqlite3
+import tempfile
+import pytest
+from mojo_core.db_utils import get_db_connection
+from mojo_core.status_store import (
+    status_event,
+    inbound_event,
+    record_status_events,
+    record_inbound_messages,
+    record_sent_message,
+    start_campaign_run,
+    finish_campaign_run,
+    get_campaign_statuses,
+    get_campaign_funnel,
+    get_spend,
+    estimate_message_cost,
+    status_callback_url,
+    MESSAGE_LIST_SQL
+)
+from mojo_core.migrations import migrate
+from mojo_core.status_writer import StatusWriter, STATUS
+
+@pytest.fixture
+def db_path():
+    """Create a temporary, migrated affiliates database"""
+    db_fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.close(db_fd)
+    get_db_connection(db_path).close()
+
+    yield db_path
+
+    os.unlink(db_path)
+
+def test_status_only_moves_forward(db_path):
+    """Out-of-order callbacks keep the most advanced status and every event"""
+    record_sent_message(db_path, 'SM1', 'whatsapp:+447700900123', 'queued')
+
+    conn = get_db_connection(db_path)
+    record_status_events(conn, [
+        status_event({'MessageSid': 'SM1', 'MessageStatus': 'read'}, event_epoch=300),
+        status_event({'MessageSid': 'SM1', 'MessageStatus': 'delivered'}, event_epoch=200),
+    ])
+    conn.commit()
+
+    row = conn.execute("SELECT status, phone_key FROM message_status WHERE message_sid = 'SM1'").fetchone()
+    assert tuple(row) == ('read', '447700900123')
+    assert conn.execute("SELECT COUNT(*) FROM message_status_events").fetchone()[0] == 3
+    conn.close()
+
+def test_status_event_requires_sid_and_status():
+    """Callbacks without a SID or status are ignored"""
+    assert status_event({'MessageStatus': 'sent'}) is None
+    assert status_event({'MessageSid': 'SM1'}) is None
+
+def test_writer_batches_events(db_path):
+    """Queued events are written by the background thread in batches"""
+    writer = StatusWriter(db_path, max_queue=1000, batch_size=100)
+    for i in range(250):
+        assert writer.submit(STATUS, status_event({'MessageSid': f"SM{i}", 'MessageStatus': 'sent'}))
+    writer.flush()
+
+    conn = get_db_connection(db_path)
+    assert conn.execute("SELECT COUNT(*) FROM message_status").fetchone()[0] == 250
+    conn.close()
+    assert writer.written == 250
+
+def test_writer_refuses_when_full(db_path):
+    """submit() reports a full queue instead of blocking the web worker"""
+    writer = StatusWriter(db_path, max_queue=1)
+    writer._ensure_started = lambda: None  # keep the queue from draining
+    assert writer.submit(STATUS, status_event({'MessageSid': 'SM1', 'MessageStatus': 'sent'}))
+    assert not writer.submit(STATUS, status_event({'MessageSid': 'SM2', 'MessageStatus': 'sent'}))
+
+def test_writer_retries_failed_batches(db_path, monkeypatch):
+    """A batch that fails is written again instead of dropped; Twilio won't resend it"""
+    from mojo_core import status_writer
+    failures = [1, 1]
+    def flaky(conn, events):
+        if failures:
+            failures.pop()
+            raise sqlite3.OperationalError('database is locked')
+        return record_status_events(conn, events)
+    monkeypatch.setattr(status_writer, 'record_status_events', flaky)
+
+    writer = StatusWriter(db_path, retry_delay=0)
+    for i in range(10):
+        writer.submit(STATUS, status_event({'MessageSid': f"SM{i}", 'MessageStatus': 'sent'}))
+    writer.flush()
+    assert (writer.written, writer.errors) == (10, 0)
+
+    conn = get_db_connection(db_path)
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+    assert conn.execute("SELECT COUNT(*) FROM message_status").fetchone()[0] == 10
+    conn.close()
+
+def test_writer_survives_failed_connect(db_path):
+    """A connection that can't be opened is retried instead of ending the writer thread"""
+    writer = StatusWriter(db_path, retry_delay=0)
+    connect = writer._connect
+    failures = [1]
+    def flaky_connect():
+        if failures:
+            failures.pop()
+            raise sqlite3.OperationalError('database is locked')
+        return connect()
+    writer._connect = flaky_connect
+
+    for i in range(5):
+        writer.submit(STATUS, status_event({'MessageSid': f"SM{i}", 'MessageStatus': 'sent'}))
+    writer.flush()
+    assert writer._thread.is_alive()
+    assert (writer.written, writer.errors) == (5, 0)
+
+    conn = get_db_connection(db_path)
+    assert conn.execute("SELECT COUNT(*) FROM message_status").fetchone()[0] == 5
+    conn.close()
+
+def test_dead_writer_thread_is_restarted(db_path):
+    """submit() starts a new writer if the last one died"""
+    from mojo_core import status_writer
+    writer = StatusWriter(db_path)
+    writer.submit(STATUS, status_event({'MessageSid': 'SM1', 'MessageStatus': 'sent'}))
+    writer.flush()
+    dead = writer._thread
+    writer.queue.put(status_writer._STOP)
+    dead.join()
+
+    writer.submit(STATUS, status_event({'MessageSid': 'SM2', 'MessageStatus': 'sent'}))
+    writer.flush()
+    assert writer._thread is not dead and writer.written == 2
+
+def test_writer_drains_queue_on_stop(db_path):
+    """stop() writes everything already queued, then refuses new events"""
+    writer = StatusWriter(db_path, batch_size=10)
+    for i in range(100):
+        writer.submit(STATUS, status_event({'MessageSid': f"SM{i}", 'MessageStatus': 'sent'}))
+    writer.stop()
+    assert writer.written == 100
+    assert not writer._thread.is_alive()
+    assert not writer.submit(STATUS, status_event({'MessageSid': 'SM100', 'MessageStatus': 'sent'}))
+
+def test_deliverability_resolves_buyers_by_index(db_path):
+    """Buyer details come from one indexed contacts lookup, not a scan per message"""
+    conn = get_db_connection(db_path)
+    query = MESSAGE_LIST_SQL.format(direction_condition="t.direction != 'inbound'")
+    plan = conn.execute(f"EXPLAIN QUERY PLAN {query}", (0, 1, 100)).fetchall()
+    details = [row[3] for row in plan]
+    conn.close()
+
+    assert any(detail.startswith('SEARCH c USING INDEX') for detail in details)
+    assert not any(detail.startswith('SCAN') for detail in details)
+
+def rollup_counts(conn, table='message_rollup_daily'):
+    """Non-empty rollup rows as {(status, campaign_id): count}"""
+    rows = conn.execute(f"SELECT status, campaign_id, message_count FROM {table} WHERE message_count > 0").fetchall()
+    return {(status, campaign_id): count for status, campaign_id, count in rows}
+
+def test_rollups_follow_status_changes(db_path):
+    """Each message counts once, under its current status, in hourly and daily rollups"""
+    record_sent_message(db_path, 'SM1', 'whatsapp:+447700900123', 'queued', template_id='HX1', campaign_id=7)
+    record_sent_message(db_path, 'SM2', 'whatsapp:+447700900456', 'queued', template_id='HX1', campaign_id=7)
+
+    conn = get_db_connection(db_path)
+    record_status_events(conn, [
+        status_event({'MessageSid': 'SM1', 'MessageStatus': 'delivered'}),
+        status_event({'MessageSid': 'SM2', 'MessageStatus': 'failed', 'ErrorCode': '63016'}),
+        status_event({'MessageSid': 'SM1', 'MessageStatus': 'sent'}),
+    ])
+    conn.commit()
+
+    assert rollup_counts(conn) == {('delivered', 7): 1, ('failed', 7): 1}
+    assert rollup_counts(conn, 'message_rollup_hourly') == rollup_counts(conn)
+    assert get_campaign_statuses(conn, 7) == {
+        'statuses': {'delivered': 1, 'failed': 1},
+        'errors': {'63016': 1},
+        'total': 2,
+    }
+    conn.close()
+
+def test_migration_builds_rollups_from_existing_statuses(db_path):
+    """Rebuilding the rollups from message_status matches the trigger-maintained counts"""
+    record_sent_message(db_path, 'SM1', 'whatsapp:+447700900123', 'queued', campaign_id=7)
+    conn = get_db_connection(db_path)
+    record_status_events(conn, [status_event({'MessageSid': 'SM1', 'MessageStatus': 'read'})])
+    conn.commit()
+    before = rollup_counts(conn)
+
+    conn.execute("PRAGMA user_version = 8")
+    conn.commit()
+    migrate(conn)
+    assert rollup_counts(conn) == before == {('read', 7): 1}
+    conn.close()
+
+def test_campaign_funnel_per_run(db_path):
+    """Funnels count each stage a run's messages reached, including replies"""
+    run_id = start_campaign_run(db_path, 7)
+    for sid, number in (('SM1', '447700900123'), ('SM2', '447700900456'), ('SM3', '447700900789')):
+        record_sent_message(db_path, sid, f"whatsapp:+{number}", 'queued', campaign_id=7, run_id=run_id)
+
+    conn = get_db_connection(db_path)
+    record_status_events(conn, [
+        status_event({'MessageSid': 'SM1', 'MessageStatus': 'read'}),
+        status_event({'MessageSid': 'SM2', 'MessageStatus': 'delivered'}),
+        status_event({'MessageSid': 'SM3', 'MessageStatus': 'failed', 'ErrorCode': '63016'}),
+    ])
+    record_inbound_messages(conn, [inbound_event({'MessageSid': 'SM9', 'From': 'whatsapp:+447700900123'})])
+    conn.commit()
+    finish_campaign_run(db_path, run_id, campaign_log_id=42)
+
+    funnel = get_campaign_funnel(conn, 7)
+    assert funnel['total'] == {'messages': 3, 'sent': 2, 'delivered': 2, 'read': 1, 'replied': 1, 'failed': 1}
+    assert funnel['errors'] == {'63016': 1}
+    [run] = funnel['runs']
+    assert (run['run_id'], run['campaign_log_id'], run['errors']) == (run_id, 42, {'63016': 1})
+    conn.close()
+
+def priced(sid, price, status='delivered'):
+    """Status event carrying the price the message sync reads from Twilio"""
+    return dict(status_event({'MessageSid': sid, 'MessageStatus': status}), price=price, price_unit='USD')
+
+def test_costs_roll_up_by_country_and_template(db_path):
+    """Prices land in the daily cost rollup once, however often they are synced"""
+    for sid, number, template in (('SM1', '447700900123', 'HX1'), ('SM2', '447700900456', 'HX1'),
+                                  ('SM3', '12025550123', 'HX2')):
+        record_sent_message(db_path, sid, f"whatsapp:+{number}", 'queued', template_id=template, campaign_id=7)
+
+    conn = get_db_connection(db_path)
+    record_status_events(conn, [priced('SM1', -0.005), priced('SM3', -0.025)])
+    record_status_events(conn, [priced('SM1', -0.005, 'read'), priced('SM2', -0.007)])
+    conn.commit()
+
+    spend = {row['key']: (row['messages'], row['priced'], row['cost'])
+             for row in get_spend(conn, 0, 2 ** 31, group_by='country', campaign_id=7)}
+    assert spend == {'44': (2, 2, 0.012), '1': (1, 1, 0.025)}
+    assert [row['key'] for row in get_spend(conn, 0, 2 ** 31, group_by='template')] == ['HX2', 'HX1']
+
+    assert estimate_message_cost(conn, 'HX1')['per_message'] == pytest.approx(0.006)
+    assert estimate_message_cost(conn, 'HX9')['per_message'] == pytest.approx(0.037 / 3)
+    with pytest.raises(ValueError):
+        get_spend(conn, 0, 2 ** 31, group_by='phone_key')
+    conn.close()
+
+def test_status_callback_url_from_base_url(monkeypatch):
+    """The callback URL can be set outright or follow the public base URL"""
+    monkeypatch.delenv('TWILIO_STATUS_CALLBACK_URL', raising=False)
+    monkeypatch.delenv('TWILIO_WEBHOOK_BASE_URL', raising=False)
+    assert status_callback_url() is None
+
+    monkeypatch.setenv('TWILIO_WEBHOOK_BASE_URL', 'https://mojo.example.com/')
+    assert status_callback_url() == 'https://mojo.example.com/webhooks/twilio/status'
+
+    monkeypatch.setenv('TWILIO_STATUS_CALLBACK_URL', 'https://hooks.example.com/status')
+    assert status_callback_url() == 'https://hooks.example.com/status'
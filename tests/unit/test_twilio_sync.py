@@ -0,0 +1,91 @@
+"""
+Unit tests for the incremental Twilio message sync
+"""
+import os
+import tempfile
+from datetime import datetime, timezone
+from types import SimpleNamespace
+import pytest
+from mojo_core.db_utils import get_db_connection
+from mojo_core.twilio_sync import sync_messages, day_slices, get_high_water_mark, DAY, LOOKBACK_SECONDS
+
+NOW = 1750000000
+
+@pytest.fixture
+def db_path():
+    """Create a temporary, migrated affiliates database"""
+    db_fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.close(db_fd)
+    get_db_connection(db_path).close()
+
+    yield db_path
+
+    os.unlink(db_path)
+
+def make_message(sid, sent_epoch, status='delivered', direction='outbound-api'):
+    """A MessageInstance-like object"""
+    sent = datetime.fromtimestamp(sent_epoch, tz=timezone.utc)
+    return SimpleNamespace(
+        sid=sid, direction=direction, from_='whatsapp:+15551234567', to='whatsapp:+447700900123',
+        body='Hello', status=status, error_code=None, error_message=None, price='-0.005',
+        price_unit='USD', num_segments='1', date_created=sent, date_sent=sent, date_updated=sent
+    )
+
+class FakeClient:
+    """Serves Messages.list pages from a fixed message list, recording each range asked for"""
+
+    def __init__(self, messages):
+        self.all_messages = messages
+        self.ranges = []
+        self.messages = self
+
+    def stream(self, date_sent_after, date_sent_before, page_size):
+        self.ranges.append((int(date_sent_after.timestamp()), int(date_sent_before.timestamp())))
+        return [m for m in self.all_messages if date_sent_after <= m.date_sent < date_sent_before]
+
+def test_day_slices_cover_range():
+    """Slices are contiguous, at most a day long, and end at the range end"""
+    slices = day_slices(0, 2 * DAY + 5)
+    assert slices == [(0, DAY), (DAY, 2 * DAY), (2 * DAY, 2 * DAY + 5)]
+
+def test_first_sync_fetches_every_day(db_path):
+    """All messages in the initial range are stored, however many there are"""
+    messages = [make_message(f"SM{i}", NOW - i * 3600) for i in range(300)]
+    client = FakeClient(messages)
+
+    assert sync_messages(client, db_path, now=NOW, initial_days=30) == 300
+    assert len(client.ranges) == 31
+
+    conn = get_db_connection(db_path)
+    assert conn.execute("SELECT COUNT(*) FROM twilio_messages").fetchone()[0] == 300
+    assert get_high_water_mark(conn) == NOW
+    conn.close()
+
+def test_incremental_sync_rereads_lookback(db_path):
+    """Later syncs start from the high-water mark minus the lookback window"""
+    client = FakeClient([make_message('SM1', NOW - 3600, status='sent')])
+    sync_messages(client, db_path, now=NOW, initial_days=1)
+
+    client = FakeClient([make_message('SM1', NOW - 3600, status='read'), make_message('SM2', NOW + 600)])
+    assert sync_messages(client, db_path, now=NOW + 1200) == 2
+    assert client.ranges[0][0] == NOW - LOOKBACK_SECONDS
+
+    conn = get_db_connection(db_path)
+    rows = conn.execute("SELECT sid, status, price FROM twilio_messages ORDER BY sid").fetchall()
+    assert [tuple(row) for row in rows] == [('SM1', 'read', -0.005), ('SM2', 'delivered', -0.005)]
+    assert get_high_water_mark(conn) == NOW + 1200
+    conn.close()
+
+def test_quiet_periods_advance_the_mark(db_path):
+    """With nothing sent, the mark still moves to the end of the scan, so the lookback is only re-read once"""
+    sync_messages(FakeClient([make_message('SM1', NOW - 3600)]), db_path, now=NOW, initial_days=1)
+
+    later = NOW + 10 * DAY
+    sync_messages(FakeClient([]), db_path, now=later)
+    conn = get_db_connection(db_path)
+    assert get_high_water_mark(conn) == later
+    conn.close()
+
+    client = FakeClient([])
+    sync_messages(client, db_path, now=later + 300, lookback_seconds=600)
+    assert client.ranges == [(later - 600, later + 301)]